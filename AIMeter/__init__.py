@@ -0,0 +1,13 @@
+"""
+AIMeter：GPU / CPU / DRAM 的功耗与性能监控。
+包内模块以相对导入互相引用（如 from . import state），导入本包不修改 sys.path，
+因此包内的通用模块名（config、state、save 等）不会遮蔽宿主程序中的同名模块。
+"""
+
+
+def __getattr__(name):
+    # session 按需导入：只 import AIMeter 时不加载监控模块
+    if name == "session":
+        from .async_engine import session
+        return session
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,60 @@
+class AdaptiveInterval:
+    """
+    自适应采样间隔控制器：
+    每次采样后比较功耗和利用率相对上一次采样的变化量，
+    任一信号的变化超过阈值时立即切换到最小间隔，信号平稳时按 backoff 倍数逐步放宽到最大间隔。
+    - 功耗（power.draw [W]、cpu_power、dram_power）按相对变化计算：|Δ| / max(|上次值|, 1 W)
+    - 利用率（utilization.gpu [%]、cpu_usage）按满量程计算：|Δ| / 100
+    """
+
+    POWER_KEYS = ('power.draw [W]', 'cpu_power', 'dram_power')
+    UTILIZATION_KEYS = ('utilization.gpu [%]', 'cpu_usage')
+
+    def __init__(self, min_interval: float, max_interval: float, threshold: float = 0.1,
+                 initial: float = None, backoff: float = 1.5):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("adaptive sampling requires 0 < min_interval <= max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.threshold = threshold
+        self.backoff = backoff
+        self.interval = min(max(initial if initial is not None else max_interval, min_interval), max_interval)
+        self._last = {}
+        # 统计：实际采样次数，以及触发加速的次数
+        self.samples = 0
+        self.speedups = 0
+
+    def _signals(self, metrics: dict):
+        """展开本次采样中参与判断的信号：(GPU索引 或 None, 指标名) -> (值, 是否为功耗)"""
+        for key in self.POWER_KEYS + self.UTILIZATION_KEYS:
+            value = metrics.get(key)
+            if value is not None:
+                yield (None, key), value, key in self.POWER_KEYS
+        for gpu_data in metrics.get('gpu_info') or []:
+            for key in self.POWER_KEYS + self.UTILIZATION_KEYS:
+                value = gpu_data.get(key)
+                if value is not None:
+                    yield (gpu_data.get('index'), key), value, key in self.POWER_KEYS
+
+    def change(self, metrics: dict) -> float:
+        """返回本次采样相对上一次采样的最大归一化变化量，并记录本次的值"""
+        largest = 0.0
+        for signal, value, is_power in self._signals(metrics):
+            last = self._last.get(signal)
+            self._last[signal] = value
+            if last is None:
+                continue
+            scale = max(abs(last), 1.0) if is_power else 100.0
+            largest = max(largest, abs(value - last) / scale)
+        return largest
+
+    def update(self, metrics: dict) -> float:
+        """根据本次采样结果计算并返回下一次采样的间隔（秒）"""
+        self.samples += 1
+        if self.change(metrics) > self.threshold:
+            if self.interval > self.min_interval:
+                self.speedups += 1
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return self.interval
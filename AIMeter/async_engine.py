@@ -0,0 +1,213 @@
+import time
+import asyncio
+from .collectors import build_collectors
+from .engine import CollectionEngine
+from .sampler import Sampler, note_shared
+from .monitor import Monitor
+from .resources_consumption_record import record_time
+from .tracing import span
+from . import tracing
+from . import state
+
+
+class AsyncCollectionEngine(CollectionEngine):
+    """
+    asyncio 采集引擎：采集器、多速率调度和结果合并与 CollectionEngine 相同，
+    区别在于 collect() 是协程，本次到期的采集器以 asample() 并发运行（asyncio.gather）：
+    nvidia-smi / dcgmi 一次性调用使用 asyncio 子进程，常驻子进程读取最新值槽，NVML 调用放到默认线程池，
+    procfs / sysfs 直接读取（见 Collector.asample），等待期间事件循环照常处理其它任务。
+    不创建线程池；超过 timeout 的采集器被取消（一次性调用的子进程随之结束），本次结果中没有它的数据。
+    取消后仍未结束的采集器（线程池中无法中断的 NVML 调用）在结束之前不再运行，与 CollectionEngine 相同。
+    """
+
+    def open(self) -> None:
+        for collector in self.collectors:
+            collector.open()
+
+    async def _asample(self, i):
+        """运行第 i 个采集器，返回 (结果, 开始时刻, 结束时刻)，时刻为 monotonic 纳秒；超时返回 None"""
+        collector = self.collectors[i]
+        start_ns = time.monotonic_ns()
+        task = asyncio.ensure_future(collector.asample())
+        try:
+            done, _ = await asyncio.wait([task], timeout=self.timeout)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if not done:
+            # 取消后 task 可能仍要等线程中的调用返回才结束，在此之前本采集器不再运行
+            task.cancel()
+            self._in_flight[i] = task
+            print(f"Failed to collect metric: {collector.name} - timeout (skipped until it returns)")
+            return None
+        try:
+            result = task.result()
+        except Exception as e:
+            print(f"Failed to collect metric: {collector.name} - {e}")
+            result = None
+        end_ns = time.monotonic_ns()
+        record_time(f"collector.{collector.name}", end_ns - start_ns)
+        tracer = state._tracer
+        if tracer is not None:
+            # 并发的采集器在事件循环线程中互相重叠，各自放在一条虚拟线程上
+            tracer.add(collector.name, "collector", start_ns, end_ns, lane=f"collector {collector.name}")
+        return result, start_ns, end_ns
+
+    async def collect(self, now_ns: int = None) -> dict:
+        """执行一次采样，返回值与 CollectionEngine.collect() 相同"""
+        if not self.collectors:
+            return {'gpu_info': []}
+        due = self._due(time.monotonic_ns() if now_ns is None else now_ns)
+        runnable = [i for i in due if not self._busy(i)]
+        outcomes = await asyncio.gather(*(self._asample(i) for i in runnable))
+        results = {i: outcome for i, outcome in zip(runnable, outcomes) if outcome is not None}
+        with span("merge", "engine"):
+            return self._merge(due, results)
+
+    def close(self) -> None:
+        # 取消后 task 要等线程中的调用返回才结束，对应的采集器由 super().close() 推迟到那时再关闭
+        for task in self._in_flight.values():
+            task.cancel()
+        super().close()
+
+
+class AsyncSampler(Sampler):
+    """
+    运行在事件循环中的共享采样器：采样循环是一个 asyncio 任务，按 DeadlineScheduler 的截止时刻 await asyncio.sleep，
+    采集由 AsyncCollectionEngine 完成，整个过程不阻塞事件循环，也不创建采样线程。
+    订阅、分发和补齐与 Sampler 相同；同一事件循环中的所有 AsyncMonitor 共享一个（见 acquire / release）。
+    """
+    _task = None
+    loop = None
+
+    def _build_engine(self):
+        return AsyncCollectionEngine(build_collectors(self.additional_metrics, self.indices, **self._collector_config))
+
+    def start(self) -> None:
+        """在当前运行的事件循环中启动采样任务，必须在协程中调用"""
+        self.loop = asyncio.get_running_loop()
+        self.engine.open()
+        self.start_monotonic = time.monotonic()
+        self.running = True
+        self._task = self.loop.create_task(self._run())
+
+    def stop(self) -> None:
+        """取消采样任务（进行中的采集随之取消），采集器在任务退出时关闭；await wait_closed() 等待任务结束"""
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+
+    async def wait_closed(self) -> None:
+        if self._task is not None:
+            await asyncio.wait([self._task])
+
+    async def _run(self) -> None:
+        """采样任务：按调度器给出的绝对截止时刻循环采集数据，直到被取消"""
+        scheduler = self.scheduler
+        scheduler.start()
+        try:
+            while self.running:
+                interval = None  # 为空时按调度器创建时的间隔推进
+                try:
+                    t = tracing.now()
+                    await asyncio.sleep(max(scheduler.remaining(), 0))
+                    deadline = scheduler.woke()
+                    tracing.lap('wait', t, 'scheduler')
+                    stamp = self._stamp()
+                    metrics = await self.engine.collect(deadline)
+                    collected_ns = time.monotonic_ns()
+                    record_time('stage.collect', collected_ns - stamp[1])
+                    interval = self._deliver(metrics, stamp)
+                    published_ns = time.monotonic_ns()
+                    record_time('stage.publish', published_ns - collected_ns)
+                    record_time('stage.tick', published_ns - stamp[1])
+                    tracing.lap('tick', stamp[1], 'sampler')
+                except Exception as e:
+                    print(f"监控过程中出现错误: {e}")
+                finally:
+                    scheduler.advance(interval)
+        finally:
+            self.engine.close()
+
+
+def acquire(session, **config) -> AsyncSampler:
+    """
+    为会话取得当前事件循环的共享 asyncio 采样器：没有时按 config 创建并启动，否则复用（见 sampler.acquire）。
+    asyncio 会话始终在事件循环中采样，不使用采样子进程和节点采样守护进程，也不支持开销预算
+    """
+    loop = asyncio.get_running_loop()
+    if config.pop('sampler_process', False):
+        print(f"Note: session '{session.task_name}' samples in the event loop; sampler_process is ignored.")
+    config.pop('use_daemon', None)
+    if config.pop('overhead_budget', None):
+        # 事件循环线程的 CPU 时间包含应用自身的协程，无法单独计量采样器的开销
+        print(f"Note: session '{session.task_name}' samples in the event loop; overhead_budget is not supported there and is ignored.")
+    sampler = state._async_samplers.get(loop)
+    if sampler is None:
+        sampler = AsyncSampler(**config)
+        # 先订阅再启动，保证第一次（所有采集器都运行的）采样交给第一个会话
+        sampler.subscribe(session)
+        sampler.start()
+        state._async_samplers[loop] = sampler
+    else:
+        note_shared(sampler, session, config)
+        sampler.subscribe(session)
+    return sampler
+
+
+def release(session):
+    """退订会话；最后一个会话退订时停止它所在事件循环的采样器并返回它，否则返回 None"""
+    sampler = session._sampler
+    if sampler is None or sampler.unsubscribe(session) > 0:
+        return None
+    sampler.stop()
+    state._async_samplers.pop(sampler.loop, None)
+    return sampler
+
+
+class AsyncMonitor(Monitor):
+    """
+    事件循环中的监控会话，由 session() 创建，用法为 async with session(...) as s。
+    与 Monitor 的区别只在采样器：订阅当前事件循环共享的 AsyncSampler，而不是采样线程；
+    mark / phase / energy_since / phases / window 与 Monitor 相同，都不阻塞事件循环。
+    订阅和退订只是列表操作，配合 output_format="none"、quiet=True 可以为每个请求创建一个会话；
+    退出 async with 后，stop() 返回的 RunSummary 保存在 result 中。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.result = None
+
+    def _acquire(self):
+        return acquire(self, **self._config)
+
+    def _release(self):
+        return release(self)
+
+    def window(self, seconds: float = None, gpu=None):
+        """读取本事件循环共享采样器内存环形缓冲区中的最近样本，见 monitor.window()"""
+        sampler = self._sampler
+        if sampler is None:
+            return {} if gpu is None else None
+        return sampler.ring.window(seconds, gpu)
+
+    async def __aenter__(self) -> "AsyncMonitor":
+        return self.start()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        sampler = self._sampler
+        self.result = self.stop()
+        # 最后一个会话退出时等待采样任务结束、采集器关闭
+        if sampler is not None and not sampler.running:
+            await sampler.wait_closed()
+
+
+def session(task_name: str, **kwargs) -> AsyncMonitor:
+    """
+    创建事件循环中的监控会话，参数与 monitor.Monitor 相同：
+        async with aimeter.session("request-42", output_format="none", quiet=True) as s:
+            with s.phase("decode"):
+                await generate()
+        print(s.result.energy['total'])
+    """
+    return AsyncMonitor(task_name, **kwargs)
@@ -0,0 +1,404 @@
+import psutil
+from abc import ABC, abstractmethod
+from array import array
+from .metrics_collect import (get_gpu_info, run_dcgm_query, get_gpu_info_async, run_dcgm_query_async, plan_queries,
+                              get_dram_usage_info, GPU_QUERY_HEADERS, GPU_FIELD_GROUPS)
+from .metrics_stream import NvidiaSmiStream, DcgmStream
+from .host_readers import RaplReader, CpuStatReader
+
+# backend='nvml' 时 PCIe 吞吐采集器（'pcie'）的默认间隔（秒），可在 intervals 中覆盖
+PCIE_THROUGHPUT_INTERVAL = 10
+
+
+class Collector(ABC):
+    """
+    采集器接口：
+    open() 在监控启动时调用一次，用于建立常驻资源（子进程、设备句柄等）；
+    sample() 在每次采样时调用；close() 在监控停止时释放资源。
+    kind 为 'gpu' 的采集器返回每个GPU一个字典的列表（含 'index'），
+    kind 为 'host' 的采集器返回主机级指标字典。
+    interval 为该采集器自己的采样间隔（秒），为 None 时每个调度时刻都运行（见 CollectionEngine）。
+    asample() 是供 AsyncCollectionEngine 使用的协程版本，不得阻塞事件循环；默认直接调用 sample()，
+    适用于只读取 procfs / sysfs 的主机级采集器：这些文件由内核在内存中生成，读取不涉及磁盘 I/O，
+    单次读取在微秒级，比交给线程池或另起子进程的开销更小。
+    """
+    name = "collector"
+    kind = "gpu"
+    interval = None
+
+    def open(self) -> None:
+        pass
+
+    @abstractmethod
+    def sample(self):
+        raise NotImplementedError
+
+    async def asample(self):
+        return self.sample()
+
+    def close(self) -> None:
+        pass
+
+
+class NvidiaSmiCollector(Collector):
+    """
+    nvidia-smi 采集器，支持一次性调用和常驻子进程（stream）两种模式。
+    headers 可只查询部分字段（必须包含 index），用于多速率采样时按字段组拆分出的采集器
+    """
+    name = "nvidia-smi"
+
+    def __init__(self, indices=None, stream: bool = False, interval_ms: int = 1000, headers=GPU_QUERY_HEADERS, name: str = None):
+        self.indices = list(indices or [])
+        self.stream = stream
+        self.interval_ms = interval_ms
+        self.headers = list(headers)
+        if name:
+            self.name = name
+        self._stream = None
+
+    def open(self) -> None:
+        if self.stream:
+            stream = NvidiaSmiStream(self.indices, interval_ms=self.interval_ms, headers=self.headers)
+            if stream.start():
+                self._stream = stream
+
+    def sample(self):
+        # 常驻子进程存活且已有数据时直接读取最新值槽，否则回退到一次性调用
+        if self._stream is not None:
+            streamed = self._stream.latest()
+            if streamed:
+                return streamed
+        return get_gpu_info(self.indices, self.headers)
+
+    async def asample(self):
+        # 读取常驻子进程的最新值槽不阻塞；一次性调用改用 asyncio 子进程
+        if self._stream is not None:
+            streamed = self._stream.latest()
+            if streamed:
+                return streamed
+        return await get_gpu_info_async(self.indices, self.headers)
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream = None
+
+
+class DcgmCollector(Collector):
+    """dcgmi dmon 采集器，字段列表由 plan_queries 合并得到，支持一次性调用和常驻子进程两种模式"""
+    name = "dcgmi"
+
+    def __init__(self, fields: str, indices=None, stream: bool = False, interval_ms: int = 1000):
+        self.fields = fields
+        self.indices = list(indices or [])
+        self.stream = stream
+        self.interval_ms = interval_ms
+        self._stream = None
+
+    def open(self) -> None:
+        if self.stream:
+            stream = DcgmStream(self.indices, interval_ms=self.interval_ms, fields=self.fields)
+            if stream.start():
+                self._stream = stream
+
+    def sample(self):
+        if self._stream is not None:
+            streamed = self._stream.latest()
+            if streamed:
+                return streamed
+        return run_dcgm_query(self.fields, self.indices)
+
+    async def asample(self):
+        if self._stream is not None:
+            streamed = self._stream.latest()
+            if streamed:
+                return streamed
+        return await run_dcgm_query_async(self.fields, self.indices)
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream = None
+
+
+class NvmlCollector(Collector):
+    """
+    进程内 NVML 采集器：
+    open() 时初始化 NVML 并缓存设备句柄和设备名称，sample() 直接调用库函数读取
+    功耗、利用率、时钟、温度和 PCIe 计数，不再启动子进程或解析文本。
+    输出字段和类型与 nvidia-smi 采集器一致（单位见 metric_schema），另外补充 PCIe 收发吞吐。
+    参数 nvml 可传入替代 pynvml 的模块（例如测试用的假 NVML 模块）。
+    fields 可只读取 FIELDS 中的部分字段（多速率采样时按字段组拆分），name 与 index 始终输出。
+    nvmlDeviceGetPcieThroughput 每次调用在驱动中阻塞约 20 ms，build_collectors 因此把 PCIe 吞吐
+    拆到单独的 'pcie' 采集器，默认每 PCIE_THROUGHPUT_INTERVAL 秒采集一次。
+    NVML 初始化失败时回退到 nvidia-smi 一次性采集（nvidia-smi 没有 PCIe 吞吐字段）。
+    """
+    name = "nvml"
+
+    FIELDS = (
+        'power.draw [W]', 'utilization.gpu [%]', 'utilization.memory [%]',
+        'pcie.link.gen.current', 'pcie.link.width.current', 'temperature.gpu', 'temperature.memory',
+        'clocks.current.graphics [MHz]', 'clocks.current.memory [MHz]', 'clocks.current.sm [MHz]',
+        'pcie_tx_bytes', 'pcie_rx_bytes',
+    )
+    THROUGHPUT_FIELDS = ('pcie_tx_bytes', 'pcie_rx_bytes')
+
+    def __init__(self, indices=None, nvml=None, fields=None, name: str = None):
+        self.indices = list(indices or [])
+        self.fields = set(fields) if fields is not None else set(self.FIELDS)
+        if name:
+            self.name = name
+        self._nvml = nvml
+        self._handles = []  # [(GPU索引, 句柄, 设备名称)]
+        self._fallback = None
+
+    def open(self) -> None:
+        try:
+            if self._nvml is None:
+                import pynvml
+                self._nvml = pynvml
+            nvml = self._nvml
+            nvml.nvmlInit()
+            indices = self.indices or range(nvml.nvmlDeviceGetCount())
+            for idx in indices:
+                handle = nvml.nvmlDeviceGetHandleByIndex(int(idx))
+                name = nvml.nvmlDeviceGetName(handle)
+                if isinstance(name, bytes):
+                    name = name.decode('utf-8')
+                self._handles.append((int(idx), handle, name))
+        except Exception as e:
+            print(f"NVML 初始化失败，回退到 nvidia-smi 采集: {e}")
+            self._handles = []
+            headers = [h for h in GPU_QUERY_HEADERS if h in ('name', 'index') or h in self.fields]
+            if len(headers) > 2:
+                self._fallback = NvidiaSmiCollector(self.indices, headers=headers)
+
+    def _read(self, func, *args):
+        """读取单个 NVML 指标，设备不支持时返回 None"""
+        try:
+            return func(*args)
+        except Exception:
+            return None
+
+    def sample(self):
+        if self._fallback is not None:
+            return self._fallback.sample()
+        nvml = self._nvml
+        fields = self.fields
+        gpu_data_list = []
+        for idx, handle, name in self._handles:
+            gpu_data = {'name': name, 'index': idx}
+
+            if 'power.draw [W]' in fields:
+                power_mw = self._read(nvml.nvmlDeviceGetPowerUsage, handle)
+                gpu_data['power.draw [W]'] = power_mw / 1000 if power_mw is not None else None
+
+            if 'utilization.gpu [%]' in fields or 'utilization.memory [%]' in fields:
+                # 一次调用同时返回两项利用率，只输出请求的字段，与 nvidia-smi 采集器保持一致
+                util = self._read(nvml.nvmlDeviceGetUtilizationRates, handle)
+                if 'utilization.gpu [%]' in fields:
+                    gpu_data['utilization.gpu [%]'] = float(util.gpu) if util is not None else None
+                if 'utilization.memory [%]' in fields:
+                    gpu_data['utilization.memory [%]'] = float(util.memory) if util is not None else None
+
+            if 'pcie.link.gen.current' in fields:
+                gpu_data['pcie.link.gen.current'] = self._read(nvml.nvmlDeviceGetCurrPcieLinkGeneration, handle)
+            if 'pcie.link.width.current' in fields:
+                gpu_data['pcie.link.width.current'] = self._read(nvml.nvmlDeviceGetCurrPcieLinkWidth, handle)
+
+            if 'temperature.gpu' in fields:
+                temp = self._read(nvml.nvmlDeviceGetTemperature, handle, nvml.NVML_TEMPERATURE_GPU)
+                gpu_data['temperature.gpu'] = float(temp) if temp is not None else None
+            if 'temperature.memory' in fields:
+                gpu_data['temperature.memory'] = self._read_memory_temperature(handle)
+
+            for field, clock in (
+                ('clocks.current.graphics [MHz]', nvml.NVML_CLOCK_GRAPHICS),
+                ('clocks.current.memory [MHz]', nvml.NVML_CLOCK_MEM),
+                ('clocks.current.sm [MHz]', nvml.NVML_CLOCK_SM),
+            ):
+                if field in fields:
+                    mhz = self._read(nvml.nvmlDeviceGetClockInfo, handle, clock)
+                    gpu_data[field] = float(mhz) if mhz is not None else None
+
+            # PCIe 吞吐，NVML 以 KB/s 返回
+            for field, counter in (
+                ('pcie_tx_bytes', nvml.NVML_PCIE_UTIL_TX_BYTES),
+                ('pcie_rx_bytes', nvml.NVML_PCIE_UTIL_RX_BYTES),
+            ):
+                if field in fields:
+                    kbps = self._read(nvml.nvmlDeviceGetPcieThroughput, handle, counter)
+                    gpu_data[field] = kbps * 1024 / 1024**3 if kbps is not None else None
+
+            gpu_data_list.append(gpu_data)
+        return gpu_data_list
+
+    async def asample(self):
+        if self._fallback is not None:
+            return await self._fallback.asample()
+        # NVML 调用进入驱动，个别查询（如 PCIe 吞吐）会阻塞数十毫秒，放到默认线程池中执行
+        import asyncio
+        future = asyncio.get_running_loop().run_in_executor(None, self.sample)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # 线程中的调用无法中断：等它返回后再结束，引擎在此之前不会再次运行本采集器（NVML 句柄不是线程安全的）
+            await asyncio.wait([future])
+            raise
+
+    def _read_memory_temperature(self, handle):
+        """显存温度只能通过字段值接口读取，旧版驱动或 pynvml 不支持时返回 None"""
+        nvml = self._nvml
+        field_id = getattr(nvml, 'NVML_FI_DEV_MEMORY_TEMP', None)
+        if field_id is None:
+            return None
+        values = self._read(nvml.nvmlDeviceGetFieldValues, handle, [field_id])
+        if not values or getattr(values[0], 'nvmlReturn', 1) != 0:
+            return None
+        return float(values[0].value.uiVal)
+
+    def close(self) -> None:
+        if self._handles:
+            try:
+                self._nvml.nvmlShutdown()
+            except Exception:
+                pass
+        self._handles = []
+
+
+class FunctionCollector(Collector):
+    """将已有的单值采集函数（如 get_cpu_usage_info）包装为主机级采集器"""
+    kind = "host"
+
+    def __init__(self, key: str, func):
+        self.name = key
+        self.key = key
+        self.func = func
+
+    def sample(self):
+        return {self.key: self.func()}
+
+
+class CpuStatCollector(Collector):
+    """
+    CPU 利用率采集器：基于 /proc/stat 累计 tick 在两次采样之间的差值，不阻塞采样线程。
+    输出 cpu_usage（总利用率）和 cpu_usage_per_core（每核利用率，array('f')）。
+    无法读取 /proc/stat 时回退到 psutil 的非阻塞模式（interval=None）。
+    """
+    name = "cpu_stat"
+    kind = "host"
+
+    def __init__(self, path: str = "/proc/stat"):
+        self.reader = CpuStatReader(path)
+        self._use_psutil = False
+
+    def open(self) -> None:
+        if not self.reader.open():
+            self._use_psutil = True
+            psutil.cpu_percent(interval=None, percpu=True)  # 建立 psutil 的基准
+
+    def sample(self):
+        if self._use_psutil:
+            per_core = array('f', psutil.cpu_percent(interval=None, percpu=True))
+            total = sum(per_core) / len(per_core) if per_core else None
+        else:
+            total, per_core = self.reader.read()
+        if total is None:
+            return {'cpu_usage': None, 'cpu_usage_per_core': None}
+        return {'cpu_usage': total, 'cpu_usage_per_core': per_core}
+
+    def close(self) -> None:
+        self.reader.close()
+
+
+class RaplCollector(Collector):
+    """
+    RAPL 功耗采集器：包装常开的 RaplReader，功耗由与上一次采样之间的计数差值得到。
+    输出 cpu_power / dram_power 总和（W）；多路服务器另外输出每个插槽的 cpu_power.socketN / dram_power.socketN。
+    """
+    name = "rapl"
+    kind = "host"
+
+    def __init__(self, cpu: bool = True, dram: bool = True, root: str = "/sys/class/powercap"):
+        self.cpu = cpu
+        self.dram = dram
+        self.reader = RaplReader(root)
+
+    def open(self) -> None:
+        self.reader.open()
+
+    def sample(self):
+        powers = self.reader.read()
+        metrics = {}
+        for enabled, kind, key in ((self.cpu, 'package', 'cpu_power'), (self.dram, 'dram', 'dram_power')):
+            if not enabled:
+                continue
+            per_socket = powers.get(kind, {})
+            total = sum(per_socket.values())
+            metrics[key] = total if per_socket else None
+            if len(per_socket) > 1:
+                for socket in sorted(per_socket):
+                    metrics[f"{key}.socket{socket}"] = per_socket[socket]
+        return metrics
+
+    def close(self) -> None:
+        self.reader.close()
+
+
+def build_collectors(additional_metrics, indices=None, backend: str = "nvidia-smi", collect_mode: str = "oneshot", interval_ms: int = 1000,
+                     intervals: dict = None, default_interval: float = None):
+    """
+    根据监控配置创建采集器列表（尚未 open）。
+    GPU 采集器按 plan_queries 的顺序排列，第一个提供每个GPU的基础数据。
+    参数:
+    backend (str): 基础 GPU 指标的后端，'nvidia-smi' 或 'nvml'；Gdetails / fp 指标始终使用 dcgmi
+    collect_mode (str): 'oneshot' 或 'stream'（常驻子进程，仅对命令行后端有效）
+    intervals (dict): 多速率采样，采集器名称 -> 采样间隔（秒）。采集器名称为
+        'nvidia-smi' / 'nvml'（基础 GPU 指标）、'dcgmi'、'cpu_stat'、'dram_usage'、'rapl'，
+        另外 GPU_FIELD_GROUPS 中的字段组（'power'、'link'）出现时会从基础 GPU 查询中拆出为独立采集器；
+        backend='nvml' 时 PCIe 吞吐始终由 'pcie' 采集器读取，未列出时间隔为 PCIE_THROUGHPUT_INTERVAL
+    default_interval (float): intervals 中未列出的采集器的间隔，为空时每个调度时刻都运行
+    """
+    additional_metrics = additional_metrics or []
+    intervals = dict(intervals or {})
+    stream = collect_mode == "stream"
+    split_groups = [group for group in GPU_FIELD_GROUPS if group in intervals]
+    split_fields = {field for group in split_groups for field in GPU_FIELD_GROUPS[group]}
+
+    def stream_interval_ms(name):
+        # 常驻子进程按该采集器自己的间隔输出
+        interval = intervals.get(name, default_interval)
+        return max(int(interval * 1000), 1) if interval else interval_ms
+
+    collectors = []
+    for query in plan_queries(additional_metrics, indices):
+        if query['backend'] == 'dcgmi':
+            collectors.append(DcgmCollector(query['fields'], query['indices'], stream=stream, interval_ms=stream_interval_ms("dcgmi")))
+        elif backend == "nvml":
+            base_fields = [f for f in NvmlCollector.FIELDS if f not in split_fields and f not in NvmlCollector.THROUGHPUT_FIELDS]
+            collectors.append(NvmlCollector(query['indices'], fields=base_fields))
+            for group in split_groups:
+                collectors.append(NvmlCollector(query['indices'], fields=GPU_FIELD_GROUPS[group], name=group))
+            collectors.append(NvmlCollector(query['indices'], fields=NvmlCollector.THROUGHPUT_FIELDS, name="pcie"))
+        else:
+            headers = [h for h in GPU_QUERY_HEADERS if h not in split_fields]
+            collectors.append(NvidiaSmiCollector(query['indices'], stream=stream, interval_ms=stream_interval_ms("nvidia-smi"), headers=headers))
+            for group in split_groups:
+                collectors.append(NvidiaSmiCollector(query['indices'], stream=stream, interval_ms=stream_interval_ms(group),
+                                                     headers=['index'] + GPU_FIELD_GROUPS[group], name=group))
+    if 'CPU' in additional_metrics:
+        collectors.append(CpuStatCollector())
+    if 'DRAM' in additional_metrics:
+        collectors.append(FunctionCollector("dram_usage", get_dram_usage_info))
+    if 'CPU' in additional_metrics or 'DRAM' in additional_metrics:
+        # CPU 与 DRAM 功耗共用一个 RAPL 读取器
+        collectors.append(RaplCollector(cpu='CPU' in additional_metrics, dram='DRAM' in additional_metrics))
+
+    names = {collector.name for collector in collectors}
+    for name in intervals:
+        if name not in names:
+            print(f"Warning: no collector named '{name}' in this session, its interval is ignored.")
+    for collector in collectors:
+        default = PCIE_THROUGHPUT_INTERVAL if collector.name == "pcie" else default_interval
+        collector.interval = intervals.get(collector.name, default)
+    return collectors
@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 import re
 from collections import defaultdict
+from .metric_schema import coerce_numeric, is_meta_column
+from .metrics_calculate import prepare_time, align_to_ticks, ELAPSED_COL
 
 # --- Pandas 显示选项设置 ---
 # 设置一个足够宽的显示宽度，以便在控制台中更好地显示表格
@@ -11,24 +13,6 @@ pd.set_option('display.max_colwidth', None)
 # 列标题左对齐
 pd.set_option('display.colheader_justify', 'left')
 
-def clean_value(value):
-    """
-    清洗单个数据值：
-    - 如果不是字符串，则先转换为字符串（处理可能被读取为浮点数的数字）。
-    - 去除首尾空格。
-    - 移除常见单位（%，°C，MHz，W，GB/s）。
-    - 尝试转换为浮点数，如果失败则返回 NaN。
-    """
-    if pd.isna(value):
-        return np.nan
-    value_str = str(value).strip()
-    # 使用正则表达式移除末尾的单位，允许单位前有可选空格
-    value_str = re.sub(r'\s*(%|°C|MHz|W|GB/s)$', '', value_str)
-    try:
-        return float(value_str)
-    except ValueError:
-        return np.nan
-
 def get_correlation_analysis_for_group(df_group, identifier_cols):
     """
     对单个分组的 DataFrame 执行相关性分析。
@@ -83,7 +67,7 @@ class CsvCorrelationAnalyzer:
         self.df_processed_groups = {}
         self.results_by_index_group = defaultdict(dict)
         # 定义不参与相关性计算的标识列
-        self.identifier_cols = ['timestamp', 'task_name', 'name', 'index']
+        self.identifier_cols = ['timestamp', 'task_name', 'name', 'index', ELAPSED_COL]
 
         try:
             self.df_original = pd.read_csv(self.filepath)
@@ -102,14 +86,15 @@ class CsvCorrelationAnalyzer:
             return
 
         df_copy = self.df_original.copy()
+        # 采样过程记录（纳秒时间戳、采集器读取时刻、missed_ticks）不参与相关性计算
+        self.identifier_cols += [col for col in df_copy.columns if is_meta_column(col) and col not in self.identifier_cols]
         # 识别潜在的需要清洗的指标列
         potential_metric_cols = [col for col in df_copy.columns if col not in self.identifier_cols]
 
-        # 清洗并转换指标列为数值类型
+        # 转换指标列为数值类型：新文件已是数值列，旧版本带单位的字符串在 coerce_numeric 中剥离单位，
+        # 无法转换的值（如 'N/A'、每核数组）设为 NaN
         for col in potential_metric_cols:
-            df_copy[col] = df_copy[col].apply(clean_value)
-            # 再次尝试转换为数值，确保 apply 返回的是数字
-            df_copy[col] = pd.to_numeric(df_copy[col], errors='coerce') # errors='coerce' 会将无法转换的值设为 NaN
+            df_copy[col] = coerce_numeric(df_copy[col])
 
         # 确保 'index' 列存在且为字符串类型，以便正确分组
         if 'index' in df_copy.columns:
@@ -119,6 +104,12 @@ class CsvCorrelationAnalyzer:
                 str(idx_val): group_df
                 for idx_val, group_df in df_copy.groupby('index')
             }
+            # 新文件带各采集器的读取时刻：把各指标插值到同一组调度时刻上，
+            # 避免不同来源之间几十到几百毫秒的读取偏差影响相关系数
+            if 'monotonic_ns' in df_copy.columns:
+                for idx_val, group_df in self.df_processed_groups.items():
+                    group_df, _, _ = prepare_time(group_df)
+                    self.df_processed_groups[idx_val] = align_to_ticks(group_df, potential_metric_cols)
             if not self.df_processed_groups:
                  print("警告：尝试按 'index' 列分组后未找到任何组。请检查 'index' 列的内容和类型。")
         else:
@@ -0,0 +1,442 @@
+import os
+import sys
+import json
+import queue
+import socket
+import stat
+import struct
+import tempfile
+import time
+import argparse
+import threading
+from array import array
+from .sampler import Sampler, Decimator
+
+
+def default_socket_path() -> str:
+    """
+    守护进程默认监听的 Unix 域套接字：环境变量 AIMETER_SOCKET 指定的路径，
+    否则为 $XDG_RUNTIME_DIR/aimeter.sock（由系统按用户创建，权限 0700），
+    没有 XDG_RUNTIME_DIR 时为临时目录下本用户专属的 aimeter-<uid>/aimeter.sock（目录由守护进程以 0700 创建）
+    """
+    if os.environ.get("AIMETER_SOCKET"):
+        return os.environ["AIMETER_SOCKET"]
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "aimeter.sock")
+    return os.path.join(tempfile.gettempdir(), f"aimeter-{os.getuid()}", "aimeter.sock")
+
+
+# 守护进程 -> 客户端：长度前缀 + JSON 消息，['reply', dict] 或 ['sample', metrics, 字符串时间戳]；
+# 客户端 -> 守护进程：每行一个 JSON 请求。两个方向都不传递可执行的序列化数据（pickle），
+# 每核利用率等 array 编码为 {'__array__': 类型码, 'values': [...]}，接收时还原
+_LENGTH = struct.Struct('!I')
+_PEERCRED = struct.Struct('3i')  # struct ucred: pid, uid, gid
+
+
+def _encode(obj):
+    if isinstance(obj, array):
+        return {'__array__': obj.typecode, 'values': obj.tolist()}
+    if hasattr(obj, 'tolist'):
+        # NumPy 标量与数组
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _decode(obj: dict):
+    if '__array__' in obj:
+        return array(obj['__array__'], obj['values'])
+    return obj
+
+
+def _frame(message) -> bytes:
+    payload = json.dumps(message, default=_encode, separators=(',', ':')).encode()
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def _recv_frame(sock):
+    length = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))[0]
+    return json.loads(_recv_exact(sock, length), object_hook=_decode)
+
+
+def _peer_uid(sock):
+    """连接另一端进程的 uid（Linux 的 SO_PEERCRED），平台不支持时返回 None"""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    try:
+        return _PEERCRED.unpack(sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, _PEERCRED.size))[1]
+    except OSError:
+        return None
+
+
+def _private_dir(path: str) -> bool:
+    """
+    确保套接字所在目录存在、属于当前用户且其他用户不可写（不存在时以 0700 创建），
+    防止其他本地用户预先放置同名套接字或替换它
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.stat(directory)
+    except OSError as e:
+        print(f"Cannot create the AIMeter socket directory {directory}: {e}")
+        return False
+    if info.st_uid != os.getuid() or info.st_mode & 0o022:
+        print(f"Refusing to use {directory} for the AIMeter socket: it must be owned by the current user "
+              f"and not writable by others.")
+        return False
+    return True
+
+
+def _send_request(sock, request: dict) -> None:
+    sock.sendall((json.dumps(request) + "\n").encode())
+
+
+class _Client:
+    """守护进程中的一个客户端连接：订阅配置、打开的会话以及发送队列（慢客户端不阻塞采样线程，队列满时丢弃样本）"""
+
+    def __init__(self, conn, queue_size: int = 1024):
+        self.conn = conn
+        self.indices = None  # 订阅的 GPU 子集，为空表示守护进程采集的全部 GPU
+        self.decimator = None  # 未订阅时为 None
+        self.sessions = []
+        self.pid = None
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._send_loop, daemon=True)
+        self._thread.start()
+
+    def send(self, message) -> None:
+        try:
+            self._queue.put_nowait(_frame(message))
+        except queue.Full:
+            self.dropped += 1
+
+    def _send_loop(self) -> None:
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
+            try:
+                self.conn.sendall(frame)
+            except OSError:
+                return
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self.conn.close()
+
+
+class SamplerDaemon:
+    """
+    节点级采样守护进程：节点上的硬件只由一个 Sampler 轮询，多个客户端进程（例如每个训练 rank 一个）
+    通过 Unix 域套接字订阅样本，可以只订阅部分 GPU、按各自的间隔抽取样本，并在连接中打开 / 关闭命名会话。
+    第一个客户端订阅时开始采样，最后一个客户端断开时停止；exit_when_idle=True 时随之退出并删除套接字文件
+    （例如随作业启动的守护进程）
+    """
+
+    def __init__(self, socket_path: str = None, exit_when_idle: bool = False, **config):
+        self.socket_path = socket_path or default_socket_path()
+        self.exit_when_idle = exit_when_idle
+        self.task_name = "aimeter-daemon"
+        self.sampler = Sampler(**config)
+        self._clients = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    def serve_forever(self) -> None:
+        if not _private_dir(self.socket_path):
+            return
+        if os.path.lexists(self.socket_path):
+            sock = connect(self.socket_path)
+            if sock is not None:
+                sock.close()
+                print(f"Another AIMeter daemon is already serving {self.socket_path}.")
+                return
+            # 上一个守护进程异常退出留下的套接字文件
+            os.unlink(self.socket_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # 套接字文件创建时即为 0600，只允许同一用户的进程连接
+        umask = os.umask(0o177)
+        try:
+            self._server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        self._server.listen()
+        print(f"AIMeter daemon serving {self.socket_path} (tick {self.sampler.tick_interval} s).")
+        try:
+            while True:
+                try:
+                    conn, _ = self._server.accept()
+                except OSError:
+                    break
+                uid = _peer_uid(conn)
+                if uid is not None and uid != os.getuid():
+                    conn.close()
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        server, self._server = self._server, None
+        if server is not None:
+            # 先删除套接字文件，新的客户端不会再连接到正在退出的守护进程；shutdown 唤醒阻塞在 accept() 中的线程
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            try:
+                server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            server.close()
+        with self._lock:
+            if self.sampler.running:
+                self.sampler.stop()
+
+    def _handle(self, conn) -> None:
+        """处理一个连接上的请求，直到客户端断开"""
+        client = _Client(conn)
+        try:
+            for line in conn.makefile('r', encoding='utf-8'):
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                self._dispatch(client, request)
+        except OSError:
+            pass
+        finally:
+            self._unsubscribe(client)
+            client.close()
+
+    def _dispatch(self, client: _Client, request: dict) -> None:
+        op = request.get('op')
+        if op == 'subscribe':
+            self._subscribe(client, request)
+        elif op == 'unsubscribe':
+            self._unsubscribe(client)
+        elif op == 'open':
+            client.sessions.append(request.get('session'))
+        elif op == 'close':
+            if request.get('session') in client.sessions:
+                client.sessions.remove(request.get('session'))
+        elif op == 'status':
+            client.send(('reply', self.status()))
+        else:
+            client.send(('reply', {'error': f"unknown op '{op}'"}))
+
+    def _subscribe(self, client: _Client, request: dict) -> None:
+        """登记客户端的订阅并回复守护进程的采样配置；回复先于该客户端的第一条样本进入发送队列"""
+        sampler = self.sampler
+        indices = list(request.get('indices') or [])
+        # GPU 子集在守护进程采集的范围内即可；指标和后端与本进程内共享采样器的检查相同
+        problems = sampler.covers(request.get('additional_metrics'), sampler.indices, request.get('backend', sampler.backend))
+        missing = [i for i in indices if sampler.indices and i not in sampler.indices]
+        if missing:
+            problems.append(f"GPU indices {missing} are not monitored by the daemon")
+        interval = max(request.get('interval') or sampler.tick_interval, sampler.tick_interval)
+        with self._lock:
+            client.indices = set(indices) or None
+            client.pid = request.get('pid')
+            client.decimator = Decimator(interval, sampler.tick_interval)
+            client.send(('reply', {'tick_interval': interval, 'layout': sampler._layout, 'problems': problems,
+                                   'additional_metrics': sampler.additional_metrics, 'indices': sampler.indices,
+                                   'backend': sampler.backend}))
+            if client not in self._clients:
+                self._clients.append(client)
+            if not sampler.running:
+                sampler.subscribe(self)
+                sampler.start()
+
+    def _unsubscribe(self, client: _Client) -> None:
+        with self._lock:
+            if client not in self._clients:
+                return
+            self._clients.remove(client)
+            idle = not self._clients
+            if idle and self.sampler.running:
+                self.sampler.unsubscribe(self)
+                self.sampler.stop()
+        if idle and self.exit_when_idle:
+            self.shutdown()
+
+    def _on_sample(self, sampler, metrics: dict, time_stamp_insert: str) -> None:
+        """
+        把一次采样按各客户端订阅的 GPU 子集和间隔放入发送队列。
+        在采样线程中调用（持有 sampler 的分发锁），不获取 self._lock，避免与退订时停止采样器的线程互相等待
+        """
+        for client in list(self._clients):
+            if not client.decimator.accept(metrics['monotonic_ns']):
+                continue
+            sample = metrics
+            if client.indices is not None:
+                sample = {**metrics, 'gpu_info': [gpu for gpu in metrics['gpu_info'] if gpu.get('index') in client.indices]}
+            client.send(('sample', sample, time_stamp_insert))
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                'tick_interval': self.sampler.tick_interval,
+                'running': self.sampler.running,
+                'clients': [{'pid': c.pid, 'sessions': list(c.sessions), 'indices': sorted(c.indices) if c.indices else None,
+                             'interval': c.decimator.interval, 'dropped': c.dropped} for c in self._clients],
+                # 守护进程长期运行，耗时统计为固定内存的直方图，随状态查询给出而不在退出时打印
+                'timings_ms': self.sampler.timings(),
+            }
+
+
+def connect(socket_path: str = None):
+    """
+    连接正在运行的守护进程，没有守护进程时返回 None。
+    只连接当前用户创建的套接字，并以 SO_PEERCRED 确认另一端的守护进程属于当前用户，
+    其他用户放置的同名套接字会被拒绝
+    """
+    socket_path = socket_path or default_socket_path()
+    try:
+        info = os.lstat(socket_path)
+    except OSError:
+        return None
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        print(f"Ignoring {socket_path}: not a socket owned by the current user.")
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    uid = _peer_uid(sock)
+    if uid is not None and uid != os.getuid():
+        print(f"Ignoring {socket_path}: the daemon serving it runs as uid {uid}.")
+        sock.close()
+        return None
+    return sock
+
+
+def status(socket_path: str = None):
+    """查询守护进程的状态（客户端、会话、间隔），没有守护进程时返回 None"""
+    sock = connect(socket_path)
+    if sock is None:
+        return None
+    try:
+        _send_request(sock, {'op': 'status'})
+        return _recv_frame(sock)[1]
+    finally:
+        sock.close()
+
+
+class DaemonSampler(Sampler):
+    """
+    客户端一侧的共享采样器：不采集硬件，而是从守护进程订阅样本，再像本进程内采样一样分发给会话。
+    本进程中的会话在守护进程中显示为该连接上的命名会话
+    """
+
+    def __init__(self, connection, **config):
+        self._connection = connection
+        self._send_lock = threading.Lock()
+        super().__init__(**config)
+        self.adaptive = None  # 采样节奏和开销预算由守护进程决定
+        self.budget = None
+        _send_request(connection, {'op': 'subscribe', 'pid': os.getpid(), 'indices': self.indices, 'interval': self.tick_interval,
+                                   'additional_metrics': self.additional_metrics, 'backend': self.backend})
+        reply = _recv_frame(connection)[1]
+        self.tick_interval = reply['tick_interval']
+        self._layout = reply['layout']
+        self.problems = reply['problems']
+        if self.problems:
+            print("Note: attached to the AIMeter daemon; " + "; ".join(self.problems) + ".")
+
+    def _build_engine(self):
+        # 硬件由守护进程采集
+        return None
+
+    def _request(self, request: dict) -> None:
+        with self._send_lock:
+            try:
+                _send_request(self._connection, request)
+            except OSError:
+                pass
+
+    def start(self) -> None:
+        self.start_monotonic = time.monotonic()
+        self.running = True
+        self._thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self._thread.start()
+
+    def _receive_loop(self) -> None:
+        while True:
+            try:
+                message = _recv_frame(self._connection)
+            except (OSError, ConnectionError, ValueError):
+                if self.running:
+                    print("Lost the connection to the AIMeter daemon; no further samples will be recorded.")
+                return
+            if message[0] == 'sample':
+                self._publish(message[1], message[2])
+
+    def stop(self) -> None:
+        self.running = False
+        self._request({'op': 'unsubscribe'})
+        try:
+            self._connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._connection.close()
+
+    def subscribe(self, session) -> None:
+        super().subscribe(session)
+        self._request({'op': 'open', 'session': session.task_name})
+
+    def unsubscribe(self, session) -> int:
+        self._request({'op': 'close', 'session': session.task_name})
+        return super().unsubscribe(session)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="AIMeter node-local sampler daemon: polls the node's GPUs once and serves "
+                                                 "samples to monitor sessions in other processes over a Unix domain socket.")
+    parser.add_argument('--socket', default=default_socket_path(), help="socket path (default: %(default)s)")
+    parser.add_argument('--sampling-interval', type=float, default=1, help="base sampling interval in seconds")
+    parser.add_argument('--additional-metrics', default="", help="comma-separated, e.g. CPU,DRAM,Gdetails,fp32")
+    parser.add_argument('--indices', default="", help="comma-separated GPU indices, empty = all")
+    parser.add_argument('--backend', default="nvidia-smi", choices=["nvidia-smi", "nvml"])
+    parser.add_argument('--collect-mode', default="oneshot", choices=["oneshot", "stream"])
+    parser.add_argument('--intervals', default="", help="per-collector intervals, e.g. power=0.02,dcgmi=0.2,link=10")
+    parser.add_argument('--overrun-policy', default="skip", choices=["skip", "coalesce"])
+    parser.add_argument('--overhead-budget', type=float, default=None, help="cap the daemon's CPU use at this fraction of one core")
+    parser.add_argument('--exit-when-idle', action='store_true', help="exit once the last client has detached")
+    parser.add_argument('--status', action='store_true', help="print the status of the running daemon and exit")
+    args = parser.parse_args(argv)
+    if args.status:
+        print(json.dumps(status(args.socket), indent=2))
+        return
+    intervals = {}
+    for item in filter(None, args.intervals.split(',')):
+        name, _, value = item.partition('=')
+        intervals[name.strip()] = float(value)
+    daemon = SamplerDaemon(args.socket, exit_when_idle=args.exit_when_idle, sampling_interval=args.sampling_interval,
+                           additional_metrics=[m for m in args.additional_metrics.split(',') if m],
+                           indices=[int(i) for i in args.indices.split(',') if i],
+                           backend=args.backend, collect_mode=args.collect_mode,
+                           intervals=intervals, overrun_policy=args.overrun_policy, overhead_budget=args.overhead_budget)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        daemon.shutdown()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
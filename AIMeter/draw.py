@@ -9,6 +9,7 @@ import socket
 import requests
 from plotly.colors import qualitative
 from dash import Dash, html, dcc, Input, Output,  ALL
+from .metric_schema import format_metric, coerce_numeric, numeric_metrics, local_datetime
 
 def find_available_port(start=8050, end=8100):
     """查找一个可用的端口"""
@@ -21,21 +22,12 @@ def find_available_port(start=8050, end=8100):
                 continue
     raise RuntimeError("没有找到可用端口，请检查端口占用情况")
 
-def strip_unit(val):
-    """提取数值部分"""
-    if pd.isnull(val):
-        return None
-    match = re.search(r"[-+]?\d*\.?\d+", str(val))
-    return float(match.group()) if match else None
-
-
-
 def clean_units(df: pd.DataFrame, unit_fields: list[str]):
-    """剥离单位并保留原值供 hover 使用"""
+    """转换为数值列（兼容旧版本带单位的字符串），并按指标注册表生成带单位的展示文本供 hover 使用"""
     for field in unit_fields:
         if field in df.columns:
-            df[f'{field}_raw'] = df[field]  # 保存原值用于 hover 显示
-            df[field] = df[field].apply(strip_unit)
+            df[field] = coerce_numeric(df[field])
+            df[f'{field}_raw'] = df[field].map(lambda v, f=field: format_metric(f, v))  # 带单位的文本用于 hover 显示
     return df
     
 def create_dashboard(df: pd.DataFrame):
@@ -206,25 +198,18 @@ def get_server_ip():
     
 
 def draw_csv(table_path: str):
-    df = pd.read_csv(table_path, parse_dates=['timestamp'])
+    df = pd.read_csv(table_path)
+    # 新文件带 int64 纳秒时间戳，直接换算；旧文件才解析字符串时间戳
+    if 'timestamp_ns' in df.columns:
+        df['timestamp'] = local_datetime(df['timestamp_ns'])
+    else:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
 
     df['index'] = pd.to_numeric(df['index'], errors='coerce')
     df = df.dropna(subset=['index'])
     df['index'] = df['index'].astype(int)
 
-    unit_fields = [
-        'clocks.current.memory [MHz]', 'temperature.memory',
-        'clocks.current.sm [MHz]', 'temperature.gpu',
-        'power.draw [W]', 'utilization.gpu [%]',
-        'clocks.current.graphics [MHz]', 'utilization.memory [%]',
-        'sm_active', 'sm_occupancy','tensor_active',
-        'fp64_active', 'fp32_active', 'fp16_active',
-        'usage.utilization [%]', 'dram_active', 'dram_usage',
-        'pcie.link.gen.current', 'pcie.link.width.current',
-        'pcie_tx_bytes', 'pcie_rx_bytes', 'nvlink_tx_bytes', 'nvlink_rx_bytes',
-        'cpu_power', 'cpu_usage', 'dram_power'
-    ]
-    df = clean_units(df, unit_fields)
+    df = clean_units(df, numeric_metrics())
     app = create_dashboard(df)
     port = find_available_port()
     ip = get_server_ip()
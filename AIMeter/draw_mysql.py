@@ -10,7 +10,8 @@ from plotly.colors import qualitative
 import mysql.connector # Use mysql.connector directly
 from mysql.connector import Error # For error handling
 import os # Optional: To read credentials from environment variables
-from config import Config # Assuming you have a config.py with your DB credentials
+from .save import sanitize_metric_key
+from .metric_schema import format_metric, coerce_numeric, numeric_metrics, local_datetime
 
 # --- Database Connection (Using mysql.connector) ---
 def create_db_connection(db_config):
@@ -48,26 +49,17 @@ def find_available_port(start=8050, end=8100):
                 continue
     raise RuntimeError("没有找到可用端口，请检查端口占用情况")
 
-# --- Unit Stripping (Unchanged, handles new units/N/A correctly) ---
-def strip_unit(val):
-    """提取数值部分 (Handles 'N/A' -> None)"""
-    if pd.isnull(val) or val == 'N/A': # Explicitly handle N/A
-        return None
-    # Regex finds the first number (int/float, optional sign)
-    match = re.search(r"[-+]?\d*\.?\d+", str(val))
-    return float(match.group()) if match else None
-
-# --- Unit Cleaning (Unchanged logic, field names updated later) ---
-def clean_units(df: pd.DataFrame, unit_fields: list[str]):
-    """剥离单位并保留原值供 hover 使用"""
+# --- Numeric Conversion (units come from metric_schema) ---
+def clean_units(df: pd.DataFrame, unit_fields: dict[str, str]):
+    """
+    转换为数值列（兼容旧表中带单位的 VARCHAR 值），并按指标注册表生成带单位的展示文本供 hover 使用。
+    unit_fields: 清理后的列名 -> 原始指标名
+    """
     cleaned_columns = []
-    for field in unit_fields:
+    for field, metric in unit_fields.items():
         if field in df.columns:
-            raw_col_name = f'{field}_raw'
-            df[raw_col_name] = df[field]  # 保存原值用于 hover 显示
-            df[field] = df[field].apply(strip_unit)
-            # Attempt to convert to numeric after stripping, handling potential errors
-            df[field] = pd.to_numeric(df[field], errors='coerce')
+            df[field] = coerce_numeric(df[field])
+            df[f'{field}_raw'] = df[field].map(lambda v, m=metric: format_metric(m, v))  # 带单位的文本用于 hover 显示
             cleaned_columns.append(field)
         # else:
         #     print(f"Warning: Field '{field}' not found in DataFrame, skipping cleaning.")
@@ -282,7 +274,11 @@ def draw_from_mysql(db_config: dict, table_name: str):
         print(f"Successfully loaded {len(df)} rows from table '{table_name}'.")
 
         # Manually parse timestamp column as pandas might not do it automatically with mysql.connector
-        if 'timestamp' in df.columns:
+        # 新表带 BIGINT 纳秒时间戳，直接换算；旧表才解析 DATETIME 列
+        if 'timestamp_ns' in df.columns and df['timestamp_ns'].notna().all():
+             df['timestamp'] = local_datetime(df['timestamp_ns'])
+             print("Converted 'timestamp_ns' column to datetime objects.")
+        elif 'timestamp' in df.columns:
              df['timestamp'] = pd.to_datetime(df['timestamp'])
              print("Parsed 'timestamp' column to datetime objects.")
         else:
@@ -310,18 +306,10 @@ def draw_from_mysql(db_config: dict, table_name: str):
     else:
         print("Warning: 'index' column not found. GPU selection might not work.")
 
-    # --- 3. Define fields requiring unit stripping (Unchanged) ---
-    unit_fields = [
-        'clocks_current_graphics_MHz', 'clocks_current_memory_MHz',
-        'clocks_current_sm_MHz', 'power_draw_W', 'utilization_gpu',
-        'utilization_memory', 'cpu_power', 'cpu_usage', 'dram_power',
-        'dram_usage', 'dram_active', 'memory_copy_util',
-        'nvlink_rx_bytes', 'nvlink_tx_bytes', 'pcie_rx_bytes',
-        'pcie_tx_bytes', 'sm_active', 'sm_occupancy', 'tensor_active', 'usage_memory',
-        'fp16_active', 'fp32_active', 'fp64_active'
-    ]
-
-    # --- 4. Clean Units (Unchanged) ---
+    # --- 3. Numeric metric columns (sanitized column name -> registry key) ---
+    unit_fields = {sanitize_metric_key(k): k for k in numeric_metrics()}
+
+    # --- 4. Convert to numeric and build hover text ---
     df = clean_units(df, unit_fields)
 
     # --- 5. Create and Run Dashboard (Unchanged) ---
@@ -0,0 +1,191 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from .metrics_collect import merge_query_results
+from .metric_schema import acquisition_columns
+from .resources_consumption_record import record_time
+from .tracing import span
+from . import state
+
+
+class CollectionEngine:
+    """
+    采集引擎：持有一组采集器和一个常驻线程池。
+    open() 时打开采集器并按采集器数量创建线程池（在 monitor.start 中调用一次），
+    每次 collect() 把采集器提交到同一个线程池并等待全部完成（屏障式扇出），
+    close() 时关闭线程池和采集器（在 monitor.stop 中调用）。
+    调用 collect() 的线程自己执行最后一个采集器，因此线程池只需 n-1 个工作线程，
+    只有一个采集器时完全不需要线程池。
+
+    多速率采样：设置了 interval 的采集器只在到期时运行（第一次 collect() 时全部运行，
+    之后每隔 interval 运行一次），未到期的采集器不出现在本次结果中，由存储层写为空值。
+    GPU 的 name / index 是静态字段，由引擎记住并补到每次的 gpu_info 中，
+    因此只有快速字段（如功耗）到期的时刻也能按 GPU 写出行。
+
+    超时的采集器仍在工作线程中运行，它的读取器（RAPL、/proc/stat、NVML 句柄）不是线程安全的，
+    因此在它返回之前不再提交（本次结果中没有它的数据），同一采集器同时最多运行一次；
+    此时停用或关闭它，也推迟到它返回之后再执行 close()。
+    """
+
+    def __init__(self, collectors, timeout: float = 10):
+        self.collectors = list(collectors)
+        self.timeout = timeout
+        self._executor = None
+        self._interval_ns = [int(c.interval * 1e9) if c.interval else None for c in self.collectors]
+        self._next_due = [None] * len(self.collectors)
+        self._identity = {}  # GPU索引 -> 设备名称
+        self._host_keys = {}  # 主机级采集器下标 -> 它上一次成功返回的指标名
+        self._disabled = set()
+        self._in_flight = {}  # 采集器下标 -> 超时后仍在运行的 future（异步引擎中为 task）
+        # 各采集器在线程池中消耗的 CPU 时间（纳秒），与采样线程的 thread_time 相加即引擎的 CPU 开销（见 OverheadBudget）
+        self._worker_cpu_ns = [0] * len(self.collectors)
+
+    def open(self) -> None:
+        for collector in self.collectors:
+            collector.open()
+        workers = min(len(self.collectors) - 1, 8)
+        if workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aimeter-collector")
+
+    @property
+    def worker_cpu_ns(self) -> int:
+        return sum(self._worker_cpu_ns)
+
+    def disable(self, name: str) -> None:
+        """停用名为 name 的采集器并释放它的资源，之后的采样不再运行它（对应的指标为空值）"""
+        for i, collector in enumerate(self.collectors):
+            if collector.name == name and i not in self._disabled:
+                self._disabled.add(i)
+                self._close_collector(i)
+
+    def _close_collector(self, i) -> None:
+        """关闭第 i 个采集器；它超时后仍在运行时，推迟到那次运行结束后再关闭（读取器不是线程安全的）"""
+        collector = self.collectors[i]
+        if self._busy(i):
+            self._in_flight[i].add_done_callback(lambda _: collector.close())
+        else:
+            collector.close()
+
+    def _sample(self, collector):
+        """运行一个采集器，返回 (结果, 开始时刻, 结束时刻)，时刻为 monotonic 纳秒"""
+        start_ns = time.monotonic_ns()
+        try:
+            result = collector.sample()
+        except Exception as e:
+            print(f"Failed to collect metric: {collector.name} - {e}")
+            result = None
+        end_ns = time.monotonic_ns()
+        record_time(f"collector.{collector.name}", end_ns - start_ns)
+        tracer = state._tracer
+        if tracer is not None:
+            tracer.add(collector.name, "collector", start_ns, end_ns)
+        return result, start_ns, end_ns
+
+    def _sample_pooled(self, i):
+        """在线程池中运行第 i 个采集器，并累计它消耗的 CPU 时间"""
+        cpu_start = time.thread_time_ns()
+        try:
+            return self._sample(self.collectors[i])
+        finally:
+            self._worker_cpu_ns[i] += time.thread_time_ns() - cpu_start
+
+    def _busy(self, i) -> bool:
+        """第 i 个采集器上一次的运行是否仍未结束（超时后仍在运行）"""
+        pending = self._in_flight.get(i)
+        if pending is None:
+            return False
+        if pending.done():
+            del self._in_flight[i]
+            return False
+        return True
+
+    def _due(self, now_ns: int) -> list:
+        """返回本次到期的采集器下标，并推进它们的下一次到期时刻"""
+        due = []
+        for i, interval_ns in enumerate(self._interval_ns):
+            if i in self._disabled:
+                continue
+            if interval_ns is None:
+                due.append(i)
+                continue
+            next_due = self._next_due[i]
+            if next_due is not None and now_ns < next_due:
+                continue
+            due.append(i)
+            next_due = now_ns + interval_ns if next_due is None else next_due + interval_ns
+            # 落后超过一个间隔（例如采样超时）时不补采，从当前时刻重新计时
+            self._next_due[i] = next_due if next_due > now_ns else now_ns + interval_ns
+        return due
+
+    def collect(self, now_ns: int = None) -> dict:
+        """
+        执行一次采样：本次到期的采集器并行运行，GPU 采集器的结果按索引合并到 gpu_info，
+        主机级采集器的结果合并到顶层字典；每个运行了的采集器另有 '<名称>.start_ns' / '<名称>.end_ns'
+        两个顶层字段，记录它实际读取数据的时间段（monotonic 纳秒），供分析时按真实读取时刻对齐不同来源
+        参数:
+            now_ns: 调度时刻（monotonic 纳秒），为空时取当前时刻
+        """
+        if not self.collectors:
+            return {'gpu_info': []}
+        due = self._due(time.monotonic_ns() if now_ns is None else now_ns)
+        # 上一次超时、仍在运行的采集器本次跳过
+        runnable = [i for i in due if not self._busy(i)]
+        results = {}
+        futures = {}
+        if runnable:
+            if self._executor is not None:
+                for i in runnable[:-1]:
+                    futures[self._executor.submit(self._sample_pooled, i)] = i
+            # 当前线程执行最后一个采集器，减少一次线程切换
+            results[runnable[-1]] = self._sample(self.collectors[runnable[-1]])
+
+        if futures:
+            done, not_done = wait(futures, timeout=self.timeout)
+            for future in done:
+                results[futures[future]] = future.result()
+            for future in not_done:
+                self._in_flight[futures[future]] = future
+                print(f"Failed to collect metric: {self.collectors[futures[future]].name} - timeout (skipped until it returns)")
+
+        with span("merge", "engine"):
+            return self._merge(due, results)
+
+    def _merge(self, due, results) -> dict:
+        """
+        合并一次采样中各采集器的结果（同步与异步引擎共用）
+        参数:
+            due: 本次到期的采集器下标
+            results: 下标 -> (结果, 开始时刻, 结束时刻)，超时的采集器不在其中
+        """
+        metrics = {}
+        gpu_results = []
+        for i in due:
+            collector = self.collectors[i]
+            result = None
+            if i in results:
+                result, start_ns, end_ns = results[i]
+                start_key, end_key = acquisition_columns(collector.name)
+                metrics[start_key] = start_ns
+                metrics[end_key] = end_ns
+            if collector.kind == "gpu":
+                gpu_results.append(result)
+                for rec in result or []:
+                    if 'name' in rec:
+                        self._identity[rec.get('index')] = rec['name']
+            elif result is not None:
+                metrics.update(result)
+                self._host_keys[i] = tuple(result)
+            else:
+                # 采集失败或超时：它已知的指标写为空值，从未成功过时不输出任何列（不以采集器名称新增列）
+                metrics.update(dict.fromkeys(self._host_keys.get(i, ())))
+        # 将各 GPU 采集器的结果按 GPU 索引合并到 gpu_info 中，静态的 name / index 作为每个 GPU 的基础记录
+        identity = [{'name': name, 'index': index} for index, name in self._identity.items()]
+        metrics['gpu_info'] = merge_query_results([identity] + gpu_results) if identity else merge_query_results(gpu_results)
+        return metrics
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for i in range(len(self.collectors)):
+            if i not in self._disabled:  # 停用时已经关闭（或已推迟关闭）
+                self._close_collector(i)
@@ -0,0 +1,101 @@
+from array import array
+
+
+class LogLinearHistogram:
+    """
+    固定内存的对数-线性直方图（类似 HdrHistogram），用于记录整数型的时延/抖动（单位由调用方决定，通常为纳秒）。
+    每个 2 的幂区间再等分为 2**sub_bucket_bits 个线性子桶，因此任意分位数的相对误差不超过 1/2**sub_bucket_bits；
+    小于 2**sub_bucket_bits 的值精确计数。桶数在创建时固定，记录一次只做一次整数运算和一次计数累加。
+    超过最大可表示值的样本计入最后一个桶（max 仍精确记录）。
+    """
+
+    def __init__(self, sub_bucket_bits: int = 5, max_exponent: int = 40):
+        self._sub_bits = sub_bucket_bits
+        self._sub = 1 << sub_bucket_bits
+        self._counts = array('Q', bytes(8 * (max_exponent + 2) * self._sub))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value: int) -> int:
+        if value < self._sub:
+            return value
+        exponent = value.bit_length() - self._sub_bits - 1
+        index = (exponent + 1) * self._sub + (value >> exponent) - self._sub
+        return min(index, len(self._counts) - 1)
+
+    def _bucket_range(self, index: int):
+        """返回桶 index 覆盖的取值区间 [low, high)"""
+        exponent = index // self._sub - 1
+        if exponent < 0:
+            return index, index + 1
+        low = ((index % self._sub) + self._sub) << exponent
+        return low, low + (1 << exponent)
+
+    def record(self, value: int, count: int = 1) -> None:
+        value = max(int(value), 0)
+        self._counts[self._index(value)] += count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "LogLinearHistogram") -> None:
+        """合并另一个相同配置的直方图"""
+        if len(other._counts) != len(self._counts):
+            raise ValueError("cannot merge histograms with different bucket layouts")
+        for i, c in enumerate(other._counts):
+            if c:
+                self._counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def reset(self) -> None:
+        for i in range(len(self._counts)):
+            self._counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p: float):
+        """返回第 p 百分位（0~100）的近似值（所在桶的中点，并限制在 [min, max] 内）；无数据时返回 None"""
+        if not self.count:
+            return None
+        rank = max(1, -(-self.count * p // 100))  # 向上取整，至少为 1
+        seen = 0
+        for index, c in enumerate(self._counts):
+            if not c:
+                continue
+            seen += c
+            if seen >= rank:
+                if index == len(self._counts) - 1:
+                    # 最后一个桶还包含超出范围的样本，没有上界，取精确记录的最大值
+                    return self.max
+                low, high = self._bucket_range(index)
+                value = low + (high - low - 1) / 2
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self, scale: float = 1.0) -> dict:
+        """常用统计量（均值、p50、p90、p99、最大值），数值除以 scale（例如 1e6 将纳秒换算为毫秒）"""
+        def scaled(v):
+            return v / scale if v is not None else None
+        return {
+            'count': self.count,
+            'mean': scaled(self.mean()),
+            'p50': scaled(self.percentile(50)),
+            'p90': scaled(self.percentile(90)),
+            'p99': scaled(self.percentile(99)),
+            'max': scaled(self.max),
+        }
@@ -0,0 +1,191 @@
+import os
+import time
+from array import array
+
+
+class RaplReader:
+    """
+    RAPL 能量计数器读取器：
+    open() 时枚举一次 /sys/class/powercap 下的 package 域及其子域（dram、core、uncore），
+    保持 energy_uj 文件描述符常开并缓存 max_energy_range_uj；
+    之后每次 read() 只做一次 pread，按与上一次读取之间的计数差值计算功耗，不在采样内 sleep。
+    参数 root 可指向伪造的 sysfs 目录，便于在没有 RAPL 的机器上测试。
+    """
+
+    def __init__(self, root: str = "/sys/class/powercap"):
+        self.root = root
+        self._domains = []  # 每项：{'kind', 'socket', 'fd', 'max_energy', 'last_energy'}
+        self._last_time_ns = None
+
+    @staticmethod
+    def _read_text(path: str) -> str:
+        with open(path, "r") as f:
+            return f.read().strip()
+
+    def open(self) -> int:
+        """枚举 RAPL 域并记录初始计数，返回成功打开的域数量"""
+        self.close()
+        if not os.path.isdir(self.root):
+            return 0
+        for entry in sorted(os.listdir(self.root)):
+            if not entry.startswith("intel-rapl:"):
+                continue
+            parts = entry[len("intel-rapl:"):].split(":")
+            domain_path = os.path.join(self.root, entry)
+            try:
+                name = self._read_text(os.path.join(domain_path, "name"))
+            except OSError:
+                continue
+            if len(parts) == 1:
+                # 顶层域：只统计 package-N，psys 等平台级域不计入 CPU 功耗
+                if not name.startswith("package"):
+                    continue
+                kind = "package"
+            else:
+                kind = name  # dram / core / uncore
+            socket = int(parts[0])
+            try:
+                fd = os.open(os.path.join(domain_path, "energy_uj"), os.O_RDONLY)
+            except OSError as e:
+                print(f"无法打开 RAPL 域 {entry}: {e}")
+                continue
+            try:
+                max_energy = int(self._read_text(os.path.join(domain_path, "max_energy_range_uj")))
+            except (OSError, ValueError):
+                max_energy = None
+            self._domains.append({
+                "kind": kind,
+                "socket": socket,
+                "fd": fd,
+                "max_energy": max_energy,
+                "last_energy": None,
+            })
+        # 记录初始计数，第一次 read() 即可得到自 open() 以来的平均功耗
+        self.read()
+        return len(self._domains)
+
+    def read(self):
+        """
+        读取所有域的计数，返回自上次读取以来的平均功耗（瓦特）：
+        {kind: {socket: watts}}，例如 {'package': {0: 152.6, 1: 148.2}, 'dram': {0: 9.1, 1: 8.7}}。
+        首次读取（仅记录基准）时返回空字典。
+        """
+        now_ns = time.monotonic_ns()
+        delta_s = (now_ns - self._last_time_ns) / 1e9 if self._last_time_ns is not None else None
+        self._last_time_ns = now_ns
+        powers = {}
+        for domain in self._domains:
+            try:
+                energy = int(os.pread(domain["fd"], 32, 0))
+            except (OSError, ValueError):
+                continue
+            last = domain["last_energy"]
+            domain["last_energy"] = energy
+            if last is None or not delta_s:
+                continue
+            delta_uj = energy - last
+            # 处理计数器溢出（RAPL 能量计数器在 max_energy_range_uj 处回绕）
+            if delta_uj < 0 and domain["max_energy"] is not None:
+                delta_uj += domain["max_energy"] + 1
+            if delta_uj < 0:
+                continue
+            powers.setdefault(domain["kind"], {})[domain["socket"]] = delta_uj * 1e-6 / delta_s  # μJ → J → W
+        return powers
+
+    def close(self) -> None:
+        for domain in self._domains:
+            try:
+                os.close(domain["fd"])
+            except OSError:
+                pass
+        self._domains = []
+        self._last_time_ns = None
+
+
+class CpuStatReader:
+    """
+    /proc/stat CPU 利用率读取器：
+    文件描述符常开，每次 read() 只读取一次 /proc/stat，
+    根据与上一次读取之间的累计 tick 差值计算总利用率和每个核心的利用率，从不阻塞。
+    每核利用率以 array('f') 紧凑存储。
+    """
+
+    def __init__(self, path: str = "/proc/stat"):
+        self.path = path
+        self._fd = None
+        self._bufsize = 65536
+        self._last_total = None  # (busy, total)
+        self._last_cores = None  # [(busy, total), ...]
+
+    def open(self) -> bool:
+        self.close()
+        try:
+            self._fd = os.open(self.path, os.O_RDONLY)
+        except OSError as e:
+            print(f"无法打开 {self.path}: {e}")
+            return False
+        # 记录初始计数，第一次 read() 即可得到自 open() 以来的利用率
+        self.read()
+        return True
+
+    def _read_all(self) -> bytes:
+        # 正常情况下一次 pread 即读完；缓冲区被填满说明文件更大（核数很多），扩大后重读
+        while True:
+            data = os.pread(self._fd, self._bufsize, 0)
+            if len(data) < self._bufsize:
+                return data
+            self._bufsize *= 2
+
+    @staticmethod
+    def _busy_total(fields):
+        # user nice system idle iowait irq softirq steal（guest 已包含在 user 中）
+        values = [int(v) for v in fields[:8]]
+        idle = values[3] + values[4]
+        total = sum(values)
+        return total - idle, total
+
+    @staticmethod
+    def _utilization(current, last) -> float:
+        d_busy = current[0] - last[0]
+        d_total = current[1] - last[1]
+        if d_total <= 0:
+            return 0.0
+        return 100.0 * d_busy / d_total
+
+    def read(self):
+        """
+        返回 (总利用率, 每核利用率 array('f'))，单位为百分比；
+        首次读取（仅记录基准）或读取失败时返回 (None, None)。
+        """
+        if self._fd is None:
+            return None, None
+        try:
+            lines = self._read_all().split(b"\n")
+        except OSError:
+            return None, None
+        total = None
+        cores = []
+        for line in lines:
+            if not line.startswith(b"cpu"):
+                break  # cpu 行总在文件开头，之后的内容不需要解析
+            parts = line.split()
+            if parts[0] == b"cpu":
+                total = self._busy_total(parts[1:])
+            else:
+                cores.append(self._busy_total(parts[1:]))
+        last_total, last_cores = self._last_total, self._last_cores
+        self._last_total, self._last_cores = total, cores
+        if total is None or last_total is None or len(last_cores) != len(cores):
+            return None, None
+        per_core = array('f', (self._utilization(c, l) for c, l in zip(cores, last_cores)))
+        return self._utilization(total, last_total), per_core
+
+    def close(self) -> None:
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+        self._fd = None
+        self._last_total = None
+        self._last_cores = None
@@ -0,0 +1,198 @@
+import re
+from array import array
+from typing import NamedTuple
+
+
+class MetricSpec(NamedTuple):
+    """
+    单个指标的定义：显示单位、显示精度、数据类型以及作用范围：
+    'gpu' / 'host' 为测量指标；'meta' 为采样过程本身的记录（如错过的采样时刻数），不参与统计和绘图
+    """
+    unit: str
+    precision: int = 2
+    dtype: type = float
+    scope: str = "gpu"
+
+
+# 指标注册表：采集器只输出原始数值（单位即此处的 unit），
+# 保存、统计、绘图和相关性分析都从这里查询单位和格式，只在打印或仪表盘展示时格式化
+METRIC_SCHEMA = {
+    # --- CPU / DRAM ---
+    'cpu_usage': MetricSpec('%', 1, scope="host"),
+    'cpu_usage_per_core': MetricSpec('%', 1, array, scope="host"),
+    'cpu_core_imbalance': MetricSpec('%', scope="host"),
+    'cpu_power': MetricSpec('W', scope="host"),
+    'dram_usage': MetricSpec('%', 1, scope="host"),
+    'dram_power': MetricSpec('W', scope="host"),
+    # --- GPU 基础指标 ---
+    'power.draw [W]': MetricSpec('W'),
+    'utilization.gpu [%]': MetricSpec('%'),
+    'utilization.memory [%]': MetricSpec('%'),
+    'usage.memory [%]': MetricSpec('%'),
+    'pcie.link.gen.current': MetricSpec('', 0, int),
+    'pcie.link.width.current': MetricSpec('', 0, int),
+    'temperature.gpu': MetricSpec('°C'),
+    'temperature.memory': MetricSpec('°C'),
+    'clocks.current.graphics [MHz]': MetricSpec('MHz', 0),
+    'clocks.current.memory [MHz]': MetricSpec('MHz', 0),
+    'clocks.current.sm [MHz]': MetricSpec('MHz', 0),
+    # --- GPU DCGM 指标 ---
+    'sm_active': MetricSpec('%'),
+    'sm_occupancy': MetricSpec('%'),
+    'tensor_active': MetricSpec('%'),
+    'dram_active': MetricSpec('%'),
+    'fp64_active': MetricSpec('%'),
+    'fp32_active': MetricSpec('%'),
+    'fp16_active': MetricSpec('%'),
+    'pcie_tx_bytes': MetricSpec('GB/s'),
+    'pcie_rx_bytes': MetricSpec('GB/s'),
+    'nvlink_tx_bytes': MetricSpec('GB/s'),
+    'nvlink_rx_bytes': MetricSpec('GB/s'),
+    # --- 采样过程记录 ---
+    'missed_ticks': MetricSpec('', 0, int, scope="meta"),
+    'timestamp_ns': MetricSpec('ns', 0, int, scope="meta"),
+    'monotonic_ns': MetricSpec('ns', 0, int, scope="meta"),
+    'phase': MetricSpec('', 0, str, scope="meta"),  # 样本所处的阶段（monitor.mark / monitor.phase），不在阶段中时为空
+    'degradation': MetricSpec('', 0, str, scope="meta"),  # 开销预算在上一次采样之后采取的降级措施（overhead_budget），没有时为空
+}
+
+# 每条样本的 int64 纳秒时间戳：timestamp_ns 为 Unix 时间（time.time_ns），
+# monotonic_ns 为单调时钟（time.monotonic_ns，不受系统时间调整影响，用于计算时间间隔）
+TIME_COLUMNS = ('timestamp_ns', 'monotonic_ns')
+
+# 每个采集器每次运行的开始 / 结束时刻（monotonic 纳秒），列名为 '<采集器名称>.start_ns' / '<采集器名称>.end_ns'
+_ACQUISITION_SUFFIX = re.compile(r'[._](start|end)_ns$')
+_ACQUISITION_SPEC = MetricSpec('ns', 0, int, scope="meta")
+
+# 指标由哪个采集器读取，按优先顺序排列：同一会话中通常只出现其中一个采集器，
+# 多速率采样拆分出的 'power' / 'link' 采集器和 NVML 的 PCIe 吞吐采集器 'pcie' 优先于基础 GPU 采集器
+_GPU_BASE_SOURCES = ('nvml', 'nvidia-smi', 'dcgmi')
+_ACQUISITION_SOURCES = {
+    'cpu_usage': ('cpu_stat',),
+    'cpu_usage_per_core': ('cpu_stat',),
+    'cpu_core_imbalance': ('cpu_stat',),
+    'cpu_power': ('rapl',),
+    'dram_power': ('rapl',),
+    'dram_usage': ('dram_usage',),
+    'power.draw [W]': ('power',) + _GPU_BASE_SOURCES,
+    'pcie.link.gen.current': ('link',) + _GPU_BASE_SOURCES,
+    'pcie.link.width.current': ('link',) + _GPU_BASE_SOURCES,
+    'pcie_tx_bytes': ('pcie', 'nvml', 'dcgmi'),
+    'pcie_rx_bytes': ('pcie', 'nvml', 'dcgmi'),
+}
+# 只能由 dcgmi 读取的指标
+for _key in ('sm_active', 'sm_occupancy', 'tensor_active', 'dram_active', 'fp64_active', 'fp32_active',
+             'fp16_active', 'nvlink_tx_bytes', 'nvlink_rx_bytes'):
+    _ACQUISITION_SOURCES[_key] = ('dcgmi',)
+
+# 多路服务器的每插槽指标（如 cpu_power.socket1，写入 MySQL 后为 cpu_power_socket1）沿用基础指标的定义
+_SOCKET_SUFFIX = re.compile(r'[._]socket\d+$')
+
+# 命令行工具表示缺失值的写法
+_MISSING = {"", "N/A", "[N/A]", "[Not Supported]", "[Unknown Error]"}
+
+# 旧版本写出的带单位字符串，例如 '292.65 W'、'79 °C'、'0.21 GB/s'
+_LEGACY_VALUE = r'^\s*([-+]?\d*\.?\d+)\s*(?:%|°C|MHz|W|GB/s|J)?\s*$'
+
+
+def spec_for(key: str):
+    """返回指标定义，未注册的键（如 name、index）返回 None"""
+    spec = METRIC_SCHEMA.get(key)
+    if spec is None:
+        spec = METRIC_SCHEMA.get(_SOCKET_SUFFIX.sub('', key))
+    if spec is None and _ACQUISITION_SUFFIX.search(key):
+        spec = _ACQUISITION_SPEC
+    return spec
+
+
+def unit_of(key: str) -> str:
+    spec = spec_for(key)
+    return spec.unit if spec else ""
+
+
+def is_host_metric(key: str) -> bool:
+    spec = spec_for(key)
+    return spec is not None and spec.scope == "host"
+
+
+def is_meta_column(key: str) -> bool:
+    spec = spec_for(key)
+    return spec is not None and spec.scope == "meta"
+
+
+def is_time_column(key: str) -> bool:
+    """int64 纳秒时间列（样本时间戳和采集器的开始 / 结束时刻）"""
+    spec = spec_for(key)
+    return spec is not None and spec.scope == "meta" and spec.unit == "ns"
+
+
+def acquisition_columns(source: str):
+    """采集器 source 的开始 / 结束时刻列名"""
+    return f"{source}.start_ns", f"{source}.end_ns"
+
+
+def acquisition_sources(key: str) -> tuple:
+    """可能读取指标 key 的采集器名称（按优先顺序），未注册的键和采样过程记录返回空元组"""
+    spec = spec_for(key)
+    if spec is None or spec.scope == "meta":
+        return ()
+    return _ACQUISITION_SOURCES.get(_SOCKET_SUFFIX.sub('', key), _GPU_BASE_SOURCES)
+
+
+def numeric_metrics() -> list:
+    """所有标量数值测量指标的键（不含每核数组和采样过程记录）"""
+    return [k for k, spec in METRIC_SCHEMA.items() if spec.dtype in (int, float) and spec.scope != "meta"]
+
+
+def parse_value(key: str, raw):
+    """
+    将命令行工具输出的原始文本转换为注册表中定义的类型；缺失值返回 None，
+    未注册的键（如 name）原样返回
+    """
+    spec = spec_for(key)
+    if spec is None:
+        return raw
+    raw = raw.strip()
+    if raw in _MISSING:
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        return None
+    return int(value) if spec.dtype is int else value
+
+
+def format_metric(key: str, value, precision: int = None) -> str:
+    """按注册表中的单位和精度把数值格式化为展示文本，例如 292.65 -> '292.65 W'；缺失值为 'N/A'"""
+    if value is None or (isinstance(value, float) and value != value):
+        return "N/A"
+    spec = spec_for(key)
+    if precision is None:
+        precision = spec.precision if spec else 2
+    if isinstance(value, array):
+        return ";".join(f"{v:.{precision}f}" for v in value)
+    if not isinstance(value, (int, float)):
+        return str(value)
+    text = f"{value:.{precision}f}"
+    return f"{text} {spec.unit}" if spec and spec.unit else text
+
+
+def local_datetime(timestamp_ns):
+    """把 int64 纳秒 Unix 时间戳列转换为本地时间（不带时区的 datetime64），用于展示，不解析字符串"""
+    import pandas as pd
+    from datetime import datetime
+    utc = pd.to_datetime(timestamp_ns, unit='ns', utc=True)
+    return utc.dt.tz_convert(datetime.now().astimezone().tzinfo).dt.tz_localize(None)
+
+
+def coerce_numeric(series):
+    """
+    把一列数据转换为数值列（读取 CSV/MySQL 后使用）。
+    新写出的文件本身就是数值列，直接返回；旧版本写出的带单位字符串在这里剥离单位，
+    无法识别的内容（如 'N/A'、每核数组）变为 NaN
+    """
+    import pandas as pd
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    extracted = series.astype(str).str.extract(_LEGACY_VALUE, expand=False)
+    return pd.to_numeric(extracted, errors='coerce')
@@ -1,11 +1,199 @@
 import pandas as pd
 import numpy as np
-from config import Config
-import pandas as pd
-import numpy as np
+from .config import Config
 import mysql.connector
 import re
-from save import sanitize_metric_key
+from array import array
+from .save import sanitize_metric_key
+from .metric_schema import (METRIC_SCHEMA, spec_for, is_host_metric, is_meta_column, coerce_numeric,
+                            acquisition_columns, acquisition_sources)
+
+# 统计摘要中固定输出的 CPU/DRAM 指标（缺失时为 N/A）
+CPU_DRAM_COLUMNS = ['cpu_usage', 'cpu_power', 'dram_usage', 'dram_power']
+
+# prepare_time 添加的列：相对第一条样本的秒数
+ELAPSED_COL = 'elapsed_s'
+
+def is_scalar_metric(key: str) -> bool:
+    """是否为注册表中的标量数值指标（每核数组等非标量指标除外）"""
+    spec = spec_for(key)
+    return spec is not None and spec.dtype in (int, float)
+
+def compute_stat(series):
+    """计算平均、最大、最小、众数（数值，单位见 metric_schema）；若整列全为NaN则返回 'N/A'"""
+    series_clean = series.dropna()
+    if series_clean.empty:
+        return {'mean': 'N/A', 'max': 'N/A', 'min': 'N/A', 'mode': 'N/A'}
+    try:
+        mode_series = series_clean.mode()
+        # 处理众数可能返回多个值或为空的情况 (尽管在 dropna 后不太可能)
+        mode_val = float(mode_series.iloc[0]) if not mode_series.empty else "N/A"
+        return {
+            'mean': float(series_clean.mean()),
+            'max': float(series_clean.max()),
+            'min': float(series_clean.min()),
+            'mode': mode_val,
+        }
+    except Exception as e:
+        print(f"Error calculating stats for series: {e}")
+        return {'mean': 'Error', 'max': 'Error', 'min': 'Error', 'mode': 'Error'}
+
+def per_core_imbalance(series: pd.Series) -> pd.Series:
+    """
+    将每核利用率列（分号分隔的字符串，如 '12.0;80.5;...'）转换为每个样本的核间不均衡度
+    （最忙核与最闲核的利用率之差，单位 %），无法解析的样本为 NaN
+    """
+    def spread(value):
+        if isinstance(value, (int, float)) and not pd.isna(value):
+            return 0.0  # 单核机器只有一个值，pandas 会直接读成数值
+        if not isinstance(value, str) or not value:
+            return np.nan
+        try:
+            cores = [float(v) for v in value.split(';')]
+        except ValueError:
+            return np.nan
+        return max(cores) - min(cores) if cores else np.nan
+    return series.map(spread)
+
+def prepare_time(df: pd.DataFrame):
+    """
+    准备分析用的时间轴：按时间排序，并添加 ELAPSED_COL 列（相对第一条样本的秒数）。
+    新数据带 int64 纳秒列，优先使用 monotonic_ns（不受系统时间调整影响），只做整数运算；
+    没有纳秒列的旧数据才解析字符串时间戳。
+    返回:
+        (排序后的 df, 标识同一次采样的列名, 总时长秒)
+    """
+    for key in ('monotonic_ns', 'timestamp_ns'):
+        if key in df.columns and df[key].notna().all():
+            ns = df[key].astype('int64')
+            df = df.assign(**{ELAPSED_COL: (ns - ns.min()) / 1e9}).sort_values(key, kind='stable')
+            # 同一次采样的各 GPU 行共用同一个纳秒时间戳
+            return df, key, float(df[ELAPSED_COL].iloc[-1])
+    df = df.assign(timestamp=pd.to_datetime(df['timestamp'])).sort_values('timestamp', kind='stable')
+    df[ELAPSED_COL] = (df['timestamp'] - df['timestamp'].iloc[0]).dt.total_seconds()
+    return df, 'timestamp', float(df[ELAPSED_COL].iloc[-1])
+
+def sample_seconds(df: pd.DataFrame, key: str, column=None) -> pd.Series:
+    """
+    指标 key 每条样本的真实读取时刻（秒，与 ELAPSED_COL 同一时间轴）：
+    取读取它的采集器开始 / 结束时刻的中点，与本行调度时刻 monotonic_ns 的差值加到 ELAPSED_COL 上。
+    没有采集时间列的数据（旧文件）使用调度时刻 ELAPSED_COL。
+    column 把原始指标名映射为 df 中的列名（MySQL 中为清理后的列名），为空时原样使用
+    """
+    column = column or (lambda k: k)
+    tick_col = column('monotonic_ns')
+    if tick_col not in df.columns:
+        return df[ELAPSED_COL]
+    for source in acquisition_sources(key):
+        start_col, end_col = (column(c) for c in acquisition_columns(source))
+        if start_col in df.columns and end_col in df.columns:
+            offset_ns = (df[start_col] - df[tick_col] + df[end_col] - df[tick_col]) / 2
+            return (df[ELAPSED_COL] + offset_ns / 1e9).fillna(df[ELAPSED_COL])
+    return df[ELAPSED_COL]
+
+def align_to_ticks(df: pd.DataFrame, columns, column=None) -> pd.DataFrame:
+    """
+    把各指标从真实读取时刻线性插值到调度时刻（ELAPSED_COL）上，
+    使不同采集器读取的数据在同一时间点上比较（用于相关性分析）；超出该指标读取范围的时刻为 NaN
+    """
+    df = df.copy()
+    target = df[ELAPSED_COL].to_numpy(dtype=float)
+    for col in columns:
+        if col not in df.columns or not pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        t = sample_seconds(df, col, column).to_numpy(dtype=float)
+        v = df[col].to_numpy(dtype=float)
+        valid = ~np.isnan(v)
+        if valid.sum() < 2:
+            continue
+        order = np.argsort(t[valid], kind='stable')
+        df[col] = np.interp(target, t[valid][order], v[valid][order], left=np.nan, right=np.nan)
+    return df
+
+def integrate_energy(seconds: pd.Series, power: pd.Series, missed: pd.Series = None):
+    """
+    梯形法积分能耗（焦耳）：相邻两个有效样本之间按功率线性变化计算，
+    对自适应采样等非均匀时间间隔同样成立；功率为 NaN 的样本直接跳过（由相邻有效样本连接）。
+    seconds 为每条样本的时间（秒，见 prepare_time / sample_seconds）；
+    missed 为每条样本之前被调度器丢弃的采样时刻数（missed_ticks 列）：
+    包含丢弃时刻的区间只是少了中间的样本，功耗并没有中断，两端样本之间的梯形同样覆盖它，照常计入能耗；
+    缺口的时长以及其中按两端线性插值得到的能耗（已包含在总能耗中）另外返回，仅供展示。
+    返回:
+        (能耗焦耳, 缺口秒数, 其中缺口内插值的能耗焦耳)；有效样本少于两个时能耗为 None
+    """
+    t = np.asarray(seconds, dtype=float)
+    p = power.to_numpy(dtype=float)
+    m = missed.fillna(0).to_numpy(dtype=float) if missed is not None else np.zeros(len(p))
+    order = np.argsort(t, kind='stable')
+    t, p, m = t[order], p[order], m[order]
+    # 累计丢弃数：两个有效样本之间（含后一个样本）有丢弃时刻即为缺口
+    cumulative_missed = np.cumsum(m)
+    valid = ~np.isnan(p)
+    t, p, cumulative_missed = t[valid], p[valid], cumulative_missed[valid]
+    if len(p) < 2:
+        return None, 0.0, 0.0
+    dt = np.diff(t)
+    gap = np.diff(cumulative_missed) > 0
+    segments = (p[1:] + p[:-1]) * dt / 2
+    return float(np.sum(segments)), float(np.sum(dt[gap])), float(np.sum(segments[gap]))
+
+def compute_energy(host_df: pd.DataFrame, gpu_groups, column=None) -> dict:
+    """
+    计算 CPU、DRAM 与各 GPU 的能耗（CSV 与 MySQL 两条路径共用）。
+    每个功耗来源按其采集器的真实读取时刻积分（见 sample_seconds），而不是调度时刻；
+    missed_ticks 标记的缺口跨越积分、计入能耗，存在缺口时结果中另外给出 'gap_time'（缺口时长）
+    和 'gap_energy'（总能耗中在缺口内插值得到的部分），仅供参考
+    参数:
+        host_df: 每次采样一行的数据（主机级功耗在每个 GPU 行中重复，需先去重），需带 ELAPSED_COL 列
+        gpu_groups: 按 GPU 索引分组的 (索引, DataFrame) 序列
+        column: 原始指标名 -> df 列名的映射（MySQL 中为 sanitize_metric_key），为空时原样使用
+    """
+    column = column or (lambda k: k)
+    missed_col = column('missed_ticks')
+    energy_consumption = {'cpu_energy': 'N/A', 'dram_energy': 'N/A', 'gpu_energy': {}, 'total_energy': 'N/A'}
+    total_energy_joules = 0.0
+    energy_calculation_possible = False
+    gap_seconds = 0.0
+    gap_joules = 0.0
+
+    def integrate(df, key):
+        nonlocal gap_seconds, gap_joules
+        missed = df[missed_col] if missed_col in df.columns else None
+        joules, seconds, estimated = integrate_energy(sample_seconds(df, key, column), df[column(key)], missed)
+        # 各功耗来源共用同一组采样时刻，缺口时长取最大值，估计能耗累加
+        gap_seconds = max(gap_seconds, seconds)
+        gap_joules += estimated
+        return joules
+
+    for metric, key in (('cpu_power', 'cpu_energy'), ('dram_power', 'dram_energy')):
+        col = column(metric)
+        if col in host_df.columns and pd.api.types.is_numeric_dtype(host_df[col]):
+            joules = integrate(host_df, metric)
+            if joules is not None:
+                energy_consumption[key] = f"{joules:.2f} J"
+                total_energy_joules += joules
+                energy_calculation_possible = True
+
+    for gpu_idx, group in gpu_groups:
+        if str(gpu_idx).lower() == 'nan':
+            continue
+        joules = None
+        gpu_col = column('power.draw [W]')
+        if gpu_col in group.columns and pd.api.types.is_numeric_dtype(group[gpu_col]):
+            joules = integrate(group, 'power.draw [W]')
+        if joules is None:
+            energy_consumption['gpu_energy'][gpu_idx] = 'N/A'
+            continue
+        energy_consumption['gpu_energy'][gpu_idx] = f"{joules:.2f} J"
+        total_energy_joules += joules
+        energy_calculation_possible = True
+
+    if energy_calculation_possible:
+        energy_consumption['total_energy'] = f"{total_energy_joules:.2f} J"
+    if gap_seconds > 0:
+        energy_consumption['gap_time'] = f"{gap_seconds:.2f} 秒"
+        energy_consumption['gap_energy'] = f"{gap_joules:.2f} J"
+    return energy_consumption
 
 def calculate_metrics(file_path: str) -> dict[str, any]:
     """
@@ -31,13 +219,9 @@ def calculate_metrics(file_path: str) -> dict[str, any]:
         return {}
     # 将 "N/A" 和空字符串替换为 NaN
     df.replace(["N/A", ""], np.nan, inplace=True)
-    # 转换时间戳
+    # 时间轴：按时间排序并计算总时间
     try:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        # 按时间戳排序，确保时间顺序正确
-        df.sort_values('timestamp', inplace=True)
-        # 计算总时间
-        total_time = (df['timestamp'].iloc[-1] - df['timestamp'].iloc[0]).total_seconds() if len(df['timestamp']) > 1 else 0
+        df, sample_key, total_time = prepare_time(df)
     except KeyError:
         print("错误：未找到 'timestamp' 列。")
         return {}
@@ -45,129 +229,36 @@ def calculate_metrics(file_path: str) -> dict[str, any]:
         print(f"错误：处理 'timestamp' 时出错: {e}")
         return {}
 
-    # --- 列名和单位定义 (基于 save_to_csv 输出) ---
-    # 列需要清理单位 (%, W, °C, MHz 等) 以进行数值计算
-    # save_to_csv 写入的列名直接来自 metrics 字典的键
-
-    # cols_to_clean: 包含所有需要从中移除单位 (%, W, °C, MHz, B/s 等) 以进行数值计算的列
-    cols_to_clean = [
-        # --- CPU 指标 ---
-        'cpu_usage',      # 示例: '5.9 %'
-        'cpu_power',      # 示例: 'N/A' (仍然包含，以防后续出现 ' W')
-        # --- DRAM 指标 ---
-        'dram_usage',     # 示例: '24.0 %'
-        'dram_power',     # 示例: 'N/A' (仍然包含，以防后续出现 ' W')
-        # --- GPU 指标 (来自您数据的通用和特定指标) ---
-        'utilization.gpu [%]', # 示例: '71 %'
-        'power.draw [W]',   # 示例: '292.65 W'
-        'temperature.gpu',  # 示例: '79 °C'
-        'temperature.memory',# 示例: '85 °C'
-        'utilization.memory [%]', # 示例: '55 %'
-        'clocks.current.graphics [MHz]', # 示例: '1125 MHz'
-        'clocks.current.memory [MHz]', # 示例: '1512 MHz'
-        'clocks.current.sm [MHz]',  # 示例: '1125 MHz'
-        # --- GPU 指标 (FPx 活动状态) ---
-        'fp64_active',      # 示例: '0.00 %'
-        'fp32_active',      # 示例: '0.00 %'
-        'fp16_active',      # 示例: '0.00 %'
-        # --- GPU 指标 (DCGM 及其他) ---
-        'pcie_tx_bytes',    # 示例: '0.21 GB/s'
-        'pcie_rx_bytes',    # 示例: '0.09 GB/s'
-        'tensor_active',    # 示例: '0.40 %'
-        'sm_active',        # 示例: '100.00 %'
-        'sm_occupancy',     # 示例: '99.10 %'
-        'nvlink_tx_bytes',  # 示例: '0 GB/s'
-        'nvlink_rx_bytes',  # 示例: '0 GB/s'
-        'dram_active',      # 示例: '52.30 %'
-        'usage.memory [%]', # 示例: '85 %'
-        # --- 不需要清理的列 (纯数值) ---
-        # 'pcie.link.gen.current', # 示例: 4
-        # 'pcie.link.width.current', # 示例: 16
-    ]
-
-    # unit_map: 包含所有计算了统计信息后，需要在结果中显示单位的列及其单位字符串
-    unit_map = {
-        # --- CPU ---
-        'cpu_usage': ' %',
-        'cpu_power': ' W',
-        # --- DRAM ---
-        'dram_usage': ' %',
-        'dram_power': ' W',
-        # --- GPU 通用和特定指标 ---
-        'utilization.gpu [%]': ' %',
-        'power.draw [W]': ' W',
-        'temperature.gpu': ' °C',
-        'temperature.memory': ' °C',
-        'utilization.memory [%]': ' %',
-        'clocks.current.graphics [MHz]': ' MHz',
-        'clocks.current.memory [MHz]': ' MHz',
-        'clocks.current.sm [MHz]': ' MHz',
-        # --- GPU FPx ---
-        'fp64_active': ' %',
-        'fp32_active': ' %',
-        'fp16_active': ' %',
-        # --- GPU DCGM 及其他 ---
-        'pcie_tx_bytes': ' GB/s',
-        'pcie_rx_bytes': ' GB/s',
-        'tensor_active': ' %',
-        'sm_active': ' %',
-        'sm_occupancy': ' %',
-        'nvlink_tx_bytes': ' GB/s',
-        'nvlink_rx_bytes': ' GB/s',
-        'dram_active': ' %',
-        'usage.memory [%]': ' %',
-        # --- 没有单位的列 (或输出统计信息中不需要单位的列) ---
-        'pcie.link.gen.current': '', # 链路代数不需要单位后缀
-        'pcie.link.width.current': '', # 链路宽度不需要单位后缀
-    }
-
-    # --- 清洗数据 ---
-    for col in cols_to_clean:
-        if col in df.columns:
-            if df[col].dtype == object:
-                # 移除所有非数字和小数点的字符
-                df[col] = df[col].astype(str).str.replace(r'[^\d.]', '', regex=True)
-            # 转换为数值，无法转换的变为 NaN
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        # else:
-            # print(f"信息：在CSV中未找到用于清理的列 '{col}'。") # 可选信息消息
-
-    # --- 统计计算函数 ---
-    def compute_stat(series, unit):
-        """计算平均、最大、最小、众数；若整列全为NaN则返回 'N/A'"""
-        series_clean = series.dropna()
-        if series_clean.empty:
-            return {'mean': 'N/A', 'max': 'N/A', 'min': 'N/A', 'mode': 'N/A'}
-        else:
-            try:
-                mean_val = f"{series_clean.mean():.2f}{unit}"
-                max_val = f"{series_clean.max():.2f}{unit}"
-                min_val = f"{series_clean.min():.2f}{unit}"
-                mode_series = series_clean.mode()
-                # 处理众数可能返回多个值或为空的情况 (尽管在 dropna 后不太可能)
-                mode_val = f"{mode_series.iloc[0]:.2f}{unit}" if not mode_series.empty else "N/A"
-            except Exception as e:
-                print(f"错误：计算序列统计信息时出错: {e}")
-                return {'mean': 'Error', 'max': 'Error', 'min': 'Error', 'mode': 'Error'}
-            return {'mean': mean_val, 'max': max_val, 'min': min_val, 'mode': mode_val}
+    # --- 数值列转换 ---
+    # 新版本写出的指标列已是数值，直接参与计算；旧版本写出的带单位字符串（如 '292.65 W'）
+    # 由 coerce_numeric 剥离单位，单位和格式统一由 metric_schema 定义
+    for col in df.columns:
+        if is_scalar_metric(col):
+            df[col] = coerce_numeric(df[col])
 
     # --- 计算 CPU 和 DRAM 统计指标 ---
-    cpu_dram_columns = ['cpu_usage', 'cpu_power', 'dram_usage', 'dram_power']
+    # 多路服务器另有每插槽列（如 cpu_power.socket1）
+    cpu_dram_columns = CPU_DRAM_COLUMNS + [
+        col for col in df.columns
+        if is_host_metric(col) and is_scalar_metric(col) and col not in CPU_DRAM_COLUMNS
+    ]
     cpu_dram_stats = {}
     for col in cpu_dram_columns:
         if col in df.columns:
-            unit = unit_map.get(col, '') # 获取单位，默认为空字符串
-            cpu_dram_stats[col] = compute_stat(df[col], unit)
+            cpu_dram_stats[col] = compute_stat(df[col])
         else:
             cpu_dram_stats[col] = {'mean': 'N/A', 'max': 'N/A', 'min': 'N/A', 'mode': 'N/A'} # 如果列缺失则标记为 N/A
+    # 每核利用率：统计核间不均衡度（最忙核 - 最闲核）
+    if 'cpu_usage_per_core' in df.columns:
+        cpu_dram_stats['cpu_core_imbalance'] = compute_stat(per_core_imbalance(df['cpu_usage_per_core']))
 
 
     # --- 计算 GPU 相关统计指标 (按 'index' 分组) ---
     # 动态识别 GPU 相关列（不包括 CPU/DRAM 或固定 ID 列）
-    fixed_cols = ['timestamp', 'task_name', 'name', 'index']
-    gpu_metric_columns = [col for col in df.columns if col not in cpu_dram_columns and col not in fixed_cols]
-    # 筛选出 GPU 相关列，确保它们在 unit_map 中有单位或是数值类型
-    gpu_cols_to_stat = [col for col in gpu_metric_columns if col in unit_map or pd.api.types.is_numeric_dtype(df[col])]
+    fixed_cols = ['timestamp', 'task_name', 'name', 'index', ELAPSED_COL]
+    gpu_metric_columns = [col for col in df.columns if not is_host_metric(col) and not is_meta_column(col) and col not in fixed_cols]
+    # 筛选出数值类型的 GPU 相关列
+    gpu_cols_to_stat = [col for col in gpu_metric_columns if pd.api.types.is_numeric_dtype(df[col])]
 
     gpu_stats = {}
     if 'index' in df.columns:
@@ -185,80 +276,17 @@ def calculate_metrics(file_path: str) -> dict[str, any]:
 
             for col in gpu_cols_to_stat:
                 if col in group.columns:
-                    unit = unit_map.get(col, '') # 获取单位
-                    gpu_stats[gpu_idx][col] = compute_stat(group[col], unit)
+                    gpu_stats[gpu_idx][col] = compute_stat(group[col])
                 # else: # 列可能存在于 df 中，但不在这个特定组中 (使用 groupby 时不太可能)
                 #     gpu_stats[gpu_idx][col] = {'mean': 'N/A', 'max': 'N/A', 'min': 'N/A', 'mode': 'N/A'}
     else:
         print("警告：未找到用于 GPU 分组的 'index' 列。")
 
     # --- 能耗计算 ---
-    energy_consumption = {
-        'cpu_energy': 'N/A',
-        'dram_energy': 'N/A',
-        'gpu_energy': {},
-        'total_energy': 'N/A'
-    }
-    total_energy_joules = 0.0
-    energy_calculation_possible = False
-
-    # CPU/DRAM Energy: Use data potentially duplicated across GPUs per timestamp
-    # 需要首先选择唯一时间戳以进行正确的间隔计算
-    # 确保功率列存在且为数值类型 *在* 计算之前
-    if 'timestamp' in df.columns:
-        df_unique_time = df.drop_duplicates(subset=['timestamp']).copy()
-        df_unique_time['time_interval'] = df_unique_time['timestamp'].diff().dt.total_seconds()
-        # 第一个间隔是 NaN，将此未知间隔期间的功率视为 0 贡献还是进行估算？
-        # 我们将间隔的 fillna(0)，意味着第一个测量点不增加能量持续时间。
-        df_unique_time['time_interval'] = df_unique_time['time_interval'].fillna(0)
-
-        # 检查并计算 CPU 能耗
-        cpu_power_col = 'cpu_power'
-        if cpu_power_col in df_unique_time.columns and pd.api.types.is_numeric_dtype(df_unique_time[cpu_power_col]):
-            # 确保没有负的时间间隔 (可能发生在未排序的数据中，尽管我们已排序)
-            df_unique_time['time_interval'] = df_unique_time['time_interval'].clip(lower=0)
-            # 计算能耗，跳过功率消耗中的 NaN
-            cpu_energy_joules = (df_unique_time[cpu_power_col].fillna(0) * df_unique_time['time_interval']).sum()
-            energy_consumption['cpu_energy'] = f"{cpu_energy_joules:.2f} J"
-            total_energy_joules += cpu_energy_joules
-            energy_calculation_possible = True
-        else:
-            # print(f"信息：无法计算 CPU 能耗。列 '{cpu_power_col}' 缺失或非数值类型。")
-            pass
-
-        # 检查并计算 DRAM 能耗
-        dram_power_col = 'dram_power'
-        if dram_power_col in df_unique_time.columns and pd.api.types.is_numeric_dtype(df_unique_time[dram_power_col]):
-            df_unique_time['time_interval'] = df_unique_time['time_interval'].clip(lower=0)
-            dram_energy_joules = (df_unique_time[dram_power_col].fillna(0) * df_unique_time['time_interval']).sum()
-            energy_consumption['dram_energy'] = f"{dram_energy_joules:.2f} J"
-            total_energy_joules += dram_energy_joules
-            energy_calculation_possible = True
-        else:
-            # print(f"信息：无法计算 DRAM 能耗。列 '{dram_power_col}' 缺失或非数值类型。")
-            pass
-
-    # GPU Energy: Calculate per GPU using grouped data
-    gpu_power_col = 'power.draw [W]' # 确保这与实际的列名匹配
-    if 'index' in df.columns and gpu_power_col in df.columns:
-        # 使用与统计计算相同的 grouped_gpus
-        for gpu_idx, group in grouped_gpus:
-              if gpu_idx == 'nan': continue # 跳过 NaN 索引组
-              # 为保险起见按时间对组进行排序，在组内计算间隔
-              group_sorted = group.sort_values('timestamp').copy()
-              group_sorted['time_interval'] = group_sorted['timestamp'].diff().dt.total_seconds().fillna(0).clip(lower=0)
-
-              if pd.api.types.is_numeric_dtype(group_sorted[gpu_power_col]):
-                  gpu_energy_joules = (group_sorted[gpu_power_col].fillna(0) * group_sorted['time_interval']).sum()
-                  energy_consumption['gpu_energy'][gpu_idx] = f"{gpu_energy_joules:.2f} J"
-                  total_energy_joules += gpu_energy_joules
-                  energy_calculation_possible = True
-              else:
-                  energy_consumption['gpu_energy'][gpu_idx] = 'N/A'
-                  print(f"信息：无法计算 GPU {gpu_idx} 的能耗。列 '{gpu_power_col}' 在其组内缺失或非数值类型。")
-
-    if energy_calculation_possible:
-        energy_consumption['total_energy'] = f"{total_energy_joules:.2f} J"
+    # CPU/DRAM 功耗在同一次采样的每个 GPU 行中重复，先按采样时间戳去重
+    df_unique_time = df.drop_duplicates(subset=[sample_key])
+    gpu_groups = grouped_gpus if 'index' in df.columns else []
+    energy_consumption = compute_energy(df_unique_time, gpu_groups)
 
     # --- 返回结果 ---
     return {
@@ -318,9 +346,7 @@ def calculate_metrics_from_mysql(table_name: str) -> dict[str, any]:
     df.fillna(value=np.nan, inplace=True) # 确保数据库的 NULL 值是 NaN
 
     try:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df.sort_values('timestamp', inplace=True)
-        total_time = (df['timestamp'].iloc[-1] - df['timestamp'].iloc[0]).total_seconds() if len(df['timestamp']) > 1 else 0
+        df, sample_key, total_time = prepare_time(df)
     except KeyError:
         print("错误：在获取的 MySQL 数据中未找到 'timestamp' 列。")
         return {}
@@ -328,93 +354,31 @@ def calculate_metrics_from_mysql(table_name: str) -> dict[str, any]:
         print(f"处理来自 MySQL 数据的 'timestamp' 时出错: {e}")
         return {}
 
-    # --- 3. 定义映射 (原始 -> 清理后, 清理后 -> 单位, 清理后 -> 原始) ---
-    original_unit_map = {
-        'cpu_usage': ' %', 
-        'cpu_power': ' W', 
-        'dram_usage': ' %', 
-        'dram_power': ' W',
-        'utilization.gpu [%]': ' %', 
-        'power.draw [W]': ' W', 
-        'temperature.gpu': ' °C',
-        'temperature.memory': ' °C', 
-        'utilization.memory [%]': ' %',
-        'clocks.current.graphics [MHz]': ' MHz', 
-        'clocks.current.memory [MHz]': ' MHz',
-        'clocks.current.sm [MHz]': ' MHz', 
-        'fp64_active': ' %', 
-        'fp32_active': ' %',
-        'fp16_active': ' %', 
-        'pcie_tx_bytes': ' GB/s', 
-        'pcie_rx_bytes': ' GB/s',
-        'tensor_active': ' %', 
-        'sm_active': ' %', 
-        'sm_occupancy': ' %',
-        'nvlink_tx_bytes': ' GB/s', 
-        'nvlink_rx_bytes': ' GB/s', 
-        'dram_active': ' %',
-        'usage.memory [%]': ' %', 
-        'pcie.link.gen.current': '', 
-        'pcie.link.width.current': '',
-        'name': '', 
-        'index': '', # 添加映射所需的非单位键
-    }
-
-    def compute_stat(series, unit):
-        """计算平均、最大、最小、众数；若整列全为NaN则返回 'N/A'"""
-        series_clean = series.dropna()
-        if series_clean.empty:
-            return {'mean': 'N/A', 'max': 'N/A', 'min': 'N/A', 'mode': 'N/A'}
-        else:
-            try:
-                mean_val = f"{series_clean.mean():.2f}{unit}"
-                max_val = f"{series_clean.max():.2f}{unit}"
-                min_val = f"{series_clean.min():.2f}{unit}"
-                mode_series = series_clean.mode()
-                # 处理众数可能返回多个值或为空的情况 (尽管在 dropna 后不太可能)
-                mode_val = f"{mode_series.iloc[0]:.2f}{unit}" if not mode_series.empty else "N/A"
-            except Exception as e:
-                # 保持英文错误消息，因为这是程序输出，可能用于日志分析
-                print(f"Error calculating stats for series: {e}")
-                return {'mean': 'Error', 'max': 'Error', 'min': 'Error', 'mode': 'Error'}
-            return {'mean': mean_val, 'max': max_val, 'min': min_val, 'mode': mode_val}
-    
-    original_cols_to_clean = [k for k, v in original_unit_map.items() if v.strip()]
+    # --- 3. 定义映射 (清理后 -> 原始)，单位和类型统一由 metric_schema 定义 ---
+    original_keys = list(METRIC_SCHEMA.keys()) + ['name', 'index']
+    # 确保反向映射包含注册表中的所有键
+    reverse_name_map = {sanitize_metric_key(k): k for k in original_keys}
 
-    sanitized_unit_map = {sanitize_metric_key(k): v for k, v in original_unit_map.items()}
-    sanitized_cols_to_clean = {sanitize_metric_key(k) for k in original_cols_to_clean}
-    # 确保反向映射包含原始映射中的所有键
-    reverse_name_map = {sanitize_metric_key(k): k for k in original_unit_map.keys()}
-
-    # --- 4. 清理数据 (使用清理后的名称) ---
-    for col in sanitized_cols_to_clean:
-        if col in df.columns:
-            if df[col].dtype == object:
-                df[col] = df[col].astype(str).str.replace(r'[^\d.]', '', regex=True)
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    # --- 新增：显式转换已知应为数值但未被清洗的列 ---
-    known_numeric_sanitized = {
-        sanitize_metric_key('pcie.link.gen.current'),
-        sanitize_metric_key('pcie.link.width.current')
-        # 如果还有其他类似的列，也添加到这里
-    }
-    for col in known_numeric_sanitized:
-        if col in df.columns:
-            # 尝试将列转换为数值，无法转换的（如 '444444'）将变为 NaN
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+    # --- 4. 数值列转换 (使用清理后的名称) ---
+    # 新版本建表时数值指标为 DOUBLE/INT 列；旧表中的 VARCHAR 带单位字符串在这里剥离单位
+    for col in df.columns:
+        if col in reverse_name_map and is_scalar_metric(reverse_name_map[col]):
+            df[col] = coerce_numeric(df[col])
 
     # --- 5. 计算 CPU/DRAM 统计信息 (使用清理后的名称) ---
-    sanitized_cpu_dram_cols = {sanitize_metric_key(k) for k in ['cpu_usage', 'cpu_power', 'dram_usage', 'dram_power']}
+    sanitized_cpu_dram_cols = {sanitize_metric_key(k) for k in CPU_DRAM_COLUMNS}
     cpu_dram_stats_sanitized = {}
-    df_unique_time = df.drop_duplicates(subset=['timestamp']).copy()
+    df_unique_time = df.drop_duplicates(subset=[sample_key]).copy()
 
     for col in sanitized_cpu_dram_cols:
         if col in df_unique_time.columns:
-            unit = sanitized_unit_map.get(col, '')
-            cpu_dram_stats_sanitized[col] = compute_stat(df_unique_time[col], unit)
+            cpu_dram_stats_sanitized[col] = compute_stat(df_unique_time[col])
         else:
             cpu_dram_stats_sanitized[col] = {'mean': 'N/A', 'max': 'N/A', 'min': 'N/A', 'mode': 'N/A'}
+    # 每核利用率：统计核间不均衡度（最忙核 - 最闲核）
+    s_per_core = sanitize_metric_key('cpu_usage_per_core')
+    if s_per_core in df_unique_time.columns:
+        cpu_dram_stats_sanitized['cpu_core_imbalance'] = compute_stat(per_core_imbalance(df_unique_time[s_per_core]))
 
     # --- 6. 计算 GPU 统计信息 (使用清理后的名称) ---
     gpu_stats_sanitized = {}
@@ -424,7 +388,8 @@ def calculate_metrics_from_mysql(table_name: str) -> dict[str, any]:
     # 识别 DataFrame 中存在的潜在 GPU 列
     potential_gpu_metric_cols = {
         col for col in df.columns
-        if col not in sanitized_cpu_dram_cols and col not in ['id', 'timestamp', 'task_name', sanitized_gpu_index_col, sanitized_gpu_name_col]
+        if not is_host_metric(col) and not is_meta_column(col) and col not in ['id', 'timestamp', 'task_name', ELAPSED_COL, sanitized_gpu_index_col, sanitized_gpu_name_col]
+        and pd.api.types.is_numeric_dtype(df[col])
     }
 
     if sanitized_gpu_index_col in df.columns:
@@ -454,60 +419,14 @@ def calculate_metrics_from_mysql(table_name: str) -> dict[str, any]:
             # 计算在此组中找到的其他 GPU 列的统计信息
             for col in potential_gpu_metric_cols:
                 if col in group.columns: # 检查该列是否存在于此特定组中
-                    unit = sanitized_unit_map.get(col, '') # 根据清理后的名称查找单位
-                    gpu_stats_sanitized[gpu_idx][col] = compute_stat(group[col], unit)
+                    gpu_stats_sanitized[gpu_idx][col] = compute_stat(group[col])
 
     else:
         print(f"警告：未找到用于 GPU 分组的清理后索引列 '{sanitized_gpu_index_col}'。")
 
     # --- 7. 计算能耗 (使用清理后的名称) ---
-    energy_consumption = {'cpu_energy': 'N/A', 'dram_energy': 'N/A', 'gpu_energy': {}, 'total_energy': 'N/A'}
-    total_energy_joules = 0.0
-    energy_calculation_possible = False
-
-    s_cpu_power = sanitize_metric_key('cpu_power')
-    s_dram_power = sanitize_metric_key('dram_power')
-    s_gpu_power = sanitize_metric_key('power.draw [W]')
-
-    df_unique_time['time_interval'] = df_unique_time['timestamp'].diff().dt.total_seconds().fillna(0).clip(lower=0)
-
-    # CPU 能耗
-    if s_cpu_power in df_unique_time.columns and pd.api.types.is_numeric_dtype(df_unique_time[s_cpu_power]):
-        cpu_energy_joules = (df_unique_time[s_cpu_power].fillna(0) * df_unique_time['time_interval']).sum()
-        energy_consumption['cpu_energy'] = f"{cpu_energy_joules:.2f} J"
-        total_energy_joules += cpu_energy_joules
-        energy_calculation_possible = True
-    # else: print(f"信息：无法计算 CPU 能耗...") # 减少冗余信息
-
-    # DRAM 能耗
-    if s_dram_power in df_unique_time.columns and pd.api.types.is_numeric_dtype(df_unique_time[s_dram_power]):
-        dram_energy_joules = (df_unique_time[s_dram_power].fillna(0) * df_unique_time['time_interval']).sum()
-        energy_consumption['dram_energy'] = f"{dram_energy_joules:.2f} J"
-        total_energy_joules += dram_energy_joules
-        energy_calculation_possible = True
-    # else: print(f"信息：无法计算 DRAM 能耗...")
-
-    # GPU 能耗
-    if sanitized_gpu_index_col in df.columns and s_gpu_power in df.columns:
-        if 'grouped_gpus' not in locals(): # 如果之前的分组失败或统计不需要分组，则重新分组
-             df[sanitized_gpu_index_col] = df[sanitized_gpu_index_col].astype(str)
-             grouped_gpus = df.dropna(subset=[sanitized_gpu_index_col]).groupby(sanitized_gpu_index_col)
-
-        for gpu_idx, group in grouped_gpus:
-            if gpu_idx.lower() == 'nan': continue
-            group_sorted = group.sort_values('timestamp').copy()
-            group_sorted['time_interval'] = group_sorted['timestamp'].diff().dt.total_seconds().fillna(0).clip(lower=0)
-
-            if s_gpu_power in group_sorted.columns and pd.api.types.is_numeric_dtype(group_sorted[s_gpu_power]):
-                gpu_energy_joules = (group_sorted[s_gpu_power].fillna(0) * group_sorted['time_interval']).sum()
-                energy_consumption['gpu_energy'][gpu_idx] = f"{gpu_energy_joules:.2f} J"
-                total_energy_joules += gpu_energy_joules
-                energy_calculation_possible = True
-            else:
-                energy_consumption['gpu_energy'][gpu_idx] = 'N/A'
-
-    if energy_calculation_possible:
-        energy_consumption['total_energy'] = f"{total_energy_joules:.2f} J"
+    gpu_groups = grouped_gpus if sanitized_gpu_index_col in df.columns else []
+    energy_consumption = compute_energy(df_unique_time, gpu_groups, sanitize_metric_key)
 
     # --- 8. 映射键名并返回 ---
     final_result = {}
@@ -1,41 +1,89 @@
-import os
 import subprocess
-import time
 import psutil
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import os
-from resources_consumption_record import timing_decorator
-
-@timing_decorator
-def get_gpu_info(indices=[]):
+from .resources_consumption_record import timing_decorator
+from .metric_schema import parse_value
+from .host_readers import CpuStatReader, RaplReader
+from . import tracing
+from . import state
+
+# nvidia-smi 查询字段，一次性采样与流式采样共用
+GPU_QUERY_FIELDS = (
+    "name,index,power.draw,utilization.gpu,utilization.memory,"
+    "pcie.link.gen.current,pcie.link.width.current,temperature.gpu,"
+    "temperature.memory,clocks.gr,clocks.mem,clocks.current.sm"
+)
+
+# 与 GPU_QUERY_FIELDS 一一对应的表头（即 --format=csv 时 nvidia-smi 输出的表头）
+GPU_QUERY_HEADERS = [
+    'name', 'index', 'power.draw [W]', 'utilization.gpu [%]', 'utilization.memory [%]',
+    'pcie.link.gen.current', 'pcie.link.width.current', 'temperature.gpu',
+    'temperature.memory', 'clocks.current.graphics [MHz]', 'clocks.current.memory [MHz]',
+    'clocks.current.sm [MHz]'
+]
+
+# 表头 -> nvidia-smi 查询字段
+GPU_QUERY_NAMES = dict(zip(GPU_QUERY_HEADERS, GPU_QUERY_FIELDS.split(",")))
+
+# 可以设置独立采样间隔的 GPU 字段组：在 monitor.start(intervals=...) 中出现时，
+# 这些字段从基础查询中拆出，由单独的采集器按自己的间隔采集
+GPU_FIELD_GROUPS = {
+    'power': ['power.draw [W]'],
+    'link': ['pcie.link.gen.current', 'pcie.link.width.current'],
+}
+
+def gpu_query_fields(headers) -> str:
+    """将表头列表转换为 --query-gpu 的字段字符串"""
+    return ",".join(GPU_QUERY_NAMES[header] for header in headers)
+
+def parse_gpu_csv_line(line: str, headers=GPU_QUERY_HEADERS):
     """
-    获取基本GPU信息，返回一个字典列表，每个字典包含一个GPU的信息
+    解析 nvidia-smi --format=csv,noheader,nounits 输出的一行（一次性采样与流式采样共用），
+    headers 为查询字段对应的表头（必须包含 index），
+    数值字段按指标注册表转换为 float/int，缺失值为 None；列数不符时返回 None
     """
+    values = line.split(", ")
+    if len(values) != len(headers):
+        return None
+    gpu_data = {header: parse_value(header, value) for header, value in zip(headers, values)}
+    gpu_data['index'] = int(gpu_data['index'])
+    return gpu_data
+
+def gpu_info_command(indices=[], headers=GPU_QUERY_HEADERS):
+    """构造一次性 nvidia-smi 查询的命令行（同步与异步采集共用）"""
     command = [
         "nvidia-smi",
-        "--query-gpu=name,index,power.draw,utilization.gpu,utilization.memory,"
-        "pcie.link.gen.current,pcie.link.width.current,temperature.gpu,"
-        "temperature.memory,clocks.gr,clocks.mem,clocks.current.sm",
-        "--format=csv"
+        "--query-gpu=" + gpu_query_fields(headers),
+        "--format=csv,noheader,nounits"
     ]
 
     if indices:  # 如果indices不为空
         id_str = ",".join(map(str, indices))  # 将indices转换为逗号分隔的字符串
         command.extend(["-i=" + id_str])  # 添加--id参数
-    
-    try:
-        result = subprocess.check_output(command, shell=False).decode('utf-8')
-        lines = result.strip().split("\n")
-        headers = lines[0].split(", ")
-        gpu_data_list = []
-        for line in lines[1:]:
-            if not line.strip():
-                continue
-            values = line.split(", ")
-            gpu_data = {}
-            for i, header in enumerate(headers):
-                gpu_data[header] = values[i]
+    return command
+
+def parse_gpu_output(output: str, headers=GPU_QUERY_HEADERS):
+    """解析一次 nvidia-smi 查询的完整输出，返回每个GPU的指标字典列表"""
+    gpu_data_list = []
+    for line in output.strip().split("\n"):
+        if not line.strip():
+            continue
+        gpu_data = parse_gpu_csv_line(line.strip(), headers)
+        if gpu_data is not None:
             gpu_data_list.append(gpu_data)
+    return gpu_data_list
+
+@timing_decorator
+def get_gpu_info(indices=[], headers=GPU_QUERY_HEADERS):
+    """
+    获取基本GPU信息，返回一个字典列表，每个字典包含一个GPU的信息；
+    headers 可以只选取部分字段（必须包含 index）
+    """
+    try:
+        t = tracing.now()
+        result = subprocess.check_output(gpu_info_command(indices, headers), shell=False).decode('utf-8')
+        t = tracing.lap("nvidia-smi.exec", t, "backend")
+        gpu_data_list = parse_gpu_output(result, headers)
+        tracing.lap("nvidia-smi.parse", t, "backend")
         return gpu_data_list
     except subprocess.CalledProcessError as e:
         print(f"Error running basic command: {e}")
@@ -44,140 +92,228 @@ def get_gpu_info(indices=[]):
         print(f"Unexpected error: {e}")
         return []
 
-@timing_decorator
-def get_dcgm_metrics_group(indices=None):
+async def run_command_async(command) -> str:
     """
-    使用 dcgmi dmon 命令获取 GPU 的高级性能指标（组1）
-    包括：设备名称、SM活跃度、SM占用率、Tensor Core活跃度、DRAM活跃度、
-    PCIe发送字节数、PCIe接收字节数、NVLink发送字节数、NVLink接收字节数、
-    内存控制器利用率、GPU利用率、内存利用率、温度、时钟频率
+    以 asyncio 子进程执行命令并返回标准输出，等待期间不阻塞事件循环；
+    返回码非零时抛出 CalledProcessError。调用被取消（例如超时）时结束子进程，不留下孤儿进程
+    """
+    import asyncio
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE)
+    try:
+        output, _ = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return output.decode('utf-8')
+
+async def get_gpu_info_async(indices=[], headers=GPU_QUERY_HEADERS):
+    """get_gpu_info 的 asyncio 版本，供 AsyncCollectionEngine 使用"""
+    try:
+        return parse_gpu_output(await run_command_async(gpu_info_command(indices, headers)), headers)
+    except subprocess.CalledProcessError as e:
+        print(f"Error running basic command: {e}")
+        return []
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return []
 
+# Gdetails 使用的 DCGM 字段 ID（DVNAM 必须排在首位，解析时据此区分设备名称）
+DCGM_GDETAILS_FIELDS = "50,155,203,252,251,237,238,150,140,100,101,1002,1003,1004,1005,1009,1010,1011,1012,204"
+
+# 从 dcgmi dmon 原始字段到输出字段的映射，包括 DVNAM
+DCGM_HEADER_MAP = {
+    'DVNAM': 'name',                  # 设备名称
+    'POWER': 'power.draw [W]',
+    'GPUTL': 'utilization.gpu [%]',
+    'FBUSD': None,  # 用于计算内存利用率，不单独输出
+    'FBFRE': None,
+    'PCILG': 'pcie.link.gen.current',
+    'PCILW': 'pcie.link.width.current',
+    'TMPTR': 'temperature.gpu',
+    'MMTMP': 'temperature.memory',
+    'SMCLK': 'clocks.current.sm [MHz]',
+    'MMCLK': 'clocks.current.memory [MHz]',
+    'SMACT': 'sm_active',
+    'SMOCC': 'sm_occupancy',
+    'TENSO': 'tensor_active',
+    'DRAMA': 'dram_active',
+    'PCITX': 'pcie_tx_bytes',
+    'PCIRX': 'pcie_rx_bytes',
+    'NVLTX': 'nvlink_tx_bytes',
+    'NVLRX': 'nvlink_rx_bytes',
+    'MCUTL': 'utilization.memory [%]',
+    'FP64A': 'fp64_active',
+    'FP32A': 'fp32_active',
+    'FP16A': 'fp16_active',
+}
+
+# DCGM 原始值到注册表单位的换算：活跃度为 0~1 的比例，换算为百分比；吞吐为 B/s，换算为 GB/s
+DCGM_SCALE = {
+    'sm_active': 100, 'sm_occupancy': 100, 'tensor_active': 100, 'dram_active': 100,
+    'fp64_active': 100, 'fp32_active': 100, 'fp16_active': 100,
+    'pcie_tx_bytes': 1 / 1024**3, 'pcie_rx_bytes': 1 / 1024**3,
+    'nvlink_tx_bytes': 1 / 1024**3, 'nvlink_rx_bytes': 1 / 1024**3,
+}
+
+# additional_metrics 中 fp 选项对应的 DCGM 字段 ID
+DCGM_FP_FIELDS = {
+    'fp64': '1006',
+    'fp32': '1007',
+    'fp16': '1008',
+}
+
+def parse_dcgm_row(raw_headers, row):
+    """
+    解析 dcgmi dmon 输出中的一行 GPU 数据（一次性采样与流式采样共用）
+    参数:
+    raw_headers (list): 表头行拆分后的字段名，如 ['#Entity', 'DVNAM', 'POWER', ...]
+    row (str): 数据行，如 'GPU 0  NVIDIA A800 80GB PCIe  70.81 ...'
     返回:
-    list: 包含每个GPU指标的字典列表
+    dict: 单个GPU的指标字典；非数据行返回 None
     """
-    if indices is None:
-        indices = []
+    parts = row.split()
+    if not parts or not parts[0].startswith('GPU'):
+        return None
+    # GPU索引
+    gpu_idx = int(parts[1])
+    raw_vals = {}
+    if len(raw_headers) > 1 and raw_headers[1] == 'DVNAM':
+        # 查找首个数值字段位置，以区分DVNAM
+        num_idx = None
+        for j in range(2, len(parts)):
+            try:
+                float(parts[j])
+                num_idx = j
+                break
+            except ValueError:
+                continue
+        if num_idx is None:
+            return None
+        # 设备名称
+        raw_vals['DVNAM'] = " ".join(parts[2:num_idx])
+        value_headers = raw_headers[2:]
+    else:
+        # 未请求 DVNAM（例如仅查询 fp 活跃度）时，数值从第三列开始
+        num_idx = 2
+        value_headers = raw_headers[1:]
+    # 剩余全部数值字段
+    numeric_vals = parts[num_idx:]
+    # 构建原始值字典
+    for k, key in enumerate(value_headers):
+        if k < len(numeric_vals):
+            raw_vals[key] = numeric_vals[k]
+
+    # 构建输出数据
+    gpu_data = {
+        'index': gpu_idx
+    }
+    # 遍历映射，按注册表转换类型并换算到注册表单位
+    for raw_key, field in DCGM_HEADER_MAP.items():
+        if field is None or raw_key not in raw_vals:
+            continue
+        value = parse_value(field, raw_vals[raw_key])
+        if value is not None and field in DCGM_SCALE:
+            value *= DCGM_SCALE[field]
+        gpu_data[field] = value
+
+    # 计算内存利用率
+    if 'FBUSD' in raw_vals and 'FBFRE' in raw_vals:
+        try:
+            used = float(raw_vals['FBUSD'])
+            free = float(raw_vals['FBFRE'])
+            mem_util = used / (used + free) * 100 if (used + free) > 0 else 0
+            gpu_data['usage.memory [%]'] = mem_util
+        except Exception:
+            pass
+
+    # 新增分组时钟，与SMCLK相同
+    if 'clocks.current.sm [MHz]' in gpu_data:
+        gpu_data['clocks.current.graphics [MHz]'] = gpu_data['clocks.current.sm [MHz]']
+    return gpu_data
+
+def parse_dcgm_output(output: str):
+    """
+    解析一次 dcgmi dmon 调用的完整输出，返回每个GPU的指标字典列表。
+    无论请求了哪些字段（Gdetails、fp 活跃度或二者合并），都使用同一套解析逻辑。
+    """
+    lines = [l for l in output.strip().splitlines() if l.strip()]
+    # 定位表头行（以 #Entity 开头）
+    header_line = next(i for i, l in enumerate(lines) if l.lstrip().startswith('#'))
+    raw_headers = lines[header_line].split()
+    gpu_list = []
+    for row in lines[header_line + 1:]:
+        gpu_data = parse_dcgm_row(raw_headers, row)
+        if gpu_data is not None:
+            gpu_list.append(gpu_data)
+    return gpu_list
 
-    # 构造命令
+def plan_queries(additional_metrics, indices=None):
+    """
+    根据 additional_metrics 和 indices 规划本次采样所需的最少后端查询。
+    - 开启 Gdetails 时：一次 dcgmi 调用，字段为 Gdetails 字段加上所选的 fp 字段
+    - 未开启 Gdetails 时：一次 nvidia-smi 调用；如选择了 fp 指标，再加一次合并了全部 fp 字段的 dcgmi 调用
+    返回:
+    list: 查询字典列表，每项包含 'backend'（'nvidia-smi' 或 'dcgmi'）、'fields' 和 'indices'；
+          第一项提供每个GPU的基础数据，其余项按 GPU 索引合并进去
+    """
+    additional_metrics = additional_metrics or []
+    indices = list(indices or [])
+    fp_fields = [DCGM_FP_FIELDS[m] for m in ('fp64', 'fp32', 'fp16') if m in additional_metrics]
+
+    queries = []
+    if 'Gdetails' in additional_metrics:
+        fields = ",".join([DCGM_GDETAILS_FIELDS] + fp_fields)
+        queries.append({'backend': 'dcgmi', 'fields': fields, 'indices': indices})
+    else:
+        queries.append({'backend': 'nvidia-smi', 'fields': GPU_QUERY_FIELDS, 'indices': indices})
+        if fp_fields:
+            queries.append({'backend': 'dcgmi', 'fields': ",".join(fp_fields), 'indices': indices})
+    return queries
+
+def dcgm_command(fields: str, indices=None):
+    """构造一次性 dcgmi dmon 查询的命令行（同步与异步采集共用）"""
     command = [
         "dcgmi", "dmon",
-        "-e", "50,155,203,252,251,237,238,150,140,100,101,1002,1003,1004,1005,1009,1010,1011,1012,204",
+        "-e", fields,
         "-c", "1"
     ]
     if indices:
         id_str = ",".join(map(str, indices))
         command.extend(["-i", id_str])
+    return command
 
+@timing_decorator
+def run_dcgm_query(fields: str, indices=None):
+    """
+    执行一次 dcgmi dmon 调用并解析输出
+    参数:
+    fields (str): 逗号分隔的 DCGM 字段 ID
+    indices (list): GPU 索引，空列表表示全部
+    返回:
+    list: 包含每个GPU指标的字典列表，出错时返回空列表
+    """
     try:
-        # 执行命令并获取输出
-        output = subprocess.check_output(command, shell=False).decode('utf-8')
-        lines = [l for l in output.strip().splitlines() if l.strip()]
-
-        # 定位表头行
-        header_line = next(i for i, l in enumerate(lines) if "SMACT" in l and "SMOCC" in l)
-        raw_headers = lines[header_line].split()
-
-        # 定义从原始字段到新字段的映射，包括 DVNAM
-        header_map = {
-            'DVNAM': 'name',                  # 设备名称
-            'POWER': 'power.draw [W]',
-            'GPUTL': 'utilization.gpu [%]',
-            'FBUSD': None,  # 用于计算内存利用率，不单独输出
-            'FBFRE': None,
-            'PCILG': 'pcie.link.gen.current',
-            'PCILW': 'pcie.link.width.current',
-            'TMPTR': 'temperature.gpu',
-            'MMTMP': 'temperature.memory',
-            'SMCLK': 'clocks.current.sm [MHz]',
-            'MMCLK': 'clocks.current.memory [MHz]',
-            'SMACT': 'sm_active',
-            'SMOCC': 'sm_occupancy',
-            'TENSO': 'tensor_active',
-            'DRAMA': 'dram_active',
-            'PCITX': 'pcie_tx_bytes',
-            'PCIRX': 'pcie_rx_bytes',
-            'NVLTX': 'nvlink_tx_bytes',
-            'NVLRX': 'nvlink_rx_bytes',
-            'MCUTL': 'utilization.memory [%]' 
-        }
-
-        gpu_list = []
-        for row in lines[header_line + 1:]:
-            parts = row.split()
-            if not parts or not parts[0].startswith('GPU'):
-                continue
-            # GPU索引
-            gpu_idx = int(parts[1])
-            # 查找首个数值字段位置，以区分DVNAM
-            num_idx = None
-            for j in range(2, len(parts)):
-                try:
-                    float(parts[j])
-                    num_idx = j
-                    break
-                except ValueError:
-                    continue
-            if num_idx is None:
-                continue
-            # 设备名称
-            dvnam = " ".join(parts[2:num_idx])
-            # 剩余全部数值字段
-            numeric_vals = parts[num_idx:]
-            # 构建原始值字典
-            raw_vals = {'DVNAM': dvnam}
-            needed = len(raw_headers) - 2
-            for k, key in enumerate(raw_headers[2:2 + needed]):
-                if k < len(numeric_vals):
-                    raw_vals[key] = numeric_vals[k]
-
-            # 构建输出数据
-            gpu_data = {
-                'index': gpu_idx
-            }
-            # 遍历映射
-            for raw_key, field in header_map.items():
-                if field is None or raw_key not in raw_vals:
-                    continue
-                val = raw_vals[raw_key]
-                try:
-                    f = float(val)
-                except ValueError:
-                    gpu_data[field] = val
-                    continue
-                # 单位格式化
-                if field == 'utilization.gpu [%]':
-                    gpu_data[field] = f"{f:.2f} %"
-                elif field in ['sm_active', 'sm_occupancy', 'tensor_active', 'dram_active']:
-                    gpu_data[field] = f"{f * 100:.2f} %"
-                elif field in ['pcie_tx_bytes', 'pcie_rx_bytes', 'nvlink_tx_bytes', 'nvlink_rx_bytes']:
-                    gpu_data[field] = f"{f / 1024**3:.2f} GB/s"
-                elif field in ['temperature.gpu', 'temperature.memory']:
-                    gpu_data[field] = f"{f:.2f} °C"
-                elif field in ['clocks.current.sm [MHz]', 'clocks.current.memory [MHz]']:
-                    gpu_data[field] = f"{f:.0f} MHz"
-                elif field in ['power.draw [W]']:
-                    gpu_data[field] = f"{f:.2f} W"
-                elif field in ['utilization.memory [%]']:
-                    gpu_data[field] = f"{f:.2f} %"
-                else:
-                    gpu_data[field] = val
-
-            # 计算内存利用率
-            try:
-                used = float(raw_vals.get('FBUSD', 0))
-                free = float(raw_vals.get('FBFRE', 0))
-                mem_util = used / (used + free) * 100 if (used + free) > 0 else 0
-                gpu_data['usage.memory [%]'] = f"{mem_util:.2f} %"
-            except Exception:
-                pass
-
-            # 新增分组时钟，与SMCLK相同
-            gpu_data['clocks.current.graphics [MHz]'] = gpu_data.get('clocks.current.sm [MHz]')
-
-            gpu_list.append(gpu_data)
-
+        t = tracing.now()
+        output = subprocess.check_output(dcgm_command(fields, indices), shell=False).decode('utf-8')
+        t = tracing.lap("dcgmi.exec", t, "backend")
+        gpu_list = parse_dcgm_output(output)
+        tracing.lap("dcgmi.parse", t, "backend")
         return gpu_list
+    except subprocess.CalledProcessError as e:
+        print(f"执行 dcgmi dmon 命令时出错: {e}")
+        return []
+    except Exception as e:
+        print(f"处理 dcgmi dmon 输出时发生意外错误: {e}")
+        return []
 
+async def run_dcgm_query_async(fields: str, indices=None):
+    """run_dcgm_query 的 asyncio 版本，供 AsyncCollectionEngine 使用"""
+    try:
+        return parse_dcgm_output(await run_command_async(dcgm_command(fields, indices)))
     except subprocess.CalledProcessError as e:
         print(f"执行 dcgmi dmon 命令时出错: {e}")
         return []
@@ -185,6 +321,51 @@ def get_dcgm_metrics_group(indices=None):
         print(f"处理 dcgmi dmon 输出时发生意外错误: {e}")
         return []
 
+def run_query(query):
+    """执行 plan_queries 规划出的单个查询"""
+    if query['backend'] == 'dcgmi':
+        return run_dcgm_query(query['fields'], query['indices'])
+    return get_gpu_info(query['indices'])
+
+def merge_query_results(results):
+    """
+    将多个查询的结果按 GPU 索引合并：第一个结果作为每个GPU的基础字典，
+    其余结果中的字段合并到索引相同的GPU中
+    """
+    if not results or not results[0]:
+        return []
+    gpu_data_list = results[0]
+    by_index = {str(gpu_data.get('index')): gpu_data for gpu_data in gpu_data_list}
+    for result in results[1:]:
+        for rec in result or []:
+            target = by_index.get(str(rec.get('index')))
+            if target is None:
+                continue
+            for key, value in rec.items():
+                if key != 'index':
+                    target[key] = value
+    return gpu_data_list
+
+@timing_decorator
+def get_dcgm_metrics_group(indices=None):
+    """
+    使用 dcgmi dmon 命令获取 GPU 的高级性能指标（组1）
+    包括：设备名称、SM活跃度、SM占用率、Tensor Core活跃度、DRAM活跃度、
+    PCIe发送字节数、PCIe接收字节数、NVLink发送字节数、NVLink接收字节数、
+    内存控制器利用率、GPU利用率、内存利用率、温度、时钟频率
+
+    返回:
+    list: 包含每个GPU指标的字典列表
+    """
+    return run_dcgm_query(DCGM_GDETAILS_FIELDS, indices)
+
+def _get_dcgm_fp_active(precision: str, indices=None):
+    """单独查询某一种 fp 活跃度，返回 [{'index': '0', 'fpXX_active': 12.5}, ...]，单位为 %；index 与原有接口一致为字符串"""
+    key = f"{precision}_active"
+    gpu_data_list = []
+    for rec in run_dcgm_query(DCGM_FP_FIELDS[precision], indices):
+        gpu_data_list.append({'index': str(rec['index']), key: rec.get(key)})
+    return gpu_data_list
 
 @timing_decorator
 def get_dcgm_fp64_active(indices=[]):
@@ -193,57 +374,7 @@ def get_dcgm_fp64_active(indices=[]):
     返回:
     list: 包含每个GPU的 FP64 活跃度指标的字典列表
     """
-    command = [
-        "dcgmi", "dmon", "-e", "1006", "-c", "1"
-    ]
-
-    if indices:  # 如果indices不为空
-        id_str = ",".join(map(str, indices))  # 将indices转换为逗号分隔的字符串
-        command.extend(["-i " + id_str])  # 添加--id参数
-
-    try:
-        result = subprocess.check_output(command, shell=False).decode('utf-8')
-        lines = result.strip().split("\n")
-        # 查找表头行和数据开始行
-        header_line = None
-        data_start_line = None
-        for i, line in enumerate(lines):
-            if "FP64A" in line:
-                header_line = i
-            if "GPU " in line and header_line is not None:
-                data_start_line = i
-                break
-        if header_line is None or data_start_line is None:
-            print("无法解析 dcgmi dmon FP64 活跃度输出的表头或数据")
-            return []
-        # 解析数据行
-        gpu_data_list = []
-        for i in range(data_start_line, len(lines)):
-            line = lines[i].strip()
-            if not line or "---" in line:
-                continue
-            parts = line.split()
-            if len(parts) < 3 or not parts[0].startswith("GPU"):
-                continue  
-            gpu_index = int(parts[1])
-            value = parts[2]
-            # 创建GPU数据字典
-            gpu_data = {'index': str(gpu_index)}
-            # 添加FP64活跃度指标
-            try:
-                fp64_value = float(value) * 100
-                gpu_data['fp64_active'] = f"{fp64_value:.2f} %"
-            except ValueError:
-                gpu_data['fp64_active'] = "N/A"
-            gpu_data_list.append(gpu_data)
-        return gpu_data_list
-    
-    except subprocess.CalledProcessError as e:
-        print(f"执行 dcgmi dmon FP64 活跃度命令时出错: {e}")
-        return []
-    except Exception as e:
-        print(f"处理 dcgmi dmon FP64 活跃度输出时发生意外错误: {e}")
-        return []
+    return _get_dcgm_fp_active('fp64', indices)
 
 @timing_decorator
 def get_dcgm_fp32_active(indices=[]):
@@ -252,366 +383,115 @@ def get_dcgm_fp32_active(indices=[]):
     返回:
     list: 包含每个GPU的 FP32 活跃度指标的字典列表
     """
-    command = [
-        "dcgmi", "dmon", "-e", "1007", "-c", "1"
-    ]
-
-    if indices:  # 如果indices不为空
-        id_str = ",".join(map(str, indices))  # 将indices转换为逗号分隔的字符串
-        command.extend(["-i " + id_str])  # 添加--id参数
+    return _get_dcgm_fp_active('fp32', indices)
 
-    try:
-        result = subprocess.check_output(command, shell=False).decode('utf-8')
-        lines = result.strip().split("\n")
-        # 查找表头行和数据开始行
-        header_line = None
-        data_start_line = None
-        for i, line in enumerate(lines):
-            if "FP32A" in line:
-                header_line = i
-            if "GPU " in line and header_line is not None:
-                data_start_line = i
-                break
-        if header_line is None or data_start_line is None:
-            print("无法解析 dcgmi dmon FP32 活跃度输出的表头或数据")
-            return []
-        # 解析数据行
-        gpu_data_list = []
-        for i in range(data_start_line, len(lines)):
-            line = lines[i].strip()
-            if not line or "---" in line:
-                continue  
-            parts = line.split()
-            if len(parts) < 3 or not parts[0].startswith("GPU"):
-                continue  
-            gpu_index = int(parts[1])
-            value = parts[2]
-            # 创建GPU数据字典
-            gpu_data = {'index': str(gpu_index)}
-            # 添加FP32活跃度指标
-            try:
-                fp32_value = float(value) * 100
-                gpu_data['fp32_active'] = f"{fp32_value:.2f} %"
-            except ValueError:
-                gpu_data['fp32_active'] = "N/A"
-            
-            gpu_data_list.append(gpu_data)
-        return gpu_data_list
-    
-    except subprocess.CalledProcessError as e:
-        print(f"执行 dcgmi dmon FP32 活跃度命令时出错: {e}")
-        return []
-    except Exception as e:
-        print(f"处理 dcgmi dmon FP32 活跃度输出时发生意外错误: {e}")
-        return []
-    
 @timing_decorator
 def get_dcgm_fp16_active(indices=[]):
     """
-    使用 dcgmi dmon 命令获取 GPU 的 FP32 活跃度指标
+    使用 dcgmi dmon 命令获取 GPU 的 FP16 活跃度指标
     返回:
-    list: 包含每个GPU的 FP32 活跃度指标的字典列表
+    list: 包含每个GPU的 FP16 活跃度指标的字典列表
     """
-    command = [
-        "dcgmi", "dmon", "-e", "1008", "-c", "1"
-    ]
-    if indices:  # 如果indices不为空
-        id_str = ",".join(map(str, indices))  # 将indices转换为逗号分隔的字符串
-        command.extend(["-i " + id_str])  # 添加--id参数
-    try:
-        result = subprocess.check_output(command, shell=False).decode('utf-8')
-        lines = result.strip().split("\n")
-        # 查找表头行和数据开始行
-        header_line = None
-        data_start_line = None
-        for i, line in enumerate(lines):
-            if "FP16A" in line:
-                header_line = i
-            if "GPU " in line and header_line is not None:
-                data_start_line = i
-                break
-        if header_line is None or data_start_line is None:
-            print("无法解析 dcgmi dmon FP16 活跃度输出的表头或数据")
-            return []
-        # 解析数据行
-        gpu_data_list = []
-        for i in range(data_start_line, len(lines)):
-            line = lines[i].strip()
-            if not line or "---" in line:
-                continue  
-            parts = line.split()
-            if len(parts) < 3 or not parts[0].startswith("GPU"):
-                continue  
-            gpu_index = int(parts[1])
-            value = parts[2]
-            # 创建GPU数据字典
-            gpu_data = {'index': str(gpu_index)}
-            # 添加FP16活跃度指标
-            try:
-                fp16_value = float(value) * 100
-                gpu_data['fp16_active'] = f"{fp16_value:.2f} %"
-            except ValueError:
-                gpu_data['fp16_active'] = "N/A"
-            
-            gpu_data_list.append(gpu_data)
-        return gpu_data_list
-    
-    except subprocess.CalledProcessError as e:
-        print(f"执行 dcgmi dmon FP16 活跃度命令时出错: {e}")
-        return []
-    except Exception as e:
-        print(f"处理 dcgmi dmon FP16 活跃度输出时发生意外错误: {e}")
-        return []
+    return _get_dcgm_fp_active('fp16', indices)
+
+def _host_reader(name: str, factory):
+    """
+    取得单值采集函数常开的读取器：第一次调用时创建并 open（建立计数基准），返回 (读取器, 是否刚创建)；
+    读取器保存在 state._host_readers 中，之后每次调用只读取一次差值，不 sleep
+    """
+    reader = state._host_readers.get(name)
+    if reader is not None:
+        return reader, False
+    reader = state._host_readers[name] = factory()
+    reader.open()
+    return reader, True
 
 @timing_decorator
 def get_cpu_usage_info():
     """
-    获取CPU信息
+    获取CPU信息：基于 /proc/stat 与上一次调用之间的 tick 差值（CpuStatReader），不阻塞；
+    第一次调用只建立基准，返回 None。采样会话使用 collectors.CpuStatCollector
     返回:
-    float: CPU使用率
+    float: CPU使用率（%）
     """
     try:
-        cpu_usage = psutil.cpu_percent(interval=0.050)
-        return str(cpu_usage) + " %"
+        reader, created = _host_reader('cpu_stat', CpuStatReader)
+        if created:
+            return None
+        return reader.read()[0]
     except Exception as e:
         print(f"Error getting CPU usage info: {e}")
         return None
 
+def _rapl_power(name: str, kind: str):
+    """RAPL 域 kind（'package' 或 'dram'）在各插槽上的功耗之和（瓦特），基于常开的 RaplReader；第一次调用或无 RAPL 时返回 None"""
+    reader, created = _host_reader(name, RaplReader)
+    if created:
+        return None
+    per_socket = reader.read().get(kind)
+    return sum(per_socket.values()) if per_socket else None
+
 @timing_decorator
-def get_cpu_power_info(sample_interval=0.050):
+def get_cpu_power_info(sample_interval=None):
     """
-    获取 CPU 功耗（两次采样差值计算，单位：瓦特）
-    参数:sample_interval (float): 采样间隔（秒）
-    返回:float: 平均功耗（瓦特）或 "N/A" 表示无法获取功耗
+    获取 CPU 功耗（所有 package 域之和，单位：瓦特）：按与上一次调用之间的 RAPL 计数差值计算，不 sleep；
+    第一次调用只建立基准，返回 None。sample_interval 仅为兼容旧调用保留，不再使用。
+    采样会话使用 collectors.RaplCollector
+    返回:float: 平均功耗（瓦特）或 None 表示无法获取功耗
     """
     try:
-        powercap_path = "/sys/class/powercap"
-        if not os.path.exists(powercap_path):
-            return "N/A"
-        domains = []
-        for entry in os.listdir(powercap_path):
-            if entry.startswith("intel-rapl:") and ":" not in entry[len("intel-rapl:"):]:
-                domain_path = os.path.join(powercap_path, entry)
-                energy_path = os.path.join(domain_path, "energy_uj") 
-                if os.path.exists(energy_path):
-                    with open(energy_path, "r") as f:
-                        energy_start = int(f.read().strip())
-                    timestamp_start = time.time() 
-                    domains.append({
-                        "path": energy_path,
-                        "energy_start": energy_start,
-                        "timestamp_start": timestamp_start})
-        if not domains:
-            return "N/A"
-        time.sleep(sample_interval)
-        total_power_w = 0.0
-        for domain in domains:
-            with open(domain["path"], "r") as f:
-                energy_end = int(f.read().strip())
-            timestamp_end = time.time()
-            delta_time = timestamp_end - domain["timestamp_start"]
-            if delta_time <= 0:
-                continue  # 避免除以零或负数
-            delta_energy_uj = energy_end - domain["energy_start"]
-            # 处理计数器溢出（RAPL 能量计数器为 32/64 位无符号）
-            if delta_energy_uj < 0:
-                max_energy_path = os.path.join(os.path.dirname(domain["path"]), "max_energy_range_uj")
-                if os.path.exists(max_energy_path):
-                    with open(max_energy_path, "r") as f:
-                        max_energy = int(f.read().strip())
-                    delta_energy_uj += max_energy + 1
-            
-            power_w = (delta_energy_uj * 1e-6) / delta_time  # μJ → J → W
-            total_power_w += power_w
-            if total_power_w > 0:
-                total_power_w = f"{total_power_w:.2f} W"  # 保留两位小数
-                return total_power_w
-            else:
-                total_power_w = "N/A"
-                return total_power_w
-    
+        return _rapl_power('rapl_cpu', 'package')
     except Exception as e:
         print(f"Error getting CPU power info: {e}")
-        return "N/A"
+        return None
 
 @timing_decorator
 def get_dram_usage_info():
     """
     获取DRAM使用情况
     返回:
-    float: DRAM使用率
+    float: DRAM使用率（%）
     """
     try:
-        info = psutil.virtual_memory()
-        dram_usage = info.percent
-        return str(dram_usage) + " %"
+        return psutil.virtual_memory().percent
     except Exception as e:
         print(f"Error getting DRAM usage info: {e}")
         return None
 
 @timing_decorator
-def get_dram_power_info(sample_interval=0.050):
+def get_dram_power_info(sample_interval=None):
     """
-    获取 DRAM 功耗（两次采样差值计算，单位：瓦特）
-    参数:sample_interval (float): 采样间隔（秒）
-    返回:float: 平均功耗（瓦特）或 "N/A" 表示无法获取功耗
+    获取 DRAM 功耗（所有 dram 域之和，单位：瓦特）：按与上一次调用之间的 RAPL 计数差值计算，不 sleep；
+    第一次调用只建立基准，返回 None。sample_interval 仅为兼容旧调用保留，不再使用
+    返回:float: 平均功耗（瓦特）或 None 表示无法获取功耗
     """
     try:
-        powercap_path = "/sys/class/powercap"
-        if not os.path.exists(powercap_path):
-            return "N/A"
-        
-        domains = []
-        for entry in os.listdir(powercap_path):
-            domain_path = os.path.join(powercap_path, entry)
-            name_path = os.path.join(domain_path, "name")
-            if os.path.exists(name_path):
-                with open(name_path, "r") as f:
-                    name = f.read().strip()
-                if name == "dram":
-                    energy_path = os.path.join(domain_path, "energy_uj")
-                    if os.path.exists(energy_path):
-                        with open(energy_path, "r") as f:
-                            energy_start = int(f.read().strip())
-                        domains.append({
-                            "path": energy_path,
-                            "energy_start": energy_start,
-                            "timestamp_start": time.time()
-                        })
-        
-        if not domains:
-            return "N/A"
-        time.sleep(sample_interval)
-        
-        total_power_w = 0.0
-        for domain in domains:
-            with open(domain["path"], "r") as f:
-                energy_end = int(f.read().strip())
-            timestamp_end = time.time()
-            delta_time = timestamp_end - domain["timestamp_start"]
-            if delta_time <= 0:
-                continue
-            delta_energy_uj = energy_end - domain["energy_start"]
-            
-            # 处理计数器溢出（RAPL 能量计数器为无符号）
-            if delta_energy_uj < 0:
-                max_energy_path = os.path.join(os.path.dirname(domain["path"]), "max_energy_range_uj")
-                if os.path.exists(max_energy_path):
-                    with open(max_energy_path, "r") as f:
-                        max_energy = int(f.read().strip())
-                    delta_energy_uj += max_energy + 1
-            
-            # 计算功耗（单位：瓦特）
-            power_w = (delta_energy_uj * 1e-6) / delta_time  # μJ → J → W
-            total_power_w += power_w
-
-            if total_power_w > 0:
-                total_power_w = f"{total_power_w:.2f} W"  # 保留两位小数
-                return total_power_w
-            else:
-                total_power_w = "N/A"
-                return total_power_w
-    
+        return _rapl_power('rapl_dram', 'dram')
     except Exception as e:
         print(f"Error getting DRAM power info: {e}")
-        return "N/A"
+        return None
 
 @timing_decorator
-def parallel_collect_metrics(additional_metrics, indices=[]):
+def parallel_collect_metrics(additional_metrics, indices=[], engine=None, now_ns=None):
 
     """
     并行收集硬件指标
     参数:
     additional_metrics (list): 额外需要收集的指标列表，可能包含 'fp64', 'fp32', 'fp16'
+    engine (CollectionEngine): 可选，已 open 的采集引擎（由 monitor.start 创建，整个会话复用采集器和线程池）；
+        为空时按 additional_metrics 临时创建一次性引擎，用完即关闭
+    now_ns (int): 本次采样的调度时刻（monotonic 纳秒），引擎据此决定哪些采集器到期；为空时取当前时刻
     返回:
-    dict: 包含所有收集到的指标的字典
+    dict: 包含所有收集到的指标的字典（多速率采样时只含本次到期的采集器给出的指标）
     """
-    metrics = {}
-    gpu_data_list = []
+    if engine is not None:
+        return engine.collect(now_ns)
 
-    # 确保是列表，避免 None
-    additional_metrics = additional_metrics or []
-
-    # 先根据要提交的任务算出总任务数
-    num_tasks = 1  
-
-    if 'CPU' in additional_metrics:
-        num_tasks += 2  # cpu_usage + cpu_power
-    if 'DRAM' in additional_metrics:
-        num_tasks += 2  # dram_power + dram_usage
-    # 每个 fp* 都是一个任务
-    for m in ('fp64', 'fp32', 'fp16'):
-        if m in additional_metrics:
-            num_tasks += 1
-    workers = min(max(num_tasks, 1), 8)
-
-    # 创建任务映射
-    futures = {}
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-
-        if 'Gdetails' not in additional_metrics:
-            futures[executor.submit(get_gpu_info, indices)] = "gpu_info"
-
-        # 根据 additional_metrics 添加额外的任务
-        if 'CPU' in additional_metrics:
-            futures[executor.submit(get_cpu_usage_info)] = "cpu_usage"
-            futures[executor.submit(get_cpu_power_info)] = "cpu_power"
-        if 'DRAM' in additional_metrics:
-            futures[executor.submit(get_dram_power_info)] = "dram_power"
-            futures[executor.submit(get_dram_usage_info)] = "dram_usage"
-
-        if 'Gdetails' in additional_metrics:
-            futures[executor.submit(get_dcgm_metrics_group, indices)] = "dcgm_metrics"
-
-        if 'fp64' in additional_metrics:
-            futures[executor.submit(get_dcgm_fp64_active, indices)] = "fp64_active"
-        if 'fp32' in additional_metrics:
-            futures[executor.submit(get_dcgm_fp32_active, indices)] = "fp32_active"
-        if 'fp16' in additional_metrics:
-            futures[executor.submit(get_dcgm_fp16_active, indices)] = "fp16_active"
-
-        # 等待所有任务完成（带超时保护）
-        for future in as_completed(futures, timeout=10):
-            key = futures[future]
-            try:
-                result = future.result()
-                if key == 'gpu_info':
-                    gpu_data_list = result
-                elif key == 'dcgm_metrics':
-                    gpu_data_list = result
-                else:
-                    metrics[key] = result
-            except Exception as e:
-                print(f"Failed to collect metric: {key} - {e}")
-                metrics[key] = None
-
-        # 后续和原来一样：把各类指标合并到 gpu_data_list 中
-        if gpu_data_list:
-
-            if metrics.get("fp64_active") is not None:
-                for gpu_data in gpu_data_list:
-                    gid = gpu_data.get('index')
-                    for rec in metrics["fp64_active"]:
-                        if rec.get('index') == str(gid):
-                            gpu_data['fp64_active'] = rec.get('fp64_active', 'N/A')
-                metrics.pop("fp64_active", None)
-
-            if metrics.get("fp32_active") is not None:
-                for gpu_data in gpu_data_list:
-                    gid = gpu_data.get('index')
-                    for rec in metrics["fp32_active"]:
-                        if rec.get('index') == str(gid):
-                            gpu_data['fp32_active'] = rec.get('fp32_active', 'N/A')
-                metrics.pop("fp32_active", None)
-
-            if metrics.get("fp16_active") is not None:
-                for gpu_data in gpu_data_list:
-                    gid = gpu_data.get('index')
-                    for rec in metrics["fp16_active"]:
-                        if rec.get('index') == str(gid):
-                            gpu_data['fp16_active'] = rec.get('fp16_active', 'N/A')
-                metrics.pop("fp16_active", None)
-
-        metrics['gpu_info'] = gpu_data_list
-
-    return metrics
\ No newline at end of file
+    from .collectors import build_collectors
+    from .engine import CollectionEngine
+    engine = CollectionEngine(build_collectors(additional_metrics, indices))
+    engine.open()
+    try:
+        return engine.collect()
+    finally:
+        engine.close()
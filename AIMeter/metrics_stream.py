@@ -0,0 +1,227 @@
+import time
+import subprocess
+import threading
+from collections import deque
+from .metrics_collect import GPU_QUERY_HEADERS, DCGM_GDETAILS_FIELDS, gpu_query_fields, parse_gpu_csv_line, parse_dcgm_row
+
+
+class _StreamReader:
+    """
+    常驻子进程读取器的基类：
+    启动一个长期运行的命令行子进程，由后台线程逐行解析其标准输出。
+    子类只需实现 _build_command() 和 _handle_line()。
+    每行数据记录收到的 monotonic 时刻：子进程卡住但没有退出时，超过 STALE_PERIODS 个输出周期
+    （至少 MIN_STALE_MS 毫秒）没有新数据即视为过期，latest() 返回 None，调用方回退到一次性采样。
+    """
+    STALE_PERIODS = 3
+    MIN_STALE_MS = 200
+
+    def __init__(self, name: str, interval_ms: int = 1000):
+        self.name = name
+        self.interval_ms = max(int(interval_ms), 1)
+        self._stale_ns = max(self.STALE_PERIODS * self.interval_ms, self.MIN_STALE_MS) * 1_000_000
+        self._stale_reported = False
+        self._proc = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def _build_command(self) -> list:
+        raise NotImplementedError
+
+    def _handle_line(self, line: str) -> None:
+        raise NotImplementedError
+
+    def start(self) -> bool:
+        """启动子进程和读取线程，启动失败时返回 False"""
+        try:
+            self._proc = subprocess.Popen(
+                self._build_command(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+        except (OSError, ValueError) as e:
+            print(f"启动 {self.name} 常驻进程失败: {e}")
+            self._proc = None
+            return False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._read_loop, name=f"{self.name}-reader", daemon=True)
+        self._thread.start()
+        return True
+
+    def _read_loop(self) -> None:
+        """后台线程：逐行读取子进程输出，直到子进程退出"""
+        try:
+            for line in self._proc.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._handle_line(line)
+                except Exception as e:
+                    print(f"解析 {self.name} 输出时出错: {e}")
+        except (OSError, ValueError):
+            # 停止时关闭管道可能触发读取异常，忽略
+            pass
+        if not self._stopping:
+            print(f"{self.name} 常驻进程已退出，回退到一次性采样模式。")
+
+    def is_alive(self) -> bool:
+        """子进程与读取线程是否都仍在运行"""
+        return (
+            self._proc is not None
+            and self._proc.poll() is None
+            and self._thread is not None
+            and self._thread.is_alive()
+        )
+
+    def _fresh(self, received_ns) -> bool:
+        """
+        收到时刻为 received_ns 的数据是否仍然有效（未超过过期时长）；
+        从有效变为过期时打印一次提示，恢复输出后可再次提示
+        """
+        if time.monotonic_ns() - min(received_ns) <= self._stale_ns:
+            self._stale_reported = False
+            return True
+        if not self._stale_reported:
+            self._stale_reported = True
+            print(f"{self.name} 常驻进程超过 {self._stale_ns / 1e9:g} 秒没有输出，回退到一次性采样模式。")
+        return False
+
+    def stop(self) -> None:
+        """终止子进程并等待读取线程退出"""
+        self._stopping = True
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.terminate()
+                try:
+                    self._proc.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    self._proc.kill()
+                    self._proc.wait()
+            if self._proc.stdout:
+                self._proc.stdout.close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._proc = None
+        self._thread = None
+
+
+class NvidiaSmiStream(_StreamReader):
+    """
+    常驻 nvidia-smi 读取器：
+    启动 `nvidia-smi --query-gpu=... -lms <interval> --format=csv,noheader,nounits`，
+    每解析一行就更新对应 GPU 的最新值槽，采样线程通过 latest() 无阻塞读取。
+    """
+
+    def __init__(self, indices=None, interval_ms: int = 1000, headers=GPU_QUERY_HEADERS):
+        super().__init__("nvidia-smi", interval_ms)
+        self.indices = list(indices or [])
+        self.headers = list(headers)
+        self._latest = {}  # GPU索引 -> (收到时刻 monotonic 纳秒, 最新一行解析结果)
+
+    def _build_command(self) -> list:
+        command = [
+            "nvidia-smi",
+            "--query-gpu=" + gpu_query_fields(self.headers),
+            "-lms", str(self.interval_ms),
+            "--format=csv,noheader,nounits"
+        ]
+        if self.indices:
+            command.extend(["-i", ",".join(map(str, self.indices))])
+        return command
+
+    def _handle_line(self, line: str) -> None:
+        gpu_data = parse_gpu_csv_line(line, self.headers)
+        if gpu_data is None:
+            return
+        with self._lock:
+            self._latest[gpu_data['index']] = (time.monotonic_ns(), gpu_data)
+
+    def latest(self):
+        """
+        返回每个GPU最新一行数据的副本（按索引排序）。
+        子进程已退出、尚无数据或数据已过期（子进程卡住）时返回 None，调用方应回退到一次性采样。
+        """
+        if not self.is_alive():
+            return None
+        with self._lock:
+            if not self._latest or not self._fresh(received for received, _ in self._latest.values()):
+                return None
+            return [dict(self._latest[k][1]) for k in sorted(self._latest)]
+
+
+class DcgmStream(_StreamReader):
+    """
+    常驻 dcgmi dmon 读取器：
+    启动 `dcgmi dmon -e <fields> -d <ms>`，整个会话只建立一次字段监视。
+    每行数据解析后追加到对应 GPU 的环形缓冲区，采样线程可读取最新一行（latest）
+    或上次读取以来的全部行（drain），热路径上没有阻塞的子进程调用。
+    """
+
+    def __init__(self, indices=None, interval_ms: int = 1000, fields: str = DCGM_GDETAILS_FIELDS, capacity: int = 64):
+        super().__init__("dcgmi", interval_ms)
+        self.indices = list(indices or [])
+        self.fields = fields
+        self.capacity = capacity
+        self._raw_headers = None
+        self._seq = 0
+        self._buffers = {}    # GPU索引 -> deque[(序号, 行数据, 收到时刻 monotonic 纳秒)]
+        self._last_read = {}  # GPU索引 -> drain() 已读取到的序号
+
+    def _build_command(self) -> list:
+        command = [
+            "dcgmi", "dmon",
+            "-e", self.fields,
+            "-d", str(self.interval_ms)
+        ]
+        if self.indices:
+            command.extend(["-i", ",".join(map(str, self.indices))])
+        return command
+
+    def _handle_line(self, line: str) -> None:
+        # dmon 会周期性重复输出表头，每次遇到都刷新一次字段顺序
+        if line.startswith('#'):
+            self._raw_headers = line.split()
+            return
+        if self._raw_headers is None:
+            return
+        gpu_data = parse_dcgm_row(self._raw_headers, line)
+        if gpu_data is None:
+            return
+        with self._lock:
+            self._seq += 1
+            buf = self._buffers.get(gpu_data['index'])
+            if buf is None:
+                buf = self._buffers[gpu_data['index']] = deque(maxlen=self.capacity)
+            buf.append((self._seq, gpu_data, time.monotonic_ns()))
+
+    def latest(self):
+        """
+        返回每个GPU最新一行数据的副本（按索引排序）。
+        子进程已退出、尚无数据或数据已过期（子进程卡住）时返回 None，调用方应回退到一次性采样。
+        """
+        if not self.is_alive():
+            return None
+        with self._lock:
+            if not self._buffers or not self._fresh(buf[-1][2] for buf in self._buffers.values()):
+                return None
+            return [dict(self._buffers[k][-1][1]) for k in sorted(self._buffers)]
+
+    def drain(self):
+        """
+        返回每个GPU自上次 drain() 以来新到达的全部行（环形缓冲区溢出的旧行会丢失）。
+        返回:
+        dict: GPU索引 -> 行数据列表（按到达顺序）
+        """
+        rows = {}
+        with self._lock:
+            for idx, buf in self._buffers.items():
+                last = self._last_read.get(idx, 0)
+                new_rows = [dict(data) for seq, data, _ in buf if seq > last]
+                if new_rows:
+                    rows[idx] = new_rows
+                    self._last_read[idx] = buf[-1][0]
+        return rows
@@ -1,15 +1,16 @@
-import sys
-# 这里的路径需要根据实际情况进行调整
-sys.path.append('__file__' + '/..')
 import time
 from datetime import datetime
-import threading
-from metrics_collect import parallel_collect_metrics
-from metrics_calculate import calculate_metrics, calculate_metrics_from_mysql
-from save import save_to_csv, save_to_mysql
-import state
-from resources_consumption_record import get_average_time, get_max_time, monitor_resources
-from get_carbon_density import get_current_carbon_intensity, compute_carbon_emission
+from .adaptive import AdaptiveInterval
+from .scheduler import DeadlineScheduler
+from . import sampler as sampler_registry
+from . import tracing
+from .sampler import Decimator
+from .online_stats import PhaseTracker, SummaryAccumulator, RunSummary
+from contextlib import contextmanager
+from .save import save_to_csv, save_to_mysql, finalize_csv
+from . import state
+from .resources_consumption_record import reset_timings
+from .metric_schema import format_metric
 import math
 # --- 格式化常量 ---
 # 指标标签的宽度（例如："cpu_usage", "power.draw [W]"）
@@ -28,12 +29,15 @@ def _safe_float(value, default=None):
     except (ValueError, TypeError):
         return default
 
-def _format_value(value, width=VALUE_WIDTH, precision=2):
-    """将单个值（数字或像'N/A'这样的字符串）格式化为固定宽度"""
+def _format_value(value, width=VALUE_WIDTH, precision=2, key_name: str = ""):
+    """
+    将单个值（数字或像'N/A'这样的字符串）格式化为固定宽度；
+    给出 key_name 时按指标注册表附加单位（例如 292.65 -> '292.65 W'）
+    """
     num_value = _safe_float(value)
     if num_value is not None:
         # 使用指定精度格式化数字
-        formatted_val = f"{num_value:.{precision}f}"
+        formatted_val = format_metric(key_name, num_value, precision)
     else:
         # 处理'N/A'或其他非数字字符串
         formatted_val = str(value)
@@ -54,29 +58,32 @@ def _format_stat_dict(stat_dict: dict | str | int | float, key_name: str = "", t
     mean = stat_dict.get('mean', 'N/A')
     max_val = stat_dict.get('max', 'N/A')
     min_val = stat_dict.get('min', 'N/A')
-    mode_val = stat_dict.get('mode', 'N/A')
+    # 在线累计的汇总（RunSummary）没有众数，第四列为标准差
+    last_label = 'Std' if 'std' in stat_dict else 'Mode'
+    mode_val = stat_dict.get(last_label.lower(), 'N/A')
 
     # 如果所有统计值都是'N/A'，则返回简单的'N/A'
     if all(v == 'N/A' for v in [mean, max_val, min_val, mode_val]):
         return "N/A"
 
     # 使用固定宽度格式化每个部分以实现对齐
-    mean_str = f"Avg: {_format_value(mean)}"
-    max_str = f"Max: {_format_value(max_val)}"
-    min_str = f"Min: {_format_value(min_val)}"
-    mode_str = f"Mode: {_format_value(mode_val)}"
+    mean_str = f"Avg: {_format_value(mean, key_name=key_name)}"
+    max_str = f"Max: {_format_value(max_val, key_name=key_name)}"
+    min_str = f"Min: {_format_value(min_val, key_name=key_name)}"
+    mode_str = f"{last_label}: {_format_value(mode_val, key_name=key_name)}"
 
     # 组合对齐后的各个部分
     return f"{mean_str} {max_str} {min_str} {mode_str}"
 
 
 # 打印格式化后的性能指标
-def print_formatted_metrics(metrics: dict[str, any], task_name: str):
+def print_formatted_metrics(metrics: dict[str, any], task_name: str, position=None):
     """
     以结构化、对齐且更美观的方式打印计算得到的性能指标。
     参数:
-        metrics (Dict[str, Any]): 由 calculate_metrics 返回的指标字典。
+        metrics (Dict[str, Any]): 由 calculate_metrics 或 RunSummary.as_metrics() 返回的指标字典。
         task_name (str): 被监控的任务名称。
+        position (tuple): 可选，(纬度, 经度)，给出时按当地电网碳强度估算碳排放。
     """
     if not metrics:
         print("\n[Error] 指标数据为空或无效，无法打印格式化结果。\n")
@@ -127,8 +134,14 @@ def print_formatted_metrics(metrics: dict[str, any], task_name: str):
     # print(f"  {'总能耗':<{LABEL_WIDTH-1}}: {_format_value(energy_consumption.get('total_energy'), precision=3)} Joules")
     # 写成英文
     print(f"  {'Total Energy':<{LABEL_WIDTH}}: {_format_value(energy_consumption.get('total_energy'), precision=3)}")
-    if state._position_use == 1:
-        result = get_current_carbon_intensity(username="xxx", password="xxx", latitude=state._latitude, longitude=state._longitude)
+    if 'gap_time' in energy_consumption:
+        # 调度器丢弃采样时刻造成的缺口已跨越积分，计入上面的能耗，这里只作提示
+        print(f"  {'Unsampled Gaps':<{LABEL_WIDTH}}: {energy_consumption['gap_time'].replace('秒', 'S')} "
+              f"(~{energy_consumption['gap_energy']} of the totals above interpolated across them)")
+    if position:
+        # 碳强度查询依赖 requests，只在给出位置时导入
+        from .get_carbon_density import get_current_carbon_intensity, compute_carbon_emission
+        result = get_current_carbon_intensity(username="xxx", password="xxx", latitude=position[0], longitude=position[1])
         lbs, kg = compute_carbon_emission(float(energy_consumption.get('total_energy').replace(" J", "")), result['value'])
         print(f"  {'Carbon Emissions':<{LABEL_WIDTH}}: {kg:.4f} kg CO2eq")
 
@@ -251,124 +264,383 @@ def print_formatted_metrics(metrics: dict[str, any], task_name: str):
     print("📊 Summary of Metrics Collection Ended 📊".center(SEPARATOR_LEN))
     print("=" * SEPARATOR_LEN + "\n")
 
-def _monitor_stats(additional_metrics,indices):
+def _print_adaptive_summary(controller: AdaptiveInterval, duration: float):
+    """打印自适应采样的实际采样次数，以及按最小间隔固定采样所需的次数，用于评估节省的开销"""
+    fixed_samples = int(duration / controller.min_interval) + 1
+    saved = (1 - controller.samples / fixed_samples) * 100 if fixed_samples else 0.0
+    print(f"-----------------------------------------------------------------------------------------------------------------")
+    print(f"Adaptive sampling: {controller.samples} samples in {duration:.2f} s "
+          f"(interval {controller.min_interval}-{controller.max_interval} s, rate raised {controller.speedups} times); "
+          f"fixed sampling at {controller.min_interval} s would take {fixed_samples} samples, {max(saved, 0.0):.1f}% saved.")
+
+def _print_scheduler_summary(scheduler: DeadlineScheduler):
+    """打印调度器的唤醒抖动与超时统计（毫秒）"""
+    summary = scheduler.summary()
+    jitter = summary['jitter_ms']
+    print(f"-----------------------------------------------------------------------------------------------------------------")
+    if not jitter['count']:
+        return
+    print(f"Scheduler: {summary['ticks']} ticks, {summary['overruns']} overruns, {summary['missed']} ticks dropped (policy '{summary['policy']}').")
+    print(f"  Wake-up jitter (ms)  : p50 {jitter['p50']:.3f}  p90 {jitter['p90']:.3f}  p99 {jitter['p99']:.3f}  max {jitter['max']:.3f}")
+    overrun = summary['overrun_ms']
+    if overrun['count']:
+        print(f"  Overrun (ms)         : p50 {overrun['p50']:.3f}  p90 {overrun['p90']:.3f}  p99 {overrun['p99']:.3f}  max {overrun['max']:.3f}")
+
+def _print_overhead_summary(budget):
+    """打印开销预算下测得的最高 CPU 占用和各次降级措施"""
+    summary = budget.summary()
+    print(f"Overhead budget: {summary['budget'] * 100:.1f}% of one core, peak {summary['peak'] * 100:.2f}%, "
+          f"{len(summary['events'])} degradation events.")
+    for timestamp_ns, usage, action in summary['events']:
+        at = datetime.fromtimestamp(timestamp_ns / 1e9).strftime('%H:%M:%S.%f')[:-3]
+        print(f"  {at}  {usage * 100:.2f}% -> {action}")
+
+def _print_timing_summary(timings: dict):
+    """打印采样各阶段（stage.*）、各采集器（collector.*）和被计时函数的耗时分布（毫秒）"""
+    if not timings:
+        return
+    print("Sampling pipeline timings (ms):")
+    print(f"  {'name':<36}{'count':>10}{'mean':>10}{'p50':>10}{'p99':>10}{'max':>10}")
+    for name in sorted(timings, key=lambda n: (not n.startswith('stage.'), not n.startswith('collector.'), n)):
+        t = timings[name]
+        if not t['count']:
+            continue
+        print(f"  {name:<36}{t['count']:>10}{t['mean']:>10.3f}{t['p50']:>10.3f}{t['p99']:>10.3f}{t['max']:>10.3f}")
+
+def _print_phase_summary(breakdown: list):
+    """打印各阶段（mark / phase）的时长、能耗和平均功率，由采样过程中在线累计得到"""
+    if not breakdown:
+        return
+    print(f"-----------------------------------------------------------------------------------------------------------------")
+    print("Phase breakdown (accumulated online):")
+    for name, seconds, joules, mean_power, count in breakdown:
+        power_text = f"{mean_power:.2f} W" if mean_power is not None else "N/A"
+        repeat_text = f" x{count}" if count > 1 else ""
+        print(f"  {name + repeat_text:<28}: Duration: {seconds:.3f} s    Energy: {joules:.2f} J    Mean power: {power_text}")
+
+class Monitor:
     """
-    内部函数：循环采集数据直到 _monitor_running 被置为 False
+    监控会话：一次 start() / stop() 之间的数据保存到自己的 CSV 文件或 MySQL 表，并在 stop() 时打印汇总。
+    同一进程中可以同时运行多个会话（例如整个作业、每个 epoch、每个请求各一个），
+    它们订阅同一个共享采样器（见 sampler.py），硬件每个调度时刻只读取一次。
+    采样器由第一个启动的会话按其配置创建，之后启动的会话复用它：
+    会话的最短间隔（sampling_interval 与 intervals 中的最小值）大于共享采样间隔时按它抽取样本，其余采集配置以第一个会话为准。
+    mark() / phase() 在样本流中标记阶段（写入 phase 列），各阶段的能耗、时长和平均功率在采样时在线累计，
+    stop() 时直接打印阶段汇总；energy_since() 为常数时间查询。
+    各指标的统计（Welford 在线均值 / 方差、最值）和能耗同样在采样时累计，stop() 立即返回并打印 RunSummary，
+    不回读输出；calculate_metrics / calculate_metrics_from_mysql 仍可用于离线分析已保存的数据。
+    模块级的 start() / stop() 使用一个默认会话，行为与之前一致。
+    output_format 为 "none" 时不保存样本，只在线累计汇总；quiet 为 True 时 start() / stop() 不打印，
+    二者配合用于每个请求一个的轻量会话（见 async_engine.session）。
+    trace 为文件路径时开启采样流水线的区间追踪（见 tracing.py），stop() 时写出 Chrome / Perfetto trace-event JSON。
+    会话同时作为 save_to_csv / save_to_mysql 的 ctx，保存文件路径、表名和写入计数。
     """
-    while state._monitor_running:
+
+    def __init__(self, task_name: str, sampling_interval: float = 1, output_format: str = "csv", additional_metrics: list = [],
+                 indices: list = [], position=(), collect_mode: str = "oneshot", backend: str = "nvidia-smi", buffer_capacity: int = 3600,
+                 adaptive: bool = False, min_interval: float = None, max_interval: float = None, change_threshold: float = 0.1,
+                 overrun_policy: str = "skip", intervals: dict = None, sampler_process: bool = False,
+                 use_daemon: bool = None, quiet: bool = False, overhead_budget: float = None, trace: str = None):
+        self.task_name = task_name
+        self.sampling_interval = sampling_interval
+        # 本会话自己需要的最短采样间隔：多速率采样中更快的采集器间隔、自适应模式下的最短间隔都不能被抽样丢掉
+        self.tick_interval = min([sampling_interval] + list((intervals or {}).values())
+                                 + ([min_interval] if adaptive and min_interval is not None else []))
+        self.output_format = output_format.lower()
+        self.position = tuple(position) if position and len(position) == 2 else None
+        self.quiet = quiet
+        self.trace = trace
+        self._owns_tracer = False
+        self._config = dict(sampling_interval=sampling_interval, additional_metrics=additional_metrics, indices=indices,
+                            collect_mode=collect_mode, backend=backend, buffer_capacity=buffer_capacity, adaptive=adaptive,
+                            min_interval=min_interval, max_interval=max_interval, change_threshold=change_threshold,
+                            overrun_policy=overrun_policy, intervals=intervals, sampler_process=sampler_process,
+                            use_daemon=use_daemon, overhead_budget=overhead_budget)
+        self._sampler = None
+        self._timestamp = ""
+        self._decimator = None
+        self._first_sample = True
+        self._phases = None
+        self._summary = None
+        # 保存函数使用的上下文（与 state 中的同名变量含义相同）
+        self._inserted_count = -1
+        self._csv_file_path = ""
+        self._csv_fieldnames = None
+        self._csv_header_columns = None
+        self._table_name = ""
+
+    @property
+    def running(self) -> bool:
+        return self._sampler is not None
+
+    def start(self) -> "Monitor":
+        if self.running:
+            print(f"-----------------------------------------------------------------------------------------------------------------")
+            print("监控工具已经在运行。")
+            print(f"-----------------------------------------------------------------------------------------------------------------")
+            return self
+        self._timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._decimator = None
+        self._first_sample = True
+        self._phases = PhaseTracker(time.monotonic_ns)
+        self._summary = SummaryAccumulator()
+        if self.trace and state._tracer is None:
+            # 在创建采样器之前开启，进程外采样时子进程据此同样追踪
+            tracing.enable()
+            self._owns_tracer = True
+        self._sampler = self._acquire()
+        if self.quiet:
+            return self
+        # 控制台输出
+        print(f"-----------------------------------------------------------------------------------------------------------------")
+        # print(f"监控工具已启动，正在监控任务 '{self.task_name}' ,采样间隔为 {self.sampling_interval} 秒，输出格式为 '{self.output_format}'。")
+        # print(f"任务 '{self.task_name}' 运行结束后，监控工具将停止运行。")
+        # 写成英文
+        print(f"Monitoring tool started, monitoring task '{self.task_name}', sampling interval is {self.sampling_interval} seconds, output format is '{self.output_format}'.")
+        print(f"After the task '{self.task_name}' ends, the monitoring tool will stop running.")
+        print(f"-----------------------------------------------------------------------------------------------------------------")
+        return self
+
+    def _on_sample(self, sampler, metrics: dict, time_stamp_insert: str) -> None:
+        """
+        共享采样器每次采样后在采样线程中调用：按本会话的间隔抽取样本并保存。
+        第一次调用可能早于 start() 中 acquire 的返回，因此使用传入的 sampler
+        """
+        monotonic_ns = metrics['monotonic_ns']
+        # 能耗按共享采样器的每次采样累计，与本会话的抽样间隔无关
+        self._phases.update(metrics)
+        if self._decimator is None:
+            self._decimator = Decimator(self.tick_interval, sampler.tick_interval)
+        if not self._decimator.accept(monotonic_ns):
+            return
+        # 复制后再添加本会话的阶段列，共享的 metrics 由所有会话读取
+        metrics = {**metrics, 'phase': self._phases.label_at(monotonic_ns)}
+        if self._first_sample:
+            # 中途加入的会话：补齐多速率采样中本次未到期的列，使文件的列完整
+            metrics = sampler.complete(metrics)
+            self._first_sample = False
+        self._summary.update(metrics)
+        if self.output_format == "csv":
+            save_to_csv(self.task_name, metrics, self._timestamp, time_stamp_insert, ctx=self)
+        elif self.output_format == "mysql":
+            save_to_mysql(self.task_name, metrics, self._timestamp, time_stamp_insert, ctx=self)
+        elif self.output_format != "none":
+            print(f"未知的输出格式：{self.output_format}")
+
+    def stop(self) -> RunSummary:
+        """
+        结束监控：停止本会话的数据保存，打印并返回在线累计的汇总；最后一个会话结束时共享采样器随之停止
+        """
+        if not self.running:
+            print(f"-----------------------------------------------------------------------------------------------------------------")
+            print("监控工具没有在运行。")
+            print(f"-----------------------------------------------------------------------------------------------------------------")
+            return None
+        sampler = self._release()
+        self._sampler = None
+        self._phases.finish()
+        if self.output_format == "csv":
+            # 会话已退订，不会再写入；补全采样中途新增的列的表头
+            finalize_csv(self)
+        if sampler is not None:
+            if not self.quiet:
+                if sampler.adaptive is not None:
+                    _print_adaptive_summary(sampler.adaptive, time.monotonic() - sampler.start_monotonic)
+                _print_scheduler_summary(sampler.scheduler)
+                if sampler.budget is not None:
+                    _print_overhead_summary(sampler.budget)
+                _print_timing_summary(sampler.timings())
+            reset_timings()
+        if self.trace:
+            # 最后一个会话退订后采样器已停止，进程外采样时子进程的区间也已合并进来
+            trace_path = tracing.dump(self.trace)
+            if self._owns_tracer:
+                tracing.disable()
+                self._owns_tracer = False
+            if trace_path and not self.quiet:
+                print(f"Pipeline trace written to {trace_path} (open it in ui.perfetto.dev or chrome://tracing).")
+        # 以下整段为输出的简略数据：由采样过程中在线累计的统计直接得到，不回读文件 / 表
+        output = self._csv_file_path if self.output_format == "csv" else self._table_name
+        result = self._summary.result(self.task_name, self._phases.energy, self._phases.breakdown(), output)
+        if self.quiet:
+            return result
+        print(f"-----------------------------------------------------------------------------------------------------------------")
+        # print(f"任务 '{self.task_name}' 已结束，监控工具停止，共采集{self._inserted_count}个样本，详细数据将保存至:{output}，简略数据如下：")
+        # 写成英文
+        print(f"Task '{self.task_name}' has ended, the monitoring tool has stopped, and {self._inserted_count} samples have been collected. Detailed data will be saved to: {output}, and the summary data is as follows:")
+        if result.samples:
+            print_formatted_metrics(result.as_metrics(), self.task_name, self.position)
+        _print_phase_summary(result.phases)
+        return result
+
+    def _acquire(self):
+        """取得并订阅共享采样器（AsyncMonitor 改为订阅本事件循环的 asyncio 采样器）"""
+        return sampler_registry.acquire(self, **self._config)
+
+    def _release(self):
+        """退订共享采样器，最后一个会话退订时返回被停止的采样器，否则返回 None"""
+        return sampler_registry.release(self)
+
+    def mark(self, name: str):
+        """
+        标记阶段边界：结束上一个 mark 开始的阶段，开始名为 name 的阶段（持续到下一次 mark 或 stop()）。
+        返回的标记可传给 energy_since()
+        """
+        if not self.running:
+            print("监控工具没有在运行。")
+            return None
+        self._sync()
+        return self._phases.mark(name)
+
+    @contextmanager
+    def phase(self, name: str):
+        """with 块内的样本属于阶段 name（可嵌套，也可与 mark 混用），产出的标记可传给 energy_since()"""
+        if not self.running:
+            print("监控工具没有在运行。")
+            yield None
+            return
+        phases = self._phases
+        self._sync()
+        started = phases.begin(name)
         try:
-            start_time = time.time()
-            # 用于数据插入的时间戳，精确到毫秒
-            time_stamp_insert = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-5]
-            # 并行采集所有指标
-            metrics = parallel_collect_metrics(additional_metrics,indices)
-            # 检查必要指标是否采集成功
-            if metrics["gpu_info"] is None:
-                print("未能采集到部分指标，跳过本次采样。")
-                time.sleep(state._sampling_interval)
-                continue
-
-            # 根据输出格式调用保存函数
-            if state._output_format == "csv":
-                save_to_csv(state._task_name, metrics, state._timestamp, time_stamp_insert)
-            elif state._output_format == "mysql":
-                save_to_mysql(state._task_name, metrics, state._timestamp, time_stamp_insert)
-            else:
-                print(f"未知的输出格式：{state._output_format}")
-                break
-
-            elapsed_time = time.time() - start_time
-            state._execution_times['elapsed_time'].append(elapsed_time)
-
-            remaining_time = max(0, state._sampling_interval - elapsed_time)
-            time.sleep(remaining_time)
-        except Exception as e:
-            print(f"监控过程中出现错误: {e}")
-            time.sleep(state._sampling_interval)
-
-# @monitor_resources(
-#     log_file="resource_monitor.log",
-#     monitor_cpu=True,
-#     monitor_mem=True,
-#     monitor_disk=True,
-#     disk_device="sda3"
-# )
-def start(task_name: str, sampling_interval: float = 1, output_format: str = "csv", additional_metrics: list = [], indices: list = [], position = ()):
+            yield started
+        finally:
+            self._sync()
+            phases.end(name)
+
+    def energy_since(self, mark) -> float:
+        """自 mark / phase 返回的标记以来所有功耗来源的累计能耗（焦耳），常数时间"""
+        if mark is None or self._phases is None:
+            return None
+        self._sync()
+        return self._phases.energy_since(mark)
+
+    def _sync(self) -> None:
+        """进程外采样时先取回尚未读取的样本，使阶段边界两侧的能耗基于最新数据"""
+        sampler = self._sampler
+        if sampler is not None:
+            sampler.sync()
+
+    def phases(self) -> list:
+        """当前的阶段汇总：[(名称, 时长秒, 能耗焦耳, 平均功率瓦, 次数)]"""
+        return self._phases.breakdown() if self._phases is not None else []
+
+    def window(self, seconds: float = None, gpu=None):
+        """读取共享采样器内存环形缓冲区中的最近样本，见模块级 window()"""
+        return window(seconds, gpu)
+
+    def __enter__(self) -> "Monitor":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+
+def start(task_name: str, sampling_interval: float = 1, output_format: str = "csv", additional_metrics: list = [], indices: list = [], position = (), collect_mode: str = "oneshot", backend: str = "nvidia-smi", buffer_capacity: int = 3600,
+          adaptive: bool = False, min_interval: float = None, max_interval: float = None, change_threshold: float = 0.1,
+          overrun_policy: str = "skip", intervals: dict = None, sampler_process: bool = False,
+          use_daemon: bool = None, overhead_budget: float = None, trace: str = None):
     """
-    启动监控：开始采集数据
+    启动监控：开始采集数据（使用默认会话，需要同时运行多个会话时请直接使用 Monitor）
     :param task_name: 任务名称，用于标识记录（同时作为保存数据的文件/表名的一部分）
     :param sampling_interval: 采样时间间隔（秒）
     :param output_format: 输出格式，支持 'csv' 或 'mysql'
     :param additional_metrics: 额外的指标列表，支持 'fp64_active', 'fp32_active', 'fp16_active''
+    :param collect_mode: 采集模式，'oneshot' 每次采样启动一次 nvidia-smi / dcgmi；
+                         'stream' 为每个后端查询启动常驻 nvidia-smi / dcgmi dmon 子进程持续输出，
+                         子进程退出时自动回退到 'oneshot'
+    :param backend: 基础 GPU 指标的采集后端，'nvidia-smi'（默认）或 'nvml'（进程内直接调用 NVML 库，
+                    需要安装 pynvml，初始化失败时回退到 nvidia-smi）；Gdetails / fp 指标始终使用 dcgmi
+    :param buffer_capacity: 内存环形缓冲区中每个 GPU 保留的最近样本数，可通过 window() 读取
+    :param adaptive: 是否启用自适应采样：功耗或利用率在相邻两次采样间的变化超过 change_threshold 时
+                     立即切换到 min_interval，信号平稳时逐步放宽到 max_interval
+    :param min_interval: 自适应采样的最小间隔（秒），默认等于 sampling_interval
+    :param max_interval: 自适应采样的最大间隔（秒），默认为 sampling_interval 的 10 倍
+    :param change_threshold: 触发加速的变化阈值：功耗为相对变化（0.1 即 10%），利用率为满量程的比例
+    :param overrun_policy: 某次采样超时、错过后续采样时刻时的处理策略：'skip' 丢弃错过的时刻并对齐到下一个时刻；
+                           'coalesce' 将错过的时刻合并为一次立即执行的采样。被丢弃的时刻记为缺口（能耗跨越缺口积分，缺口时长另行报告）
+    :param intervals: 多速率采样，采集器名称 -> 采样间隔（秒），例如 {'power': 0.02, 'dcgmi': 0.2, 'link': 10}。
+                      'power' / 'link' 把功耗 / PCIe 链路字段从基础 GPU 查询中拆出单独采集；backend='nvml' 时
+                      PCIe 吞吐由 'pcie' 采集器读取，默认每 10 秒一次；其余名称见 build_collectors。
+                      调度器按所有间隔中最短的一个运行，未列出的采集器按 sampling_interval 采集，
+                      未到期的指标在该行中为空值
+    :param sampler_process: 是否在独立进程中运行采样引擎：样本经共享内存交给本进程，每秒批量读取一次，
+                            采集和解析不占用被监控任务的 GIL。子进程启动失败时回退到本进程内采样
+    :param use_daemon: 是否订阅节点采样守护进程（python daemon.py）的样本而不在本进程中轮询硬件；默认（None）只在设置了
+                       环境变量 AIMETER_SOCKET 时订阅，True 时使用默认套接字，False 时从不订阅。没有运行的守护进程时在本进程中采样；
+                       订阅时 GPU 子集和采样间隔由守护进程按本会话的请求提供，其余采集配置以守护进程为准
+    :param overhead_budget: 监控开销预算，单核 CPU 时间的比例（如 0.02）。采样器每 2 秒测量一次自身的 CPU 占用，
+                            超出时依次停用可选采集器（PCIe 吞吐、PCIe 链路、DRAM 使用率、CPU 利用率、dcgmi），再逐步加倍采样间隔；
+                            每次降级写入之后第一条样本的 degradation 列。命令行后端子进程的 CPU 时间不计入
+    :param trace: 追踪文件路径：记录每次采样的调度等待、各采集器（命令行后端细分为子进程执行和解析）、合并、
+                  各会话的保存（格式化、写入、刷新，MySQL 为连接、表结构、插入和提交）等区间，
+                  存入固定容量的缓冲区，stop() 时写出为 Chrome / Perfetto trace-event JSON；运行中可用 dump_trace() 导出
     """
-    if state._monitor_running:
+    if state._default_monitor is not None and state._default_monitor.running:
         print(f"-----------------------------------------------------------------------------------------------------------------")
         print("监控工具已经在运行。")
         print(f"-----------------------------------------------------------------------------------------------------------------")
         return
-    state._task_name = task_name
-    state._sampling_interval = sampling_interval
-    state._output_format = output_format.lower()
-    state._timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    state._monitor_running = True
-    state._monitor_thread = threading.Thread(target=_monitor_stats, args=(additional_metrics,indices,), daemon=True)
-    state._monitor_thread.start()
-    if position and len(position) == 2:
-        state._position_use = 1
-        state._latitude = position[0]
-        state._longitude = position[1]
-    # 控制台输出
-    print(f"-----------------------------------------------------------------------------------------------------------------")
-    # print(f"监控工具已启动，正在监控任务 '{state._task_name}' ,采样间隔为 {state._sampling_interval} 秒，输出格式为 '{state._output_format}'。")
-    # print(f"任务 '{state._task_name}' 运行结束后，监控工具将停止运行。")
-    # 写成英文
-    print(f"Monitoring tool started, monitoring task '{state._task_name}', sampling interval is {state._sampling_interval} seconds, output format is '{state._output_format}'.")
-    print(f"After the task '{state._task_name}' ends, the monitoring tool will stop running.")
-    print(f"-----------------------------------------------------------------------------------------------------------------")
+    state._default_monitor = Monitor(task_name, sampling_interval, output_format, additional_metrics, indices, position,
+                                     collect_mode, backend, buffer_capacity, adaptive, min_interval, max_interval,
+                                     change_threshold, overrun_policy, intervals, sampler_process, use_daemon,
+                                     overhead_budget=overhead_budget, trace=trace)
+    state._default_monitor.start()
 
-def stop():
+def window(seconds: float = None, gpu=None):
     """
-    结束监控：停止采集数据
+    读取内存环形缓冲区中最近 seconds 秒的样本（seconds 为空时返回全部），用于仪表盘、告警等实时消费者。
+    返回 {GPU索引 或 'host': Window}；指定 gpu 时只返回该 GPU 的 Window（不存在时为 None）。
+    Window 中的数组是缓冲区的零拷贝视图：window.timestamps 为 int64 纳秒时间戳，
+    window['power.draw [W]'] 为对应的 float64 数组（缺失值为 NaN）。需要长期保存时请调用 copy()。
+    监控停止后缓冲区保留到下一次 start()。
     """
-    if not state._monitor_running:
-        print(f"-----------------------------------------------------------------------------------------------------------------")
+    if state._ring is None:
+        return {} if gpu is None else None
+    if state._sampler is not None:
+        # 进程外采样时先取回尚未读取的样本
+        state._sampler.sync()
+    return state._ring.window(seconds, gpu)
+
+def mark(name: str):
+    """在默认会话中标记阶段边界，见 Monitor.mark"""
+    if state._default_monitor is None:
         print("监控工具没有在运行。")
-        print(f"-----------------------------------------------------------------------------------------------------------------")
+        return None
+    return state._default_monitor.mark(name)
+
+@contextmanager
+def phase(name: str):
+    """在默认会话中标记一个 with 块为阶段 name，见 Monitor.phase"""
+    if state._default_monitor is None:
+        print("监控工具没有在运行。")
+        yield None
         return
-    state._monitor_running = False
-    state._monitor_thread.join()
-    # 以下整段为输出的简略数据
-    if state._output_format == "csv":
+    with state._default_monitor.phase(name) as started:
+        yield started
+
+def energy_since(mark) -> float:
+    """默认会话中自 mark 以来的累计能耗（焦耳），见 Monitor.energy_since"""
+    if state._default_monitor is None:
+        return None
+    return state._default_monitor.energy_since(mark)
+
+def dump_trace(path: str):
+    """运行中导出采样流水线的追踪（需以 trace 参数开启），返回文件路径；进程外采样时子进程的区间在 stop() 时才合并"""
+    trace_path = tracing.dump(path)
+    if trace_path is None:
+        print("Tracing is not enabled; pass trace=<path> to monitor.start().")
+    return trace_path
+
+def stop() -> RunSummary:
+    """
+    结束监控：停止默认会话的数据采集，打印并返回汇总（RunSummary）
+    """
+    if state._default_monitor is None or not state._default_monitor.running:
         print(f"-----------------------------------------------------------------------------------------------------------------")
-        # print(f"任务 '{state._task_name}' 已结束，监控工具停止，共采集{state._inserted_count}个样本，详细数据将保存至:{state._csv_file_path}，简略数据如下：")
-        # 写成英文
-        print(f"Task '{state._task_name}' has ended, the monitoring tool has stopped, and {state._inserted_count} samples have been collected. Detailed data will be saved to: {state._csv_file_path}, and the summary data is as follows:")
-        metrics = calculate_metrics(state._csv_file_path)
-        if metrics: # 确保 metrics 不是空的
-            print_formatted_metrics(metrics, state._task_name)
-    elif state._output_format == "mysql":
+        print("监控工具没有在运行。")
         print(f"-----------------------------------------------------------------------------------------------------------------")
-        # print(f"任务 '{state._task_name}' 已结束，监控工具停止，共采集{state._inserted_count}个样本，详细数据将保存至:{state._table_name}，简略数据如下：")
-        # 写成英文
-        print(f"Task '{state._task_name}' has ended, the monitoring tool has stopped, and {state._inserted_count} samples have been collected. Detailed data will be saved to: {state._table_name}, and the summary data is as follows:")
-    
-        metrics = calculate_metrics_from_mysql(state._table_name)
-        if metrics: # 确保 metrics 不是空的
-            print_formatted_metrics(metrics, state._task_name)
-    # print(get_average_time('parallel_collect_metrics'))
-    # print(get_max_time('parallel_collect_metrics'))
-    # print(get_average_time('elapsed_time'))
-    # print(get_max_time('elapsed_time'))
-    state._inserted_count = -1 # 用于记录已插入的行数
-    state._csv_file_path = "" # 用于记录CSV文件路径
-    state._table_name = "" # 用于记录MYSQL的表格名称
-    state._monitor_thread = None # 用于记录监控线程
-    state._task_name = ""  # 用于记录任务名称
-    state._sampling_interval = 10  # 采样间隔
-    state._output_format = "csv"  # 输出格式，支持csv和mysql
-    state._timestamp = ""  # 用于记录时间戳
-    state._execution_times = {} # 用于保存每个函数的执行时间
-    state._execution_times['elapsed_time'] = [] # 专门用于记录采样频率的key-value对
-    state._position_use = 0 # 用于记录位置使用情况
-    state._latitude = 37.7749 # 用于记录纬度
-    state._longitude = -122.4194 # 用于记录经度
+        return None
+    result = state._default_monitor.stop()
+    state._default_monitor = None
+    return result
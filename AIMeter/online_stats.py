@@ -0,0 +1,342 @@
+import math
+import threading
+from array import array
+from typing import NamedTuple
+from .metric_schema import acquisition_sources, acquisition_columns, spec_for, is_host_metric
+
+# 参与能耗累计的功耗来源：主机级指标在顶层字典中，GPU 功耗在 gpu_info 的每一项中
+HOST_POWER_KEYS = ('cpu_power', 'dram_power')
+GPU_POWER_KEY = 'power.draw [W]'
+# 汇总中总是列出的主机级指标（与 metrics_calculate.CPU_DRAM_COLUMNS 相同），缺失时显示为 N/A
+HOST_SUMMARY_KEYS = ('cpu_usage', 'cpu_power', 'dram_usage', 'dram_power')
+
+
+class Mark(NamedTuple):
+    """mark() 返回的标记：名称、打点时刻（monotonic 纳秒）以及该时刻的累计能耗（焦耳）"""
+    name: str
+    monotonic_ns: int
+    energy: float
+
+
+def read_time_ns(metrics: dict, key: str) -> int:
+    """
+    指标 key 在本次采样中的读取时刻（monotonic 纳秒）：读取它的采集器开始 / 结束时刻的中点，
+    与 metrics_calculate.sample_seconds 一致；没有采集时间时使用调度时刻 monotonic_ns
+    """
+    for source in acquisition_sources(key):
+        start_key, end_key = acquisition_columns(source)
+        start_ns, end_ns = metrics.get(start_key), metrics.get(end_key)
+        if start_ns is not None and end_ns is not None:
+            return (start_ns + end_ns) // 2
+    return metrics['monotonic_ns']
+
+
+class EnergyAccumulator:
+    """
+    在线累计能耗：每个功耗来源（CPU、DRAM、各 GPU）按梯形法积分到最近一次读取，
+    与 metrics_calculate.integrate_energy 的规则相同，missed_ticks 标记的缺口跨越积分，另外记录缺口时长供参考。
+    同时维护 Σ最近功率 和 Σ(最近功率 × 读取时刻)，任意时刻的累计能耗（把每个来源的最近功率外推到该时刻）
+    都可以常数时间得到：E(t) = Σ累计能耗 + t·ΣP - Σ(P·t_i)
+    """
+
+    def __init__(self):
+        self._last = {}  # 来源 -> (读取时刻秒, 功率瓦)
+        self._origin_ns = None  # 时间原点，避免纳秒整数转为浮点数时损失精度
+        self.energy = 0.0  # 所有来源积分到各自最近一次读取的能耗（焦耳）
+        self.sources = {}  # 来源（'cpu_power'、'dram_power' 或 GPU 索引字符串） -> 能耗焦耳，至少有两次读取的来源才出现
+        self.gap_time = 0.0  # 丢弃采样时刻造成的缺口时长（秒，各来源的最大值）
+        self.gap_energy = 0.0  # 能耗中在缺口内按两端线性插值得到的部分（焦耳，已包含在 energy 中）
+        self._gap_by_source = {}
+        self._power = 0.0
+        self._power_time = 0.0
+
+    def _seconds(self, monotonic_ns: int) -> float:
+        return (monotonic_ns - self._origin_ns) / 1e9
+
+    def _add(self, source, seconds: float, power: float, gap: bool) -> None:
+        last = self._last.get(source)
+        if last is not None:
+            last_seconds, last_power = last
+            dt = seconds - last_seconds
+            segment = (power + last_power) * dt / 2
+            # 缺口只是少了中间的样本，两端之间的梯形覆盖它，照常计入
+            self.energy += segment
+            self.sources[source] = self.sources.get(source, 0.0) + segment
+            if gap:
+                self._gap_by_source[source] = self._gap_by_source.get(source, 0.0) + dt
+                self.gap_time = max(self.gap_time, self._gap_by_source[source])
+                self.gap_energy += segment
+            self._power -= last_power
+            self._power_time -= last_power * last_seconds
+        self._last[source] = (seconds, power)
+        self._power += power
+        self._power_time += power * seconds
+
+    def update(self, metrics: dict) -> None:
+        """累计一次采样（Sampler 分发的 metrics）；多速率采样中本次未读取的功耗来源保持不变"""
+        if self._origin_ns is None:
+            self._origin_ns = metrics['monotonic_ns']
+        gap = bool(metrics.get('missed_ticks'))
+        for key in HOST_POWER_KEYS:
+            power = metrics.get(key)
+            if power is not None:
+                self._add(key, self._seconds(read_time_ns(metrics, key)), power, gap)
+        gpu_seconds = None
+        for gpu in metrics.get('gpu_info') or []:
+            power = gpu.get(GPU_POWER_KEY)
+            if power is None:
+                continue
+            if gpu_seconds is None:
+                gpu_seconds = self._seconds(read_time_ns(metrics, GPU_POWER_KEY))
+            self._add(str(gpu.get('index')), gpu_seconds, power, gap)
+
+    def energy_at(self, monotonic_ns: int) -> float:
+        """monotonic_ns 时刻的累计能耗（焦耳），最近一次读取之后按各来源的最近功率外推"""
+        if self._origin_ns is None:
+            return 0.0
+        return self.energy + self._seconds(monotonic_ns) * self._power - self._power_time
+
+
+class PhaseTracker:
+    """
+    阶段记录：mark(name) 结束当前标记段并开始名为 name 的新段；begin / end 为可嵌套的显式阶段（phase 上下文管理器）。
+    每段结束时把时长和能耗累加到同名阶段的汇总中，不需要回读输出文件；
+    同名阶段多次出现（如循环中的 decode）合并统计。所有操作为常数时间，可在采样线程和用户线程中同时调用
+    """
+
+    def __init__(self, clock):
+        self._clock = clock  # 返回当前 monotonic 纳秒的函数
+        self.energy = EnergyAccumulator()
+        self._lock = threading.Lock()
+        self._marked = None  # 当前标记段：(名称, 开始纳秒, 开始能耗)
+        self._stack = []  # 嵌套的显式阶段，元素同上
+        self._totals = {}  # 名称 -> [时长秒, 能耗焦耳, 次数]，按首次出现的顺序
+        # 当前阶段名称及其开始时刻，以及之前的名称：采样时刻早于切换时刻的样本仍属于之前的阶段
+        self._label = (None, 0, None)
+
+    def update(self, metrics: dict) -> None:
+        with self._lock:
+            self.energy.update(metrics)
+
+    def _close(self, segment, now_ns: int) -> None:
+        name, start_ns, start_energy = segment
+        total = self._totals.setdefault(name, [0.0, 0.0, 0])
+        total[0] += (now_ns - start_ns) / 1e9
+        total[1] += self.energy.energy_at(now_ns) - start_energy
+        total[2] += 1
+
+    def _relabel(self, now_ns: int) -> None:
+        current = self._stack[-1][0] if self._stack else (self._marked[0] if self._marked else None)
+        if current != self._label[0]:
+            self._label = (current, now_ns, self._label[0])
+
+    def mark(self, name: str) -> Mark:
+        with self._lock:
+            now_ns = self._clock()
+            if self._marked is not None:
+                self._close(self._marked, now_ns)
+            result = Mark(name, now_ns, self.energy.energy_at(now_ns))
+            self._marked = (name, now_ns, result.energy)
+            self._relabel(now_ns)
+            return result
+
+    def begin(self, name: str) -> Mark:
+        with self._lock:
+            now_ns = self._clock()
+            result = Mark(name, now_ns, self.energy.energy_at(now_ns))
+            self._stack.append((name, now_ns, result.energy))
+            self._relabel(now_ns)
+            return result
+
+    def end(self, name: str) -> None:
+        with self._lock:
+            now_ns = self._clock()
+            # 按名称出栈，容忍内层阶段未正确结束的情况
+            while self._stack:
+                segment = self._stack.pop()
+                self._close(segment, now_ns)
+                if segment[0] == name:
+                    break
+            self._relabel(now_ns)
+
+    def finish(self) -> None:
+        """会话结束：在当前时刻结束所有未结束的阶段，之后的查询都以该时刻为准，不再外推"""
+        with self._lock:
+            now_ns = self._clock()
+            for segment in ([self._marked] if self._marked else []) + self._stack[::-1]:
+                self._close(segment, now_ns)
+            self._marked = None
+            self._stack = []
+            self._clock = lambda: now_ns
+
+    def energy_since(self, mark: Mark) -> float:
+        with self._lock:
+            return self.energy.energy_at(self._clock()) - mark.energy
+
+    def label_at(self, monotonic_ns: int):
+        """monotonic_ns 时刻（样本的调度时刻）所处阶段的名称，不在任何阶段中时为 None"""
+        name, since_ns, previous = self._label
+        return name if monotonic_ns >= since_ns else previous
+
+    def breakdown(self) -> list:
+        """
+        各阶段的汇总：[(名称, 时长秒, 能耗焦耳, 平均功率瓦, 次数)]，尚未结束的阶段计算到当前时刻
+        """
+        with self._lock:
+            now_ns = self._clock()
+            totals = {name: list(total) for name, total in self._totals.items()}
+            for name, start_ns, start_energy in ([self._marked] if self._marked else []) + self._stack:
+                total = totals.setdefault(name, [0.0, 0.0, 0])
+                total[0] += (now_ns - start_ns) / 1e9
+                total[1] += self.energy.energy_at(now_ns) - start_energy
+                total[2] += 1
+        return [(name, seconds, joules, joules / seconds if seconds > 0 else None, count)
+                for name, (seconds, joules, count) in totals.items()]
+
+
+class RunningStat:
+    """Welford 算法的在线统计：样本数、均值、最小值、最大值和方差，内存固定，数值稳定"""
+
+    __slots__ = ('count', 'mean', 'min', 'max', '_m2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def variance(self) -> float:
+        """样本方差（与 pandas 的 var() 相同，除以 n - 1），样本少于两个时为 0"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def as_dict(self) -> dict:
+        """print_formatted_metrics 使用的统计字典，没有样本时各项为 'N/A'"""
+        if not self.count:
+            return {'mean': 'N/A', 'max': 'N/A', 'min': 'N/A', 'std': 'N/A'}
+        return {'mean': self.mean, 'max': self.max, 'min': self.min, 'std': self.std}
+
+
+class RunSummary(NamedTuple):
+    """
+    stop() 返回的会话汇总，由采样过程中在线累计得到，不回读输出文件：
+    host_stats / gpu_stats 为指标名 -> RunningStat（gpu_stats 按 GPU 索引字符串分组，另含 'name'），
+    energy 为能耗焦耳：{'cpu', 'dram', 'gpu': {索引: 焦耳}, 'total', 'gap_time', 'gap_energy'}，无法计算的项为 None，
+    phases 为各阶段的 (名称, 时长秒, 能耗焦耳, 平均功率瓦, 次数)
+    """
+    task_name: str
+    samples: int
+    total_time: float
+    host_stats: dict
+    gpu_stats: dict
+    energy: dict
+    phases: list
+    output: str
+
+    def as_metrics(self) -> dict:
+        """转换为 calculate_metrics 返回的字典格式，供 print_formatted_metrics 打印"""
+        def joules(value):
+            return f"{value:.2f} J" if value is not None else 'N/A'
+        cpu_dram_stats = {key: RunningStat().as_dict() for key in HOST_SUMMARY_KEYS}
+        cpu_dram_stats.update({key: stat.as_dict() for key, stat in self.host_stats.items()})
+        gpu_stats = {}
+        for index, stats in self.gpu_stats.items():
+            gpu_stats[index] = {key: (stat.as_dict() if isinstance(stat, RunningStat) else stat) for key, stat in stats.items()}
+        energy = self.energy
+        energy_consumption = {
+            'cpu_energy': joules(energy['cpu']),
+            'dram_energy': joules(energy['dram']),
+            'gpu_energy': {index: joules(value) for index, value in energy['gpu'].items()},
+            'total_energy': joules(energy['total']),
+        }
+        if energy['gap_time'] > 0:
+            energy_consumption['gap_time'] = f"{energy['gap_time']:.2f} 秒"
+            energy_consumption['gap_energy'] = joules(energy['gap_energy'])
+        return {
+            'cpu_dram_stats': cpu_dram_stats,
+            'gpu_stats': gpu_stats,
+            'total_time': f"{self.total_time:.2f} 秒",
+            'energy_consumption': energy_consumption,
+        }
+
+
+def _is_summary_metric(key: str) -> bool:
+    spec = spec_for(key)
+    return spec is not None and spec.scope != "meta" and spec.dtype in (int, float)
+
+
+class SummaryAccumulator:
+    """
+    会话汇总的在线累计：每个主机级指标和每个 GPU 的每个指标一个 RunningStat，
+    每核利用率数组累计为核间不均衡度（cpu_core_imbalance，与 metrics_calculate 相同）。
+    只处理会话实际保存的样本，与离线的 calculate_metrics 读取同一组数据
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.host = {}
+        self.gpus = {}
+        self._first_ns = None
+        self._last_ns = None
+
+    @staticmethod
+    def _add(stats: dict, key: str, value) -> None:
+        stat = stats.get(key)
+        if stat is None:
+            stat = stats[key] = RunningStat()
+        stat.add(value)
+
+    def update(self, metrics: dict) -> None:
+        self.samples += 1
+        monotonic_ns = metrics['monotonic_ns']
+        if self._first_ns is None:
+            self._first_ns = monotonic_ns
+        self._last_ns = monotonic_ns
+        for key, value in metrics.items():
+            if value is None or not is_host_metric(key):
+                continue
+            if isinstance(value, array):
+                if len(value):
+                    self._add(self.host, 'cpu_core_imbalance', max(value) - min(value))
+            elif _is_summary_metric(key):
+                self._add(self.host, key, value)
+        for gpu in metrics.get('gpu_info') or []:
+            index = str(gpu.get('index'))
+            stats = self.gpus.get(index)
+            if stats is None:
+                stats = self.gpus[index] = {'name': gpu.get('name', 'N/A')}
+            for key, value in gpu.items():
+                if value is not None and _is_summary_metric(key) and not is_host_metric(key):
+                    self._add(stats, key, value)
+
+    def result(self, task_name: str, energy: EnergyAccumulator, phases: list = None, output: str = "") -> RunSummary:
+        total_time = (self._last_ns - self._first_ns) / 1e9 if self._first_ns is not None else 0.0
+        sources = energy.sources
+        gpu_energy = {index: sources.get(index) for index in self.gpus}
+        parts = [value for value in [sources.get('cpu_power'), sources.get('dram_power')] + list(gpu_energy.values())
+                 if value is not None]
+        energy_summary = {
+            'cpu': sources.get('cpu_power'),
+            'dram': sources.get('dram_power'),
+            'gpu': gpu_energy,
+            'total': sum(parts) if parts else None,
+            'gap_time': energy.gap_time,
+            'gap_energy': energy.gap_energy,
+        }
+        return RunSummary(task_name, self.samples, total_time, dict(self.host), dict(self.gpus),
+                          energy_summary, list(phases or []), output)
@@ -0,0 +1,94 @@
+import time
+
+# 超出预算时依次停用的可选采集器（按对能耗分析的重要性从低到高）；
+# 基础 GPU 采集器（功耗所在的查询）和 RAPL 功耗采集器不在其中，始终保留
+DROP_ORDER = ('pcie', 'link', 'dram_usage', 'cpu_stat', 'dcgmi')
+
+
+class OverheadBudget:
+    """
+    监控开销预算：把采样器自身的 CPU 占用限制在单核的 budget 比例以内（0.02 即单核的 2%）。
+    每隔 window 秒测量一次采样线程（time.thread_time_ns）和采集线程池中采集器消耗的 CPU 时间之和，
+    超出预算时执行一步降级：先按 DROP_ORDER 停用一个可选采集器，全部停用后再把调度间隔加倍，
+    直到 max_stretch 倍的基础间隔为止。
+    采样器每次采样的 CPU 成本基本固定，与被监控任务的负载无关，因此降级不会自动撤销。
+    一次性调用的 nvidia-smi / dcgmi 子进程和常驻子进程的 CPU 时间不属于本进程，不计入预算，
+    需要严格控制开销时请配合 backend='nvml' 或 collect_mode='stream' 使用。
+    每次降级记为一个事件：写入之后第一条样本的 degradation 列，并在 stop() 时打印。
+    """
+
+    def __init__(self, budget: float, base_interval: float, window: float = 2.0, max_stretch: int = 16):
+        if not 0 < budget < 1:
+            raise ValueError("overhead_budget must be a fraction of one core between 0 and 1")
+        self.budget = budget
+        self.base_interval = base_interval
+        self.window_ns = int(window * 1e9)
+        self.max_stretch = max_stretch
+        self.stretch = 1
+        self.events = []  # [(timestamp_ns, 测得的占用, 措施)]
+        self.peak = 0.0
+        self._engine = None
+        self._drops = []
+        self._exhausted = False
+        self._pending = None
+        self._window_start = None
+        self._cpu_start = 0
+
+    def _cpu_ns(self) -> int:
+        """采样线程（调用线程）与采集线程池累计消耗的 CPU 时间（纳秒）"""
+        return time.thread_time_ns() + (self._engine.worker_cpu_ns if self._engine is not None else 0)
+
+    def start(self, engine) -> None:
+        """在采样线程中调用：记录 CPU 时间的基准，并确定本次可以停用的采集器"""
+        self._engine = engine
+        names = [collector.name for collector in engine.collectors[1:]] if engine is not None else []
+        self._drops = [name for name in DROP_ORDER if name in names]
+        self._window_start = time.monotonic_ns()
+        self._cpu_start = self._cpu_ns()
+
+    def update(self, interval: float = None) -> float:
+        """
+        每次采样后在采样线程中调用：到达测量窗口时检查 CPU 占用，超出预算则降级一步。
+        参数 interval 为下一次采样的间隔（为空表示基础间隔），返回按当前降级程度放宽后的间隔（未放宽时原样返回）
+        """
+        now_ns = time.monotonic_ns()
+        if self._window_start is not None and now_ns - self._window_start >= self.window_ns:
+            cpu_ns = self._cpu_ns()
+            usage = (cpu_ns - self._cpu_start) / (now_ns - self._window_start)
+            self.peak = max(self.peak, usage)
+            if usage > self.budget:
+                self._degrade(usage)
+            self._window_start = now_ns
+            self._cpu_start = cpu_ns
+        if self.stretch == 1:
+            return interval
+        return max(interval if interval is not None else self.base_interval, self.base_interval * self.stretch)
+
+    def _degrade(self, usage: float) -> None:
+        if self._drops:
+            name = self._drops.pop(0)
+            self._engine.disable(name)
+            action = f"dropped collector '{name}'"
+        elif self.stretch < self.max_stretch:
+            self.stretch *= 2
+            action = f"interval raised to {self.base_interval * self.stretch:g} s"
+        elif not self._exhausted:
+            # 已无可降级的措施，只记录一次
+            self._exhausted = True
+            action = "budget cannot be met"
+        else:
+            return
+        self.events.append((time.time_ns(), usage, action))
+        self._pending = action if self._pending is None else f"{self._pending}; {action}"
+
+    def take_event(self) -> str:
+        """取出并清空上一次采样之后发生的降级措施（没有时为 None），写入下一条样本"""
+        event, self._pending = self._pending, None
+        return event
+
+    def summary(self) -> dict:
+        return {
+            'budget': self.budget,
+            'peak': self.peak,
+            'events': [list(event) for event in self.events],
+        }
@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import pickle
+import struct
+import threading
+import subprocess
+from multiprocessing import shared_memory
+from .sampler import Sampler
+from .resources_consumption_record import record_time, timing_snapshot
+from . import tracing
+from . import state
+
+# 共享内存布局：64 字节头部（已写入的样本数），之后为 slots 个定长槽位；
+# 每个槽位以 (样本序号, 数据长度) 开头，序号从 1 开始，写入过程中为 0，随后是 pickle 后的 (metrics, 字符串时间戳)
+_HEADER = struct.Struct('Q')
+_HEADER_SIZE = 64
+_SLOT_HEADER = struct.Struct('QI')
+
+
+class SharedSampleRing:
+    """
+    单写多读的共享内存样本环：采样子进程写入，监控进程按需读取。
+    槽位数固定，读取方落后超过 slots 个样本时，被覆盖的样本计为丢失（read_since 返回丢失数）
+    """
+
+    def __init__(self, name: str = None, slots: int = 512, slot_size: int = 32768):
+        if name is None:
+            self.slots = slots
+            self.slot_size = slot_size
+            self._shm = shared_memory.SharedMemory(create=True, size=_HEADER_SIZE + slots * slot_size)
+            _HEADER.pack_into(self._shm.buf, 0, 0)
+            self._shm.buf[_HEADER_SIZE:_HEADER_SIZE + _SLOT_HEADER.size] = bytes(_SLOT_HEADER.size)
+            self.owner = True
+        else:
+            self._shm = _attach(name)
+            self.slots = slots
+            self.slot_size = slot_size
+            self.owner = False
+        self.name = self._shm.name
+        self._written = _HEADER.unpack_from(self._shm.buf, 0)[0]
+
+    def _offset(self, seq: int) -> int:
+        return _HEADER_SIZE + ((seq - 1) % self.slots) * self.slot_size
+
+    def write(self, payload: bytes) -> bool:
+        """写入一条样本，数据超过槽位大小时返回 False"""
+        if len(payload) > self.slot_size - _SLOT_HEADER.size:
+            return False
+        buf = self._shm.buf
+        seq = self._written + 1
+        offset = self._offset(seq)
+        # 先把序号置 0，读取方据此识别正在被覆盖的槽位
+        _SLOT_HEADER.pack_into(buf, offset, 0, 0)
+        start = offset + _SLOT_HEADER.size
+        buf[start:start + len(payload)] = payload
+        _SLOT_HEADER.pack_into(buf, offset, seq, len(payload))
+        _HEADER.pack_into(buf, 0, seq)
+        self._written = seq
+        return True
+
+    def read_since(self, seq: int):
+        """
+        读取序号大于 seq 的所有样本，返回 (数据列表, 最新序号, 丢失数)；
+        复制前后各检查一次槽位序号，被覆盖或正在写入的样本计为丢失
+        """
+        buf = self._shm.buf
+        written = _HEADER.unpack_from(buf, 0)[0]
+        first = max(seq + 1, written - self.slots + 1)
+        lost = first - seq - 1
+        records = []
+        for current in range(first, written + 1):
+            offset = self._offset(current)
+            slot_seq, length = _SLOT_HEADER.unpack_from(buf, offset)
+            start = offset + _SLOT_HEADER.size
+            payload = bytes(buf[start:start + length])
+            if slot_seq != current or _SLOT_HEADER.unpack_from(buf, offset)[0] != current:
+                lost += 1
+                continue
+            records.append(payload)
+        return records, written, lost
+
+    def close(self) -> None:
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+
+def _attach(name: str):
+    """连接已有的共享内存；由创建方负责删除，避免本进程退出时资源跟踪器提前删除它"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13 之前没有 track 参数
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class _Reported:
+    """采样子进程结束时报告的统计，提供与本进程中对应对象（DeadlineScheduler、OverheadBudget）相同的 summary()"""
+
+    def __init__(self, summary: dict):
+        self._summary = summary
+
+    def summary(self) -> dict:
+        return self._summary
+
+
+class ProcessSampler(Sampler):
+    """
+    进程外采样：采集引擎、调度器和采样循环运行在独立的子进程中（python process_sampler.py），
+    不与被监控任务（数据加载、generate 循环等）争用 GIL。子进程把每次采样写入共享内存样本环，
+    本进程只在需要结果时读取：后台线程每隔 drain_interval 秒批量读取一次，
+    mark / phase / energy_since / window 和会话结束时立即读取（sync）。
+    子进程通过标准输入感知本进程：stop() 关闭它的标准输入，本进程异常退出时子进程同样随之结束。
+    子进程启动失败时回退到本进程内采样
+    """
+
+    def __init__(self, drain_interval: float = 1.0, slots: int = 512, slot_size: int = 32768, **config):
+        self._config = config
+        self.drain_interval = drain_interval
+        self._slots = slots
+        self._slot_size = slot_size
+        super().__init__(**config)
+        self.lost = 0
+        self._shared = None
+        self._process = None
+        self._read_seq = 0
+        self._drain_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._child_timings = {}
+
+    def _build_engine(self):
+        # 采集器在子进程中创建；回退到本进程采样时再创建
+        return None
+
+    def start(self) -> None:
+        self._shared = SharedSampleRing(slots=self._slots, slot_size=self._slot_size)
+        # 子进程以 python -m <包名>.process_sampler 运行，包所在目录放在 PYTHONPATH 最前面
+        package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_parent, os.environ.get("PYTHONPATH")])))
+        if state._tracer is not None:
+            # 本进程开启了追踪时子进程同样追踪，结束时随统计一起报告
+            env['AIMETER_TRACE'] = str(state._tracer.capacity)
+        try:
+            self._process = subprocess.Popen(
+                [sys.executable, "-m", f"{__package__}.process_sampler", self._shared.name, str(self._slots), str(self._slot_size),
+                 json.dumps(self._config)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=env)
+            # 等待子进程打开采集器后再返回，第一次采样不会早于 start() 的返回
+            ready = self._process.stdout.readline().strip()
+        except OSError as e:
+            ready = f"{e}"
+        if ready != "ready":
+            print(f"Sampler process failed to start ({ready or 'exited'}), sampling in-process instead.")
+            self._shutdown_process()
+            self._shared.close()
+            self._shared = None
+            self.engine = super()._build_engine()
+            super().start()
+            return
+        self.start_monotonic = time.monotonic()
+        self.running = True
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._drain_loop, daemon=True)
+        self._thread.start()
+
+    def timings(self) -> dict:
+        """子进程报告的采样各阶段、各采集器耗时，加上本进程读取共享内存的耗时（stage.drain）"""
+        return {**self._child_timings, **timing_snapshot()}
+
+    def _drain_loop(self) -> None:
+        while not self._stopping.wait(self.drain_interval):
+            self.sync()
+
+    def sync(self) -> None:
+        """读取共享内存中尚未读取的样本，按顺序写入环形缓冲区并分发给会话"""
+        if self._shared is None:
+            return
+        with self._drain_lock:
+            start_ns = time.monotonic_ns()
+            records, self._read_seq, lost = self._shared.read_since(self._read_seq)
+            self.lost += lost
+            for payload in records:
+                metrics, time_stamp_insert = pickle.loads(payload)
+                self._publish(metrics, time_stamp_insert)
+            if records:
+                record_time('stage.drain', time.monotonic_ns() - start_ns)
+                tracing.lap('drain', start_ns, 'sampler')
+
+    def _shutdown_process(self) -> dict:
+        """关闭子进程的标准输入使其停止采样，返回它报告的统计（没有报告时为空字典）"""
+        process, self._process = self._process, None
+        if process is None:
+            return {}
+        report = {}
+        try:
+            process.stdin.close()
+            line = process.stdout.readline()
+            report = json.loads(line) if line.strip() else {}
+            process.wait(timeout=10)
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            print(f"Sampler process did not exit cleanly: {e}")
+            process.kill()
+            process.wait()
+        return report
+
+    def stop(self) -> None:
+        if self._shared is None:
+            super().stop()
+            return
+        self.running = False
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        report = self._shutdown_process()
+        self.sync()
+        self._shared.close()
+        self._shared = None
+        if 'scheduler' in report:
+            self.scheduler = _Reported(report['scheduler'])
+        self._child_timings = report.get('timings', {})
+        if state._tracer is not None and 'trace' in report:
+            state._tracer.add_events(report['trace'])
+        if self.budget is not None and 'overhead' in report:
+            self.budget = _Reported(report['overhead'])
+        if self.adaptive is not None and 'adaptive' in report:
+            self.adaptive.samples, self.adaptive.speedups = report['adaptive']
+        if self.lost:
+            print(f"Warning: {self.lost} samples were overwritten in shared memory before they were read.")
+
+
+class _PublishingSampler(Sampler):
+    """子进程中的采样器：每次采样写入共享内存样本环，不保存、不分发"""
+
+    def __init__(self, shared: SharedSampleRing, **config):
+        super().__init__(**config)
+        self._shared = shared
+        self._oversize = 0
+
+    def _publish(self, metrics: dict, time_stamp_insert: str) -> None:
+        if not self._shared.write(pickle.dumps((metrics, time_stamp_insert), pickle.HIGHEST_PROTOCOL)):
+            self._oversize += 1
+            if self._oversize == 1:
+                print("Warning: a sample is larger than the shared-memory slot and was dropped; increase slot_size.")
+
+
+def main(argv) -> None:
+    """采样子进程入口：python -m AIMeter.process_sampler <共享内存名> <槽位数> <槽位大小> <采样配置 JSON>"""
+    name, slots, slot_size, config = argv[1], int(argv[2]), int(argv[3]), json.loads(argv[4])
+    # 标准输出只用于与监控进程通信，采样过程中的提示改为输出到标准错误
+    channel, sys.stdout = sys.stdout, sys.stderr
+    if os.environ.get('AIMETER_TRACE'):
+        tracing.enable(int(os.environ['AIMETER_TRACE']))
+    shared = SharedSampleRing(name, slots, slot_size)
+    sampler = _PublishingSampler(shared, **config)
+    sampler.start()
+    channel.write("ready\n")
+    channel.flush()
+    # 阻塞到监控进程关闭标准输入（stop() 或监控进程退出）
+    sys.stdin.read()
+    sampler.stop()
+    report = {'scheduler': sampler.scheduler.summary(), 'timings': sampler.timings()}
+    if sampler.adaptive is not None:
+        report['adaptive'] = [sampler.adaptive.samples, sampler.adaptive.speedups]
+    if sampler.budget is not None:
+        report['overhead'] = sampler.budget.summary()
+    if state._tracer is not None:
+        report['trace'] = state._tracer.events()
+    channel.write(json.dumps(report) + "\n")
+    channel.flush()
+    shared.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
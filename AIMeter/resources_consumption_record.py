@@ -3,41 +3,62 @@ import psutil
 import threading
 import functools
 from typing import Callable
-import state
+from .histogram import LogLinearHistogram
+from . import state
 import logging
 
+# 保护 state._execution_times 中直方图的创建与更新（采集器在线程池中并发记录）
+_timing_lock = threading.Lock()
+
+# 记录一次耗时（纳秒）：每个名称一个固定内存的对数-线性直方图，长时间运行内存也不增长。
+# 名称约定：'stage.<阶段>' 为采样循环的各阶段，'collector.<名称>' 为各采集器，其余为被 timing_decorator 装饰的函数名
+def record_time(name: str, duration_ns: int) -> None:
+    with _timing_lock:
+        histogram = state._execution_times.get(name)
+        if histogram is None:
+            histogram = state._execution_times[name] = LogLinearHistogram()
+        histogram.record(duration_ns)
+
 # 用于计算函数的执行时间
 def timing_decorator(func):
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()  # 记录开始时间
-        result = func(*args, **kwargs)  # 调用原函数
-        end_time = time.time()  # 记录结束时间
-        execution_time = end_time - start_time  # 计算执行时间
-
-        # 记录每次执行的时间
-        if func.__name__ not in state._execution_times:
-            state._execution_times[func.__name__] = []
-        state._execution_times[func.__name__].append(execution_time)
-        return result
+        start_ns = time.perf_counter_ns()  # 记录开始时间
+        try:
+            return func(*args, **kwargs)  # 调用原函数
+        finally:
+            record_time(func.__name__, time.perf_counter_ns() - start_ns)
     return wrapper
 
-# 用于获取函数的平均执行时间
+# 所有已记录耗时的统计快照：名称 -> {count, mean, p50, p90, p99, max}（毫秒）；reset 为 True 时取快照后清零
+def timing_snapshot(reset: bool = False) -> dict:
+    with _timing_lock:
+        snapshot = {name: histogram.summary(1e6) for name, histogram in state._execution_times.items()}
+        if reset:
+            state._execution_times = {}
+    return snapshot
+
+def reset_timings() -> None:
+    with _timing_lock:
+        state._execution_times = {}
+
+# 用于获取函数的平均执行时间（秒）
 def get_average_time(func_name):
-    if func_name in state._execution_times:
-        times = state._execution_times[func_name]
-        average_time = sum(times) / len(times)
-        print(f"Average time for function '{func_name}': {average_time:.4f} seconds")
-        return average_time
-    else:
+    histogram = state._execution_times.get(func_name)
+    if histogram is None or not histogram.count:
         return None
-    
-# 用于获取函数的最大执行时间
+    average_time = histogram.mean() / 1e9
+    print(f"Average time for function '{func_name}': {average_time:.4f} seconds")
+    return average_time
+
+# 用于获取函数的最大执行时间（秒）
 def get_max_time(func_name):
-    if func_name in state._execution_times:
-        print(f"Max time for function '{func_name}': {max(state._execution_times[func_name]):.4f} seconds")
-        return max(state._execution_times[func_name])
-    else:
+    histogram = state._execution_times.get(func_name)
+    if histogram is None or not histogram.count:
         return None
+    max_time = histogram.max / 1e9
+    print(f"Max time for function '{func_name}': {max_time:.4f} seconds")
+    return max_time
 
 # 用于监控函数运行时资源占用的装饰器工厂
 def monitor_resources(
@@ -0,0 +1,149 @@
+import time
+from .metric_schema import spec_for, is_time_column
+
+_NAN = float('nan')
+
+
+class Window:
+    """
+    环形缓冲区的一段时间窗口：timestamps 为 int64 纳秒时间戳，columns 为 指标名 -> float64 数组。
+    默认是缓冲区内部数组的零拷贝视图，采样线程继续写入并绕回后内容会被覆盖；
+    需要长期保存时请用 copy()。
+    """
+
+    def __init__(self, timestamps, columns):
+        self.timestamps = timestamps
+        self.columns = columns
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    def __contains__(self, key):
+        return key in self.columns
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def keys(self):
+        return self.columns.keys()
+
+    def copy(self):
+        return Window(self.timestamps.copy(), {k: v.copy() for k, v in self.columns.items()})
+
+
+class RingBuffer:
+    """
+    单个 GPU（或主机）的列式环形缓冲区：每个指标一个预分配的 float64 数组，另有一个 int64 时间戳数组。
+    采用双写布局：每个样本同时写入位置 i 和 i + capacity，
+    因此最近 count 个样本总是连续存放在 [head + capacity - count, head + capacity) 中，
+    读取任意时间窗口都只需切片，不需要拼接或拷贝。append() 只做标量赋值，不分配内存。
+    NumPy 在创建第一个缓冲区（收到第一个样本）时才导入，import monitor 不加载它。
+    """
+
+    def __init__(self, columns, capacity: int = 3600):
+        import numpy as np
+        self.columns = list(columns)
+        self.capacity = int(capacity)
+        self._data = np.full((len(self.columns), 2 * self.capacity), np.nan, dtype=np.float64)
+        self._timestamps = np.zeros(2 * self.capacity, dtype=np.int64)
+        self._rows = [self._data[i] for i in range(len(self.columns))]
+        self._head = 0   # 下一个样本在前半段的写入位置
+        self._count = 0  # 有效样本数（不超过 capacity）
+
+    def __len__(self):
+        return self._count
+
+    def add_columns(self, columns) -> None:
+        """
+        追加列（之前的样本在新列中为 NaN）：重新分配数据数组并拷贝已有数据；
+        之前取得的 Window 仍指向旧数组，内容保持不变
+        """
+        import numpy as np
+        columns = [c for c in columns if c not in self.columns]
+        if not columns:
+            return
+        extra = np.full((len(columns), 2 * self.capacity), np.nan, dtype=np.float64)
+        self._data = np.vstack([self._data, extra])
+        self.columns += columns
+        self._rows = [self._data[i] for i in range(len(self.columns))]
+
+    def append(self, timestamp_ns: int, record: dict) -> None:
+        i = self._head
+        j = i + self.capacity
+        self._timestamps[i] = timestamp_ns
+        self._timestamps[j] = timestamp_ns
+        for key, row in zip(self.columns, self._rows):
+            value = record.get(key)
+            if value is None:
+                value = _NAN
+            row[i] = value
+            row[j] = value
+        self._head = (i + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def window(self, since_ns: int = None) -> Window:
+        """返回时间戳不早于 since_ns 的样本视图；since_ns 为空时返回缓冲区中的全部样本"""
+        end = self._head + self.capacity
+        start = end - self._count
+        timestamps = self._timestamps[start:end]
+        if since_ns is not None:
+            import numpy as np
+            start += int(np.searchsorted(timestamps, since_ns, side='left'))
+            timestamps = self._timestamps[start:end]
+        return Window(timestamps, {key: row[start:end] for key, row in zip(self.columns, self._rows)})
+
+
+class SampleRing:
+    """
+    监控会话的内存样本缓冲：每个 GPU 一个 RingBuffer（键为 GPU 索引），主机级指标一个 RingBuffer（键为 'host'）。
+    各缓冲区的列在收到第一个样本时由其中出现的注册表数值指标确定（纳秒时间列不存为列，样本时间戳由 timestamps 数组保存），
+    之后的样本中出现新的数值指标（如第一次采样失败的采集器、回退后端的字段）时追加为新列。
+    """
+
+    def __init__(self, capacity: int = 3600):
+        self.capacity = int(capacity)
+        self._buffers = {}
+        self._seen = {}  # 缓冲区键 -> 已检查过的指标名集合，只有出现新指标名时才重新确定列
+
+    @staticmethod
+    def _numeric_keys(record: dict) -> list:
+        keys = []
+        for key in record:
+            spec = spec_for(key)
+            if spec is not None and spec.dtype in (int, float) and not is_time_column(key):
+                keys.append(key)
+        return keys
+
+    def _append(self, key, timestamp_ns: int, record: dict) -> None:
+        buf = self._buffers.get(key)
+        seen = self._seen.get(key)
+        if seen is None or not seen.issuperset(record):
+            columns = self._numeric_keys(record)
+            self._seen[key] = (seen or set()).union(record)
+            if buf is None:
+                if not columns:
+                    return
+                buf = self._buffers[key] = RingBuffer(columns, self.capacity)
+            else:
+                buf.add_columns(columns)
+        elif buf is None:
+            return
+        buf.append(timestamp_ns, record)
+
+    def append(self, timestamp_ns: int, metrics: dict) -> None:
+        """写入一次采样结果（parallel_collect_metrics 的返回值），主机级指标直接从顶层字典读取"""
+        self._append('host', timestamp_ns, metrics)
+        for gpu_data in metrics.get('gpu_info') or []:
+            self._append(gpu_data.get('index'), timestamp_ns, gpu_data)
+
+    def window(self, seconds: float = None, gpu=None):
+        """
+        返回最近 seconds 秒内的样本视图（seconds 为空时返回缓冲区中的全部样本）。
+        gpu 为空时返回 {GPU索引 或 'host': Window}，否则只返回该 GPU（或 'host'）的 Window。
+        """
+        since_ns = time.time_ns() - int(seconds * 1e9) if seconds is not None else None
+        if gpu is not None:
+            buf = self._buffers.get(gpu)
+            return buf.window(since_ns) if buf is not None else None
+        return {key: buf.window(since_ns) for key, buf in self._buffers.items()}
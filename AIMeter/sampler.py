@@ -0,0 +1,302 @@
+import os
+import time
+import threading
+from datetime import datetime
+from .metrics_collect import parallel_collect_metrics
+from .collectors import build_collectors
+from .engine import CollectionEngine
+from .ring_buffer import SampleRing
+from .adaptive import AdaptiveInterval
+from .scheduler import DeadlineScheduler
+from .overhead import OverheadBudget
+from .resources_consumption_record import record_time, timing_snapshot
+from .tracing import span
+from . import tracing
+from . import state
+
+# 保护 state._sampler 的创建与停止
+_registry_lock = threading.Lock()
+
+
+class Decimator:
+    """
+    从调度间隔为 tick_interval 的样本流中按 interval 抽取样本（interval 不大于 tick_interval 时全部保留）。
+    允许半个调度间隔的误差，避免唤醒抖动使样本落到下一个间隔；
+    落后超过一个间隔（调度器丢弃了时刻）时从本次样本重新计时，不会紧接着再取一个样本
+    """
+
+    def __init__(self, interval: float, tick_interval: float):
+        self.interval = interval
+        self.tick_interval = tick_interval
+        self._next_ns = None
+
+    def accept(self, monotonic_ns: int) -> bool:
+        if self.interval <= self.tick_interval:
+            return True
+        if self._next_ns is not None and monotonic_ns < self._next_ns - self.tick_interval * 5e8:
+            return False
+        interval_ns = int(self.interval * 1e9)
+        next_ns = monotonic_ns if self._next_ns is None else self._next_ns
+        next_ns += interval_ns
+        self._next_ns = next_ns if next_ns > monotonic_ns else monotonic_ns + interval_ns
+        return True
+
+
+class Sampler:
+    """
+    共享采样循环：持有采集引擎、调度器、内存环形缓冲区和采样线程。
+    同一进程中的所有监控会话（Monitor）订阅同一个 Sampler，硬件每个调度时刻只读取一次，
+    每次采样的结果依次分发给所有订阅的会话，由会话各自保存。
+    第一个会话订阅时按它的配置创建并启动，最后一个会话退订时停止（见 acquire / release）。
+    """
+
+    def __init__(self, sampling_interval: float = 1, additional_metrics=None, indices=None, collect_mode: str = "oneshot",
+                 backend: str = "nvidia-smi", buffer_capacity: int = 3600, adaptive: bool = False, min_interval: float = None,
+                 max_interval: float = None, change_threshold: float = 0.1, overrun_policy: str = "skip", intervals: dict = None,
+                 overhead_budget: float = None):
+        self.sampling_interval = sampling_interval
+        self.additional_metrics = list(additional_metrics or [])
+        self.indices = list(indices or [])
+        self.collect_mode = collect_mode.lower()
+        self.backend = backend.lower()
+        self.adaptive = None
+        stream_interval = sampling_interval
+        if adaptive:
+            min_interval = min_interval if min_interval is not None else sampling_interval
+            max_interval = max_interval if max_interval is not None else sampling_interval * 10
+            self.adaptive = AdaptiveInterval(min_interval, max_interval, change_threshold, initial=min_interval)
+            # 常驻子进程按最快的采样间隔输出，保证加速后读到的是新数据
+            stream_interval = min_interval
+        intervals = dict(intervals or {})
+        base_interval = self.adaptive.min_interval if adaptive else sampling_interval
+        # 多速率采样：调度器按最短的间隔运行，各采集器只在自己的间隔到期时采集；
+        # 自适应模式下调度间隔由控制器决定，未列出的采集器每个调度时刻都运行
+        self.tick_interval = min([base_interval] + list(intervals.values()))
+        self._collector_config = dict(backend=self.backend, collect_mode=self.collect_mode, interval_ms=stream_interval * 1000,
+                                      intervals=intervals, default_interval=sampling_interval if intervals and not adaptive else None)
+        self.engine = self._build_engine()
+        self.ring = SampleRing(buffer_capacity)
+        self.scheduler = DeadlineScheduler(self.tick_interval, overrun_policy)
+        # 监控开销预算：超出时停用可选采集器、放宽调度间隔，降级事件写入样本的 degradation 列
+        self.budget = OverheadBudget(overhead_budget, self.tick_interval) if overhead_budget else None
+        self.running = False
+        self.start_monotonic = 0.0
+        self._thread = None
+        self._subscribers = []
+        # 所有采集器都运行的第一次采样的列（顶层键与各 GPU 的键），用于补齐中途加入的会话的第一条样本
+        self._layout = None
+        # 分发样本与退订互斥：会话退订返回后不会再收到样本
+        self._lock = threading.Lock()
+
+    def _build_engine(self):
+        """创建采集引擎；采集器的常驻资源（子进程、NVML 句柄）和线程池在整个采样期间复用"""
+        return CollectionEngine(build_collectors(self.additional_metrics, self.indices, **self._collector_config))
+
+    def start(self) -> None:
+        self.engine.open()
+        self.start_monotonic = time.monotonic()
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.engine.close()
+
+    def sync(self) -> None:
+        """把已采集但尚未分发的样本交给会话；本进程内采样时样本随采随发，无需处理（见 ProcessSampler）"""
+
+    def timings(self) -> dict:
+        """采样各阶段和各采集器的耗时统计（毫秒），见 resources_consumption_record.timing_snapshot"""
+        return timing_snapshot()
+
+    def subscribe(self, session) -> None:
+        with self._lock:
+            self._subscribers.append(session)
+
+    def unsubscribe(self, session) -> int:
+        """退订会话，返回剩余的订阅数"""
+        with self._lock:
+            if session in self._subscribers:
+                self._subscribers.remove(session)
+            return len(self._subscribers)
+
+    def covers(self, additional_metrics, indices, backend: str) -> list:
+        """检查新会话的配置能否由本采样器满足，返回不满足之处的说明（为空表示满足）"""
+        problems = []
+        missing = [m for m in (additional_metrics or []) if m not in self.additional_metrics]
+        if missing:
+            problems.append(f"additional metrics {missing} are not collected")
+        if list(indices or []) != self.indices:
+            problems.append(f"GPU indices {self.indices or 'all'} are used")
+        if backend.lower() != self.backend:
+            problems.append(f"backend '{self.backend}' is used")
+        return problems
+
+    def complete(self, metrics: dict) -> dict:
+        """
+        按第一次采样的列补齐本次采样：多速率采样中未到期的采集器不产生对应的键，
+        中途加入的会话以第一条样本确定 CSV 的列，补齐为空值后文件的列才完整
+        """
+        layout = self._layout
+        if layout is None:
+            return metrics
+        top_keys, gpu_keys = layout
+        completed = dict.fromkeys(top_keys)
+        completed.update(metrics)
+        if completed.get('gpu_info'):
+            completed['gpu_info'] = [{**dict.fromkeys(gpu_keys), **gpu} for gpu in completed['gpu_info']]
+        return completed
+
+    def _publish(self, metrics: dict, time_stamp_insert: str) -> None:
+        """发布一次采样：写入内存环形缓冲区（供 window() 实时读取），再依次分发给所有订阅的会话"""
+        if self._layout is None:
+            gpu_keys = {}
+            for gpu in metrics['gpu_info']:
+                gpu_keys.update(dict.fromkeys(gpu))
+            self._layout = (list(metrics), list(gpu_keys))
+        with span("ring"):
+            self.ring.append(metrics['timestamp_ns'], metrics)
+        # 由会话按各自的输出格式保存
+        with self._lock:
+            for session in self._subscribers:
+                try:
+                    with span(session.task_name, "session"):
+                        session._on_sample(self, metrics, time_stamp_insert)
+                except Exception as e:
+                    print(f"Session '{session.task_name}' failed to handle a sample: {e}")
+
+    @staticmethod
+    def _stamp():
+        """
+        本次采样的时间：int64 纳秒时间戳（分析时直接使用，不再解析字符串）、monotonic 纳秒时刻，
+        以及只用于阅读的字符串时间戳（MySQL 的 DATETIME 列），三者由同一时刻生成
+        """
+        timestamp_ns = time.time_ns()
+        monotonic_ns = time.monotonic_ns()
+        time_stamp_insert = datetime.fromtimestamp(timestamp_ns / 1e9).strftime('%Y-%m-%d %H:%M:%S.%f')[:-5]
+        return timestamp_ns, monotonic_ns, time_stamp_insert
+
+    def _deliver(self, metrics: dict, stamp) -> float:
+        """
+        补充样本的时间字段并发布，返回自适应模式下下一次采样的间隔（否则为 None）；
+        必要指标采集失败时跳过本次采样
+        """
+        # 检查必要指标是否采集成功
+        if metrics["gpu_info"] is None:
+            print("未能采集到部分指标，跳过本次采样。")
+            return None
+        timestamp_ns, monotonic_ns, time_stamp_insert = stamp
+        # 上一次采样之后因超时被丢弃的采样时刻数，能耗汇总据此报告数据缺口
+        metrics['missed_ticks'] = self.scheduler.take_missed()
+        metrics['timestamp_ns'] = timestamp_ns
+        metrics['monotonic_ns'] = monotonic_ns
+        if self.budget is not None:
+            metrics['degradation'] = self.budget.take_event()
+        self._publish(metrics, time_stamp_insert)
+        # 自适应模式下由功耗/利用率的变化决定下一次采样的间隔
+        if self.adaptive is not None:
+            return self.adaptive.update(metrics)
+        return None
+
+    def _run(self) -> None:
+        """采样线程：按调度器给出的绝对截止时刻循环采集数据，直到 running 被置为 False"""
+        scheduler = self.scheduler
+        scheduler.start()
+        if self.budget is not None:
+            self.budget.start(self.engine)
+        while self.running:
+            interval = None  # 为空时按调度器创建时的间隔推进
+            try:
+                t = tracing.now()
+                deadline = scheduler.wait()
+                tracing.lap('wait', t, 'scheduler')
+                if not self.running:
+                    break
+                stamp = self._stamp()
+                # 并行采集所有指标
+                metrics = parallel_collect_metrics(self.additional_metrics, self.indices, self.engine, deadline)
+                # 各阶段耗时：采集（含全部采集器）、发布（写入环形缓冲区、各会话保存）、整次采样
+                collected_ns = time.monotonic_ns()
+                record_time('stage.collect', collected_ns - stamp[1])
+                interval = self._deliver(metrics, stamp)
+                published_ns = time.monotonic_ns()
+                record_time('stage.publish', published_ns - collected_ns)
+                record_time('stage.tick', published_ns - stamp[1])
+                tracing.lap('tick', stamp[1], 'sampler')
+                if self.budget is not None:
+                    interval = self.budget.update(interval)
+            except Exception as e:
+                print(f"监控过程中出现错误: {e}")
+            finally:
+                scheduler.advance(interval)
+
+
+def acquire(session, **config) -> Sampler:
+    """
+    为会话取得共享采样器：没有正在运行的采样器时按 config 创建并启动，
+    否则复用已有的采样器（配置不一致时打印提示），然后订阅会话
+    """
+    with _registry_lock:
+        sampler = state._sampler
+        if sampler is None:
+            sampler_process = config.pop('sampler_process', False)
+            # 选择使用节点采样守护进程（use_daemon=True，或未指定时设置了 AIMETER_SOCKET）且它正在运行时，
+            # 直接订阅它的样本，不再在本进程中轮询硬件
+            connection = None
+            use_daemon = config.pop('use_daemon', None)
+            if use_daemon is None:
+                use_daemon = bool(os.environ.get("AIMETER_SOCKET"))
+            if use_daemon:
+                from . import daemon
+                connection = daemon.connect()
+            if connection is not None:
+                sampler = daemon.DaemonSampler(connection, **config)
+            elif sampler_process:
+                # 采样引擎运行在独立进程中，样本经共享内存交给本进程
+                from .process_sampler import ProcessSampler
+                sampler = ProcessSampler(**config)
+            else:
+                sampler = Sampler(**config)
+            # 先订阅再启动，保证第一次（所有采集器都运行的）采样交给第一个会话
+            sampler.subscribe(session)
+            sampler.start()
+            state._sampler = sampler
+            state._ring = sampler.ring
+            return sampler
+        else:
+            config.pop('sampler_process', None)
+            config.pop('use_daemon', None)
+            note_shared(sampler, session, config)
+            sampler.subscribe(session)
+        return sampler
+
+
+def note_shared(sampler, session, config) -> None:
+    """会话复用已运行的采样器时，打印它的配置中采样器无法满足之处"""
+    problems = sampler.covers(config.get('additional_metrics'), config.get('indices'), config.get('backend', "nvidia-smi"))
+    wanted = min([config.get('sampling_interval', sampler.tick_interval)] + list((config.get('intervals') or {}).values()))
+    if wanted < sampler.tick_interval:
+        problems.append(f"samples arrive every {sampler.tick_interval} s at most")
+    if problems:
+        print(f"Note: session '{session.task_name}' shares the running sampler; " + "; ".join(problems) + ".")
+
+
+def release(session):
+    """
+    退订会话；最后一个会话退订时停止共享采样器并返回它（用于打印采样统计），否则返回 None
+    """
+    with _registry_lock:
+        sampler = state._sampler
+        if sampler is None:
+            return None
+        # 先取回尚未分发的样本，会话退订前收到截至此刻的全部数据
+        sampler.sync()
+        if sampler.unsubscribe(session) > 0:
+            return None
+        sampler.stop()
+        state._sampler = None
+        return sampler
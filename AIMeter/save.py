@@ -1,12 +1,33 @@
-from config import Config
-import mysql.connector
 import csv
 import os
-import state
+from . import state
 import re
-from resources_consumption_record import timing_decorator
-import mysql.connector
 import hashlib
+from array import array
+from .metric_schema import spec_for, is_time_column
+from . import tracing
+
+def format_cell(value):
+    """将采集值转换为可写入 CSV/MySQL 的标量：数组（如每核利用率）以分号分隔，保留一位小数"""
+    if isinstance(value, array):
+        return ";".join(f"{v:.1f}" for v in value)
+    return value
+
+def column_type(key: str) -> str:
+    """
+    动态列的 MySQL 类型，由指标注册表决定（key 为原始指标名）：
+    数值指标使用 DOUBLE/INT，纳秒时间戳使用 BIGINT，每核数组可能超过 255 字符，使用 TEXT，其余（如 name、phase）使用 VARCHAR
+    """
+    if is_time_column(key):
+        return "BIGINT NULL DEFAULT NULL"
+    spec = spec_for(key)
+    if spec is None or spec.dtype is str:
+        return "VARCHAR(255) NULL DEFAULT NULL"
+    if spec.dtype is array:
+        return "TEXT NULL DEFAULT NULL"
+    if spec.dtype is int:
+        return "INT NULL DEFAULT NULL"
+    return "DOUBLE NULL DEFAULT NULL"
 
 def sanitize_metric_key(key: str) -> str:
     """将指标名转换为更安全的 SQL 列名。"""
@@ -28,6 +49,7 @@ def sanitize_metric_key(key: str) -> str:
 
 def get_existing_columns(cursor, table_name: str) -> set[str]:
     """获取某个表中已存在的列名集合。"""
+    import mysql.connector
     try:
         # 使用 INFORMATION_SCHEMA 提供更广泛兼容性
         cursor.execute(f"""
@@ -45,7 +67,7 @@ def get_existing_columns(cursor, table_name: str) -> set[str]:
         print(f"警告：无法获取表 `{table_name}` 的列信息: {e}")
         return set()  # 出错时返回空集合
 
-def save_to_mysql(task_name: str, metrics: dict[str, any], table_timestamp: str, insert_timestamp: str) -> None:
+def save_to_mysql(task_name: str, metrics: dict[str, any], table_timestamp: str, insert_timestamp: str, ctx=state) -> None:
     """
     将监控 metrics 写入 MySQL，动态创建/修改表结构以匹配 metrics 中的键。
     警告：频繁的 ALTER TABLE 可能影响性能。建议在非生产环境或低频监控中使用。
@@ -54,15 +76,24 @@ def save_to_mysql(task_name: str, metrics: dict[str, any], table_timestamp: str,
     - metrics: 包含所有监控指标的字典
     - table_timestamp: 用于生成表名的时间戳字符串
     - insert_timestamp: 用于记录每行数据时间戳的字符串
+    - ctx: 保存表名和写入计数的对象（_table_name, _inserted_count），默认为 state，监控会话传入自身
     """
+    # MySQL 驱动和连接配置只在 output_format="mysql" 时导入，CSV / 无输出的会话不加载
+    try:
+        import mysql.connector
+        from .config import Config
+    except ImportError as e:
+        print(f"MySQL output requires mysql-connector-python: {e}")
+        return
     # 安全处理任务名以生成合法表名
     safe_task_name = "".join(c if c.isalnum() else "_" for c in task_name)
-    state._table_name = f"{safe_task_name}_{table_timestamp}"
+    ctx._table_name = f"{safe_task_name}_{table_timestamp}"
 
     mydb = None
     cursor = None
     new_columns_added = False
 
+    t = tracing.now()
     try:
         # 连接数据库
         mydb = mysql.connector.connect(
@@ -72,6 +103,7 @@ def save_to_mysql(task_name: str, metrics: dict[str, any], table_timestamp: str,
             database=Config.database
         )
         cursor = mydb.cursor()
+        t = tracing.lap("mysql.connect", t)
 
         # 1. 收集所有可能的列名（包括基础字段和 gpu_info 中的字段）
         all_metric_keys = set()
@@ -88,15 +120,15 @@ def save_to_mysql(task_name: str, metrics: dict[str, any], table_timestamp: str,
         all_potential_columns = static_columns.union(potential_dynamic_columns.keys())
 
         # 2. 检查表是否存在，并获取其列名
-        cursor.execute(f"SHOW TABLES LIKE '{state._table_name}'")
+        cursor.execute(f"SHOW TABLES LIKE '{ctx._table_name}'")
         table_exists = cursor.fetchone() is not None
 
         existing_columns = set()
         if table_exists:
             # 表存在则获取已有列
-            existing_columns = get_existing_columns(cursor, state._table_name)
+            existing_columns = get_existing_columns(cursor, ctx._table_name)
             if not existing_columns and table_exists:
-                print(f"错误：表 `{state._table_name}` 存在但无法获取列信息。终止写入。")
+                print(f"错误：表 `{ctx._table_name}` 存在但无法获取列信息。终止写入。")
                 return
 
             # 3. 如果有缺失列则进行 ALTER TABLE
@@ -105,27 +137,27 @@ def save_to_mysql(task_name: str, metrics: dict[str, any], table_timestamp: str,
                 if col not in existing_columns and col not in static_columns
             }
             if columns_to_add:
-                print(f"检测到字段漂移：将添加新列至 `{state._table_name}`：{', '.join(columns_to_add)}")
+                print(f"检测到字段漂移：将添加新列至 `{ctx._table_name}`：{', '.join(columns_to_add)}")
                 for col_name in columns_to_add:
-                    col_type = "VARCHAR(255) NULL DEFAULT NULL"
+                    col_type = column_type(potential_dynamic_columns[col_name])
                     try:
-                        alter_query = f"ALTER TABLE `{state._table_name}` ADD COLUMN `{col_name}` {col_type}"
+                        alter_query = f"ALTER TABLE `{ctx._table_name}` ADD COLUMN `{col_name}` {col_type}"
                         print(f"执行 SQL: {alter_query}")
                         cursor.execute(alter_query)
                         new_columns_added = True
                     except mysql.connector.Error as e:
-                        print(f"警告：添加列 `{col_name}` 到表 `{state._table_name}` 失败：{e}")
+                        print(f"警告：添加列 `{col_name}` 到表 `{ctx._table_name}` 失败：{e}")
                 mydb.commit()
         else:
             # 4. 如果表不存在则创建新表
-            # print(f"创建新表：`{state._table_name}`")
+            # print(f"创建新表：`{ctx._table_name}`")
             columns_definitions = [
                 "id INT AUTO_INCREMENT PRIMARY KEY",
                 "timestamp DATETIME COMMENT '数据插入时间'",
                 "task_name VARCHAR(255) COMMENT '任务名称'"
             ]
             for col_name in sorted(list(potential_dynamic_columns.keys())):
-                col_type = "VARCHAR(255) NULL DEFAULT NULL"
+                col_type = column_type(potential_dynamic_columns[col_name])
                 columns_definitions.append(f"`{col_name}` {col_type}")
 
             # 添加索引
@@ -136,7 +168,7 @@ def save_to_mysql(task_name: str, metrics: dict[str, any], table_timestamp: str,
             columns_definitions = [c for c in columns_definitions if c]
 
             create_query = f"""
-                CREATE TABLE `{state._table_name}` (
+                CREATE TABLE `{ctx._table_name}` (
                     {', '.join(columns_definitions)}
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
             """
@@ -144,13 +176,14 @@ def save_to_mysql(task_name: str, metrics: dict[str, any], table_timestamp: str,
             mydb.commit()
 
         # 5. 获取最终列名用于插入数据（确保最新结构）
-        final_columns_in_db = sorted(list(get_existing_columns(cursor, state._table_name)))
+        final_columns_in_db = sorted(list(get_existing_columns(cursor, ctx._table_name)))
         if 'id' in final_columns_in_db:
             final_columns_in_db.remove('id')
 
         if not final_columns_in_db:
-            print(f"错误：表 `{state._table_name}` 的最终列无法确定。")
+            print(f"错误：表 `{ctx._table_name}` 的最终列无法确定。")
             return
+        t = tracing.lap("mysql.schema", t)
 
         # 6. 准备插入的数据行
         base_fields = {k: metrics.get(k) for k in metrics if k != 'gpu_info'}
@@ -169,7 +202,7 @@ def save_to_mysql(task_name: str, metrics: dict[str, any], table_timestamp: str,
             }
             for original_key, value in base_fields.items():
                 sanitized_key = sanitize_metric_key(original_key)
-                data_for_row[sanitized_key] = value
+                data_for_row[sanitized_key] = format_cell(value)
             for original_key, value in gpu_data.items():
                 sanitized_key = sanitize_metric_key(original_key)
                 data_for_row[sanitized_key] = value
@@ -185,95 +218,143 @@ def save_to_mysql(task_name: str, metrics: dict[str, any], table_timestamp: str,
 
             rows_to_insert.append(tuple(data_tuple))
 
+        t = tracing.lap("mysql.format", t)
+
         # 7. 执行批量插入
         if rows_to_insert:
             column_str = ", ".join([f"`{col}`" for col in final_columns_in_db])
             placeholder_str = ", ".join(["%s"] * len(final_columns_in_db))
-            insert_query = f"INSERT INTO `{state._table_name}` ({column_str}) VALUES ({placeholder_str})"
+            insert_query = f"INSERT INTO `{ctx._table_name}` ({column_str}) VALUES ({placeholder_str})"
             cursor.executemany(insert_query, rows_to_insert)
+            t = tracing.lap("mysql.insert", t)
             mydb.commit()
+            t = tracing.lap("mysql.commit", t)
 
             # 记录插入计数
-            if state._inserted_count == -1:
-                state._inserted_count = 0
-            state._inserted_count += len(rows_to_insert)
+            if ctx._inserted_count == -1:
+                ctx._inserted_count = 0
+            ctx._inserted_count += len(rows_to_insert)
 
     except mysql.connector.Error as e:
-        print(f"MySQL 错误：动态写入表 `{state._table_name}` 时发生错误：{e}")
+        print(f"MySQL 错误：动态写入表 `{ctx._table_name}` 时发生错误：{e}")
         if mydb and mydb.is_connected():
             try: mydb.rollback()
             except Exception as rb_e:
                 print(f"回滚失败：{rb_e}")
     except Exception as e:
-        print(f"未预料的错误：写入表 `{state._table_name}` 时出现异常：{e}")
+        print(f"未预料的错误：写入表 `{ctx._table_name}` 时出现异常：{e}")
     finally:
         if cursor: cursor.close()
         if mydb and mydb.is_connected(): mydb.close()
+        tracing.lap("mysql.close", t)
 
-def save_to_csv(task_name: str, metrics: dict[str, any], file_timestamp: str, insert_timestamp: str) -> None:
+def _rewrite_csv_header(filename: str, fieldnames: list) -> None:
+    """用新的列重写 CSV 文件：表头换为 fieldnames，较短的行在新增的列中补空单元格（写入临时文件后替换原文件）"""
+    tmp_path = f"{filename}.tmp"
+    with open(filename, newline='', encoding='utf-8') as src, open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        next(reader, None)
+        writer.writerow(fieldnames)
+        padding = [''] * len(fieldnames)
+        for row in reader:
+            writer.writerow(row + padding[len(row):])
+    os.replace(tmp_path, filename)
+
+def finalize_csv(ctx=state) -> None:
+    """
+    会话结束时补全 CSV 表头：采样过程中新出现的列只追加在之后各行的末尾（不在采样线程中重写整个文件），
+    这里一次性重写表头，并为较早的行补空单元格；没有新增列时不做任何事
+    """
+    header_columns = ctx._csv_header_columns
+    ctx._csv_header_columns = None
+    if header_columns is None or not ctx._csv_file_path:
+        return
+    try:
+        _rewrite_csv_header(ctx._csv_file_path, ctx._csv_fieldnames)
+    except (OSError, csv.Error) as e:
+        print(f"Failed to add columns {', '.join(ctx._csv_fieldnames[header_columns:])} to the header of {ctx._csv_file_path}: {e}")
+
+def save_to_csv(task_name: str, metrics: dict[str, any], file_timestamp: str, insert_timestamp: str, ctx=state) -> None:
     """
     将监控 metrics 动态写入 CSV。
     参数:
     - task_name: 任务名称，用于文件名和记录
-    - metrics: 各项监控指标，结构示例：
+    - metrics: 各项监控指标（原始数值，单位见 metric_schema，缺失值为 None），结构示例：
         {
-            'cpu_usage': '2.2 %',
-            'cpu_power': 'N/A',
-            'dram_usage': '23.7 %',
-            'dram_power': 'N/A',
+            'cpu_usage': 2.2,
+            'cpu_power': None,
+            'dram_usage': 23.7,
+            'dram_power': None,
             'gpu_info': [
-                {'index': '0', 'name': 'NVIDIA...', 'utilization.gpu [%]': '100 %', 'temperature.gpu': '80', 'temperature.memory': '85', ...},
+                {'index': 0, 'name': 'NVIDIA...', 'utilization.gpu [%]': 100.0, 'temperature.gpu': 80.0, 'temperature.memory': 85.0, ...},
                 {...}
             ]
         }
     - file_timestamp: 用于生成文件名的时间戳字符串
     - insert_timestamp: 用于记录每行 timestamp 字段
+    - ctx: 保存文件路径、列、表头列数和写入计数的对象（_csv_file_path, _csv_fieldnames, _csv_header_columns, _inserted_count），
+      默认为 state，监控会话传入自身
     """
+    t = tracing.now()
     # 构建文件名和写入模式
     filename = f"{task_name}_{file_timestamp}.csv"
     is_new = not os.path.exists(filename)
     mode = 'w' if is_new else 'a'
-    state._csv_file_path = os.path.abspath(filename)
+    ctx._csv_file_path = os.path.abspath(filename)
     # 准备多行数据，每个 GPU 一行
     rows = []
     # 基础字段来自 metrics 中除 gpu_info 外的所有键
-    base_fields = {k: metrics.get(k, 'N/A')
+    base_fields = {k: format_cell(metrics.get(k))
                    for k in metrics.keys() if k != 'gpu_info'}
     rows_data = metrics.get('gpu_info', [{}])
     for gpu in rows_data:
-        # 复制并格式化 GPU 字段值（给温度字段加单位）
-        formatted_gpu = {}
-        for k, v in gpu.items():
-            if 'temperature' in k and v not in (None, 'N/A'):
-                formatted_gpu[k] = f"{v}"
-            else:
-                formatted_gpu[k] = v
-        # 合并行数据
+        # 合并行数据，数值原样写入（None 写为空单元格）
         row = {
             'timestamp': insert_timestamp,
             'task_name': task_name,
             **base_fields,
-            **formatted_gpu
+            **gpu
         }
         rows.append(row)
-    # 动态确定所有列的顺序：保证 timestamp, task_name 固定在前
-    all_keys = set()
-    for r in rows:
-        all_keys.update(r.keys())
-    sorted_keys = ['timestamp', 'task_name', 'name', 'index'] + [k for k in all_keys if k not in ('timestamp', 'task_name', 'name', 'index')]
+    # 列在文件创建时确定，保证 timestamp, task_name 固定在前；多速率采样时未到期的指标在该行中为空单元格，而不是改变列数。
+    # 之后才出现的指标（如第一次采样失败的采集器、回退后端的字段、degradation）追加到列末尾：
+    # 采样过程中只写在之后各行的末尾，表头由 finalize_csv 在会话结束时补全，采样线程中不重写文件
+    sorted_keys = ctx._csv_fieldnames
+    if sorted_keys is None:
+        if is_new:
+            all_keys = {}
+            for r in rows:
+                all_keys.update(dict.fromkeys(r.keys()))
+            sorted_keys = ['timestamp', 'task_name', 'name', 'index'] + [k for k in all_keys if k not in ('timestamp', 'task_name', 'name', 'index')]
+        else:
+            with open(filename, newline='', encoding='utf-8') as csvfile:
+                sorted_keys = next(csv.reader(csvfile), [])
+        ctx._csv_fieldnames = sorted_keys
+    known = set(sorted_keys)
+    new_keys = list(dict.fromkeys(k for r in rows for k in r if k not in known))
+    if new_keys:
+        if not is_new and ctx._csv_header_columns is None:
+            ctx._csv_header_columns = len(sorted_keys)
+            print(f"Note: new columns {', '.join(new_keys)} appeared in {filename}; they are added to the header when the session stops.")
+        sorted_keys = ctx._csv_fieldnames = sorted_keys + new_keys
+    t = tracing.lap("csv.format", t)
     try:
         with open(filename, mode=mode, newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=sorted_keys)
+            writer = csv.DictWriter(csvfile, fieldnames=sorted_keys, restval='', extrasaction='ignore')
             if is_new:
                 writer.writeheader()
                 # 初始计数
-                if state._inserted_count < 0:
-                    state._inserted_count = 0
+                if ctx._inserted_count < 0:
+                    ctx._inserted_count = 0
             # 写入所有行
             for row in rows:
                 writer.writerow(row)
             # 更新计数
-            state._inserted_count += len(rows)
+            ctx._inserted_count += len(rows)
+            t = tracing.lap("csv.write", t)
+            csvfile.flush()
+        tracing.lap("csv.flush", t)
     except PermissionError as pe:
         print(f"Permission denied for file {filename}: {pe}")
     except csv.Error as ce:
@@ -0,0 +1,91 @@
+import time
+from .histogram import LogLinearHistogram
+
+# 错过采样时刻后的处理策略
+OVERRUN_POLICIES = ("skip", "coalesce")
+
+
+class DeadlineScheduler:
+    """
+    基于 time.monotonic_ns() 绝对截止时刻的采样调度器：
+    每个采样时刻由上一个截止时刻加间隔得到，而不是由“本次耗时之后再睡眠”得到，
+    因此单次采样的耗时波动不会累积成速率漂移。
+    某次采样超时、错过了后续一个或多个截止时刻时，按 policy 处理：
+    - 'skip'：丢弃错过的时刻，下一次采样对齐到网格上最近的未来时刻
+    - 'coalesce'：错过的时刻合并为一次立即执行的采样，之后以该时刻为新的基准继续
+    被丢弃的时刻数（skip 为全部错过的时刻，coalesce 为合并掉的时刻）记录在 pending_missed 中，
+    由调用方写入下一条样本，供能耗汇总报告数据缺口。
+    唤醒抖动（实际唤醒时刻 - 截止时刻）与超时时长记录在固定内存的直方图中。
+    """
+
+    def __init__(self, interval: float, policy: str = "skip"):
+        if policy not in OVERRUN_POLICIES:
+            raise ValueError(f"unknown overrun policy {policy!r}, expected one of {OVERRUN_POLICIES}")
+        self.interval_ns = int(interval * 1e9)
+        self.policy = policy
+        self.jitter = LogLinearHistogram()
+        self.overrun = LogLinearHistogram()
+        self.ticks = 0
+        self.missed = 0
+        self.pending_missed = 0  # 上一次采样之后错过的时刻数，尚未写入样本
+        self._deadline = None
+
+    def start(self) -> None:
+        self._deadline = time.monotonic_ns()
+
+    def wait(self) -> int:
+        """阻塞到当前截止时刻并记录唤醒抖动，返回截止时刻（monotonic 纳秒）"""
+        remaining = self.remaining()
+        if remaining > 0:
+            time.sleep(remaining)
+        return self.woke()
+
+    def remaining(self) -> float:
+        """距当前截止时刻的秒数（已过时为负）；asyncio 采样循环据此 await asyncio.sleep，再调用 woke()"""
+        if self._deadline is None:
+            self.start()
+        return (self._deadline - time.monotonic_ns()) / 1e9
+
+    def woke(self) -> int:
+        """在截止时刻醒来后调用：记录唤醒抖动，返回截止时刻（monotonic 纳秒）"""
+        self.jitter.record(time.monotonic_ns() - self._deadline)
+        self.ticks += 1
+        return self._deadline
+
+    def take_missed(self) -> int:
+        """取出并清零 pending_missed"""
+        missed, self.pending_missed = self.pending_missed, 0
+        return missed
+
+    def advance(self, interval: float = None) -> None:
+        """
+        本次采样完成后计算下一个截止时刻。
+        interval 为空时使用创建时的固定间隔；自适应采样时传入本次计算出的间隔。
+        """
+        interval_ns = int(interval * 1e9) if interval is not None else self.interval_ns
+        next_deadline = self._deadline + interval_ns
+        now = time.monotonic_ns()
+        if now > next_deadline and interval_ns > 0:
+            # 超时：本次采样结束时已经过了下一个截止时刻
+            self.overrun.record(now - next_deadline)
+            behind = (now - next_deadline) // interval_ns + 1  # 已错过的截止时刻数
+            if self.policy == "skip":
+                next_deadline += behind * interval_ns
+                dropped = behind
+            else:
+                # 第一个错过的时刻立即（迟到地）执行，其余合并掉
+                next_deadline = now
+                dropped = behind - 1
+            self.missed += dropped
+            self.pending_missed += dropped
+        self._deadline = next_deadline
+
+    def summary(self) -> dict:
+        return {
+            'policy': self.policy,
+            'ticks': self.ticks,
+            'missed': self.missed,
+            'overruns': self.overrun.count,
+            'jitter_ms': self.jitter.summary(1e6),
+            'overrun_ms': self.overrun.summary(1e6),
+        }
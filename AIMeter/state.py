@@ -1,15 +1,14 @@
 # 全局变量
+# 以下五项是 save_to_csv / save_to_mysql 默认的保存上下文；监控会话（monitor.Monitor）各自持有同名属性
 _inserted_count = -1 # 用于记录已插入的行数
-_monitor_running = False # 用于记录监控是否正在运行
 _csv_file_path = "" # 用于记录CSV文件路径
+_csv_fieldnames = None # CSV 文件的列，首次写入时确定，之后每行按这些列写出（缺失的指标为空单元格）
+_csv_header_columns = None # 采样中途新增了列时，文件表头中的列数；表头在 save.finalize_csv 中补全
 _table_name = "" # 用于记录MYSQL的表格名称
-_monitor_thread = None # 用于记录监控线程
-_task_name = ""  # 用于记录任务名称
-_sampling_interval = 10  # 采样间隔
-_output_format = "csv"  # 输出格式，支持csv和mysql
-_timestamp = ""  # 用于记录时间戳
-_execution_times = {} # 用于保存每个函数的执行时间
-_execution_times['elapsed_time'] = [] # 专门用于记录采样频率的key-value对
-_position_use = 0 # 用于记录位置使用情况
-_latitude = 37.7749 # 用于记录纬度
-_longitude = -122.4194 # 用于记录经度
\ No newline at end of file
+_sampler = None  # 所有监控会话共享的采样器（sampler.Sampler），没有会话运行时为 None
+_async_samplers = {}  # 事件循环 -> 该循环中所有 asyncio 会话共享的采样器（async_engine.AsyncSampler）
+_default_monitor = None  # 模块级 monitor.start() / stop() 使用的默认会话
+_tracer = None  # 采样流水线的区间追踪（tracing.Tracer），未开启追踪时为 None
+_host_readers = {}  # 单值采集函数（get_cpu_usage_info 等）常开的读取器：名称 -> host_readers 中的读取器
+_ring = None  # 内存中的列式样本环形缓冲区，stop() 后保留到下一次 start()
+_execution_times = {} # 采样各阶段、各采集器和被计时函数的耗时：名称 -> LogLinearHistogram（纳秒），见 resources_consumption_record
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from . import state
+
+
+class Tracer:
+    """
+    采样流水线的区间追踪：每个区间（名称、类别、开始时刻、时长、线程）存入容量固定的环形缓冲区，
+    超出 capacity 时覆盖最早的区间，长时间运行内存也不增长。
+    dump() 导出为 Chrome / Perfetto 的 trace-event JSON（chrome://tracing 或 ui.perfetto.dev 打开），
+    时间轴为 monotonic 时钟（微秒），与样本的 monotonic_ns 列一致。
+    """
+
+    def __init__(self, capacity: int = 100000):
+        self.capacity = capacity
+        self.recorded = 0
+        self._spans = deque(maxlen=capacity)
+        self._threads = {}  # 线程号 -> 线程名
+        self._lanes = {}    # 虚拟线程名 -> 线程号，用于事件循环中并发的区间
+        self._foreign = []  # 其它进程（采样子进程）报告的事件
+
+    def add(self, name: str, cat: str, start_ns: int, end_ns: int, args: dict = None, lane: str = None) -> None:
+        """
+        记录一个区间；lane 不为空时放到名为 lane 的虚拟线程上
+        （同一线程中的区间在时间轴上必须嵌套，事件循环中并发的采集器各占一条虚拟线程）
+        """
+        if lane is None:
+            tid = threading.get_native_id()
+            if tid not in self._threads:
+                self._threads[tid] = threading.current_thread().name
+        else:
+            tid = self._lanes.get(lane)
+            if tid is None:
+                tid = self._lanes[lane] = -(len(self._lanes) + 1)
+                self._threads[tid] = lane
+        self._spans.append((name, cat, start_ns, end_ns - start_ns, tid, args))
+        self.recorded += 1
+
+    def add_events(self, events: list) -> None:
+        """加入其它进程导出的 trace 事件（见 events()），保留它们自己的 pid"""
+        self._foreign.extend(events)
+
+    def events(self) -> list:
+        """当前缓冲区中的区间，转换为 trace-event 字典（完整事件 'X' 与线程 / 进程名元数据 'M'）"""
+        pid = os.getpid()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': f"AIMeter ({pid})"}}]
+        for tid, thread_name in list(self._threads.items()):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+        for name, cat, start_ns, dur_ns, tid, args in list(self._spans):
+            event = {'name': name, 'cat': cat, 'ph': 'X', 'ts': start_ns / 1000, 'dur': dur_ns / 1000, 'pid': pid, 'tid': tid}
+            if args:
+                event['args'] = args
+            events.append(event)
+        return events + self._foreign
+
+    def dump(self, path: str) -> str:
+        """写出 trace-event JSON，返回文件的绝对路径"""
+        trace = {
+            'traceEvents': self.events(),
+            'displayTimeUnit': 'ms',
+            'otherData': {'recorded_spans': self.recorded, 'dropped_spans': max(self.recorded - self.capacity, 0)},
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f)
+        return os.path.abspath(path)
+
+
+class span:
+    """
+    with span("merge"): ... —— 开启追踪时记录 with 块的区间；未开启时只检查一次 state._tracer
+    """
+    __slots__ = ('name', 'cat', 'args', '_start_ns')
+
+    def __init__(self, name: str, cat: str = "sampler", args: dict = None):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self._start_ns = None
+
+    def __enter__(self) -> "span":
+        if state._tracer is not None:
+            self._start_ns = time.monotonic_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        tracer = state._tracer
+        if tracer is not None and self._start_ns is not None:
+            tracer.add(self.name, self.cat, self._start_ns, time.monotonic_ns(), self.args)
+
+
+def now():
+    """开启追踪时返回当前 monotonic 纳秒时刻，否则返回 None；与 lap() 配合对一段代码分段计时"""
+    return time.monotonic_ns() if state._tracer is not None else None
+
+
+def lap(name: str, start_ns, cat: str = "sink"):
+    """记录从 start_ns（now() 或上一次 lap() 的返回值）到现在的区间，返回现在的时刻，作为下一段的开始"""
+    tracer = state._tracer
+    if tracer is None or start_ns is None:
+        return None
+    end_ns = time.monotonic_ns()
+    tracer.add(name, cat, start_ns, end_ns)
+    return end_ns
+
+
+def enable(capacity: int = 100000) -> Tracer:
+    """开启追踪（已开启时沿用当前的缓冲区）并返回 Tracer"""
+    if state._tracer is None:
+        state._tracer = Tracer(capacity)
+    return state._tracer
+
+
+def disable() -> None:
+    state._tracer = None
+
+
+def dump(path: str):
+    """把当前缓冲区写出为 trace-event JSON，返回文件路径；未开启追踪时返回 None"""
+    tracer = state._tracer
+    if tracer is None:
+        return None
+    return tracer.dump(path)
@@ -0,0 +1,98 @@
+"""
+采集调度开销基准：对比每次采样新建线程池（旧的 parallel_collect_metrics）
+与常驻线程池（CollectionEngine）在每个采样周期上的调度开销。
+采集器使用空操作实现，测得的时间只包含线程创建/提交/等待/合并的开销。
+
+用法: python benchmarks/bench_executor.py [--collectors 4] [--iterations 2000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from AIMeter.collectors import Collector
+from AIMeter.engine import CollectionEngine
+from AIMeter.metrics_collect import merge_query_results
+
+
+class NoopGpuCollector(Collector):
+    name = "noop-gpu"
+    kind = "gpu"
+
+    def sample(self):
+        return [{'index': '0'}]
+
+
+class NoopHostCollector(Collector):
+    kind = "host"
+
+    def __init__(self, key):
+        self.name = key
+
+    def sample(self):
+        return {self.name: 0.0}
+
+
+def make_collectors(n):
+    return [NoopGpuCollector()] + [NoopHostCollector(f"host{i}") for i in range(n - 1)]
+
+
+def collect_per_call_pool(collectors):
+    """旧实现：每次采样都新建并关闭一个线程池"""
+    metrics = {}
+    gpu_results = [None] * len(collectors)
+    with ThreadPoolExecutor(max_workers=min(max(len(collectors), 1), 8)) as executor:
+        futures = {executor.submit(c.sample): (i, c) for i, c in enumerate(collectors)}
+        for future in as_completed(futures):
+            i, collector = futures[future]
+            if collector.kind == "gpu":
+                gpu_results[i] = future.result()
+            else:
+                metrics.update(future.result())
+    metrics['gpu_info'] = merge_query_results([r for r in gpu_results if r is not None])
+    return metrics
+
+
+def measure(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - t0)
+    samples.sort()
+    return {
+        'mean_us': statistics.fmean(samples) / 1000,
+        'p50_us': samples[len(samples) // 2] / 1000,
+        'p99_us': samples[int(len(samples) * 0.99)] / 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-sample scheduling overhead: per-call pool vs persistent engine")
+    parser.add_argument("--collectors", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    collectors = make_collectors(args.collectors)
+    before = measure(lambda: collect_per_call_pool(collectors), args.iterations)
+
+    engine = CollectionEngine(collectors)
+    engine.open()
+    try:
+        after = measure(engine.collect, args.iterations)
+    finally:
+        engine.close()
+
+    print(f"collectors={args.collectors} iterations={args.iterations}")
+    print(f"{'':<22}{'mean (us)':>12}{'p50 (us)':>12}{'p99 (us)':>12}")
+    for label, result in (("per-call pool", before), ("persistent engine", after)):
+        print(f"{label:<22}{result['mean_us']:>12.1f}{result['p50_us']:>12.1f}{result['p99_us']:>12.1f}")
+    print(f"speedup (mean): {before['mean_us'] / after['mean_us']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
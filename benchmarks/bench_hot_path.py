@@ -0,0 +1,200 @@
+"""
+采样热路径基准：在伪造后端上测量每次采样的延迟和内存分配，覆盖
+解析器（parse_gpu_output / parse_dcgm_output）、采集函数（get_gpu_info、get_dcgm_metrics_group、fp 活跃度）、
+完整一次采集（parallel_collect_metrics）以及保存（save_to_csv、写入进程内 MySQL 替身的 save_to_mysql），
+模拟的 GPU 数量从 1 扩展到 16。不需要 GPU、DCGM、RAPL 或 MySQL：
+nvidia-smi / dcgmi 为 PATH 上输出录制结果（benchmarks/fixtures）的伪命令，RAPL 为伪造的 sysfs 目录（见 fake_backends.py）。
+延迟为 perf_counter_ns 的 mean/p50/p99/max；分配由 tracemalloc 单独测量（每次调用的峰值增量和调用后仍保留的字节数），
+只统计本进程的 Python 分配，不含伪命令子进程。结果写入 JSON（含 git 提交和运行环境），便于跨版本对比。
+
+用法: python benchmarks/bench_hot_path.py [--gpus 1,2,4,8,16] [--iterations 200] [--bench save_] [--mysql-rtt-us 0] [--output hot_path.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+import mysql.connector
+
+from AIMeter.collectors import DcgmCollector, RaplCollector, build_collectors
+from AIMeter.engine import CollectionEngine
+from AIMeter.host_readers import RaplReader
+from AIMeter.metrics_collect import (DCGM_FP_FIELDS, DCGM_GDETAILS_FIELDS, get_dcgm_fp16_active, get_dcgm_fp32_active,
+                                     get_dcgm_fp64_active, get_dcgm_metrics_group, get_gpu_info, parallel_collect_metrics,
+                                     parse_dcgm_output, parse_gpu_output)
+from AIMeter.save import save_to_csv, save_to_mysql
+from fake_backends import FakeMySQLConnection, dcgmi_output, install_fake_clis, make_fake_rapl, nvidia_smi_output
+
+FP_FIELDS = ",".join(DCGM_FP_FIELDS[m] for m in ('fp64', 'fp32', 'fp16'))
+# 伪 dcgmi 需要支持的 -e 组合：Gdetails、单个 fp、合并的 fp，以及 Gdetails 与 fp 合并（见 plan_queries）
+DCGM_FIELD_SETS = [DCGM_GDETAILS_FIELDS, FP_FIELDS, f"{DCGM_GDETAILS_FIELDS},{FP_FIELDS}"] + list(DCGM_FP_FIELDS.values())
+
+
+def measure(func, iterations, alloc_iterations, warmup=3):
+    """返回 func 每次调用的延迟（微秒）和内存分配（字节）统计"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - t0)
+    samples.sort()
+
+    # 分配单独测量，tracemalloc 会拖慢调用，不与延迟混在一起
+    tracemalloc.start()
+    peaks = []
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    for _ in range(alloc_iterations):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func()
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    retained = (tracemalloc.get_traced_memory()[0] - start_bytes) / max(alloc_iterations, 1)
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'mean_us': statistics.fmean(samples) / 1000,
+        'p50_us': samples[len(samples) // 2] / 1000,
+        'p99_us': samples[int(len(samples) * 0.99)] / 1000,
+        'max_us': samples[-1] / 1000,
+        'alloc_peak_bytes': int(statistics.fmean(peaks)) if peaks else 0,
+        'alloc_retained_bytes': int(retained),
+    }
+
+
+def open_engine(additional_metrics, rapl_root):
+    """按 monitor.start 的方式创建并 open 采集引擎，RAPL 采集器改为读取伪造的 sysfs 目录"""
+    collectors = build_collectors(additional_metrics)
+    for collector in collectors:
+        if isinstance(collector, RaplCollector):
+            collector.reader = RaplReader(rapl_root)
+    engine = CollectionEngine(collectors)
+    engine.open()
+    return engine
+
+
+def sample_record(metrics):
+    """补上采样器在发布前加入的时间字段（见 Sampler._deliver），得到 save_* 实际收到的样本"""
+    now_ns = time.time_ns()
+    return {**metrics, 'missed_ticks': 0, 'timestamp_ns': now_ns, 'monotonic_ns': time.monotonic_ns()}
+
+
+def run_gpu_count(gpus, args, workdir, mysql_tables):
+    """在 gpus 个模拟 GPU 上运行全部基准，返回结果列表"""
+    root = os.path.join(workdir, f"gpus{gpus}")
+    bin_dir = install_fake_clis(root, gpus, DCGM_FIELD_SETS)
+    rapl_root = make_fake_rapl(root)
+    os.environ["PATH"] = bin_dir + os.pathsep + args.base_path
+
+    smi_text = nvidia_smi_output(gpus)
+    gdetails_text = dcgmi_output(gpus, DCGM_GDETAILS_FIELDS)
+    fp_collector = DcgmCollector(FP_FIELDS)
+    smi_engine = open_engine(['CPU', 'DRAM', 'fp64', 'fp32', 'fp16'], rapl_root)
+    dcgm_engine = open_engine(['CPU', 'DRAM', 'Gdetails', 'fp64', 'fp32', 'fp16'], rapl_root)
+
+    record = sample_record(dcgm_engine.collect())
+    if len(record['gpu_info']) != gpus:
+        raise RuntimeError(f"fake backends returned {len(record['gpu_info'])} GPUs, expected {gpus}")
+    csv_ctx = SimpleNamespace(_csv_file_path=None, _csv_fieldnames=None, _csv_header_columns=None, _inserted_count=-1)
+    mysql_ctx = SimpleNamespace(_table_name=None, _inserted_count=-1)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    insert_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    benches = [
+        ("parse_gpu_output", lambda: parse_gpu_output(smi_text)),
+        ("parse_dcgm_output[Gdetails]", lambda: parse_dcgm_output(gdetails_text)),
+        ("get_gpu_info", lambda: get_gpu_info([])),
+        ("get_dcgm_metrics_group", lambda: get_dcgm_metrics_group([])),
+        ("get_dcgm_fp64_active", lambda: get_dcgm_fp64_active([])),
+        ("get_dcgm_fp32_active", lambda: get_dcgm_fp32_active([])),
+        ("get_dcgm_fp16_active", lambda: get_dcgm_fp16_active([])),
+        ("dcgmi[fp64,fp32,fp16]", fp_collector.sample),
+        ("parallel_collect_metrics[nvidia-smi+fp+CPU+DRAM]", lambda: parallel_collect_metrics(None, engine=smi_engine)),
+        ("parallel_collect_metrics[Gdetails+fp+CPU+DRAM]", lambda: parallel_collect_metrics(None, engine=dcgm_engine)),
+        ("save_to_csv", lambda: save_to_csv(f"bench{gpus}", record, stamp, insert_ts, ctx=csv_ctx)),
+        ("save_to_mysql", lambda: save_to_mysql(f"bench{gpus}", record, stamp, insert_ts, ctx=mysql_ctx)),
+    ]
+
+    results = []
+    cwd = os.getcwd()
+    os.chdir(root)  # save_to_csv 写入当前目录
+    real_connect = mysql.connector.connect
+    mysql.connector.connect = lambda **kwargs: FakeMySQLConnection(mysql_tables, args.mysql_rtt_us / 1e6)
+    try:
+        for name, func in benches:
+            if args.bench and args.bench not in name:
+                continue
+            result = measure(func, args.iterations, args.alloc_iterations)
+            results.append({'benchmark': name, 'gpus': gpus, **result})
+            print(f"{name:<52}{gpus:>5}{result['mean_us']:>12.1f}{result['p50_us']:>12.1f}{result['p99_us']:>12.1f}"
+                  f"{result['alloc_peak_bytes'] / 1024:>14.1f}{result['alloc_retained_bytes']:>14}")
+    finally:
+        mysql.connector.connect = real_connect
+        os.chdir(cwd)
+        smi_engine.close()
+        dcgm_engine.close()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-sample latency and allocations of collectors, parsers and sinks on fake backends")
+    parser.add_argument("--gpus", default="1,2,4,8,16", help="comma-separated simulated GPU counts")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--alloc-iterations", type=int, default=50, help="calls measured under tracemalloc")
+    parser.add_argument("--bench", default="", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--mysql-rtt-us", type=float, default=0.0, help="simulated round-trip time of each MySQL call")
+    parser.add_argument("--output", default=f"hot_path_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    args = parser.parse_args()
+    args.base_path = os.environ.get("PATH", "")
+    gpu_counts = [int(n) for n in args.gpus.split(",")]
+
+    print(f"{'benchmark':<52}{'gpus':>5}{'mean (us)':>12}{'p50 (us)':>12}{'p99 (us)':>12}{'peak (KiB)':>14}{'retained (B)':>14}")
+    results = []
+    mysql_tables = {}
+    with tempfile.TemporaryDirectory(prefix="aimeter-bench-") as workdir:
+        for gpus in gpu_counts:
+            results.extend(run_gpu_count(gpus, args, workdir, mysql_tables))
+    os.environ["PATH"] = args.base_path
+
+    report = {
+        'meta': {
+            'benchmark': 'hot_path',
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'iterations': args.iterations,
+            'alloc_iterations': args.alloc_iterations,
+            'mysql_rtt_us': args.mysql_rtt_us,
+            'gpus': gpu_counts,
+        },
+        'results': results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
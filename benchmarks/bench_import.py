@@ -0,0 +1,88 @@
+"""
+导入开销基准：在全新的解释器中测量 from AIMeter import monitor 的耗时和内存增量，
+并检查导入后没有加载分析、数据库、碳强度和可视化相关的重量级模块（pandas、numpy、mysql、requests 等），
+它们只应在首次使用时按需导入。出现这些模块或超过 --max-ms 时以非零状态退出，可放在 CI 中防止回退。
+
+用法: python benchmarks/bench_import.py [--runs 10] [--target monitor] [--max-ms 150] [--output import.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# 采样核心只应依赖标准库、psutil 和所选后端；asyncio 只在 aimeter.session 中使用
+HEAVY_MODULES = ('pandas', 'numpy', 'mysql', 'requests', 'plotly', 'matplotlib', 'asyncio')
+
+CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+modules_before = set(sys.modules)
+t0 = time.perf_counter_ns()
+from AIMeter import {target}
+elapsed_ns = time.perf_counter_ns() - t0
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+loaded = set(sys.modules) - modules_before
+print(json.dumps({{
+    'import_ms': elapsed_ns / 1e6,
+    'rss_delta_kib': rss_after - rss_before,
+    'modules': len(loaded),
+    'heavy': sorted({{name.split('.')[0] for name in loaded}} & set({heavy!r})),
+}}))
+"""
+
+
+def run_once(target):
+    code = CHILD.format(root=os.path.abspath(REPO_ROOT), target=target, heavy=HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=os.path.abspath(REPO_ROOT))
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and heavy-module check for the AIMeter sampling core")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--target", default="monitor", help="module imported as 'from AIMeter import <target>'")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail when the median import time exceeds this")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    args = parser.parse_args()
+
+    runs = [run_once(args.target) for _ in range(args.runs)]
+    times = sorted(run['import_ms'] for run in runs)
+    heavy = sorted({name for run in runs for name in run['heavy']})
+    result = {
+        'target': f"from AIMeter import {args.target}",
+        'runs': args.runs,
+        'python': sys.version.split()[0],
+        'median_ms': statistics.median(times),
+        'min_ms': times[0],
+        'max_ms': times[-1],
+        'rss_delta_kib': int(statistics.median(run['rss_delta_kib'] for run in runs)),
+        'modules': runs[-1]['modules'],
+        'heavy_modules': heavy,
+    }
+
+    print(f"{result['target']}  runs={args.runs}")
+    print(f"  import time (ms)   median {result['median_ms']:.1f}  min {result['min_ms']:.1f}  max {result['max_ms']:.1f}")
+    print(f"  peak RSS increase  {result['rss_delta_kib'] / 1024:.1f} MiB")
+    print(f"  modules loaded     {result['modules']}")
+    print(f"  heavy modules      {', '.join(heavy) if heavy else 'none'}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    failed = False
+    if heavy:
+        print(f"FAIL: importing the sampling core loaded {', '.join(heavy)}; import them lazily where they are used.")
+        failed = True
+    if args.max_ms is not None and result['median_ms'] > args.max_ms:
+        print(f"FAIL: median import time {result['median_ms']:.1f} ms exceeds {args.max_ms:g} ms.")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+基准测试用的伪造后端：
+- 由 fixtures/ 中录制的 nvidia-smi / dcgmi 输出扩展出任意数量的模拟 GPU
+- PATH 上的 nvidia-smi / dcgmi 伪命令（sh 脚本，只 cat 预先生成的输出，进程开销接近真实 CLI 的下限）；
+  nvidia-smi 按 --query-gpu 选择输出，带 -lms（dcgmi 带 -d）时像常驻进程一样按间隔重复输出
+- 伪造的 RAPL sysfs 目录（两个插槽，每个插槽 package + dram 域）
+- 进程内的假 NVML 模块（替代 pynvml），数值与录制的 nvidia-smi 输出一致
+- 进程内的 MySQL 替身连接，实现 save_to_mysql 用到的 DB-API 子集，可模拟每次往返的网络延迟
+"""
+import os
+import re
+import time
+from types import SimpleNamespace
+
+from AIMeter.metrics_collect import GPU_QUERY_HEADERS, gpu_query_fields
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# DCGM 字段 ID -> dcgmi dmon 输出的列名（与 fixtures/dcgmi.txt 的表头一致）
+DCGM_FIELD_TAGS = {
+    '50': 'DVNAM', '155': 'POWER', '203': 'GPUTL', '252': 'FBUSD', '251': 'FBFRE',
+    '237': 'PCILG', '238': 'PCILW', '150': 'TMPTR', '140': 'MMTMP', '100': 'SMCLK',
+    '101': 'MMCLK', '1002': 'SMACT', '1003': 'SMOCC', '1004': 'TENSO', '1005': 'DRAMA',
+    '1009': 'PCITX', '1010': 'PCIRX', '1011': 'NVLTX', '1012': 'NVLRX', '204': 'MCUTL',
+    '1006': 'FP64A', '1007': 'FP32A', '1008': 'FP16A',
+}
+
+
+def _read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def nvidia_smi_rows(gpus: int):
+    """按录制的行循环扩展出 gpus 个 GPU 的原始字段（表头 -> 文本），fixtures/nvidia-smi.txt 的列顺序与 GPU_QUERY_HEADERS 一致"""
+    recorded = [line.split(", ") for line in _read_fixture("nvidia-smi.txt").splitlines() if line.strip()]
+    rows = []
+    for i in range(gpus):
+        row = dict(zip(GPU_QUERY_HEADERS, recorded[i % len(recorded)]))
+        row['index'] = str(i)
+        rows.append(row)
+    return rows
+
+
+def nvidia_smi_output(gpus: int, headers=GPU_QUERY_HEADERS) -> str:
+    """gpus 个 GPU 的 nvidia-smi --query-gpu=<headers 对应字段> --format=csv,noheader,nounits 输出"""
+    return "".join(", ".join(row[header] for header in headers) + "\n" for row in nvidia_smi_rows(gpus))
+
+
+def dcgmi_output(gpus: int, fields: str) -> str:
+    """按录制的行循环扩展出 gpus 个 GPU 的 dcgmi dmon -e <fields> -c 1 输出，只保留 fields 对应的列"""
+    lines = [line for line in _read_fixture("dcgmi.txt").splitlines() if line.strip()]
+    tags = lines[0].split()[1:]
+    # 数据行的列之间至少两个空格（设备名称内部只有单个空格）
+    recorded = [dict(zip(tags, re.split(r"\s{2,}", line.strip())[1:])) for line in lines[2:]]
+    selected = [DCGM_FIELD_TAGS[field] for field in fields.split(",")]
+    widths = [max(len(tag), 24 if tag == 'DVNAM' else 10) for tag in selected]
+    out = ["#Entity   " + " ".join(tag.ljust(width) for tag, width in zip(selected, widths)).rstrip(), "ID"]
+    for i in range(gpus):
+        row = recorded[i % len(recorded)]
+        out.append(f"GPU {i}".ljust(10) + " ".join(row[tag].ljust(width) for tag, width in zip(selected, widths)).rstrip())
+    return "\n".join(out) + "\n"
+
+
+def install_fake_clis(root: str, gpus: int, dcgm_field_sets=()) -> str:
+    """
+    在 root 下生成 gpus 个 GPU 的预置输出和 nvidia-smi / dcgmi 伪命令，返回伪命令所在目录（由调用方加到 PATH 前面）。
+    nvidia-smi 伪命令按 --query-gpu 参数输出对应的列：完整查询直接 cat 预置输出，
+    其他字段组合（多速率采样拆分出的字段组、只查询部分字段）由 awk 从完整输出中选列；
+    带 -lms 时每隔相应毫秒重复输出一次，直到被终止。
+    dcgmi 伪命令按 -e 参数选择输出，dcgm_field_sets 为需要支持的全部字段组合；
+    带 -d 时与 dcgmi dmon 一样每隔相应毫秒重复输出（连同表头），直到被终止
+    """
+    bin_dir = os.path.join(root, "bin")
+    out_dir = os.path.join(root, "out")
+    os.makedirs(bin_dir, exist_ok=True)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "nvidia-smi.txt"), "w") as f:
+        f.write(nvidia_smi_output(gpus))
+    for fields in dcgm_field_sets:
+        with open(os.path.join(out_dir, f"dcgmi-{fields}.txt"), "w") as f:
+            f.write(dcgmi_output(gpus, fields))
+    all_fields = gpu_query_fields(GPU_QUERY_HEADERS)
+    select_columns = (
+        'awk -v query="$query" \'BEGIN { FS = ", "; '
+        f'n = split("{all_fields}", all, ","); for (i = 1; i <= n; i++) col[all[i]] = i; m = split(query, q, ",") }} '
+        '{ line = $(col[q[1]]); for (j = 2; j <= m; j++) line = line ", " $(col[q[j]]); print line }\' '
+        f'"{out_dir}/nvidia-smi.txt"'
+    )
+    scripts = {
+        "nvidia-smi": (
+            "#!/bin/sh\n"
+            "query=\n"
+            "interval=\n"
+            "while [ $# -gt 0 ]; do\n"
+            '  case "$1" in\n'
+            '    --query-gpu=*) query=${1#--query-gpu=} ;;\n'
+            "    -lms) interval=$2; shift ;;\n"
+            "  esac\n"
+            "  shift\n"
+            "done\n"
+            f'if [ "$query" = "{all_fields}" ]; then output() {{ cat "{out_dir}/nvidia-smi.txt"; }}\n'
+            f"else output() {{ {select_columns}; }}\n"
+            "fi\n"
+            'if [ -z "$interval" ]; then output; exit; fi\n'
+            'seconds=$((interval / 1000)).$(printf %03d $((interval % 1000)))\n'
+            'while output; do sleep "$seconds"; done\n'
+        ),
+        "dcgmi": (
+            "#!/bin/sh\n"
+            "fields=\n"
+            "interval=\n"
+            "while [ $# -gt 0 ]; do\n"
+            '  case "$1" in\n'
+            "    -e) fields=$2; shift ;;\n"
+            "    -d) interval=$2; shift ;;\n"
+            "  esac\n"
+            "  shift\n"
+            "done\n"
+            f'if [ -z "$interval" ]; then exec cat "{out_dir}/dcgmi-$fields.txt"; fi\n'
+            'seconds=$((interval / 1000)).$(printf %03d $((interval % 1000)))\n'
+            f'while cat "{out_dir}/dcgmi-$fields.txt"; do sleep "$seconds"; done\n'
+        ),
+    }
+    for name, body in scripts.items():
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(body)
+        os.chmod(path, 0o755)
+    return bin_dir
+
+
+def make_fake_rapl(root: str, sockets: int = 2) -> str:
+    """生成伪造的 /sys/class/powercap 目录（每个插槽一个 package 域和一个 dram 子域），返回其路径"""
+    powercap = os.path.join(root, "powercap")
+    for socket in range(sockets):
+        for entry, name in ((f"intel-rapl:{socket}", f"package-{socket}"), (f"intel-rapl:{socket}:0", "dram")):
+            domain = os.path.join(powercap, entry)
+            os.makedirs(domain, exist_ok=True)
+            for filename, value in (("name", name), ("energy_uj", 123456789 * (socket + 1)), ("max_energy_range_uj", 262143328850)):
+                with open(os.path.join(domain, filename), "w") as f:
+                    f.write(f"{value}\n")
+    return powercap
+
+
+class FakeNvml:
+    """
+    替代 pynvml 的进程内假模块，实现 NvmlCollector 用到的函数；数值取自录制的 nvidia-smi 输出，
+    因此两种后端的结果可以直接比较。fail_init=True 时 nvmlInit() 抛出异常（模拟没有驱动），
+    pcie_kbps 为 PCIe 收发吞吐（KB/s）
+    """
+    NVML_TEMPERATURE_GPU = 0
+    NVML_CLOCK_GRAPHICS, NVML_CLOCK_SM, NVML_CLOCK_MEM = 0, 1, 2
+    NVML_PCIE_UTIL_TX_BYTES, NVML_PCIE_UTIL_RX_BYTES = 0, 1
+    NVML_FI_DEV_MEMORY_TEMP = 82
+
+    class NVMLError(Exception):
+        pass
+
+    def __init__(self, gpus: int, fail_init: bool = False, pcie_kbps=(1048576, 2097152)):
+        self.rows = nvidia_smi_rows(gpus)
+        self.fail_init = fail_init
+        self.pcie_kbps = pcie_kbps
+        self.initialized = False
+
+    def nvmlInit(self) -> None:
+        if self.fail_init:
+            raise self.NVMLError("NVML Shared Library Not Found")
+        self.initialized = True
+
+    def nvmlShutdown(self) -> None:
+        self.initialized = False
+
+    def nvmlDeviceGetCount(self) -> int:
+        return len(self.rows)
+
+    def nvmlDeviceGetHandleByIndex(self, index: int):
+        return self.rows[index]
+
+    def nvmlDeviceGetName(self, handle) -> bytes:
+        return handle['name'].encode('utf-8')
+
+    def nvmlDeviceGetPowerUsage(self, handle) -> int:
+        return round(float(handle['power.draw [W]']) * 1000)  # mW
+
+    def nvmlDeviceGetUtilizationRates(self, handle):
+        return SimpleNamespace(gpu=int(handle['utilization.gpu [%]']), memory=int(handle['utilization.memory [%]']))
+
+    def nvmlDeviceGetCurrPcieLinkGeneration(self, handle) -> int:
+        return int(handle['pcie.link.gen.current'])
+
+    def nvmlDeviceGetCurrPcieLinkWidth(self, handle) -> int:
+        return int(handle['pcie.link.width.current'])
+
+    def nvmlDeviceGetTemperature(self, handle, sensor) -> int:
+        return int(handle['temperature.gpu'])
+
+    def nvmlDeviceGetFieldValues(self, handle, field_ids):
+        return [SimpleNamespace(nvmlReturn=0, value=SimpleNamespace(uiVal=int(handle['temperature.memory'])))
+                for _ in field_ids]
+
+    def nvmlDeviceGetClockInfo(self, handle, clock) -> int:
+        header = {self.NVML_CLOCK_GRAPHICS: 'clocks.current.graphics [MHz]', self.NVML_CLOCK_SM: 'clocks.current.sm [MHz]',
+                  self.NVML_CLOCK_MEM: 'clocks.current.memory [MHz]'}[clock]
+        return int(handle[header])
+
+    def nvmlDeviceGetPcieThroughput(self, handle, counter) -> int:
+        return self.pcie_kbps[counter]
+
+
+class FakeMySQLConnection:
+    """
+    MySQL 连接的进程内替身：记录表结构（SHOW TABLES / INFORMATION_SCHEMA / CREATE / ALTER），
+    executemany 只计数不存储；每次往返（连接、execute、commit）sleep rtt 秒以模拟网络延迟
+    """
+
+    def __init__(self, tables: dict, rtt: float = 0.0):
+        self.tables = tables  # 表名 -> 列名列表，在多次连接之间共享（相当于服务器上的数据库）
+        self.rtt = rtt
+        self.rows = 0
+        self._connected = True
+        self._round_trip()
+
+    def _round_trip(self) -> None:
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def cursor(self) -> "FakeMySQLCursor":
+        return FakeMySQLCursor(self)
+
+    def commit(self) -> None:
+        self._round_trip()
+
+    def rollback(self) -> None:
+        self._round_trip()
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def close(self) -> None:
+        self._connected = False
+
+
+class FakeMySQLCursor:
+    def __init__(self, connection: FakeMySQLConnection):
+        self.connection = connection
+        self._result = []
+
+    def execute(self, query: str, params=None) -> None:
+        self.connection._round_trip()
+        tables = self.connection.tables
+        query = query.strip()
+        if query.startswith("SHOW TABLES LIKE"):
+            name = re.search(r"'([^']+)'", query).group(1)
+            self._result = [(name,)] if name in tables else []
+        elif "INFORMATION_SCHEMA.COLUMNS" in query:
+            name = re.search(r"TABLE_NAME = '([^']+)'", query).group(1)
+            self._result = [(column,) for column in tables.get(name, [])]
+        elif query.startswith("CREATE TABLE"):
+            name = re.search(r"CREATE TABLE `([^`]+)`", query).group(1)
+            body = query[query.index("(") + 1:]
+            columns = ["id", "timestamp", "task_name"]
+            columns += [c for c in re.findall(r"`(\w+)` \w+", body) if c not in columns]
+            tables[name] = columns
+            self._result = []
+        elif query.startswith("ALTER TABLE"):
+            name, column = re.search(r"ALTER TABLE `([^`]+)` ADD COLUMN `(\w+)`", query).groups()
+            tables[name].append(column)
+            self._result = []
+        else:
+            self._result = []
+
+    def executemany(self, query: str, rows) -> None:
+        self.connection._round_trip()
+        self.connection.rows += len(rows)
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
+
+    def close(self) -> None:
+        pass
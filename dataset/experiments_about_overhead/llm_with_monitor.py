@@ -3,9 +3,10 @@ import torch
 import os
 from Metrics_Counter import monitor
 import time
-from datetime import datetime
 os.environ["CUDA_VISIBLE_DEVICES"] = "0"
 import sys
+# 采样引擎运行方式：'thread'（默认，被测进程内的采样线程）或 'process'（独立采样进程 + 共享内存），由 run_and_monitor.sh 设置
+SAMPLER_MODE = os.environ.get("SAMPLER_MODE", "thread")
 PID_FILENAME = "python_pid.txt" # The name of the file to store the PID
 try:
     # Get the current process's ID
@@ -57,42 +58,40 @@ print(f"Batch size: {batch_size}, Input token length: {input_length}")
 max_new_tokens = 100
 
 try:
-    monitor.start(task_name = "prefill_decode_batch_size_2", sampling_interval = 1, output_format = "csv", additional_metrics=['Gdetails','CPU','DRAM','fp64','fp32','fp16'], indices=[0], position=(37,-122))
-    
-    now1 = datetime.now()
-    print("Prefill start time:", now1.strftime("%Y-%m-%d %H:%M:%S.") + f"{now1.microsecond // 1000:03d} ms")
+    monitor.start(task_name = "prefill_decode_batch_size_2", sampling_interval = 1, output_format = "csv", additional_metrics=['Gdetails','CPU','DRAM','fp64','fp32','fp16'], indices=[0], position=(37,-122), sampler_process=(SAMPLER_MODE == "process"))
 
-    with torch.no_grad():
-        prefill_outputs = model(
-            input_ids=input_ids,
-            attention_mask=attention_mask,
-            use_cache=True
-        )
-    past_key_values = prefill_outputs.past_key_values
-
-    now2 = datetime.now()
-    print("Prefill end time:", now2.strftime("%Y-%m-%d %H:%M:%S.") + f"{now2.microsecond // 1000:03d} ms")
+    # 阶段边界写入样本流（phase 列），各阶段的时长、能耗和平均功率在 monitor.stop() 时汇总打印
+    with monitor.phase("prefill") as prefill_mark:
+        with torch.no_grad():
+            prefill_outputs = model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                use_cache=True
+            )
+        past_key_values = prefill_outputs.past_key_values
+    print(f"Prefill energy: {monitor.energy_since(prefill_mark):.2f} J")
 
     # SLEEP
     print("\nSleeping for 15 seconds before decode...")
-    time.sleep(15)
+    with monitor.phase("sleep"):
+        time.sleep(15)
 
     # DECODE 阶段
-    now3 = datetime.now()
-    print("Decode start time:", now3.strftime("%Y-%m-%d %H:%M:%S.") + f"{now3.microsecond // 1000:03d} ms")
-    generated = input_ids
-    for _ in range(max_new_tokens):
-        with torch.no_grad():
-            next_output = model(
-                input_ids=generated[:, -1:],
-                attention_mask=torch.ones_like(generated),
-                past_key_values=past_key_values,
-                use_cache=True
-            )
-        logits = next_output.logits[:, -1, :]
-        next_token_id = torch.argmax(logits, dim=-1, keepdim=True)
-        generated = torch.cat([generated, next_token_id], dim=1)
-        past_key_values = next_output.past_key_values
+    with monitor.phase("decode") as decode_mark:
+        generated = input_ids
+        for _ in range(max_new_tokens):
+            with torch.no_grad():
+                next_output = model(
+                    input_ids=generated[:, -1:],
+                    attention_mask=torch.ones_like(generated),
+                    past_key_values=past_key_values,
+                    use_cache=True
+                )
+            logits = next_output.logits[:, -1, :]
+            next_token_id = torch.argmax(logits, dim=-1, keepdim=True)
+            generated = torch.cat([generated, next_token_id], dim=1)
+            past_key_values = next_output.past_key_values
+    print(f"Decode energy: {monitor.energy_since(decode_mark):.2f} J")
 
     for i in range(batch_size):
         generated_tokens = generated[i][input_length:]
@@ -101,9 +100,7 @@ try:
         print("=" * 80)
         print(output_text)
 
-
-    now4 = datetime.now()
-    print("Decode end time:", now4.strftime("%Y-%m-%d %H:%M:%S.") + f"{now4.microsecond // 1000:03d} ms")
+    end_ns = time.monotonic_ns()
     print("\nGenerated continuation:")
     print("=" * 80)
     print(output_text)
@@ -112,8 +109,9 @@ finally:
     # 确保监控器停止
     # 写入 duration_log.csv
     import csv
-    duration = (now4 - now1).total_seconds()
-    csv_file = "duration_log.csv"
+    duration = (end_ns - prefill_mark.monotonic_ns) / 1e9
+    # 两种采样方式的耗时分别记录
+    csv_file = "duration_log.csv" if SAMPLER_MODE == "thread" else f"duration_log_{SAMPLER_MODE}.csv"
     file_exists = os.path.isfile(csv_file)
 
     current_id = 1
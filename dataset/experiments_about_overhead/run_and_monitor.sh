@@ -1,23 +1,55 @@
 #!/bin/bash
 
-PYTHON_BIN="sudo python"
+PYTHON_BIN="sudo -E python"
 PID_FILE="python_pid.txt"
 LOG_BASE_DIR="monitor_logs_sleep"
 SCRIPT_LIST=("llm_with_monitor.py" "llm_without_monitor.py" "sleep.py")
 REPEAT=10
+# llm_with_monitor.py 分别以进程内采样线程（thread）和独立采样进程（process）运行，用于比较两种方式的开销
+SAMPLER_MODES=("thread" "process")
+
+# 采样进程由 monitor.start 创建，出现后同样记录它的 CPU、内存和磁盘 I/O
+monitor_sampler_process() {
+    local parent=$1
+    local log_dir=$2
+    local child=""
+    while kill -0 "$parent" 2>/dev/null; do
+        child=$(pgrep -P "$parent" -f process_sampler.py | head -n 1)
+        if [ -n "$child" ]; then
+            pidstat -u -p "$child" 1 > "$log_dir/sampler_cpu.csv" &
+            pidstat -r -p "$child" 1 > "$log_dir/sampler_memory.csv" &
+            pidstat -d -p "$child" 1 > "$log_dir/sampler_disk.csv" &
+            return
+        fi
+        sleep 1
+    done
+}
 
 for SCRIPT in "${SCRIPT_LIST[@]}"; do
     SCRIPT_NAME="${SCRIPT%.*}"  # 去掉.py扩展名
-    echo "==== Running $SCRIPT ===="
+    if [ "$SCRIPT" = "llm_with_monitor.py" ]; then
+        MODES=("${SAMPLER_MODES[@]}")
+    else
+        MODES=("thread")
+    fi
+
+    for MODE in "${MODES[@]}"; do
+    export SAMPLER_MODE="$MODE"
+    RUN_NAME="$SCRIPT_NAME"
+    if [ "$MODE" != "thread" ]; then
+        RUN_NAME="${SCRIPT_NAME}_${MODE}"
+    fi
+    echo "==== Running $SCRIPT (sampler: $MODE) ===="
 
     for i in $(seq 1 $REPEAT); do
-        echo "---- Run $i for $SCRIPT ----"
+        echo "---- Run $i for $SCRIPT (sampler: $MODE) ----"
 
         # 清除旧的 PID 文件（如果有）
         rm -f "$PID_FILE"
 
-        # 启动 Python 脚本
+        # 启动 Python 脚本（sudo 需要 -E 才能把 SAMPLER_MODE 传给脚本）
         $PYTHON_BIN "$SCRIPT" &
+        SCRIPT_JOB=$!
 
         # 等待 PID 文件生成（最多等待 10 秒）
         for j in {1..10}; do
@@ -36,7 +68,7 @@ for SCRIPT in "${SCRIPT_LIST[@]}"; do
         echo "Detected Python PID: $PID"
 
         # 创建日志目录
-        LOG_DIR="${LOG_BASE_DIR}/${SCRIPT_NAME}_run${i}"
+        LOG_DIR="${LOG_BASE_DIR}/${RUN_NAME}_run${i}"
         mkdir -p "$LOG_DIR"
 
         # 启动监控
@@ -49,16 +81,21 @@ for SCRIPT in "${SCRIPT_LIST[@]}"; do
         echo "Starting disk I/O monitoring..."
         pidstat -d -p $PID 1 > "$LOG_DIR/disk.csv" &
 
+        if [ "$MODE" = "process" ]; then
+            monitor_sampler_process "$PID" "$LOG_DIR" &
+        fi
+
         # 等待 Python 脚本执行完成
-        wait $!
+        wait $SCRIPT_JOB
 
         # 终止监控子进程
         echo "Stopping monitoring..."
         pkill -P $$ pidstat
 
-        echo "Completed run $i for $SCRIPT. Logs saved in $LOG_DIR"
+        echo "Completed run $i for $SCRIPT (sampler: $MODE). Logs saved in $LOG_DIR"
         echo ""
     done
+    done
 done
 
 echo "All tests completed."
@@ -0,0 +1,24 @@
+"""
+测试公共夹具：测试通过包名导入（from AIMeter.collectors import ...），仓库根目录放在 sys.path 上；
+伪造后端（PATH 上的 nvidia-smi / dcgmi 伪命令、假 NVML、伪造的 RAPL sysfs 目录）与基准测试共用 benchmarks/fake_backends.py。
+"""
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "benchmarks"))
+sys.path.insert(0, os.path.join(TESTS_DIR, ".."))
+
+from fake_backends import install_fake_clis
+
+GPUS = 2
+
+
+@pytest.fixture
+def fake_clis(tmp_path, monkeypatch):
+    """在 PATH 最前面安装 GPUS 个 GPU 的 nvidia-smi / dcgmi 伪命令（nvidia-smi 按 --query-gpu 输出对应的列）"""
+    bin_dir = install_fake_clis(str(tmp_path), GPUS)
+    monkeypatch.setenv("PATH", bin_dir + os.pathsep + os.environ.get("PATH", ""))
+    return bin_dir
@@ -0,0 +1,94 @@
+"""采集时间：每个运行了的采集器的开始 / 结束时刻列、指标到采集器的对应、按真实读取时刻积分与对齐"""
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from AIMeter.collectors import Collector
+from AIMeter.engine import CollectionEngine
+from AIMeter.metric_schema import acquisition_columns, acquisition_sources, is_time_column
+from AIMeter.metrics_calculate import ELAPSED_COL, align_to_ticks, sample_seconds
+from AIMeter.online_stats import read_time_ns
+
+MS = 1_000_000
+
+
+class SleepyCollector(Collector):
+    def __init__(self, name, kind, seconds=0.0, interval=None):
+        self.name = name
+        self.kind = kind
+        self.seconds = seconds
+        self.interval = interval
+
+    def sample(self):
+        time.sleep(self.seconds)
+        if self.kind == "gpu":
+            return [{'name': 'GPU', 'index': 0, 'power.draw [W]': 100.0}]
+        return {'cpu_power': 50.0}
+
+
+def test_engine_records_each_collector_read_window():
+    engine = CollectionEngine([SleepyCollector("nvidia-smi", "gpu", 0.02), SleepyCollector("rapl", "host", interval=10)])
+    engine.open()
+    try:
+        before = time.monotonic_ns()
+        first = engine.collect()
+        after = time.monotonic_ns()
+        second = engine.collect()
+    finally:
+        engine.close()
+    start, end = first['nvidia-smi.start_ns'], first['nvidia-smi.end_ns']
+    assert before <= start and end <= after
+    assert end - start >= 20 * MS
+    assert before <= first['rapl.start_ns'] <= first['rapl.end_ns'] <= after
+    # 未到期的采集器本次没有运行，也就没有它的采集时间
+    assert 'rapl.start_ns' not in second and 'nvidia-smi.start_ns' in second
+
+
+def test_sources_and_columns():
+    assert acquisition_columns("rapl") == ("rapl.start_ns", "rapl.end_ns")
+    assert all(is_time_column(c) for c in acquisition_columns("dcgmi"))
+    assert acquisition_sources('power.draw [W]') == ('power', 'nvml', 'nvidia-smi', 'dcgmi')
+    assert acquisition_sources('cpu_power.socket1') == acquisition_sources('cpu_power_socket1') == ('rapl',)
+    assert acquisition_sources('sm_active') == ('dcgmi',)
+    assert acquisition_sources('missed_ticks') == ()
+    assert acquisition_sources('name') == ()
+
+
+def test_read_time_is_midpoint_of_the_read_window():
+    metrics = {'monotonic_ns': 1000, 'nvidia-smi.start_ns': 1100, 'nvidia-smi.end_ns': 1300,
+               'power.start_ns': 2000, 'power.end_ns': 2100, 'rapl.start_ns': None, 'rapl.end_ns': None}
+    # 多速率拆分出的 power 采集器优先于基础查询
+    assert read_time_ns(metrics, 'power.draw [W]') == 2050
+    assert read_time_ns(metrics, 'utilization.gpu [%]') == 1200
+    # 没有采集时间时使用调度时刻
+    assert read_time_ns(metrics, 'cpu_power') == 1000
+
+
+def frame():
+    return pd.DataFrame({
+        ELAPSED_COL: [0.0, 1.0, 2.0],
+        'monotonic_ns': [0, 10**9, 2 * 10**9],
+        'nvidia-smi.start_ns': [100 * MS, 10**9 + 300 * MS, np.nan],
+        'nvidia-smi.end_ns': [300 * MS, 10**9 + 500 * MS, np.nan],
+        'power.draw [W]': [100.0, 200.0, 300.0],
+        'cpu_power': [10.0, 20.0, 30.0],
+    })
+
+
+def test_sample_seconds_uses_read_times():
+    df = frame()
+    assert sample_seconds(df, 'power.draw [W]').tolist() == pytest.approx([0.2, 1.4, 2.0])
+    # 没有对应的采集时间列时使用调度时刻
+    assert sample_seconds(df, 'cpu_power').tolist() == [0.0, 1.0, 2.0]
+    assert sample_seconds(df.drop(columns=['monotonic_ns']), 'power.draw [W]').tolist() == [0.0, 1.0, 2.0]
+
+
+def test_align_to_ticks_interpolates_to_schedule():
+    aligned = align_to_ticks(frame(), ['power.draw [W]', 'cpu_power'])
+    power = aligned['power.draw [W]'].tolist()
+    # 0 s 早于第一次读取（0.2 s），为 NaN；1 s 在 0.2 s 与 1.4 s 之间插值
+    assert np.isnan(power[0])
+    assert power[1:] == pytest.approx([100 + 100 * 0.8 / 1.2, 300.0])
+    assert aligned['cpu_power'].tolist() == [10.0, 20.0, 30.0]
@@ -0,0 +1,50 @@
+"""自适应采样间隔：平稳时按倍数放宽到最大间隔、功耗或利用率变化超过阈值时立即回到最小间隔"""
+import pytest
+
+from AIMeter.adaptive import AdaptiveInterval
+
+
+def gpus(*powers, utilization=50.0):
+    return {'gpu_info': [{'index': i, 'power.draw [W]': p, 'utilization.gpu [%]': utilization}
+                         for i, p in enumerate(powers)]}
+
+
+def test_rejects_invalid_bounds():
+    with pytest.raises(ValueError):
+        AdaptiveInterval(0, 1)
+    with pytest.raises(ValueError):
+        AdaptiveInterval(2, 1)
+    assert AdaptiveInterval(0.1, 1).interval == 1
+    assert AdaptiveInterval(0.1, 1, initial=0.01).interval == 0.1
+
+
+def test_backs_off_while_flat_and_speeds_up_on_change():
+    adaptive = AdaptiveInterval(0.1, 1.0, threshold=0.1, initial=0.1)
+    intervals = [adaptive.update(gpus(100.0, 200.0)) for _ in range(8)]
+    assert intervals[:4] == pytest.approx([0.15, 0.225, 0.3375, 0.50625])
+    assert intervals[-1] == 1.0
+    # 第二块 GPU 的功耗相对变化 15%，超过阈值
+    assert adaptive.update(gpus(100.0, 230.0)) == 0.1
+    assert adaptive.speedups == 1
+    # 已经是最小间隔时再次触发不计为加速
+    assert adaptive.update(gpus(100.0, 300.0)) == 0.1
+    assert adaptive.speedups == 1 and adaptive.samples == 10
+
+
+def test_change_normalization():
+    adaptive = AdaptiveInterval(0.1, 1.0)
+    assert adaptive.change({'cpu_power': 0.2, 'cpu_usage': 10.0}) == 0.0  # 第一次只记录基准
+    # 接近 0 的功耗按 1 W 归一化，利用率按满量程归一化
+    assert adaptive.change({'cpu_power': 0.5, 'cpu_usage': 15.0}) == pytest.approx(0.3)
+    assert adaptive.change({'cpu_power': 0.5, 'cpu_usage': 35.0}) == pytest.approx(0.2)
+    assert adaptive.change({'cpu_power': 50.5, 'cpu_usage': 35.0}) == pytest.approx(50.0)
+    # 缺失的信号不参与比较
+    assert adaptive.change({'cpu_usage': None, 'gpu_info': []}) == 0.0
+
+
+def test_signals_are_tracked_per_gpu():
+    adaptive = AdaptiveInterval(0.1, 1.0)
+    adaptive.change(gpus(100.0, 200.0))
+    # 两块 GPU 交换功耗：每块 GPU 都相对自己的上次值比较
+    assert adaptive.change(gpus(200.0, 100.0)) == pytest.approx(1.0)
+    assert adaptive.change(gpus(200.0, 100.0, utilization=60.0)) == pytest.approx(0.1)
@@ -0,0 +1,182 @@
+"""asyncio 采集引擎：采集器并发运行、超时的采集器被取消且子进程被结束、无法取消的线程调用返回前不再运行、session 会话"""
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+import AIMeter as aimeter
+from AIMeter.async_engine import AsyncCollectionEngine
+from AIMeter.collectors import Collector, NvidiaSmiCollector
+from AIMeter.engine import CollectionEngine
+
+
+class SleepingCollector(Collector):
+    """asample() 等待 seconds 秒；记录是否被取消"""
+    kind = "host"
+
+    def __init__(self, name, seconds):
+        self.name = name
+        self.seconds = seconds
+        self.calls = 0
+        self.cancelled = False
+
+    def sample(self):
+        raise AssertionError("the async engine must call asample()")
+
+    async def asample(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {f"{self.name}_value": float(self.calls)}
+
+
+class ThreadCollector(Collector):
+    """与 NVML 采集器相同：sample() 在默认线程池中运行，取消后等线程中的调用返回再结束"""
+    name = "nvml"
+    kind = "host"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def sample(self):
+        self.calls += 1
+        if self.calls == 1:
+            self.release.wait(5)
+        return {'nvml_value': float(self.calls)}
+
+    async def asample(self):
+        future = asyncio.get_running_loop().run_in_executor(None, self.sample)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait([future])
+            raise
+
+
+def test_collectors_run_concurrently():
+    async def main():
+        engine = AsyncCollectionEngine([SleepingCollector("a", 0.2), SleepingCollector("b", 0.2)])
+        engine.open()
+        started = time.monotonic()
+        metrics = await engine.collect()
+        elapsed = time.monotonic() - started
+        engine.close()
+        return metrics, elapsed
+
+    metrics, elapsed = asyncio.run(main())
+    assert metrics['a_value'] == metrics['b_value'] == 1.0
+    assert elapsed < 0.35
+
+
+def test_timed_out_collector_is_cancelled(capsys):
+    hung = SleepingCollector("hung", 60)
+
+    async def main():
+        engine = AsyncCollectionEngine([hung, SleepingCollector("fast", 0)], timeout=0.05)
+        engine.open()
+        started = time.monotonic()
+        first = await engine.collect()
+        elapsed = time.monotonic() - started
+        await asyncio.sleep(0)  # 让取消送达
+        second = await engine.collect()
+        engine.close()
+        return first, second, elapsed
+
+    first, second, elapsed = asyncio.run(main())
+    assert "hung - timeout (skipped until it returns)" in capsys.readouterr().out
+    assert hung.cancelled and elapsed < 1
+    assert 'hung_value' not in first and 'hung.start_ns' not in first
+    assert first['fast_value'] == 1.0
+    # 可取消的协程在取消后立即结束，下一次采样照常运行
+    assert hung.calls == 2 and second['fast_value'] == 2.0
+
+
+def test_uncancellable_collector_is_skipped_until_it_returns():
+    collector = ThreadCollector()
+
+    async def main():
+        engine = AsyncCollectionEngine([collector], timeout=0.05)
+        engine.open()
+        try:
+            first = await engine.collect()
+            second = await engine.collect()
+            assert collector.calls == 1
+            collector.release.set()
+            for _ in range(500):
+                if not engine._busy(0):
+                    break
+                await asyncio.sleep(0.01)
+            third = await engine.collect()
+        finally:
+            collector.release.set()
+            engine.close()
+        return first, second, third
+
+    first, second, third = asyncio.run(main())
+    assert 'nvml_value' not in first and 'nvml_value' not in second
+    assert third['nvml_value'] == 2.0 and collector.calls == 2
+
+
+def test_timed_out_subprocess_is_killed(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    pid_file = tmp_path / "pid"
+    script = bin_dir / "nvidia-smi"
+    script.write_text(f'#!/bin/sh\necho $$ > "{pid_file}"\nexec sleep 30\n')
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir) + os.pathsep + os.environ.get("PATH", ""))
+
+    async def main():
+        engine = AsyncCollectionEngine([NvidiaSmiCollector()], timeout=0.3)
+        engine.open()
+        metrics = await engine.collect()
+        for _ in range(100):
+            if not engine._busy(0):
+                break
+            await asyncio.sleep(0.01)
+        engine.close()
+        return metrics
+
+    assert asyncio.run(main())['gpu_info'] == []
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+
+def test_matches_sync_engine(fake_clis):
+    sync_engine = CollectionEngine([NvidiaSmiCollector()])
+    sync_engine.open()
+    expected = sync_engine.collect()['gpu_info']
+    sync_engine.close()
+
+    async def main():
+        engine = AsyncCollectionEngine([NvidiaSmiCollector()])
+        engine.open()
+        try:
+            return (await engine.collect())['gpu_info']
+        finally:
+            engine.close()
+
+    assert asyncio.run(main()) == expected
+
+
+def test_sessions_in_one_loop_share_a_sampler(fake_clis):
+    async def request(name):
+        async with aimeter.session(name, sampling_interval=0.05, output_format="none", quiet=True) as s:
+            with s.phase("decode"):
+                await asyncio.sleep(0.3)
+        return s
+
+    async def main():
+        return await asyncio.gather(request("req-1"), request("req-2"))
+
+    sessions = asyncio.run(main())
+    for s in sessions:
+        assert s.result.samples >= 3
+        assert [name for name, *_ in s.result.phases] == ["decode"]
+        assert s.result.energy['total'] > 0
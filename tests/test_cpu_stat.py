@@ -0,0 +1,89 @@
+"""CPU 利用率：伪造的 /proc/stat 上的 tick 差值（iowait 计为空闲、guest 列不重复计算）、每核向量、核数变化与回退"""
+from array import array
+
+import pytest
+
+from AIMeter.collectors import CpuStatCollector
+from AIMeter.host_readers import CpuStatReader
+
+TAIL = "intr 12345 0 0\nctxt 6789\nbtime 1700000000\n"
+
+
+def stat_line(name, user, system, idle, iowait=0, guest=0):
+    # user nice system idle iowait irq softirq steal guest guest_nice
+    return f"{name} {user} 0 {system} {idle} {iowait} 0 0 0 {guest} 0\n"
+
+
+def write_stat(path, cores):
+    """cores 为每个核心的 (user, system, idle, iowait)，总行为各核之和"""
+    totals = [sum(values) for values in zip(*cores)]
+    with open(path, "w") as f:
+        f.write(stat_line("cpu ", *totals, guest=totals[0]))
+        for i, values in enumerate(cores):
+            f.write(stat_line(f"cpu{i}", *values, guest=values[0]))
+        f.write(TAIL)
+
+
+@pytest.fixture
+def stat_path(tmp_path):
+    path = str(tmp_path / "stat")
+    write_stat(path, [(50, 50, 400, 0), (50, 50, 400, 0)])
+    return path
+
+
+def test_utilization_from_tick_deltas(stat_path):
+    reader = CpuStatReader(stat_path)
+    assert reader.open()
+    # cpu0 忙 60 / 空闲 40；cpu1 忙 10 / iowait 90（iowait 计为空闲）
+    write_stat(stat_path, [(90, 70, 440, 0), (55, 55, 400, 90)])
+    total, per_core = reader.read()
+    assert isinstance(per_core, array) and per_core.typecode == 'f'
+    assert list(per_core) == [pytest.approx(60.0), pytest.approx(10.0)]
+    assert total == pytest.approx(35.0)
+    # 计数没有变化时利用率为 0
+    assert reader.read() == (0.0, array('f', [0.0, 0.0]))
+    reader.close()
+    assert reader.read() == (None, None)
+
+
+def test_core_count_change_resets_baseline(stat_path):
+    reader = CpuStatReader(stat_path)
+    reader.open()
+    write_stat(stat_path, [(60, 60, 480, 0), (60, 60, 480, 0), (0, 0, 100, 0)])
+    assert reader.read() == (None, None)
+    write_stat(stat_path, [(70, 70, 480, 0), (60, 60, 500, 0), (50, 0, 150, 0)])
+    total, per_core = reader.read()
+    assert list(per_core) == [pytest.approx(100.0), pytest.approx(0.0), pytest.approx(50.0)]
+    assert total == pytest.approx(70 / 140 * 100)
+    reader.close()
+
+
+def test_grows_buffer_for_large_files(stat_path):
+    reader = CpuStatReader(stat_path)
+    reader._bufsize = 16
+    reader.open()
+    write_stat(stat_path, [(100, 50, 450, 0), (50, 50, 500, 0)])
+    total, per_core = reader.read()
+    assert reader._bufsize > 16
+    assert list(per_core) == [pytest.approx(50.0), pytest.approx(0.0)]
+    reader.close()
+
+
+def test_collector_outputs_total_and_per_core(stat_path):
+    collector = CpuStatCollector(stat_path)
+    collector.open()
+    write_stat(stat_path, [(100, 100, 400, 0), (50, 50, 500, 0)])
+    sample = collector.sample()
+    collector.close()
+    assert sample['cpu_usage'] == pytest.approx(50.0)
+    assert list(sample['cpu_usage_per_core']) == [pytest.approx(100.0), pytest.approx(0.0)]
+
+
+def test_collector_falls_back_to_psutil(tmp_path, capsys):
+    collector = CpuStatCollector(str(tmp_path / "missing"))
+    collector.open()
+    assert "missing" in capsys.readouterr().out
+    sample = collector.sample()
+    collector.close()
+    assert isinstance(sample['cpu_usage'], float)
+    assert len(sample['cpu_usage_per_core']) >= 1
@@ -0,0 +1,173 @@
+"""节点采样守护进程：两个客户端收到相同的调度时刻、状态查询、最后一个客户端断开后退出并删除套接字、JSON 帧与套接字属主检查"""
+import os
+import socket
+import tempfile
+import threading
+import time
+from array import array
+
+import pytest
+
+from AIMeter import daemon
+from AIMeter.collectors import Collector
+from AIMeter.engine import CollectionEngine
+
+
+class CountingCollector(Collector):
+    """每次采样返回递增的计数，用于在客户端一侧识别同一个调度时刻"""
+    name = "counting"
+
+    def __init__(self):
+        self.count = 0
+
+    def sample(self):
+        self.count += 1
+        return [{'name': 'Fake GPU', 'index': 0, 'power.draw [W]': float(self.count)},
+                {'name': 'Fake GPU', 'index': 1, 'power.draw [W]': float(self.count) + 0.5}]
+
+
+class HostArrayCollector(Collector):
+    name = "cpu_stat"
+    kind = "host"
+
+    def sample(self):
+        return {'cpu_usage': 12.5, 'cpu_usage_per_core': array('f', [10.0, 15.0])}
+
+
+class RecordingSession:
+    def __init__(self, task_name):
+        self.task_name = task_name
+        self.samples = []
+
+    def _on_sample(self, sampler, metrics, time_stamp_insert):
+        self.samples.append(metrics)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return
+        time.sleep(0.01)
+    pytest.fail("condition not met within timeout")
+
+
+@pytest.fixture
+def socket_path():
+    # AF_UNIX 路径长度有限（108 字节），不使用 pytest 的 tmp_path
+    with tempfile.TemporaryDirectory(prefix="aimeter-test-") as directory:
+        os.chmod(directory, 0o700)
+        yield os.path.join(directory, "aimeter.sock")
+
+
+def start_daemon(socket_path, **kwargs):
+    server = daemon.SamplerDaemon(socket_path, sampling_interval=0.02, **kwargs)
+    server.sampler.engine = CollectionEngine([CountingCollector(), HostArrayCollector()])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    wait_for(lambda: os.path.exists(socket_path))
+    return server, thread
+
+
+def attach(socket_path, task_name, **config):
+    connection = daemon.connect(socket_path)
+    assert connection is not None
+    client = daemon.DaemonSampler(connection, sampling_interval=0.02, **config)
+    session = RecordingSession(task_name)
+    client.subscribe(session)
+    client.start()
+    return client, session
+
+
+def test_two_clients_receive_the_same_ticks(socket_path):
+    server, thread = start_daemon(socket_path, exit_when_idle=True)
+    first, first_session = attach(socket_path, "rank0")
+    second, second_session = attach(socket_path, "rank1", indices=[1])
+    wait_for(lambda: len(second_session.samples) >= 5)
+
+    report = daemon.status(socket_path)
+    assert report['running']
+    assert sorted(c['sessions'][0] for c in report['clients']) == ["rank0", "rank1"]
+    assert [c['indices'] for c in report['clients']] == [None, [1]]
+    assert {c['pid'] for c in report['clients']} == {os.getpid()}
+
+    second.stop()
+    wait_for(lambda: len(daemon.status(socket_path)['clients']) == 1)
+    first.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert not os.path.exists(socket_path)
+    assert not server.sampler.running
+
+    def by_tick(session):
+        return {int(m['gpu_info'][0]['power.draw [W]']): m for m in session.samples}
+
+    all_gpus, gpu1 = by_tick(first_session), by_tick(second_session)
+    # 第二个客户端订阅之后的每个调度时刻，两个客户端都收到了
+    common = [tick for tick in all_gpus if min(gpu1) <= tick <= max(gpu1)]
+    assert sorted(gpu1) == common
+    for tick in common:
+        assert all_gpus[tick]['monotonic_ns'] == gpu1[tick]['monotonic_ns']
+        assert gpu1[tick]['gpu_info'] == [all_gpus[tick]['gpu_info'][1]]
+    # 主机级 array 经 JSON 帧传递后还原
+    sample = first_session.samples[-1]
+    assert sample['cpu_usage_per_core'] == array('f', [10.0, 15.0])
+
+
+def test_daemon_keeps_serving_after_clients_detach(socket_path):
+    server, thread = start_daemon(socket_path)
+    client, session = attach(socket_path, "job")
+    wait_for(lambda: session.samples)
+    client.stop()
+    wait_for(lambda: not server.sampler.running)
+    assert os.path.exists(socket_path)
+    assert daemon.status(socket_path)['clients'] == []
+    server.shutdown()
+    thread.join(timeout=5)
+    assert not os.path.exists(socket_path)
+
+
+def test_frames_are_json():
+    left, right = socket.socketpair()
+    try:
+        message = ['sample', {'gpu_info': [{'index': 0, 'power.draw [W]': 1.5}], 'cpu_usage_per_core': array('f', [1.0])},
+                   "2026-01-01 00:00:00"]
+        frame = daemon._frame(message)
+        assert frame[daemon._LENGTH.size:].startswith(b'["sample",')
+        left.sendall(frame)
+        assert daemon._recv_frame(right) == message
+    finally:
+        left.close()
+        right.close()
+
+
+def test_refuses_socket_owned_by_another_user(socket_path, capsys):
+    server, thread = start_daemon(socket_path)
+    try:
+        if os.getuid() != 0:
+            pytest.skip("changing the socket owner needs root")
+        os.chown(socket_path, os.getuid() + 12345, -1)
+        assert daemon.connect(socket_path) is None
+        assert "not a socket owned by the current user" in capsys.readouterr().out
+    finally:
+        os.chown(socket_path, os.getuid(), -1)
+        server.shutdown()
+        thread.join(timeout=5)
+
+
+def test_refuses_world_writable_socket_directory(socket_path, capsys):
+    os.chmod(os.path.dirname(socket_path), 0o777)
+    server = daemon.SamplerDaemon(socket_path)
+    server.serve_forever()
+    assert "Refusing" in capsys.readouterr().out
+    assert not os.path.exists(socket_path)
+
+
+def test_default_socket_path(monkeypatch):
+    monkeypatch.delenv("AIMETER_SOCKET", raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user/1000")
+    assert daemon.default_socket_path() == "/run/user/1000/aimeter.sock"
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    assert daemon.default_socket_path().endswith(f"aimeter-{os.getuid()}/aimeter.sock")
+    monkeypatch.setenv("AIMETER_SOCKET", "/tmp/custom.sock")
+    assert daemon.default_socket_path() == "/tmp/custom.sock"
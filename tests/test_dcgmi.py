@@ -0,0 +1,149 @@
+"""dcgmi 采集：dmon 输出解析（有无 DVNAM 列）、常驻 dcgmi dmon 子进程与一次性调用的结果一致、
+查询规划把 fp 活跃度与 Gdetails 合并为一次 dcgmi 调用"""
+import os
+import time
+
+import pytest
+
+from AIMeter.collectors import DcgmCollector, build_collectors
+from AIMeter.engine import CollectionEngine
+from AIMeter.metrics_collect import (DCGM_GDETAILS_FIELDS, GPU_QUERY_FIELDS, dcgm_command, get_dcgm_fp32_active,
+                                     merge_query_results, parse_dcgm_output, plan_queries)
+from AIMeter.metrics_stream import DcgmStream
+from fake_backends import dcgmi_output, install_fake_clis
+from conftest import GPUS
+
+FP_FIELDS = "1006,1007,1008"
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(0.01)
+    pytest.fail("condition not met within timeout")
+
+
+@pytest.fixture
+def fake_dcgmi(tmp_path, monkeypatch):
+    """在 PATH 最前面安装支持本文件用到的 Gdetails / fp 活跃度字段组合的 dcgmi 伪命令"""
+    field_sets = (DCGM_GDETAILS_FIELDS, FP_FIELDS, "1007", "1007,1008", DCGM_GDETAILS_FIELDS + ",1006")
+    bin_dir = install_fake_clis(str(tmp_path), GPUS, dcgm_field_sets=field_sets)
+    monkeypatch.setenv("PATH", bin_dir + os.pathsep + os.environ.get("PATH", ""))
+    return bin_dir
+
+
+def test_parses_gdetails_output():
+    rows = parse_dcgm_output(dcgmi_output(GPUS, DCGM_GDETAILS_FIELDS))
+    assert [row['index'] for row in rows] == [0, 1]
+    gpu1 = rows[1]
+    # 设备名称中的空格不影响数值列的对齐
+    assert gpu1['name'] == 'NVIDIA A800 80GB PCIe'
+    assert gpu1['power.draw [W]'] == 212.37
+    assert gpu1['pcie.link.gen.current'] == 4
+    # 活跃度由 0~1 的比例换算为百分比，吞吐由 B/s 换算为 GB/s
+    assert gpu1['sm_active'] == pytest.approx(98.1)
+    assert gpu1['tensor_active'] == pytest.approx(65.5)
+    assert gpu1['pcie_tx_bytes'] == pytest.approx(236223201 / 1024**3)
+    # 显存利用率由 FBUSD / FBFRE 计算，二者本身不输出；图形时钟与 SM 时钟相同
+    assert gpu1['usage.memory [%]'] == pytest.approx(61200 / (61200 + 20300) * 100)
+    assert 'FBUSD' not in gpu1 and 'FBFRE' not in gpu1
+    assert gpu1['clocks.current.graphics [MHz]'] == gpu1['clocks.current.sm [MHz]'] == 1410.0
+
+
+def test_parses_output_without_device_name():
+    rows = parse_dcgm_output(dcgmi_output(GPUS, FP_FIELDS))
+    assert rows == [
+        {'index': 0, 'fp64_active': 0.0, 'fp32_active': pytest.approx(1.2), 'fp16_active': pytest.approx(25.0)},
+        {'index': 1, 'fp64_active': 0.0, 'fp32_active': pytest.approx(3.4), 'fp16_active': pytest.approx(61.1)},
+    ]
+
+
+def test_stream_matches_oneshot(fake_dcgmi):
+    oneshot = DcgmCollector(DCGM_GDETAILS_FIELDS).sample()
+    assert len(oneshot) == GPUS
+    collector = DcgmCollector(DCGM_GDETAILS_FIELDS, stream=True, interval_ms=50)
+    collector.open()
+    try:
+        assert collector._stream is not None
+        assert wait_for(collector._stream.latest) == oneshot
+        assert collector.sample() == oneshot
+    finally:
+        collector.close()
+
+
+def test_stream_drain_returns_rows_since_last_read():
+    stream = DcgmStream(fields=FP_FIELDS, capacity=4)
+    header, _, *rows = dcgmi_output(GPUS, FP_FIELDS).splitlines()
+    stream._handle_line(rows[0])  # 表头之前的行被忽略
+    stream._handle_line(header)
+    for row in rows:
+        stream._handle_line(row)
+    first = stream.drain()
+    assert {idx: [row['fp16_active'] for row in rows] for idx, rows in first.items()} == {0: [25.0], 1: [61.1]}
+    assert stream.drain() == {}
+    # dmon 周期性重复表头；之后只返回新到达的行，超出容量的旧行丢弃
+    for _ in range(6):
+        stream._handle_line(header)
+        stream._handle_line(rows[1])
+    assert {idx: len(rows) for idx, rows in stream.drain().items()} == {1: 4}
+
+
+@pytest.mark.parametrize("additional_metrics, expected", [
+    ([], [('nvidia-smi', GPU_QUERY_FIELDS)]),
+    (['CPU', 'DRAM'], [('nvidia-smi', GPU_QUERY_FIELDS)]),
+    # 未开启 Gdetails 时全部 fp 字段合并为一次 dcgmi 调用，顺序固定为 fp64 / fp32 / fp16
+    (['fp16', 'fp32'], [('nvidia-smi', GPU_QUERY_FIELDS), ('dcgmi', "1007,1008")]),
+    (['fp64', 'fp32', 'fp16'], [('nvidia-smi', GPU_QUERY_FIELDS), ('dcgmi', FP_FIELDS)]),
+    # 开启 Gdetails 时只有一次 dcgmi 调用，fp 字段追加在 Gdetails 字段之后
+    (['Gdetails'], [('dcgmi', DCGM_GDETAILS_FIELDS)]),
+    (['Gdetails', 'fp64'], [('dcgmi', DCGM_GDETAILS_FIELDS + ",1006")]),
+])
+def test_plan_queries(additional_metrics, expected):
+    queries = plan_queries(additional_metrics, indices=(0, 2))
+    assert [(q['backend'], q['fields']) for q in queries] == expected
+    assert all(q['indices'] == [0, 2] for q in queries)
+
+
+def test_dcgm_command_passes_indices_as_separate_argument():
+    assert dcgm_command(FP_FIELDS) == ["dcgmi", "dmon", "-e", FP_FIELDS, "-c", "1"]
+    assert dcgm_command(FP_FIELDS, []) == ["dcgmi", "dmon", "-e", FP_FIELDS, "-c", "1"]
+    assert dcgm_command("1007", [0, 2]) == ["dcgmi", "dmon", "-e", "1007", "-c", "1", "-i", "0,2"]
+
+
+def test_merge_query_results_by_index():
+    base = [{'name': 'A', 'index': 0, 'power.draw [W]': 1.0}, {'name': 'B', 'index': 1, 'power.draw [W]': 2.0}]
+    # 其余结果按索引合并（整数与字符串索引视为相同），基础结果中没有的 GPU 被忽略，index 保持基础结果的值
+    merged = merge_query_results([base, [{'index': '1', 'fp32_active': 3.4}, {'index': 7, 'fp32_active': 9.9}],
+                                  None, [{'index': 0, 'fp16_active': 25.0}]])
+    assert merged == [{'name': 'A', 'index': 0, 'power.draw [W]': 1.0, 'fp16_active': 25.0},
+                      {'name': 'B', 'index': 1, 'power.draw [W]': 2.0, 'fp32_active': 3.4}]
+    assert merge_query_results([]) == []
+    assert merge_query_results([[], [{'index': 0, 'fp32_active': 1.0}]]) == []
+
+
+@pytest.mark.parametrize("additional_metrics, backends", [
+    (['fp32', 'fp16'], ['nvidia-smi', 'dcgmi']),
+    (['Gdetails', 'fp64'], ['dcgmi']),
+])
+def test_engine_merges_planned_queries(fake_dcgmi, additional_metrics, backends):
+    collectors = build_collectors(additional_metrics)
+    assert [c.name for c in collectors] == backends
+    engine = CollectionEngine(collectors)
+    engine.open()
+    try:
+        rows = engine.collect()['gpu_info']
+    finally:
+        engine.close()
+    assert [(row['index'], row['name'], row['power.draw [W]']) for row in rows] == \
+        [(0, 'NVIDIA A800 80GB PCIe', 70.81), (1, 'NVIDIA A800 80GB PCIe', 212.37)]
+    for metric in additional_metrics:
+        if metric.startswith('fp'):
+            assert all(row[f"{metric}_active"] is not None for row in rows)
+
+
+def test_fp_helper_keeps_string_index(fake_dcgmi):
+    assert get_dcgm_fp32_active() == [{'index': '0', 'fp32_active': pytest.approx(1.2)},
+                                      {'index': '1', 'fp32_active': pytest.approx(3.4)}]
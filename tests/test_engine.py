@@ -0,0 +1,155 @@
+"""采集引擎：常驻线程池的并行采集、超时采集器在返回前不再运行也不被关闭、失败的主机级采集器不产生额外的列"""
+import asyncio
+import threading
+import time
+
+from AIMeter.collectors import Collector
+from AIMeter.async_engine import AsyncCollectionEngine
+from AIMeter.engine import CollectionEngine
+
+
+class GpuCollector(Collector):
+    name = "gpu"
+
+    def sample(self):
+        return [{'name': 'GPU', 'index': 0, 'power.draw [W]': 100.0}]
+
+
+class FlakyHostCollector(Collector):
+    """按 outcomes 依次返回结果或抛出异常"""
+    name = "rapl"
+    kind = "host"
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+
+    def sample(self):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class BlockingCollector(Collector):
+    """第一次采样阻塞到 release 被设置，记录同时运行的最大次数"""
+    name = "slow"
+    kind = "host"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.closed_while_running = False
+        self.closed = False
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if self.calls == 1:
+                self.release.wait(5)
+            return {'slow_metric': 1.0}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    async def asample(self):
+        # 与 NVML 采集器相同：线程中的调用无法取消，取消后等它返回再结束
+        future = asyncio.get_running_loop().run_in_executor(None, self.sample)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait([future])
+            raise
+
+    def close(self) -> None:
+        self.closed_while_running = self.closed_while_running or self.running > 0
+        self.closed = True
+
+
+def test_failed_host_collector_adds_no_collector_named_column(capsys):
+    engine = CollectionEngine([GpuCollector(), FlakyHostCollector([
+        RuntimeError("no RAPL"), {'cpu_power': 50.0, 'dram_power': 5.0}, RuntimeError("read failed")])])
+    engine.open()
+    try:
+        first, second, third = engine.collect(), engine.collect(), engine.collect()
+    finally:
+        engine.close()
+    assert "Failed to collect metric: rapl" in capsys.readouterr().out
+    assert 'rapl' not in first and 'cpu_power' not in first
+    assert second['cpu_power'] == 50.0
+    # 失败时已知的列为空值，列集合与成功时相同
+    assert 'rapl' not in third
+    assert third['cpu_power'] is None and third['dram_power'] is None
+    assert set(third) == set(second)
+
+
+def test_timed_out_collector_is_skipped_until_it_returns(capsys):
+    slow = BlockingCollector()
+    engine = CollectionEngine([slow, GpuCollector()], timeout=0.05)
+    engine.open()
+    try:
+        first = engine.collect()
+        assert "slow - timeout (skipped until it returns)" in capsys.readouterr().out
+        assert 'slow.start_ns' not in first
+        second = engine.collect()
+        assert slow.calls == 1 and 'slow.start_ns' not in second
+        assert second['gpu_info'][0]['power.draw [W]'] == 100.0
+        slow.release.set()
+        deadline = time.monotonic() + 5
+        while engine._busy(0) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        third = engine.collect()
+        assert slow.calls == 2 and third['slow_metric'] == 1.0
+    finally:
+        slow.release.set()
+        engine.close()
+    assert slow.max_running == 1
+
+
+def wait_until(predicate):
+    deadline = time.monotonic() + 5
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_disabling_a_running_collector_closes_it_after_it_returns():
+    slow = BlockingCollector()
+    engine = CollectionEngine([slow, GpuCollector()], timeout=0.05)
+    engine.open()
+    try:
+        engine.collect()
+        engine.disable("slow")
+        assert not slow.closed
+        slow.release.set()
+        wait_until(lambda: slow.closed)
+        assert slow.closed and not slow.closed_while_running
+    finally:
+        slow.release.set()
+        engine.close()
+
+
+def test_async_close_waits_for_a_running_collector():
+    slow = BlockingCollector()
+
+    async def main():
+        engine = AsyncCollectionEngine([slow, GpuCollector()], timeout=0.05)
+        engine.open()
+        await engine.collect()
+        engine.close()
+        assert not slow.closed
+        slow.release.set()
+        for _ in range(500):
+            if slow.closed:
+                break
+            await asyncio.sleep(0.01)
+
+    try:
+        asyncio.run(main())
+    finally:
+        slow.release.set()
+    assert slow.closed and not slow.closed_while_running
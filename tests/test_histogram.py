@@ -0,0 +1,93 @@
+"""对数-线性直方图：桶区间覆盖记录的值、分位数的相对误差不超过子桶精度、小值精确、超范围值计入最后一个桶、合并与重置"""
+import math
+
+import numpy as np
+import pytest
+
+from AIMeter.histogram import LogLinearHistogram
+
+
+def nearest_rank(values, p):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(len(ordered) * p / 100)) - 1]
+
+
+@pytest.mark.parametrize("sub_bucket_bits", [3, 5])
+def test_bucket_ranges_cover_values(sub_bucket_bits):
+    histogram = LogLinearHistogram(sub_bucket_bits=sub_bucket_bits, max_exponent=20)
+    sub = 1 << sub_bucket_bits
+    values = set(range(4 * sub))
+    for exponent in range(sub_bucket_bits, 20):
+        values.update({(1 << exponent) - 1, 1 << exponent, (1 << exponent) + 1, 3 << (exponent - 1)})
+    previous = -1
+    for value in sorted(values):
+        index = histogram._index(value)
+        low, high = histogram._bucket_range(index)
+        assert low <= value < high
+        # 桶宽不超过下界的 1/2**sub_bucket_bits；桶号随取值单调不减
+        assert (high - low) * sub <= max(low, sub)
+        assert index >= previous
+        previous = index
+
+
+def test_small_values_are_exact():
+    histogram = LogLinearHistogram()
+    for value in range(32):
+        histogram.record(value)
+    assert [histogram.percentile(p) for p in (1, 50, 100)] == [0, 15, 31]
+    assert histogram.min == 0 and histogram.max == 31 and histogram.mean() == 15.5
+
+
+def test_percentiles_within_relative_error():
+    # 典型的采集耗时分布：毫秒级、长尾
+    values = np.random.default_rng(3).lognormal(math.log(2e6), 0.8, 20000).astype(np.int64).tolist()
+    histogram = LogLinearHistogram()
+    for value in values:
+        histogram.record(value)
+    assert histogram.count == len(values) and histogram.total == sum(values)
+    for p in (1, 10, 50, 90, 99, 99.9, 100):
+        exact = nearest_rank(values, p)
+        assert histogram.percentile(p) == pytest.approx(exact, rel=1 / 32)
+    # 分位数限制在 [min, max] 内
+    assert histogram.percentile(0) >= min(values)
+    assert histogram.percentile(100) <= max(values)
+
+
+def test_values_beyond_range_go_to_last_bucket():
+    histogram = LogLinearHistogram(sub_bucket_bits=2, max_exponent=4)
+    histogram.record(10 ** 9)
+    histogram.record(-5)
+    assert histogram._counts[-1] == 1 and histogram._counts[0] == 1
+    assert (histogram.min, histogram.max) == (0, 10 ** 9)
+    assert histogram.percentile(100) == 10 ** 9
+
+
+def test_merge_and_reset():
+    first, second, combined = LogLinearHistogram(), LogLinearHistogram(), LogLinearHistogram()
+    for value in range(0, 100000, 37):
+        (first if value % 2 else second).record(value)
+        combined.record(value)
+    second.record(7, count=3)
+    combined.record(7, count=3)
+    first.merge(second)
+    assert first._counts == combined._counts
+    assert (first.count, first.total, first.min, first.max) == (combined.count, combined.total, combined.min, combined.max)
+    # 合并空直方图不改变结果
+    first.merge(LogLinearHistogram())
+    assert first.summary() == combined.summary()
+    with pytest.raises(ValueError):
+        first.merge(LogLinearHistogram(sub_bucket_bits=4))
+
+    first.reset()
+    assert first.count == 0 and not any(first._counts)
+    assert first.summary() == {'count': 0, 'mean': None, 'p50': None, 'p90': None, 'p99': None, 'max': None}
+
+
+def test_summary_scale():
+    histogram = LogLinearHistogram()
+    for ms in (1, 2, 3, 4):
+        histogram.record(ms * 1_000_000)
+    summary = histogram.summary(1e6)
+    assert summary['count'] == 4 and summary['mean'] == 2.5 and summary['max'] == 4.0
+    assert summary['p50'] == pytest.approx(2.0, rel=1 / 32)
+    assert summary['p99'] == pytest.approx(4.0, rel=1 / 32)
@@ -0,0 +1,83 @@
+"""多速率采样：各采集器按自己的间隔到期、未到期的 GPU 字段仍按 GPU 写出行、调度间隔取最短的间隔"""
+import pytest
+
+from AIMeter.collectors import Collector, build_collectors
+from AIMeter.engine import CollectionEngine
+from AIMeter.sampler import Sampler
+
+MS = 1_000_000
+
+
+class CountingCollector(Collector):
+    """记录被运行的次数"""
+
+    def __init__(self, name, interval=None, kind="host"):
+        self.name = name
+        self.interval = interval
+        self.kind = kind
+        self.calls = 0
+
+    def sample(self):
+        self.calls += 1
+        if self.kind == "gpu":
+            if self.name == "nvidia-smi":
+                return [{'name': 'GPU', 'index': 0, 'utilization.gpu [%]': 50.0}]
+            return [{'index': 0, 'power.draw [W]': float(self.calls)}]
+        return {f"{self.name}_value": float(self.calls)}
+
+
+def due_names(engine, now_ms):
+    return [engine.collectors[i].name for i in engine._due(now_ms * MS)]
+
+
+def test_due_sets():
+    engine = CollectionEngine([CountingCollector("base"), CountingCollector("power", 0.02), CountingCollector("link", 0.1)])
+    # 第一次全部到期，之后各自按间隔到期；没有间隔的采集器每个调度时刻都运行
+    assert due_names(engine, 0) == ["base", "power", "link"]
+    assert due_names(engine, 10) == ["base"]
+    assert due_names(engine, 20) == ["base", "power"]
+    assert due_names(engine, 40) == ["base", "power"]
+    assert due_names(engine, 100) == ["base", "power", "link"]
+    # 落后超过一个间隔时不补采，从当前时刻重新计时
+    assert due_names(engine, 500) == ["base", "power", "link"]
+    assert due_names(engine, 510) == ["base"]
+    assert due_names(engine, 520) == ["base", "power"]
+
+
+def test_disabled_collectors_are_never_due():
+    engine = CollectionEngine([CountingCollector("base"), CountingCollector("link", 0.1)])
+    engine.disable("link")
+    assert due_names(engine, 0) == ["base"]
+
+
+def test_rows_keep_gpu_identity_when_only_fast_fields_are_due():
+    base = CountingCollector("nvidia-smi", 0.1, kind="gpu")
+    power = CountingCollector("power", 0.02, kind="gpu")
+    engine = CollectionEngine([base, power])
+    engine.open()
+    try:
+        first = engine.collect(now_ns=0)
+        second = engine.collect(now_ns=20 * MS)
+    finally:
+        engine.close()
+    assert first['gpu_info'] == [{'name': 'GPU', 'index': 0, 'utilization.gpu [%]': 50.0, 'power.draw [W]': 1.0}]
+    # 基础查询未到期：name / index 由引擎补齐，未到期的字段不出现（存储层写为空值），也没有它的采集时间
+    assert second['gpu_info'] == [{'name': 'GPU', 'index': 0, 'power.draw [W]': 2.0}]
+    assert 'nvidia-smi.start_ns' not in second and 'power.start_ns' in second
+    assert (base.calls, power.calls) == (1, 2)
+
+
+def test_build_collectors_assigns_intervals(capsys):
+    collectors = build_collectors(['CPU', 'DRAM'], intervals={'power': 0.02, 'rapl': 0.05, 'missing': 1}, default_interval=1)
+    assert {c.name: c.interval for c in collectors} == {
+        'nvidia-smi': 1, 'power': 0.02, 'cpu_stat': 1, 'dram_usage': 1, 'rapl': 0.05}
+    assert "no collector named 'missing'" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("kwargs, tick", [
+    (dict(sampling_interval=1), 1),
+    (dict(sampling_interval=1, intervals={'power': 0.02, 'link': 10}), 0.02),
+    (dict(sampling_interval=0.01, intervals={'link': 10}), 0.01),
+])
+def test_sampler_ticks_at_the_shortest_interval(kwargs, tick):
+    assert Sampler(**kwargs).tick_interval == tick
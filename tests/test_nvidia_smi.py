@@ -0,0 +1,98 @@
+"""nvidia-smi 采集器：一次性调用与常驻子进程的解析结果一致、常驻进程卡住时回退、多速率采样拆分字段组"""
+import os
+import signal
+import time
+
+import pytest
+
+from AIMeter.collectors import NvidiaSmiCollector, build_collectors
+from AIMeter.engine import CollectionEngine
+from AIMeter.metrics_collect import GPU_QUERY_HEADERS, GPU_FIELD_GROUPS
+
+# benchmarks/fixtures/nvidia-smi.txt 中录制的第二块 GPU
+GPU1 = {
+    'name': 'NVIDIA A800 80GB PCIe', 'index': 1, 'power.draw [W]': 212.37,
+    'utilization.gpu [%]': 98.0, 'utilization.memory [%]': 41.0,
+    'pcie.link.gen.current': 4, 'pcie.link.width.current': 16,
+    'temperature.gpu': 71.0, 'temperature.memory': 78.0,
+    'clocks.current.graphics [MHz]': 1410.0, 'clocks.current.memory [MHz]': 1512.0, 'clocks.current.sm [MHz]': 1410.0,
+}
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(0.01)
+    pytest.fail("condition not met within timeout")
+
+
+def test_oneshot_parses_values(fake_clis):
+    rows = NvidiaSmiCollector().sample()
+    assert [row['index'] for row in rows] == [0, 1]
+    assert rows[0]['power.draw [W]'] == 70.81
+    assert rows[1] == GPU1
+
+
+def test_stream_matches_oneshot(fake_clis):
+    oneshot = NvidiaSmiCollector().sample()
+    collector = NvidiaSmiCollector(stream=True, interval_ms=50)
+    collector.open()
+    try:
+        assert collector._stream is not None
+        streamed = wait_for(collector._stream.latest)
+        assert streamed == oneshot
+        assert collector.sample() == oneshot
+    finally:
+        collector.close()
+
+
+def test_stream_subset_matches_oneshot(fake_clis):
+    headers = ['index'] + GPU_FIELD_GROUPS['power']
+    oneshot = NvidiaSmiCollector(headers=headers).sample()
+    assert oneshot == [{'index': 0, 'power.draw [W]': 70.81}, {'index': 1, 'power.draw [W]': 212.37}]
+    collector = NvidiaSmiCollector(stream=True, interval_ms=50, headers=headers, name='power')
+    collector.open()
+    try:
+        assert wait_for(collector._stream.latest) == oneshot
+    finally:
+        collector.close()
+
+
+def test_stalled_stream_falls_back_to_oneshot(fake_clis):
+    collector = NvidiaSmiCollector(stream=True, interval_ms=50)
+    collector.open()
+    stream = collector._stream
+    try:
+        wait_for(stream.latest)
+        # 暂停子进程：它仍然存活，但不再输出
+        os.kill(stream._proc.pid, signal.SIGSTOP)
+        try:
+            time.sleep(stream._stale_ns / 1e9 + 0.1)
+            assert stream.is_alive()
+            assert stream.latest() is None
+            assert collector.sample()[1] == GPU1
+        finally:
+            os.kill(stream._proc.pid, signal.SIGCONT)
+        assert wait_for(stream.latest)[1] == GPU1
+    finally:
+        collector.close()
+
+
+@pytest.mark.parametrize("collect_mode", ["oneshot", "stream"])
+def test_split_field_groups_merge_to_full_rows(fake_clis, collect_mode):
+    collectors = build_collectors([], backend="nvidia-smi", collect_mode=collect_mode, intervals={'power': 0.05, 'link': 0.05})
+    assert [c.name for c in collectors] == ['nvidia-smi', 'power', 'link']
+    assert [h for h in collectors[0].headers if h in GPU_FIELD_GROUPS['power'] + GPU_FIELD_GROUPS['link']] == []
+    engine = CollectionEngine(collectors)
+    engine.open()
+    try:
+        if collect_mode == "stream":
+            wait_for(lambda: all(c._stream.latest() for c in collectors))
+        rows = engine.collect()['gpu_info']
+    finally:
+        engine.close()
+    assert rows[1] == GPU1
+    assert set(rows[0]) == set(GPU_QUERY_HEADERS)
@@ -0,0 +1,110 @@
+"""NVML 采集器：与 nvidia-smi 采集器输出相同的字段和数值、只输出请求的字段、NVML 不可用时回退到 nvidia-smi"""
+import asyncio
+import sys
+
+import pytest
+
+from AIMeter.collectors import NvidiaSmiCollector, NvmlCollector, build_collectors, PCIE_THROUGHPUT_INTERVAL
+from AIMeter.engine import CollectionEngine
+from AIMeter.metric_schema import acquisition_sources
+from fake_backends import FakeNvml
+from conftest import GPUS
+
+PCIE_FIELDS = ('pcie_tx_bytes', 'pcie_rx_bytes')
+
+
+def open_nvml(**kwargs):
+    collector = NvmlCollector(**kwargs)
+    collector.open()
+    return collector
+
+
+def test_matches_nvidia_smi(fake_clis):
+    collector = open_nvml(nvml=FakeNvml(GPUS))
+    rows = collector.sample()
+    collector.close()
+    assert [{k: v for k, v in row.items() if k not in PCIE_FIELDS} for row in rows] == NvidiaSmiCollector().sample()
+    # KB/s -> GB/s
+    assert [(row['pcie_tx_bytes'], row['pcie_rx_bytes']) for row in rows] == [(1.0, 2.0)] * GPUS
+
+
+@pytest.mark.parametrize("fields", [
+    ['utilization.gpu [%]'],
+    ['utilization.memory [%]'],
+    ['power.draw [W]', 'utilization.gpu [%]'],
+    ['pcie.link.gen.current', 'pcie.link.width.current'],
+    ['temperature.memory', 'clocks.current.sm [MHz]'],
+])
+def test_only_requested_fields(fake_clis, fields):
+    collector = open_nvml(nvml=FakeNvml(GPUS), fields=fields)
+    rows = collector.sample()
+    collector.close()
+    assert [set(row) for row in rows] == [{'name', 'index', *fields}] * GPUS
+    assert rows == NvidiaSmiCollector(headers=['name', 'index'] + fields).sample()
+
+
+def test_falls_back_to_nvidia_smi(fake_clis, capsys):
+    fields = ['power.draw [W]', 'utilization.gpu [%]']
+    collector = open_nvml(nvml=FakeNvml(GPUS, fail_init=True), fields=fields)
+    assert "NVML" in capsys.readouterr().out
+    assert collector._fallback is not None
+    expected = [{'name': 'NVIDIA A800 80GB PCIe', 'index': 0, 'power.draw [W]': 70.81, 'utilization.gpu [%]': 23.0},
+                {'name': 'NVIDIA A800 80GB PCIe', 'index': 1, 'power.draw [W]': 212.37, 'utilization.gpu [%]': 98.0}]
+    assert collector.sample() == expected
+    assert asyncio.run(collector.asample()) == expected
+    collector.close()
+
+
+def test_missing_pynvml_falls_back_to_nvidia_smi(fake_clis, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pynvml', None)  # import pynvml 抛出 ImportError
+    collector = open_nvml()
+    assert collector._fallback is not None
+    assert collector.sample() == NvidiaSmiCollector().sample()
+    collector.close()
+
+
+def test_split_field_groups_match_nvidia_smi_backend(fake_clis, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pynvml', FakeNvml(GPUS))
+    intervals = {'power': 0.05, 'link': 0.05}
+    results = {}
+    for backend in ("nvml", "nvidia-smi"):
+        collectors = build_collectors([], backend=backend, intervals=intervals)
+        assert [c.name for c in collectors] == [backend, 'power', 'link'] + (['pcie'] if backend == "nvml" else [])
+        engine = CollectionEngine(collectors)
+        engine.open()
+        try:
+            results[backend] = engine.collect()['gpu_info']
+        finally:
+            engine.close()
+    nvml_rows = [{k: v for k, v in row.items() if k not in PCIE_FIELDS} for row in results["nvml"]]
+    assert nvml_rows == results["nvidia-smi"]
+
+
+def test_pcie_throughput_on_its_own_slow_collector(fake_clis, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pynvml', FakeNvml(GPUS))
+    collectors = build_collectors([], backend="nvml")
+    assert [(c.name, c.interval) for c in collectors] == [("nvml", None), ("pcie", PCIE_THROUGHPUT_INTERVAL)]
+    assert not collectors[0].fields & set(PCIE_FIELDS)
+    assert collectors[1].fields == set(PCIE_FIELDS)
+    engine = CollectionEngine(collectors)
+    engine.open()
+    try:
+        first = engine.collect(now_ns=0)['gpu_info']
+        second = engine.collect(now_ns=int(0.1 * 1e9))['gpu_info']
+    finally:
+        engine.close()
+    # 第一次采样全部运行，之后 PCIe 吞吐在间隔到期前不再读取
+    assert [(row['pcie_tx_bytes'], row['pcie_rx_bytes']) for row in first] == [(1.0, 2.0)] * GPUS
+    assert acquisition_sources('pcie_tx_bytes')[0] == "pcie"
+    assert all(field not in row for row in second for field in PCIE_FIELDS)
+    assert [row['power.draw [W]'] for row in second] == [row['power.draw [W]'] for row in first]
+
+    collectors = build_collectors([], backend="nvml", intervals={'pcie': 0.5})
+    assert collectors[-1].interval == 0.5
+
+
+def test_pcie_collector_does_not_fall_back_to_nvidia_smi(fake_clis):
+    collector = open_nvml(nvml=FakeNvml(GPUS, fail_init=True), fields=PCIE_FIELDS, name="pcie")
+    assert collector._fallback is None
+    assert collector.sample() == []
+    collector.close()
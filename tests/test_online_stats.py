@@ -0,0 +1,76 @@
+"""在线汇总：Welford 统计与 NumPy 一致、汇总只累计数值测量指标、stop() 的结果与离线 calculate_metrics 一致"""
+import math
+import time
+from array import array
+
+import numpy as np
+import pytest
+
+from AIMeter.metrics_calculate import calculate_metrics
+from AIMeter.monitor import Monitor
+from AIMeter.online_stats import EnergyAccumulator, RunningStat, SummaryAccumulator
+
+
+@pytest.mark.parametrize("offset", [0.0, 1e9])
+def test_running_stat_matches_numpy(offset):
+    values = np.random.default_rng(17).normal(250.0, 40.0, 5000) + offset
+    stat = RunningStat()
+    for value in values:
+        stat.add(float(value))
+    assert stat.count == len(values)
+    assert stat.mean == pytest.approx(np.mean(values), rel=1e-12)
+    # 大偏移量下仍与两遍算法的结果一致（朴素的 Σx² 公式会严重损失精度）
+    assert stat.variance == pytest.approx(np.var(values, ddof=1), rel=1e-6)
+    assert stat.std == pytest.approx(np.std(values, ddof=1), rel=1e-6)
+    assert (stat.min, stat.max) == (np.min(values), np.max(values))
+
+
+def test_running_stat_with_few_samples():
+    stat = RunningStat()
+    assert stat.as_dict() == {'mean': 'N/A', 'max': 'N/A', 'min': 'N/A', 'std': 'N/A'}
+    stat.add(3.0)
+    assert stat.as_dict() == {'mean': 3.0, 'max': 3.0, 'min': 3.0, 'std': 0.0}
+    stat.add(5.0)
+    assert stat.variance == 2.0 and stat.std == math.sqrt(2.0)
+
+
+def test_summary_accumulates_measurements_only():
+    summary = SummaryAccumulator()
+    energy = EnergyAccumulator()
+    for i, (power, usage) in enumerate([(100.0, 10.0), (200.0, None), (300.0, 30.0)]):
+        metrics = {
+            'monotonic_ns': i * 1_000_000_000, 'timestamp_ns': i, 'missed_ticks': 0, 'nvidia-smi.start_ns': i,
+            'cpu_usage': usage, 'cpu_usage_per_core': array('f', [usage or 0.0, 50.0]),
+            'gpu_info': [{'name': 'GPU', 'index': 0, 'power.draw [W]': power}],
+        }
+        summary.update(metrics)
+        energy.update(metrics)
+    result = summary.result("job", energy, output="job.csv")
+    assert (result.task_name, result.samples, result.total_time, result.output) == ("job", 3, 2.0, "job.csv")
+    # 缺失值不参与统计；每核数组累计为核间不均衡度；时间列和采样过程记录不参与汇总
+    assert set(result.host_stats) == {'cpu_usage', 'cpu_core_imbalance'}
+    assert result.host_stats['cpu_usage'].count == 2 and result.host_stats['cpu_usage'].mean == 20.0
+    assert result.host_stats['cpu_core_imbalance'].max == 50.0
+    gpu = result.gpu_stats['0']
+    assert gpu['name'] == 'GPU' and gpu['power.draw [W]'].mean == 200.0
+    assert result.energy == {'cpu': None, 'dram': None, 'gpu': {'0': 400.0}, 'total': 400.0,
+                             'gap_time': 0.0, 'gap_energy': 0.0}
+
+
+def test_stop_summary_matches_offline_calculation(fake_clis, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monitor = Monitor("job", sampling_interval=0.02, output_format="csv", quiet=True)
+    monitor.start()
+    try:
+        time.sleep(0.3)
+    finally:
+        result = monitor.stop()
+    offline = calculate_metrics(result.output)
+    assert result.samples >= 5
+    for index in ('0', '1'):
+        online = result.gpu_stats[index]['power.draw [W]']
+        assert online.mean == pytest.approx(offline['gpu_stats'][index]['power.draw [W]']['mean'])
+        assert online.max == pytest.approx(offline['gpu_stats'][index]['power.draw [W]']['max'])
+        # 两种计算都按 nvidia-smi 采集器的读取时刻积分
+        offline_joules = float(offline['energy_consumption']['gpu_energy'][index].split()[0])
+        assert result.energy['gpu'][index] == pytest.approx(offline_joules, abs=0.01)
@@ -0,0 +1,121 @@
+"""监控开销预算：按测量窗口计算 CPU 占用、超出预算时先按 DROP_ORDER 停用采集器再加倍间隔、降级事件写入下一条样本"""
+import types
+
+import pytest
+
+from AIMeter import overhead
+from AIMeter.overhead import OverheadBudget
+
+S = 1_000_000_000
+
+
+class FakeClock:
+    """替换 overhead.time：单调时钟、采样线程的 CPU 时间和墙上时间都由测试推进"""
+
+    def __init__(self):
+        self.ns = 0
+        self.cpu_ns = 0
+
+    def monotonic_ns(self):
+        return self.ns
+
+    def thread_time_ns(self):
+        return self.cpu_ns
+
+    def time_ns(self):
+        return 1_700_000_000 * S + self.ns
+
+
+class FakeEngine:
+    def __init__(self, *names):
+        self.collectors = [types.SimpleNamespace(name=name) for name in ('nvidia-smi',) + names]
+        self.worker_cpu_ns = 0
+        self.disabled = []
+
+    def disable(self, name):
+        self.disabled.append(name)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(overhead, "time", clock)
+    return clock
+
+
+def run_window(budget, clock, engine, usage, interval=None, window=2):
+    """推进一个测量窗口，期间采样线程与采集线程池各消耗一半 CPU 时间"""
+    clock.ns += window * S
+    clock.cpu_ns += int(usage * window * S / 2)
+    engine.worker_cpu_ns += int(usage * window * S / 2)
+    return budget.update(interval)
+
+
+def test_rejects_budget_outside_one_core():
+    for value in (0, 1, 1.5, -0.1):
+        with pytest.raises(ValueError):
+            OverheadBudget(value, 0.1)
+
+
+def test_within_budget_keeps_interval(clock):
+    engine = FakeEngine('pcie', 'cpu_stat')
+    budget = OverheadBudget(0.02, 0.1)
+    budget.start(engine)
+    assert run_window(budget, clock, engine, 0.01) is None
+    assert run_window(budget, clock, engine, 0.01, interval=0.05) == 0.05
+    assert engine.disabled == [] and budget.events == []
+    assert budget.peak == pytest.approx(0.01)
+    # 测量窗口未到时不检查，到达时按整个窗口计算占用
+    clock.ns += S
+    clock.cpu_ns += S
+    assert budget.update() is None and engine.disabled == []
+    clock.ns += S
+    budget.update()
+    assert budget.peak == pytest.approx(0.5) and engine.disabled == ['pcie']
+    # 降级不会自动撤销：占用回落后仍保持已采取的措施
+    assert run_window(budget, clock, engine, 0.01) is None
+    assert budget.peak == pytest.approx(0.5) and engine.disabled == ['pcie']
+
+
+def test_drops_collectors_in_order_then_stretches(clock):
+    # 采集器列表顺序与 DROP_ORDER 不同，停用顺序仍按 DROP_ORDER；第一个（基础）采集器不会被停用
+    engine = FakeEngine('dcgmi', 'cpu_stat', 'rapl', 'link')
+    budget = OverheadBudget(0.02, 0.1, max_stretch=4)
+    budget.start(engine)
+    intervals = [run_window(budget, clock, engine, 0.05) for _ in range(7)]
+    assert engine.disabled == ['link', 'cpu_stat', 'dcgmi']
+    assert intervals == [None, None, None, pytest.approx(0.2), pytest.approx(0.4), pytest.approx(0.4),
+                         pytest.approx(0.4)]
+    assert [action for _, _, action in budget.events] == [
+        "dropped collector 'link'", "dropped collector 'cpu_stat'", "dropped collector 'dcgmi'",
+        "interval raised to 0.2 s", "interval raised to 0.4 s", "budget cannot be met",
+    ]
+    assert all(usage == pytest.approx(0.05) for _, usage, _ in budget.events)
+    # 放宽后的间隔不小于调用方给出的间隔（多速率调度的下一次间隔可能更长）
+    assert run_window(budget, clock, engine, 0.05, interval=1.0) == 1.0
+    assert run_window(budget, clock, engine, 0.05, interval=0.1) == pytest.approx(0.4)
+
+
+def test_events_are_taken_once(clock):
+    engine = FakeEngine('pcie')
+    budget = OverheadBudget(0.02, 0.1)
+    budget.start(engine)
+    assert budget.take_event() is None
+    run_window(budget, clock, engine, 0.5)
+    run_window(budget, clock, engine, 0.5)
+    # 两次采样之间的多个措施合并写入下一条样本
+    assert budget.take_event() == "dropped collector 'pcie'; interval raised to 0.2 s"
+    assert budget.take_event() is None
+    summary = budget.summary()
+    assert summary['budget'] == 0.02 and summary['peak'] == pytest.approx(0.5)
+    assert [event[2] for event in summary['events']] == ["dropped collector 'pcie'", "interval raised to 0.2 s"]
+    assert summary['events'][0][0] == 1_700_000_002 * S
+
+
+def test_without_engine_only_stretches(clock):
+    budget = OverheadBudget(0.02, 0.5, max_stretch=2)
+    budget.start(None)
+    clock.ns += 2 * S
+    clock.cpu_ns += S
+    assert budget.update() == pytest.approx(1.0)
+    assert [action for _, _, action in budget.events] == ["interval raised to 1 s"]
@@ -0,0 +1,116 @@
+"""阶段标记：mark / 嵌套阶段的时长与能耗在线累计、同名阶段合并、样本按调度时刻归属阶段、energy_since 外推"""
+import time
+
+import pytest
+
+from AIMeter.monitor import Monitor
+from AIMeter.online_stats import PhaseTracker
+
+S = 1_000_000_000
+# 两个功耗来源共 150 W
+POWER = 150.0
+
+
+class Clock:
+    def __init__(self):
+        self.ns = 0
+
+    def __call__(self) -> int:
+        return self.ns
+
+
+def sample(tracker, clock, seconds):
+    clock.ns = int(seconds * S)
+    tracker.update({'monotonic_ns': clock.ns, 'cpu_power': 50.0,
+                    'gpu_info': [{'index': 0, 'power.draw [W]': 100.0}]})
+
+
+def totals(tracker):
+    return {name: (seconds, joules, power, count) for name, seconds, joules, power, count in tracker.breakdown()}
+
+
+def test_marks_and_phases_accumulate_duration_and_energy():
+    clock = Clock()
+    tracker = PhaseTracker(clock)
+    sample(tracker, clock, 0)
+    load = tracker.mark("load")
+    assert (load.name, load.monotonic_ns, load.energy) == ("load", 0, 0.0)
+    sample(tracker, clock, 1)
+    sample(tracker, clock, 2)
+    assert tracker.energy_since(load) == pytest.approx(2 * POWER)
+    # 最近一次读取之后按最近功率外推
+    clock.ns = int(2.5 * S)
+    assert tracker.energy_since(load) == pytest.approx(2.5 * POWER)
+
+    clock.ns = 2 * S
+    prefill = tracker.begin("prefill")
+    sample(tracker, clock, 3)
+    tracker.end("prefill")
+    tracker.mark("decode")
+    for start in (3, 4):
+        tracker.begin("step")
+        sample(tracker, clock, start + 1)
+        tracker.end("step")
+    assert tracker.energy_since(prefill) == pytest.approx(3 * POWER)
+
+    clock.ns = int(5.5 * S)
+    tracker.finish()
+    # 会话结束后时刻固定，不再外推
+    clock.ns = 100 * S
+    assert tracker.energy_since(load) == pytest.approx(5.5 * POWER)
+    assert totals(tracker) == {
+        'load': (pytest.approx(3.0), pytest.approx(3 * POWER), pytest.approx(POWER), 1),
+        'prefill': (pytest.approx(1.0), pytest.approx(POWER), pytest.approx(POWER), 1),
+        'step': (pytest.approx(2.0), pytest.approx(2 * POWER), pytest.approx(POWER), 2),
+        'decode': (pytest.approx(2.5), pytest.approx(2.5 * POWER), pytest.approx(POWER), 1),
+    }
+
+
+def test_ending_an_outer_phase_closes_inner_phases():
+    clock = Clock()
+    tracker = PhaseTracker(clock)
+    sample(tracker, clock, 0)
+    tracker.begin("outer")
+    tracker.begin("inner")
+    sample(tracker, clock, 1)
+    tracker.end("outer")
+    assert {name: count for name, *_, count in tracker.breakdown()} == {'inner': 1, 'outer': 1}
+    # 没有结束的阶段计算到当前时刻
+    tracker.begin("open")
+    sample(tracker, clock, 3)
+    assert totals(tracker)['open'][:2] == (pytest.approx(2.0), pytest.approx(2 * POWER))
+
+
+def test_samples_are_labelled_by_schedule_time():
+    clock = Clock()
+    tracker = PhaseTracker(clock)
+    assert tracker.label_at(0) is None
+    clock.ns = 10
+    tracker.mark("load")
+    clock.ns = 20
+    tracker.begin("prefill")
+    # 采样时刻早于切换时刻的样本（切换时尚未分发）仍属于之前的阶段
+    assert tracker.label_at(19) == "load"
+    assert tracker.label_at(20) == "prefill"
+    clock.ns = 30
+    tracker.end("prefill")
+    assert tracker.label_at(30) == "load"
+
+
+def test_monitor_phase_energy(fake_clis):
+    # 伪造 nvidia-smi 的两块 GPU 功耗恒定
+    gpu_power = 70.81 + 212.37
+    monitor = Monitor("llm", sampling_interval=0.02, output_format="none", quiet=True)
+    monitor.start()
+    try:
+        time.sleep(0.1)
+        with monitor.phase("decode") as decode:
+            time.sleep(0.4)
+        energy = monitor.energy_since(decode)
+    finally:
+        result = monitor.stop()
+    assert [name for name, *_ in result.phases] == ["decode"]
+    _, seconds, joules, power, count = result.phases[0]
+    assert count == 1 and seconds == pytest.approx(0.4, abs=0.1)
+    assert power == pytest.approx(gpu_power, rel=0.01)
+    assert energy >= joules
@@ -0,0 +1,110 @@
+"""进程外采样：共享内存样本环的写入 / 读取往返、落后过多与正在覆盖的槽位计为丢失、跨进程读取不出现撕裂的样本"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from AIMeter.monitor import Monitor
+from AIMeter.process_sampler import SharedSampleRing, _SLOT_HEADER, _HEADER_SIZE
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def ring():
+    ring = SharedSampleRing(slots=8, slot_size=64)
+    yield ring
+    ring.close()
+
+
+def attach(ring):
+    return SharedSampleRing(ring.name, slots=ring.slots, slot_size=ring.slot_size)
+
+
+def test_round_trip(ring):
+    reader = attach(ring)
+    try:
+        assert reader.read_since(0) == ([], 0, 0)
+        for i in range(3):
+            assert ring.write(f"sample-{i}".encode())
+        assert reader.read_since(0) == ([b"sample-0", b"sample-1", b"sample-2"], 3, 0)
+        # 只返回序号大于 seq 的样本
+        ring.write(b"sample-3")
+        assert reader.read_since(3) == ([b"sample-3"], 4, 0)
+        assert reader.read_since(4) == ([], 4, 0)
+    finally:
+        reader.close()
+
+
+def test_oversized_payload_is_rejected(ring):
+    assert not ring.write(bytes(ring.slot_size - _SLOT_HEADER.size + 1))
+    assert ring.write(bytes(ring.slot_size - _SLOT_HEADER.size))
+    assert ring.read_since(0)[1] == 1
+
+
+def test_overwritten_samples_are_counted_as_lost(ring):
+    for i in range(ring.slots + 3):
+        ring.write(bytes([i]))
+    records, written, lost = ring.read_since(0)
+    assert written == ring.slots + 3 and lost == 3
+    assert records == [bytes([i]) for i in range(3, ring.slots + 3)]
+
+
+def test_slot_being_written_is_counted_as_lost(ring):
+    for i in range(4):
+        ring.write(bytes([i]))
+    # 模拟写入方正在覆盖第 3 条样本所在的槽位：序号已被置 0
+    _SLOT_HEADER.pack_into(ring._shm.buf, _HEADER_SIZE + 2 * ring.slot_size, 0, 0)
+    records, written, lost = ring.read_since(0)
+    assert (records, written, lost) == ([bytes([0]), bytes([1]), bytes([3])], 4, 1)
+
+
+WRITER = """
+import sys
+from AIMeter.process_sampler import SharedSampleRing
+ring = SharedSampleRing(sys.argv[1], slots=int(sys.argv[2]), slot_size=int(sys.argv[3]))
+for i in range(int(sys.argv[4])):
+    # 每条样本的全部字节相同，读取到混合了两条样本的数据即为撕裂
+    ring.write(bytes([i % 251]) * (ring.slot_size - 16))
+ring.close()
+"""
+
+
+def test_reader_never_sees_torn_samples_from_another_process():
+    ring = SharedSampleRing(slots=4, slot_size=4096)
+    count = 20000
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+    writer = subprocess.Popen([sys.executable, "-c", WRITER, ring.name, str(ring.slots), str(ring.slot_size), str(count)], env=env)
+    try:
+        seq = received = lost = 0
+        while True:
+            records, seq, missed = ring.read_since(seq)
+            for payload in records:
+                assert payload == payload[:1] * len(payload)
+            received += len(records)
+            lost += missed
+            if writer.poll() is not None and seq == ring.read_since(seq)[1]:
+                break
+        assert writer.returncode == 0
+        assert seq == count and received + lost == count and received > 0
+    finally:
+        writer.kill()
+        writer.wait()
+        ring.close()
+
+
+def test_monitor_with_sampler_process(fake_clis):
+    monitor = Monitor("job", sampling_interval=0.05, output_format="none", quiet=True, sampler_process=True)
+    monitor.start()
+    try:
+        assert monitor._sampler._process is not None
+        time.sleep(0.5)
+        # window() 先取回子进程已写入的样本
+        assert len(monitor.window(gpu=0)) >= 3
+    finally:
+        result = monitor.stop()
+    assert result.samples >= 3
+    assert set(result.gpu_stats) == {'0', '1'}
+    assert result.gpu_stats['1']['power.draw [W]'].mean == pytest.approx(212.37)
@@ -0,0 +1,126 @@
+"""RAPL 功耗：伪造的 powercap 目录上的计数差值、计数器回绕（使用 open() 时缓存的 max_energy_range_uj）、按插槽输出"""
+import os
+
+import pytest
+
+from AIMeter import host_readers, metrics_collect, state
+from AIMeter.collectors import RaplCollector
+from AIMeter.host_readers import RaplReader
+from fake_backends import make_fake_rapl
+
+MAX_ENERGY_UJ = 262143328850  # make_fake_rapl 写入的 max_energy_range_uj
+
+
+class FakeClock:
+    """替代 host_readers 中的 time 模块，让两次读取之间的间隔精确可控"""
+
+    def __init__(self):
+        self.ns = 1_000_000_000
+
+    def monotonic_ns(self) -> int:
+        return self.ns
+
+    def advance(self, seconds: float) -> None:
+        self.ns += int(seconds * 1e9)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(host_readers, "time", clock)
+    return clock
+
+
+def rapl_root(tmp_path, sockets=2):
+    return make_fake_rapl(str(tmp_path), sockets)
+
+
+def write(root, entry, filename, value):
+    with open(os.path.join(root, entry, filename), "w") as f:
+        f.write(f"{value}\n")
+
+
+def add_energy(root, entry, delta_uj):
+    path = os.path.join(root, entry, "energy_uj")
+    with open(path) as f:
+        energy = int(f.read())
+    write(root, entry, "energy_uj", energy + delta_uj)
+
+
+def test_per_socket_output(tmp_path, clock):
+    root = rapl_root(tmp_path)
+    collector = RaplCollector(root=root)
+    collector.open()
+    clock.advance(2)
+    for entry, watts in (("intel-rapl:0", 50), ("intel-rapl:1", 70), ("intel-rapl:0:0", 5), ("intel-rapl:1:0", 7)):
+        add_energy(root, entry, watts * 2_000_000)
+    metrics = collector.sample()
+    collector.close()
+    assert metrics == pytest.approx({
+        'cpu_power': 120.0, 'cpu_power.socket0': 50.0, 'cpu_power.socket1': 70.0,
+        'dram_power': 12.0, 'dram_power.socket0': 5.0, 'dram_power.socket1': 7.0,
+    })
+
+
+def test_single_socket_has_no_socket_columns(tmp_path, clock):
+    root = rapl_root(tmp_path, sockets=1)
+    collector = RaplCollector(dram=False, root=root)
+    collector.open()
+    clock.advance(1)
+    add_energy(root, "intel-rapl:0", 80_000_000)
+    assert collector.sample() == pytest.approx({'cpu_power': 80.0})
+    collector.close()
+
+
+def test_wraparound_uses_cached_max_energy_range(tmp_path, clock):
+    root = rapl_root(tmp_path, sockets=1)
+    reader = RaplReader(root)
+    assert reader.open() == 2
+    # open() 之后 max_energy_range_uj 变得不可读，回绕仍按缓存的值计算
+    write(root, "intel-rapl:0", "max_energy_range_uj", "")
+    write(root, "intel-rapl:0", "energy_uj", MAX_ENERGY_UJ - 10_000_000)
+    clock.advance(1)
+    reader.read()
+    write(root, "intel-rapl:0", "energy_uj", 30_000_000)  # 回绕
+    clock.advance(0.5)
+    powers = reader.read()
+    reader.close()
+    assert powers['package'][0] == pytest.approx((10_000_000 + 1 + 30_000_000) * 1e-6 / 0.5)
+
+
+def test_wraparound_without_max_energy_range_is_dropped(tmp_path, clock):
+    root = rapl_root(tmp_path, sockets=1)
+    os.remove(os.path.join(root, "intel-rapl:0", "max_energy_range_uj"))
+    reader = RaplReader(root)
+    reader.open()
+    write(root, "intel-rapl:0", "energy_uj", 1000)
+    clock.advance(1)
+    powers = reader.read()
+    reader.close()
+    assert 0 not in powers.get('package', {})
+
+
+def test_missing_powercap_reports_none(tmp_path, clock):
+    collector = RaplCollector(root=str(tmp_path / "missing"))
+    collector.open()
+    clock.advance(1)
+    assert collector.sample() == {'cpu_power': None, 'dram_power': None}
+    collector.close()
+
+
+def test_legacy_power_helpers_wrap_rapl_reader(tmp_path, clock, monkeypatch):
+    root = rapl_root(tmp_path)
+    monkeypatch.setattr(state, "_host_readers", {})
+    monkeypatch.setattr(metrics_collect, "RaplReader", lambda: RaplReader(root))
+    # 第一次调用只建立基准
+    assert metrics_collect.get_cpu_power_info() is None
+    assert metrics_collect.get_dram_power_info(sample_interval=1) is None
+    clock.advance(1)
+    for entry, delta_uj in (("intel-rapl:0", 40_000_000), ("intel-rapl:1", 60_000_000),
+                            ("intel-rapl:0:0", 3_000_000), ("intel-rapl:1:0", 4_000_000)):
+        add_energy(root, entry, delta_uj)
+    assert metrics_collect.get_cpu_power_info() == pytest.approx(100.0)
+    # DRAM 使用自己的读取器，距离它的上一次读取同样是 1 秒
+    assert metrics_collect.get_dram_power_info() == pytest.approx(7.0)
+    for reader in state._host_readers.values():
+        reader.close()
@@ -0,0 +1,78 @@
+"""列式环形缓冲区：绕回后窗口仍是按时间顺序的连续零拷贝视图、按时间截取窗口、追加列、按 GPU / 主机分开存放"""
+import math
+import time
+
+import numpy as np
+
+from AIMeter.ring_buffer import RingBuffer, SampleRing
+
+
+def test_wraparound_keeps_latest_samples_in_order():
+    buf = RingBuffer(['power.draw [W]'], capacity=4)
+    for i in range(6):
+        buf.append(1000 + i, {'power.draw [W]': float(i)})
+    assert len(buf) == 4
+    window = buf.window()
+    assert window.timestamps.tolist() == [1002, 1003, 1004, 1005]
+    assert window['power.draw [W]'].tolist() == [2.0, 3.0, 4.0, 5.0]
+    # 双写布局：窗口是内部数组的切片，不做拷贝
+    assert np.shares_memory(window['power.draw [W]'], buf._data)
+    # 继续写入会覆盖视图，copy() 后的窗口保持不变
+    kept = window.copy()
+    buf.append(1006, {'power.draw [W]': 6.0})
+    assert buf.window()['power.draw [W]'].tolist() == [3.0, 4.0, 5.0, 6.0]
+    assert kept['power.draw [W]'].tolist() == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_window_since_and_missing_values():
+    buf = RingBuffer(['power.draw [W]', 'utilization.gpu [%]'], capacity=8)
+    assert len(buf.window()) == 0
+    for i in range(5):
+        buf.append(i * 100, {'power.draw [W]': float(i), 'utilization.gpu [%]': None if i % 2 else 50.0})
+    window = buf.window(since_ns=250)
+    assert window.timestamps.tolist() == [300, 400]
+    assert window['power.draw [W]'].tolist() == [3.0, 4.0]
+    assert math.isnan(window['utilization.gpu [%]'][0]) and window['utilization.gpu [%]'][1] == 50.0
+    assert len(buf.window(since_ns=1000)) == 0
+
+
+def test_add_columns_fills_earlier_samples_with_nan():
+    buf = RingBuffer(['power.draw [W]'], capacity=4)
+    buf.append(1, {'power.draw [W]': 1.0})
+    before = buf.window()
+    buf.add_columns(['power.draw [W]', 'temperature.gpu'])
+    buf.append(2, {'power.draw [W]': 2.0, 'temperature.gpu': 40.0})
+    window = buf.window()
+    assert buf.columns == ['power.draw [W]', 'temperature.gpu']
+    assert window['power.draw [W]'].tolist() == [1.0, 2.0]
+    assert math.isnan(window['temperature.gpu'][0]) and window['temperature.gpu'][1] == 40.0
+    assert before['power.draw [W]'].tolist() == [1.0]
+
+
+def test_sample_ring_splits_gpus_and_host():
+    ring = SampleRing(capacity=16)
+    now = time.time_ns()
+    for i in range(3):
+        ring.append(now - (2 - i) * 10**9, {
+            'cpu_usage': 10.0 * i,
+            'nvml.start_ns': 123, 'nvml.end_ns': 456,
+            'gpu_info': [{'name': 'GPU', 'index': gpu, 'power.draw [W]': 100.0 * gpu + i} for gpu in (0, 1)],
+        })
+    windows = ring.window()
+    assert set(windows) == {'host', 0, 1}
+    # 只保存注册表中的数值指标：设备名称和纳秒时间列不存为列
+    assert set(windows['host'].keys()) == {'cpu_usage'}
+    assert set(windows[1].keys()) == {'power.draw [W]'}
+    assert windows[1]['power.draw [W]'].tolist() == [100.0, 101.0, 102.0]
+    assert ring.window(seconds=1.5, gpu=0)['power.draw [W]'].tolist() == [1.0, 2.0]
+    assert ring.window(gpu=7) is None
+
+
+def test_sample_ring_adds_late_metrics():
+    ring = SampleRing(capacity=16)
+    ring.append(1, {'gpu_info': [{'index': 0, 'power.draw [W]': 1.0}]})
+    ring.append(2, {'cpu_usage': 5.0, 'gpu_info': [{'index': 0, 'power.draw [W]': 2.0, 'temperature.gpu': 40.0}]})
+    windows = ring.window()
+    assert windows['host'].timestamps.tolist() == [2]
+    assert windows[0].timestamps.tolist() == [1, 2]
+    assert math.isnan(windows[0]['temperature.gpu'][0]) and windows[0]['temperature.gpu'][1] == 40.0
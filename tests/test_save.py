@@ -0,0 +1,49 @@
+"""CSV 输出：中途出现的列在采样过程中只追加到行尾，会话结束时一次性补全表头"""
+import csv
+from types import SimpleNamespace
+
+from AIMeter.save import save_to_csv, finalize_csv
+
+
+def csv_ctx():
+    return SimpleNamespace(_csv_file_path=None, _csv_fieldnames=None, _csv_header_columns=None, _inserted_count=-1)
+
+
+def sample(power, **host):
+    return {'timestamp_ns': 1, **host, 'gpu_info': [{'name': 'GPU', 'index': 0, 'power.draw [W]': power}]}
+
+
+def test_late_columns_do_not_rewrite_the_file_until_finalize(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ctx = csv_ctx()
+    save_to_csv("job", sample(100.0), "stamp", "t0", ctx=ctx)
+    path = tmp_path / "job_stamp.csv"
+    header = path.read_text().splitlines()[0]
+    inode = path.stat().st_ino
+
+    save_to_csv("job", sample(110.0, cpu_power=55.0), "stamp", "t1", ctx=ctx)
+    save_to_csv("job", sample(120.0), "stamp", "t2", ctx=ctx)
+    # 采样过程中既不重写文件也不替换它，只在之后的行尾追加新列
+    lines = path.read_text().splitlines()
+    assert lines[0] == header
+    assert path.stat().st_ino == inode
+    assert lines[2].endswith(",55.0")
+    assert ctx._csv_header_columns == len(header.split(","))
+
+    finalize_csv(ctx)
+    assert ctx._csv_header_columns is None
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['cpu_power'] for row in rows] == ['', '55.0', '']
+    assert [row['power.draw [W]'] for row in rows] == ['100.0', '110.0', '120.0']
+    assert ctx._inserted_count == 3
+
+
+def test_finalize_without_new_columns_leaves_the_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ctx = csv_ctx()
+    save_to_csv("job", sample(100.0, cpu_power=50.0), "stamp", "t0", ctx=ctx)
+    path = tmp_path / "job_stamp.csv"
+    inode = path.stat().st_ino
+    finalize_csv(ctx)
+    assert path.stat().st_ino == inode
@@ -0,0 +1,117 @@
+"""截止时刻调度：采样耗时不累积为漂移、超时后 skip / coalesce 的对齐与丢弃计数、能耗跨越缺口积分"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from AIMeter import scheduler as scheduler_module
+from AIMeter.metrics_calculate import integrate_energy
+from AIMeter.online_stats import EnergyAccumulator
+from AIMeter.scheduler import DeadlineScheduler
+
+MS = 1_000_000
+
+
+class FakeClock:
+    """替代 scheduler 中的 time 模块：sleep() 直接推进时钟"""
+
+    def __init__(self):
+        self.ns = 0
+
+    def monotonic_ns(self) -> int:
+        return self.ns
+
+    def sleep(self, seconds: float) -> None:
+        self.ns += round(seconds * 1e9)
+
+    def work(self, ms: float) -> None:
+        self.ns += int(ms * MS)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module, "time", clock)
+    return clock
+
+
+def run(scheduler, clock, work_ms):
+    """按 work_ms 中每次采样的耗时运行调度循环，返回每次的截止时刻（毫秒）"""
+    deadlines = []
+    for ms in work_ms:
+        deadlines.append(scheduler.wait() / MS)
+        clock.work(ms)
+        scheduler.advance()
+    return deadlines
+
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        DeadlineScheduler(0.1, policy="catch-up")
+
+
+def test_sample_duration_does_not_drift(clock):
+    scheduler = DeadlineScheduler(0.1)
+    assert run(scheduler, clock, [30, 70, 99, 10, 50]) == [0, 100, 200, 300, 400]
+    assert scheduler.missed == 0 and scheduler.overrun.count == 0
+    assert scheduler.ticks == 5
+
+
+def test_skip_aligns_to_the_grid(clock):
+    scheduler = DeadlineScheduler(0.1, policy="skip")
+    # 第二次采样耗时 350 ms，错过 200 / 300 / 400 三个时刻，下一次对齐到 500
+    assert run(scheduler, clock, [10, 350, 10, 10]) == [0, 100, 500, 600]
+    assert scheduler.missed == 3
+    assert scheduler.take_missed() == 3 and scheduler.take_missed() == 0
+    assert scheduler.overrun.count == 1
+
+
+def test_coalesce_runs_one_late_sample(clock):
+    scheduler = DeadlineScheduler(0.1, policy="coalesce")
+    # 错过的三个时刻合并为一次在 450 立即执行的采样，之后以它为新的基准
+    assert run(scheduler, clock, [10, 350, 10, 10]) == [0, 100, 450, 550]
+    assert scheduler.missed == 2
+    assert scheduler.take_missed() == 2
+    summary = scheduler.summary()
+    assert (summary['policy'], summary['ticks'], summary['missed'], summary['overruns']) == ("coalesce", 4, 2, 1)
+
+
+def test_advance_with_adaptive_interval(clock):
+    scheduler = DeadlineScheduler(0.1)
+    scheduler.start()
+    scheduler.wait()
+    scheduler.advance(0.25)
+    assert scheduler.wait() == 250 * MS
+    scheduler.advance()
+    assert scheduler.wait() == 350 * MS
+
+
+def test_integrate_energy_across_gaps():
+    seconds = pd.Series([0.0, 1.0, 4.0, 5.0])
+    power = pd.Series([100.0, 100.0, 200.0, 200.0])
+    # 4.0 s 的样本之前丢弃了两个时刻：1~4 s 的梯形照常计入，另外报告为缺口
+    joules, gap_seconds, gap_joules = integrate_energy(seconds, power, pd.Series([0, 0, 2, 0]))
+    assert joules == pytest.approx(100 + 450 + 200)
+    assert (gap_seconds, gap_joules) == (pytest.approx(3.0), pytest.approx(450.0))
+    assert integrate_energy(seconds, power)[1:] == (0.0, 0.0)
+
+
+def test_integrate_energy_skips_missing_and_unordered_samples():
+    seconds = pd.Series([2.0, 0.0, 1.0, 3.0])
+    power = pd.Series([300.0, 100.0, np.nan, 300.0])
+    # 1.0 s 的功率缺失，0~2 s 由两端的有效样本连接；时间无序时先排序
+    assert integrate_energy(seconds, power, pd.Series([None, 0, 0, 1]))[0] == pytest.approx(400 + 300)
+    assert integrate_energy(pd.Series([0.0, 1.0]), pd.Series([np.nan, 5.0])) == (None, 0.0, 0.0)
+
+
+def test_online_energy_matches_offline_integration():
+    samples = [(0.0, 100.0, 0), (0.5, 120.0, 0), (2.0, 80.0, 2), (2.5, 90.0, 0), (4.0, 60.0, 1)]
+    accumulator = EnergyAccumulator()
+    for seconds, power, missed in samples:
+        accumulator.update({'monotonic_ns': int(seconds * 1e9), 'missed_ticks': missed,
+                            'gpu_info': [{'index': 0, 'power.draw [W]': power}]})
+    t, p, m = (pd.Series(column) for column in zip(*samples))
+    joules, gap_seconds, gap_joules = integrate_energy(t, p, m)
+    assert accumulator.energy == pytest.approx(joules)
+    assert accumulator.sources == {'0': pytest.approx(joules)}
+    assert accumulator.gap_time == pytest.approx(gap_seconds)
+    assert accumulator.gap_energy == pytest.approx(gap_joules)
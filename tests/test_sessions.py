@@ -0,0 +1,79 @@
+"""会话：Decimator 按会话间隔抽取样本、共享采样器把每次采样分发给所有会话、并发会话共用一个采样器"""
+import time
+
+from AIMeter import state
+from AIMeter.monitor import Monitor
+from AIMeter.sampler import Decimator, Sampler
+
+MS = 1_000_000
+
+
+def accepted(decimator, ticks_ms):
+    return [t for t in ticks_ms if decimator.accept(t * MS)]
+
+
+def test_decimator_keeps_everything_at_or_below_the_tick():
+    assert accepted(Decimator(0.1, 0.1), range(0, 500, 100)) == [0, 100, 200, 300, 400]
+    assert accepted(Decimator(0.05, 0.1), range(0, 300, 100)) == [0, 100, 200]
+
+
+def test_decimator_picks_one_sample_per_interval():
+    assert accepted(Decimator(1.0, 0.1), range(0, 2600, 100)) == [0, 1000, 2000]
+    # 半个调度间隔以内的唤醒抖动不会把样本推到下一个间隔
+    assert accepted(Decimator(1.0, 0.1), [0, 960, 1040, 1960, 2010]) == [0, 960, 1960]
+    # 调度器丢弃了时刻时，从下一个到达的样本重新计时
+    assert accepted(Decimator(1.0, 0.1), [0, 2500, 3000, 3500]) == [0, 2500, 3500]
+
+
+class RecordingSession:
+    def __init__(self, task_name, fail=False):
+        self.task_name = task_name
+        self.fail = fail
+        self.samples = []
+
+    def _on_sample(self, sampler, metrics, time_stamp_insert):
+        if self.fail:
+            raise RuntimeError("sink down")
+        self.samples.append(sampler.complete(metrics))
+
+
+def publish(sampler, i, metrics):
+    sampler._publish({'timestamp_ns': i, 'monotonic_ns': i, **metrics}, f"t{i}")
+
+
+def test_each_sample_is_fanned_out_to_every_session(capsys):
+    sampler = Sampler(sampling_interval=0.1)
+    first, broken, second = RecordingSession("job"), RecordingSession("broken", fail=True), RecordingSession("epoch")
+    for session in (first, broken, second):
+        sampler.subscribe(session)
+    publish(sampler, 1, {'cpu_power': 10.0, 'gpu_info': [{'name': 'GPU', 'index': 0, 'power.draw [W]': 100.0}]})
+    # 多速率采样中未到期的键按第一次采样的列补齐为空值
+    publish(sampler, 2, {'gpu_info': [{'name': 'GPU', 'index': 0}]})
+    # 一个会话出错不影响其他会话
+    assert "Session 'broken' failed to handle a sample: sink down" in capsys.readouterr().out
+    assert first.samples == second.samples
+    assert first.samples[1]['cpu_power'] is None
+    assert first.samples[1]['gpu_info'] == [{'name': 'GPU', 'index': 0, 'power.draw [W]': None}]
+    assert sampler.unsubscribe(broken) == 2
+    assert sampler.unsubscribe(first) == 1
+    publish(sampler, 3, {'cpu_power': 30.0, 'gpu_info': []})
+    assert len(first.samples) == 2 and len(second.samples) == 3
+
+
+def test_concurrent_sessions_share_one_sampler(fake_clis):
+    job = Monitor("job", sampling_interval=0.05, output_format="none", quiet=True)
+    epoch = Monitor("epoch", sampling_interval=0.25, output_format="none", quiet=True)
+    job.start()
+    try:
+        epoch.start()
+        assert job._sampler is epoch._sampler is state._sampler
+        time.sleep(1.2)
+        epoch_result = epoch.stop()
+        # 还有会话在运行，共享采样器继续采样
+        assert state._sampler is job._sampler
+    finally:
+        job_result = job.stop()
+    assert state._sampler is None
+    assert job_result.samples > epoch_result.samples >= 3
+    assert epoch_result.samples <= job_result.samples // 3
+    assert set(epoch_result.gpu_stats) == set(job_result.gpu_stats) == {'0', '1'}
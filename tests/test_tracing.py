@@ -0,0 +1,98 @@
+"""流水线追踪：dump() 输出 Chrome trace-event JSON、超出容量时覆盖最早的区间并计入丢弃数、未开启时 span 不记录、Monitor(trace=...) 写出采集区间"""
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from AIMeter import state, tracing
+from AIMeter.monitor import Monitor
+from AIMeter.tracing import Tracer, span
+
+
+@pytest.fixture(autouse=True)
+def no_tracer():
+    tracing.disable()
+    yield
+    tracing.disable()
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def complete_events(trace):
+    return [event for event in trace['traceEvents'] if event['ph'] == 'X']
+
+
+def test_dump_schema(tmp_path):
+    tracer = Tracer()
+    tracer.add("nvidia-smi", "collector", 1_000_000, 3_500_000, args={'gpus': 2})
+    tracer.add("dcgmi", "collector", 2_000_000, 2_250_000, lane="collector dcgmi")
+    tracer.add_events([{'name': 'ring', 'cat': 'sampler', 'ph': 'X', 'ts': 1.0, 'dur': 2.0, 'pid': 1, 'tid': 1}])
+    path = tracer.dump(str(tmp_path / "trace.json"))
+    assert os.path.isabs(path)
+
+    trace = load(path)
+    assert trace['displayTimeUnit'] == 'ms'
+    assert trace['otherData'] == {'recorded_spans': 2, 'dropped_spans': 0}
+    pid = os.getpid()
+    metadata = [event for event in trace['traceEvents'] if event['ph'] == 'M']
+    assert {'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': f"AIMeter ({pid})"}} in metadata
+    threads = {event['tid']: event['args']['name'] for event in metadata if event['name'] == 'thread_name'}
+    # 时间单位为微秒；虚拟线程使用负的线程号，不与真实线程冲突
+    smi, dcgmi, foreign = complete_events(trace)
+    assert smi == {'name': 'nvidia-smi', 'cat': 'collector', 'ph': 'X', 'ts': 1000.0, 'dur': 2500.0,
+                   'pid': pid, 'tid': threading.get_native_id(), 'args': {'gpus': 2}}
+    assert threads[smi['tid']] == threading.current_thread().name
+    assert (dcgmi['ts'], dcgmi['dur'], dcgmi['tid']) == (2000.0, 250.0, -1) and 'args' not in dcgmi
+    assert threads[-1] == "collector dcgmi"
+    # 其它进程报告的事件原样保留
+    assert foreign['pid'] == 1
+
+
+def test_capacity_drops_oldest_spans(tmp_path):
+    tracer = Tracer(capacity=3)
+    for i in range(5):
+        tracer.add(f"s{i}", "sampler", i * 1000, i * 1000 + 500)
+    trace = load(tracer.dump(str(tmp_path / "trace.json")))
+    assert [event['name'] for event in complete_events(trace)] == ["s2", "s3", "s4"]
+    assert trace['otherData'] == {'recorded_spans': 5, 'dropped_spans': 2}
+
+
+def test_span_records_only_when_enabled(tmp_path):
+    with span("merge", "engine"):
+        pass
+    assert tracing.now() is None and tracing.lap("x", None) is None
+    assert tracing.dump(str(tmp_path / "off.json")) is None
+    assert not os.path.exists(tmp_path / "off.json")
+
+    tracer = tracing.enable(capacity=10)
+    assert tracing.enable() is tracer and state._tracer is tracer
+    with span("merge", "engine", args={'keys': 3}):
+        time.sleep(0.01)
+    t = tracing.now()
+    t = tracing.lap("mysql.connect", t)
+    tracing.lap("mysql.insert", t)
+    events = complete_events(load(tracing.dump(str(tmp_path / "on.json"))))
+    assert [(event['name'], event['cat']) for event in events] == [
+        ("merge", "engine"), ("mysql.connect", "sink"), ("mysql.insert", "sink")]
+    assert events[0]['args'] == {'keys': 3} and events[0]['dur'] >= 10_000
+    # 分段计时首尾相接
+    assert events[2]['ts'] == pytest.approx(events[1]['ts'] + events[1]['dur'])
+
+
+def test_monitor_writes_trace(fake_clis, tmp_path):
+    path = str(tmp_path / "pipeline.json")
+    monitor = Monitor("job", sampling_interval=0.05, output_format="none", quiet=True, trace=path)
+    monitor.start()
+    try:
+        time.sleep(0.3)
+    finally:
+        monitor.stop()
+    # stop() 写出追踪后关闭自己开启的追踪
+    assert state._tracer is None
+    names = {event['name'] for event in complete_events(load(path))}
+    assert {"nvidia-smi", "merge", "ring", "job"} <= names